@@ -54,9 +54,11 @@ from api_endpoints.financeGPT.chatbot_endpoints import (
     add_message_to_db,
     add_sources_to_db,
     get_relevant_chunks,
+    get_relevant_chunks_multi,
     retrieve_docs_from_db,
     retrieve_message_from_db,
 )
+from services.lexical_index import RETRIEVAL_MODE, RETRIEVAL_MODES
 
 # ---------------------------------------------------------------------------
 # Tool registry — one canonical definition, converted per-provider below
@@ -66,7 +68,7 @@ _TOOL_SPECS: list[dict] = [
     {
         "name": "retrieve_documents",
         "description": (
-            "Semantic search over the user's uploaded documents. "
+            "Keyword and semantic search over the user's uploaded documents. "
             "ALWAYS call this first before answering any factual question. "
             "Returns the most relevant text chunks with their source filenames."
         ),
@@ -82,6 +84,15 @@ _TOOL_SPECS: list[dict] = [
                     "description": "Number of chunks to retrieve (1–10). Default 6.",
                     "default": 6,
                 },
+                "mode": {
+                    "type": "string",
+                    "enum": ["hybrid", "lexical", "vector"],
+                    "description": (
+                        "hybrid combines keyword and semantic ranking; lexical matches exact "
+                        "tickers, section numbers and figures without an embedding call; vector is "
+                        "purely semantic. Omit to use the configured default."
+                    ),
+                },
             },
             "required": ["query"],
         },
@@ -215,6 +226,15 @@ _TOOL_SPECS: list[dict] = [
                     "description": "Chunks per query (1–6, default 3).",
                     "default": 3,
                 },
+                "mode": {
+                    "type": "string",
+                    "enum": ["hybrid", "lexical", "vector"],
+                    "description": (
+                        "hybrid combines keyword and semantic ranking; lexical matches exact "
+                        "tickers, section numbers and figures without an embedding call; vector is "
+                        "purely semantic. Omit to use the configured default."
+                    ),
+                },
             },
             "required": ["queries"],
         },
@@ -1073,10 +1093,15 @@ def _execute_tool(
         return f"Tool error ({name}): {exc}\n{traceback.format_exc()[:400]}", docs, charts
 
 
+def _retrieval_mode(inputs: dict) -> str:
+    mode = str(inputs.get("mode") or RETRIEVAL_MODE).lower()
+    return mode if mode in RETRIEVAL_MODES else RETRIEVAL_MODE
+
+
 def _tool_retrieve(inputs: dict, chat_id: int, user_email: str, docs: list) -> tuple[str, list]:
     query = inputs.get("query", "")
     k = min(int(inputs.get("k", 6)), 10)
-    chunks = get_relevant_chunks(k, query, chat_id, user_email)
+    chunks = get_relevant_chunks(k, query, chat_id, user_email, mode=_retrieval_mode(inputs))
     if not chunks:
         return "No relevant document chunks found for this query.", docs
     parts = []
@@ -1143,8 +1168,8 @@ def _tool_search_web(inputs: dict) -> str:
     import re
     import urllib.parse
 
-    import requests
     from bs4 import BeautifulSoup
+    from services.http_fetch import session
 
     query = inputs.get("query", "").strip()
     num = min(int(inputs.get("num_results", 5)), 10)
@@ -1159,7 +1184,7 @@ def _tool_search_web(inputs: dict) -> str:
         )
     }
     try:
-        resp = requests.post(url, data={"q": query}, headers=headers, timeout=10)
+        resp = session().post(url, data={"q": query}, headers=headers, timeout=10)
         resp.raise_for_status()
     except Exception as exc:
         return f"[Web search failed: {exc}]"
@@ -1190,9 +1215,14 @@ def _tool_search_web(inputs: dict) -> str:
 
 
 def _tool_fetch_url(inputs: dict) -> str:
-    """Fetch and extract readable text from a URL."""
-    import requests
+    """Fetch and extract readable text from a public URL.
+
+    Goes through ``services.http_fetch``: pooled connections, no private or
+    loopback hosts (redirects included), and an unchanged page is revalidated
+    with one conditional request and not re-parsed.
+    """
     from bs4 import BeautifulSoup
+    from services.http_fetch import extracted_text, fetch
 
     url = inputs.get("url", "").strip()
     if not url:
@@ -1207,26 +1237,30 @@ def _tool_fetch_url(inputs: dict) -> str:
         )
     }
     try:
-        resp = requests.get(url, headers=headers, timeout=15)
+        resp = fetch(url, headers=headers, timeout=15, allow_redirects=True)
         resp.raise_for_status()
     except Exception as exc:
         return f"[Failed to fetch URL: {exc}]"
 
-    soup = BeautifulSoup(resp.text, "html.parser")
+    def extract() -> str:
+        soup = BeautifulSoup(resp.text, "html.parser")
 
-    # Remove boilerplate
-    for tag in soup(["script", "style", "nav", "footer", "header", "aside"]):
-        tag.decompose()
+        # Remove boilerplate
+        for tag in soup(["script", "style", "nav", "footer", "header", "aside"]):
+            tag.decompose()
 
-    # Try <article> first, fall back to <main>, then <body>
-    content = soup.find("article") or soup.find("main") or soup.find("body")
-    if not content:
-        return "[Could not extract readable content from this URL.]"
+        # Try <article> first, fall back to <main>, then <body>
+        content = soup.find("article") or soup.find("main") or soup.find("body")
+        if not content:
+            return ""
+
+        text = content.get_text(separator="\n", strip=True)
+        # Collapse excessive blank lines
+        return "\n".join(l for l in text.splitlines() if l.strip())
 
-    text = content.get_text(separator="\n", strip=True)
-    # Collapse excessive blank lines
-    lines = [l for l in text.splitlines() if l.strip()]
-    clean = "\n".join(lines)
+    clean = extracted_text(resp.content, "readable-html", extract)
+    if not clean:
+        return "[Could not extract readable content from this URL.]"
 
     # Limit output size
     if len(clean) > 6000:
@@ -1271,17 +1305,14 @@ def _tool_retrieve_multi(
         return "No queries provided.", docs
 
     k_per = min(int(inputs.get("k_per_query", 3)), 6)
-    seen_texts: set[str] = set()
     all_parts: list[str] = []
 
-    for query in queries[:5]:  # cap at 5 queries
-        chunks = get_relevant_chunks(k_per, query, chat_id, user_email)
-        for chunk_text, doc_name in (chunks or []):
-            key = chunk_text[:80]  # deduplicate by prefix
-            if key not in seen_texts:
-                seen_texts.add(key)
-                all_parts.append(f"**Source: {doc_name}** (query: '{query}')\n{chunk_text.strip()}")
-                docs.append({"chunk_text": chunk_text, "document_name": doc_name})
+    # One embedding call and one matrix multiply for all queries (capped at 5);
+    # results are already deduplicated by chunk id.
+    for chunk in get_relevant_chunks_multi(k_per, queries[:5], chat_id, user_email, mode=_retrieval_mode(inputs)):
+        chunk_text, doc_name = chunk["chunk_text"], chunk["document_name"]
+        all_parts.append(f"**Source: {doc_name}** (query: '{chunk['query']}')\n{chunk_text.strip()}")
+        docs.append({"chunk_text": chunk_text, "document_name": doc_name})
 
     if not all_parts:
         return "No relevant chunks found across all queries.", docs
@@ -1810,49 +1841,45 @@ def _prune_messages(messages: list[dict]) -> list[dict]:
 
 
 def _build_user_content_anthropic(query: str, media_attachments: list) -> list:
-    if not media_attachments:
-        return [{"type": "text", "text": query}]
-
-    from services.vision_service import describe_image
-    import base64
-
-    descriptions = []
-    for att in media_attachments:
-        if att.get("media_type") == "image":
-            try:
-                raw = base64.b64decode(att["data"])
-                desc = describe_image(raw, mime_type=att.get("mime_type", "image/jpeg"))
-                fname = att.get("original_filename", "attachment")
-                descriptions.append(f"[Image: {fname}]\n{desc}")
-            except Exception as exc:
-                descriptions.append(f"[Image could not be described: {exc}]")
-
+    descriptions = _describe_image_attachments(media_attachments)
     if descriptions:
         return [{"type": "text", "text": "\n\n".join(descriptions) + "\n\n" + query}]
     return [{"type": "text", "text": query}]
 
 
 def _build_user_content_openai(query: str, media_attachments: list) -> str:
+    descriptions = _describe_image_attachments(media_attachments)
+    if descriptions:
+        return "\n\n".join(descriptions) + "\n\n" + query
+    return query
+
+
+def _describe_image_attachments(media_attachments: list) -> list[str]:
+    """Describe the image attachments of one message concurrently (cached per image)."""
     if not media_attachments:
-        return query
+        return []
 
-    from services.vision_service import describe_image
+    from services.vision_service import describe_images
     import base64
 
-    descriptions = []
+    slots: list = []
+    images = []
     for att in media_attachments:
         if att.get("media_type") == "image":
             try:
-                raw = base64.b64decode(att["data"])
-                desc = describe_image(raw, mime_type=att.get("mime_type", "image/jpeg"))
-                fname = att.get("original_filename", "attachment")
-                descriptions.append(f"[Image: {fname}]\n{desc}")
+                images.append((base64.b64decode(att["data"]), att.get("mime_type", "image/jpeg")))
+                slots.append(att.get("original_filename", "attachment"))
             except Exception as exc:
-                descriptions.append(f"[Image could not be described: {exc}]")
+                slots.append(exc)
 
-    if descriptions:
-        return "\n\n".join(descriptions) + "\n\n" + query
-    return query
+    described = iter(describe_images(images))
+    descriptions = []
+    for slot in slots:
+        if isinstance(slot, Exception):
+            descriptions.append(f"[Image could not be described: {slot}]")
+        else:
+            descriptions.append(f"[Image: {slot}]\n{next(described)}")
+    return descriptions
 
 
 def _finalize(
@@ -37,14 +37,32 @@ class AgentConfig:
     ENABLE_MULTIMODAL = os.getenv("ENABLE_MULTIMODAL", "true").lower() == "true"
     # Max image size (bytes) accepted for inline vision calls (20 MB)
     MAX_IMAGE_BYTES = int(os.getenv("MAX_IMAGE_BYTES", str(20 * 1024 * 1024)))
+    # JPEG quality used when images are recompressed before a vision call
+    VISION_JPEG_QUALITY = int(os.getenv("VISION_JPEG_QUALITY", "85"))
+    # Concurrent vision calls when one message carries several images
+    VISION_DESCRIBE_CONCURRENCY = int(os.getenv("VISION_DESCRIBE_CONCURRENCY", "4"))
     # Max audio file size for Whisper transcription (25 MB — Whisper API limit)
     MAX_AUDIO_BYTES = int(os.getenv("MAX_AUDIO_BYTES", str(25 * 1024 * 1024)))
+    # Max audio upload size when long recordings are split into segments (500 MB)
+    MAX_LONG_AUDIO_BYTES = int(os.getenv("MAX_LONG_AUDIO_BYTES", str(500 * 1024 * 1024)))
+    # Longest audio segment sent to Whisper in one request; longer audio is split on silence
+    AUDIO_SEGMENT_MAX_SECS = int(os.getenv("AUDIO_SEGMENT_MAX_SECS", "600"))
+    # Seconds each segment overlaps its neighbours so words at a cut are not lost
+    AUDIO_SEGMENT_OVERLAP_SECS = float(os.getenv("AUDIO_SEGMENT_OVERLAP_SECS", "2"))
+    # Concurrent Whisper requests per recording
+    AUDIO_TRANSCRIBE_CONCURRENCY = int(os.getenv("AUDIO_TRANSCRIBE_CONCURRENCY", "6"))
     # Max video file upload size (500 MB)
     MAX_VIDEO_BYTES = int(os.getenv("MAX_VIDEO_BYTES", str(500 * 1024 * 1024)))
-    # How often (in seconds) to extract a frame from a video for vision analysis
+    # Longest gap (in seconds) between analysed frames when no scene changes
     VIDEO_FRAME_INTERVAL_SECS = int(os.getenv("VIDEO_FRAME_INTERVAL_SECS", "30"))
     # Maximum number of frames to analyse per video (cost/time guardrail)
     VIDEO_MAX_FRAMES = int(os.getenv("VIDEO_MAX_FRAMES", "20"))
+    # ffmpeg scene score (0-1) above which a frame starts a new scene
+    VIDEO_SCENE_THRESHOLD = float(os.getenv("VIDEO_SCENE_THRESHOLD", "0.3"))
+    # Frames whose 64-bit perceptual hashes differ in at most this many bits are duplicates
+    VIDEO_FRAME_DEDUP_DISTANCE = int(os.getenv("VIDEO_FRAME_DEDUP_DISTANCE", "6"))
+    # Concurrent vision calls per video
+    VIDEO_VISION_CONCURRENCY = int(os.getenv("VIDEO_VISION_CONCURRENCY", "4"))
 
     # Document retrieval settings
     DEFAULT_CHUNK_RETRIEVAL_COUNT = int(os.getenv("DEFAULT_CHUNK_RETRIEVAL_COUNT", "6"))
@@ -75,8 +93,15 @@ class AgentConfig:
             "enable_multimodal": cls.ENABLE_MULTIMODAL,
             "openai_vision_model": cls.OPENAI_VISION_MODEL,
             "anthropic_vision_model": cls.ANTHROPIC_VISION_MODEL,
+            "vision_jpeg_quality": cls.VISION_JPEG_QUALITY,
+            "vision_describe_concurrency": cls.VISION_DESCRIBE_CONCURRENCY,
             "video_frame_interval_secs": cls.VIDEO_FRAME_INTERVAL_SECS,
             "video_max_frames": cls.VIDEO_MAX_FRAMES,
+            "video_scene_threshold": cls.VIDEO_SCENE_THRESHOLD,
+            "video_frame_dedup_distance": cls.VIDEO_FRAME_DEDUP_DISTANCE,
+            "video_vision_concurrency": cls.VIDEO_VISION_CONCURRENCY,
+            "audio_segment_max_secs": cls.AUDIO_SEGMENT_MAX_SECS,
+            "audio_transcribe_concurrency": cls.AUDIO_TRANSCRIBE_CONCURRENCY,
         }
     
     @classmethod
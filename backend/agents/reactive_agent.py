@@ -4,7 +4,6 @@ except ImportError:
     from langchain_classic.agents import AgentExecutor, create_react_agent
 
 from langchain_core.tools import BaseTool
-from langchain_core.messages import HumanMessage
 from langchain_core.prompts import PromptTemplate
 from langchain_openai import ChatOpenAI
 from langchain_anthropic import ChatAnthropic
@@ -14,10 +13,13 @@ import re
 import time
 from pydantic import Field
 import json
+import base64
 from api_endpoints.financeGPT.chatbot_endpoints import (
     get_relevant_chunks, add_message_to_db, add_sources_to_db,
     retrieve_message_from_db, retrieve_docs_from_db, serialize_sources_for_api
 )
+from services import table_store
+from services.vision_service import describe_images
 from .config import AgentConfig
 from .multi_agent_system import MultiAgentDocumentSystem
 
@@ -103,6 +105,60 @@ class DocumentListTool(BaseTool):
             return f"Error listing documents: {str(e)}"
 
 
+class TableQueryTool(BaseTool):
+    name: str = "table_query"
+    description: str = (
+        "Answer totals, counts, averages and filters over uploaded spreadsheets (CSV/Excel) with SQL. "
+        "Input an empty string to list the tables and columns of each spreadsheet, then "
+        "'<document id>: SELECT ...' to run one read-only SQLite query against that document's tables"
+    )
+    chat_id: int = Field(...)
+    user_email: str = Field(...)
+
+    def __init__(self, chat_id: int, user_email: str, **kwargs):
+        super().__init__(chat_id=chat_id, user_email=user_email, **kwargs)
+
+    def _run(self, query: str = "") -> str:
+        try:
+            docs = {
+                int(doc['id']): doc['document_name']
+                for doc in retrieve_docs_from_db(self.chat_id, self.user_email) or []
+                if table_store.has_tables(doc['id'])
+            }
+            if not docs:
+                return "No spreadsheets with queryable tables in this chat."
+
+            match = re.match(r"\s*(\d+)\s*:\s*(.+)", query or "", re.DOTALL)
+            if not match:
+                return self._describe(docs)
+
+            document_id = int(match.group(1))
+            if document_id not in docs:
+                return f"Document {document_id} has no queryable tables. " + self._describe(docs)
+            columns, rows, truncated = table_store.query_tables(document_id, match.group(2))
+            if not rows:
+                return "The query returned no rows."
+            lines = [" | ".join(columns)]
+            lines.extend(" | ".join("" if value is None else str(value) for value in row) for row in rows)
+            if truncated:
+                lines.append(f"(only the first {len(rows)} rows are shown)")
+            return "\n".join(lines)
+        except Exception as e:
+            return f"Error querying tables: {str(e)}"
+
+    @staticmethod
+    def _describe(docs: Dict[int, str]) -> str:
+        described = []
+        for document_id, document_name in docs.items():
+            for table in table_store.describe_tables(document_id):
+                columns = ", ".join(f"{name} ({kind})" for name, kind in table["columns"])
+                described.append(
+                    f"- document {document_id} ({document_name}), table {table['table']}, "
+                    f"{table['rows']} rows: {columns}"
+                )
+        return "Queryable tables (use '<document id>: SELECT ...'):\n" + "\n".join(described)
+
+
 class GeneralKnowledgeTool(BaseTool):
     name: str = "general_knowledge"
     description: str = "Use general LLM knowledge to answer questions when documents don't contain relevant information"
@@ -483,44 +539,42 @@ class ReactiveDocumentAgent:
             )
     
     def _describe_images(self, attachments: List[Dict[str, Any]]) -> str:
-        """Call the vision LLM once per image attachment and return a combined
-        description string that can be prepended to the user's query.
+        """Describe every image attachment with the vision LLM and return a
+        combined description string that can be prepended to the user's query.
 
         Each attachment dict must have:
             "data"      – base64-encoded image bytes
             "mime_type" – e.g. "image/png"
 
-        Only image attachments are handled here; video/audio are skipped and
-        should be processed by their dedicated pipelines.
+        Images are described concurrently, and descriptions are cached per
+        image, so attachments repeated on later turns are not sent again
+        (see ``services.vision_service``).  Only image attachments are
+        handled here; video/audio are skipped and should be processed by
+        their dedicated pipelines.
         """
         image_attachments = [a for a in attachments if a.get("media_type") == "image"]
         if not image_attachments:
             return ""
 
-        vision_llm = self._initialize_llm(vision=True)
-        descriptions = []
-
+        images, errors = [], {}
         for idx, att in enumerate(image_attachments, start=1):
-            data_b64 = att.get("data", "")
-            mime = att.get("mime_type", "image/jpeg")
-
-            if self.model_type == 0:  # OpenAI — uses image_url with data URI
-                content = [
-                    {"type": "text", "text": "Describe this image in detail for use in a document Q&A context."},
-                    {"type": "image_url", "image_url": {"url": f"data:{mime};base64,{data_b64}"}},
-                ]
-            else:  # Anthropic — uses source block
-                content = [
-                    {"type": "image", "source": {"type": "base64", "media_type": mime, "data": data_b64}},
-                    {"type": "text", "text": "Describe this image in detail for use in a document Q&A context."},
-                ]
-
             try:
-                response = vision_llm.invoke([HumanMessage(content=content)])
-                desc = response.content if hasattr(response, "content") else str(response)
-                descriptions.append(f"[Image {idx}: {desc.strip()}]")
+                images.append((base64.b64decode(att.get("data", "")), att.get("mime_type", "image/jpeg")))
             except Exception as e:
-                descriptions.append(f"[Image {idx}: could not be described — {e}]")
+                errors[idx] = e
+
+        described = iter(describe_images(
+            images,
+            prompt="Describe this image in detail for use in a document Q&A context.",
+            model_type=self.model_type,
+            model=self.model_key,
+        ))
+        descriptions = []
+        for idx in range(1, len(image_attachments) + 1):
+            if idx in errors:
+                descriptions.append(f"[Image {idx}: could not be described — {errors[idx]}]")
+            else:
+                descriptions.append(f"[Image {idx}: {next(described).strip()}]")
 
         return "\n".join(descriptions)
 
@@ -529,6 +583,7 @@ class ReactiveDocumentAgent:
             DocumentRetrievalTool(chat_id, user_email),
             ChatHistoryTool(chat_id, user_email),
             DocumentListTool(chat_id, user_email),
+            TableQueryTool(chat_id, user_email),
         ]
         
         # Add general knowledge tool if enabled
@@ -563,6 +618,7 @@ class ReactiveDocumentAgent:
             6. Be concise but comprehensive
             7. For follow-up questions or when context is unclear, ALWAYS use the chat_history tool
             8. You can use document_list to see what documents are available
+            9. For totals, counts, averages or filters over spreadsheet data, use table_query instead of adding up retrieved rows
 
             Question: {input}
             {agent_scratchpad}
@@ -594,6 +650,7 @@ class ReactiveDocumentAgent:
             6. Be concise but comprehensive
             7. For follow-up questions or when context is unclear, ALWAYS use the chat_history tool
             8. You can use document_list to see what documents are available
+            9. For totals, counts, averages or filters over spreadsheet data, use table_query instead of adding up retrieved rows
 
             Question: {input}
             {agent_scratchpad}
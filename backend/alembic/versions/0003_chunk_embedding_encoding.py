@@ -0,0 +1,36 @@
+"""record the encoding of each chunk embedding blob
+
+Embeddings were always written as float64.  New rows are written as float32
+(or float16, see EMBEDDING_ENCODING) and tagged with their encoding so old
+and new rows coexist; existing rows default to float64 until the backfill in
+services/embedding_backfill.py re-encodes them in place.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        "ALTER TABLE chunks ADD COLUMN embedding_encoding VARCHAR(16) NOT NULL DEFAULT 'float64'"
+    )
+    op.execute(
+        "ALTER TABLE chat_share_chunks ADD COLUMN embedding_encoding VARCHAR(16) NOT NULL DEFAULT 'float64'"
+    )
+
+
+def downgrade() -> None:
+    # Blobs already re-encoded would be misread as float64; the backfill must
+    # be run in reverse (target float64) before downgrading.
+    op.execute("ALTER TABLE chat_share_chunks DROP COLUMN embedding_encoding")
+    op.execute("ALTER TABLE chunks DROP COLUMN embedding_encoding")
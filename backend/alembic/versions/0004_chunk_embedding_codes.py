@@ -0,0 +1,31 @@
+"""store a quantized code alongside each chunk embedding
+
+Two-stage retrieval (EMBEDDING_QUANTIZATION=int8|binary) keeps only compact
+codes in memory and rescores candidates with the full vector.  Codes are
+derived data: rows without one are quantized when the chat index is built,
+and `python -m services.embedding_backfill --codes` fills them in.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        "ALTER TABLE chunks ADD COLUMN embedding_code BLOB NULL, "
+        "ADD COLUMN embedding_code_scheme VARCHAR(8) NULL"
+    )
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE chunks DROP COLUMN embedding_code_scheme, DROP COLUMN embedding_code")
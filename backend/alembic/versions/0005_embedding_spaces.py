@@ -0,0 +1,53 @@
+"""record the embedding model and dimension of every chunk and chat
+
+Chunks record which model/dimension produced their vector; chats record the
+space retrieval embeds queries into.  Everything written so far came from
+text-embedding-3-small at 768 dimensions.  `chunk_embedding_staging` holds
+re-embedded vectors while `services.reembed` migrates a chat, so a chat's
+chunks switch space in a single transaction.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_SPACE_COLUMNS = (
+    "ADD COLUMN embedding_model VARCHAR(64) NOT NULL DEFAULT 'text-embedding-3-small', "
+    "ADD COLUMN embedding_dimensions INTEGER NOT NULL DEFAULT 768"
+)
+
+
+def upgrade() -> None:
+    op.execute(f"ALTER TABLE chunks {_SPACE_COLUMNS}")
+    op.execute(f"ALTER TABLE chat_share_chunks {_SPACE_COLUMNS}")
+    op.execute(f"ALTER TABLE chats {_SPACE_COLUMNS}")
+    op.execute(
+        """
+        CREATE TABLE chunk_embedding_staging (
+            chunk_id INTEGER PRIMARY KEY,
+            chat_id INTEGER NOT NULL,
+            embedding_model VARCHAR(64) NOT NULL,
+            embedding_dimensions INTEGER NOT NULL,
+            embedding_vector BLOB NOT NULL,
+            embedding_encoding VARCHAR(16) NOT NULL,
+            created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (chunk_id) REFERENCES chunks(id) ON DELETE CASCADE,
+            INDEX idx_chunk_embedding_staging_chat (chat_id)
+        )
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE chunk_embedding_staging")
+    for table in ("chats", "chat_share_chunks", "chunks"):
+        op.execute(f"ALTER TABLE {table} DROP COLUMN embedding_dimensions, DROP COLUMN embedding_model")
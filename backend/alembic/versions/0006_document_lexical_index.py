@@ -0,0 +1,38 @@
+"""persist a BM25 inverted index per document
+
+One row per document holds the term → chunk postings written at ingestion
+(see services.lexical_index), so hybrid and lexical retrieval never
+re-tokenize a chat.  Rows follow their document on delete; documents
+ingested before this revision are indexed on their first lexical search.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        CREATE TABLE document_lexical_index (
+            document_id INTEGER PRIMARY KEY,
+            chunk_count INTEGER NOT NULL,
+            postings LONGBLOB NOT NULL,
+            updated TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            FOREIGN KEY (document_id) REFERENCES documents(id) ON DELETE CASCADE
+        )
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE document_lexical_index")
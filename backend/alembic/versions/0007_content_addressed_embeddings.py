@@ -0,0 +1,52 @@
+"""content-addressed embedding store shared by chunks
+
+`embeddings` holds one vector per (model, dimensions, passage text) digest.
+Ingestion looks texts up there before calling the provider, and new chunks
+(and shared-chat copies) point at a row via `embedding_id` instead of
+carrying their own blob.  Chunks written earlier keep their inline vector.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0007"
+down_revision: Union[str, None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        CREATE TABLE embeddings (
+            id INTEGER PRIMARY KEY AUTO_INCREMENT,
+            content_hash CHAR(64) NOT NULL UNIQUE,
+            embedding_model VARCHAR(64) NOT NULL,
+            embedding_dimensions INTEGER NOT NULL,
+            embedding_vector BLOB NOT NULL,
+            embedding_encoding VARCHAR(16) NOT NULL,
+            created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    op.execute(
+        "ALTER TABLE chunks ADD COLUMN embedding_id INTEGER NULL, "
+        "ADD CONSTRAINT fk_chunks_embedding_id FOREIGN KEY (embedding_id) REFERENCES embeddings(id)"
+    )
+    op.execute(
+        "ALTER TABLE chat_share_chunks ADD COLUMN embedding_id INTEGER NULL, "
+        "ADD CONSTRAINT fk_chat_share_chunks_embedding_id FOREIGN KEY (embedding_id) REFERENCES embeddings(id)"
+    )
+
+
+def downgrade() -> None:
+    op.execute(
+        "ALTER TABLE chat_share_chunks DROP FOREIGN KEY fk_chat_share_chunks_embedding_id, DROP COLUMN embedding_id"
+    )
+    op.execute("ALTER TABLE chunks DROP FOREIGN KEY fk_chunks_embedding_id, DROP COLUMN embedding_id")
+    op.execute("DROP TABLE embeddings")
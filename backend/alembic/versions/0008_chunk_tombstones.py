@@ -0,0 +1,28 @@
+"""tombstone chunks removed by incremental re-ingestion
+
+Re-ingesting a changed document marks the chunks whose text disappeared
+with `deleted_at` instead of deleting them inside the revision transaction.
+Every read path only sees chunks where `deleted_at IS NULL`.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0008"
+down_revision: Union[str, None] = "0007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE chunks ADD COLUMN deleted_at TIMESTAMP NULL DEFAULT NULL")
+
+
+def downgrade() -> None:
+    op.execute("DELETE FROM chunks WHERE deleted_at IS NOT NULL")
+    op.execute("ALTER TABLE chunks DROP COLUMN deleted_at")
@@ -0,0 +1,37 @@
+"""record where shared and imported documents were copied from
+
+Sharing and importing a chat now copy each table with one
+`INSERT ... SELECT`.  Chunks find their copied document through these
+provenance columns instead of a per-document loop.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0009"
+down_revision: Union[str, None] = "0008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        "ALTER TABLE chat_share_documents ADD COLUMN source_document_id INTEGER NULL, "
+        "ADD INDEX idx_chat_share_documents_source (chat_share_id, source_document_id)"
+    )
+    op.execute(
+        "ALTER TABLE documents ADD COLUMN source_share_document_id INTEGER NULL, "
+        "ADD INDEX idx_documents_source_share (chat_id, source_share_document_id)"
+    )
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE documents DROP INDEX idx_documents_source_share, DROP COLUMN source_share_document_id")
+    op.execute(
+        "ALTER TABLE chat_share_documents DROP INDEX idx_chat_share_documents_source, DROP COLUMN source_document_id"
+    )
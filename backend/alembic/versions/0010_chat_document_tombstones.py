@@ -0,0 +1,29 @@
+"""tombstone deleted chats and documents
+
+Deleting a chat or document now only sets `deleted_at`; read paths skip
+tombstoned rows and `services.reaper` removes them, with their chunks and
+messages, in small batches in the background.
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0010"
+down_revision: Union[str, None] = "0009"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE chats ADD COLUMN deleted_at TIMESTAMP NULL DEFAULT NULL")
+    op.execute("ALTER TABLE documents ADD COLUMN deleted_at TIMESTAMP NULL DEFAULT NULL")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE documents DROP COLUMN deleted_at")
+    op.execute("ALTER TABLE chats DROP COLUMN deleted_at")
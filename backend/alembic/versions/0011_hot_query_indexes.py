@@ -0,0 +1,93 @@
+"""indexes for the hot chat, document, usage and API key queries
+
+Every request resolves a user by email or API key and walks
+chats -> documents -> chunks; usage pages scan `api_usage` by user and date.
+The single-column indexes left most of those lookups filtering tombstones
+and sorting in the row data:
+
+- `chats(user_id, deleted_at, created)` lists a user's live chats newest
+  first straight from the index;
+- `documents(chat_id, document_name, deleted_at)` serves the duplicate-name
+  check in `add_document` and covers `retrieve_docs`;
+- `chunks(document_id, deleted_at)` covers the live-chunk count and max id
+  that validate cached retrieval indexes on every question;
+- `apiKeys(api_key)` backs every API-key authenticated request;
+- `api_usage(user_id, created)` serves the usage pages and monthly quota.
+
+Each replaces the narrower index it extends.  `api_usage` was only ever
+created by `database/schema.sql`, so it is created here if missing.
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0011"
+down_revision: Union[str, None] = "0010"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS api_usage (
+            id          INTEGER PRIMARY KEY AUTO_INCREMENT,
+            user_id     INTEGER,
+            api_key_id  INTEGER,
+            endpoint    VARCHAR(128) NOT NULL,
+            model       VARCHAR(128),
+            prompt_tokens      INTEGER NOT NULL DEFAULT 0,
+            completion_tokens  INTEGER NOT NULL DEFAULT 0,
+            total_tokens       INTEGER NOT NULL DEFAULT 0,
+            credits_used       INTEGER NOT NULL DEFAULT 1,
+            created     TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_api_usage_user_id (user_id),
+            INDEX idx_api_usage_key_id (api_key_id),
+            INDEX idx_api_usage_created (created),
+            FOREIGN KEY (user_id)    REFERENCES users(id)   ON DELETE SET NULL,
+            FOREIGN KEY (api_key_id) REFERENCES apiKeys(id) ON DELETE SET NULL
+        )
+        """
+    )
+    op.execute(
+        "ALTER TABLE chats ADD INDEX idx_chats_user_live (user_id, deleted_at, created), "
+        "DROP INDEX idx_chats_user_id"
+    )
+    op.execute(
+        "ALTER TABLE documents ADD INDEX idx_documents_chat_name (chat_id, document_name, deleted_at), "
+        "DROP INDEX idx_documents_chat_id"
+    )
+    op.execute(
+        "ALTER TABLE chunks ADD INDEX idx_chunks_document_live (document_id, deleted_at), "
+        "DROP INDEX idx_chunks_document_id"
+    )
+    op.execute("ALTER TABLE apiKeys ADD INDEX idx_api_keys_api_key (api_key)")
+    op.execute(
+        "ALTER TABLE api_usage ADD INDEX idx_api_usage_user_created (user_id, created), "
+        "DROP INDEX idx_api_usage_user_id"
+    )
+
+
+def downgrade() -> None:
+    op.execute(
+        "ALTER TABLE api_usage ADD INDEX idx_api_usage_user_id (user_id), "
+        "DROP INDEX idx_api_usage_user_created"
+    )
+    op.execute("ALTER TABLE apiKeys DROP INDEX idx_api_keys_api_key")
+    op.execute(
+        "ALTER TABLE chunks ADD INDEX idx_chunks_document_id (document_id), "
+        "DROP INDEX idx_chunks_document_live"
+    )
+    op.execute(
+        "ALTER TABLE documents ADD INDEX idx_documents_chat_id (chat_id), "
+        "DROP INDEX idx_documents_chat_name"
+    )
+    op.execute(
+        "ALTER TABLE chats ADD INDEX idx_chats_user_id (user_id), "
+        "DROP INDEX idx_chats_user_live"
+    )
@@ -0,0 +1,37 @@
+"""store a document's lexical index as one segment per ingestion batch
+
+Ingestion used to keep a term counter for every chunk of a document and
+write the whole index once at the end.  Each stored batch now writes its own
+`document_lexical_index` row, keyed by `(document_id, segment)`; search
+merges a document's segments and compacts them back into segment 0.
+
+Downgrading keeps segment 0 only; documents it does not fully cover are
+re-indexed from their stored text on their next lexical search.
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0012"
+down_revision: Union[str, None] = "0011"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        "ALTER TABLE document_lexical_index ADD COLUMN segment INTEGER NOT NULL DEFAULT 0 AFTER document_id, "
+        "DROP PRIMARY KEY, ADD PRIMARY KEY (document_id, segment)"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DELETE FROM document_lexical_index WHERE segment <> 0")
+    op.execute(
+        "ALTER TABLE document_lexical_index DROP PRIMARY KEY, ADD PRIMARY KEY (document_id), DROP COLUMN segment"
+    )
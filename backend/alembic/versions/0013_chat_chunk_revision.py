@@ -0,0 +1,30 @@
+"""count in-place chunk updates per chat
+
+Cached retrieval indexes are validated by the chat's live chunk count and
+highest chunk id, which do not change when re-ingestion moves kept chunks or
+the re-embedding swap replaces vectors in place.  `chats.chunk_revision` is
+bumped by those updates and is part of the version the cache compares.
+
+Revision ID: 0013
+Revises: 0012
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0013"
+down_revision: Union[str, None] = "0012"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        "ALTER TABLE chats ADD COLUMN chunk_revision INTEGER NOT NULL DEFAULT 0 AFTER embedding_dimensions"
+    )
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE chats DROP COLUMN chunk_revision")
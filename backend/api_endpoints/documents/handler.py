@@ -32,7 +32,8 @@ MAX_FILES_PER_BATCH = 50
 # (e.g. in test suites) without these attributes.
 _CATEGORY_BYTE_LIMITS: dict[str, int] = {
     "image": getattr(AgentConfig, "MAX_IMAGE_BYTES", 20 * 1024 * 1024),
-    "audio": getattr(AgentConfig, "MAX_AUDIO_BYTES", 25 * 1024 * 1024),
+    # Long recordings are split into Whisper-sized segments by audio_service.
+    "audio": getattr(AgentConfig, "MAX_LONG_AUDIO_BYTES", 500 * 1024 * 1024),
     "video": getattr(AgentConfig, "MAX_VIDEO_BYTES", 500 * 1024 * 1024),
     # Text covers PDF/DOCX/CSV/etc. — there is no service-level cap today, so
     # we apply a generous default (20 MB) to keep parser latency reasonable.
@@ -203,6 +204,7 @@ def IngestDocumentsHandler(
     user_email: str,
     parser_module: Any,
     chunk_document_fn: Any,
+    chunk_tabular_fn: Any = None,
 ) -> ResponseReturnValue:
     start_time = datetime.now()
     logger.info("ingest_documents start")
@@ -215,6 +217,10 @@ def IngestDocumentsHandler(
             "message": "'chat_id' form field is required.",
         }), 400
     chat_id = chat_ids[0]
+    # Files already in the chat are skipped unless the caller asks to refresh
+    # them; re-ingest only re-embeds the chunks whose text changed.
+    reingest_values = request.form.getlist("reingest")
+    reingest = bool(reingest_values) and reingest_values[0].strip().lower() in ("1", "true", "yes")
 
     # --- files: validate batch shape ------------------------------------------
     files = request.files.getlist("files[]")
@@ -272,6 +278,8 @@ def IngestDocumentsHandler(
                 max_chunk_size=max_chunk_size,
                 parser_module=parser_module,
                 chunk_document_fn=chunk_document_fn,
+                chunk_tabular_fn=chunk_tabular_fn,
+                reingest=reingest,
             )
             uploaded.append({
                 "filename": filename,
@@ -317,11 +325,25 @@ def _ingest_single_file(
     max_chunk_size: int,
     parser_module: Any,
     chunk_document_fn: Any,
+    chunk_tabular_fn: Any = None,
+    reingest: bool = False,
 ) -> int:
     """Ingest one file. Returns the new doc_id. Raises on any failure."""
     if category == "text":
         subcategory = _text_subcategory(mime, filename)
 
+        if subcategory == "tabular" and chunk_tabular_fn is not None:
+            # Streamed into row-group chunks and the table store; the
+            # document text is filled in as chunks are stored.
+            raw = file.read()
+            doc_id, does_exist = add_document(
+                "", filename, chat_id=chat_id, media_type="text", mime_type=mime
+            )
+            _schedule_chunking(
+                chunk_tabular_fn, (raw, filename, mime, max_chunk_size, doc_id), does_exist, reingest
+            )
+            return cast(int, doc_id)
+
         if subcategory == "tabular":
             raw = file.read()
             text = ingest_tabular(raw, filename=filename, mime_type=mime)
@@ -336,8 +358,7 @@ def _ingest_single_file(
         doc_id, does_exist = add_document(
             text, filename, chat_id=chat_id, media_type="text", mime_type=mime
         )
-        if not does_exist:
-            chunk_document_fn.remote(text, max_chunk_size, doc_id)
+        _schedule_chunking(chunk_document_fn, (text, max_chunk_size, doc_id), does_exist, reingest)
         return cast(int, doc_id)
 
     if category == "image":
@@ -346,8 +367,8 @@ def _ingest_single_file(
         doc_id, does_exist = add_document(
             description, filename, chat_id=chat_id, media_type="image", mime_type=mime
         )
-        if not does_exist and description:
-            chunk_document_fn.remote(description, max_chunk_size, doc_id)
+        if description:
+            _schedule_chunking(chunk_document_fn, (description, max_chunk_size, doc_id), does_exist, reingest)
         return cast(int, doc_id)
 
     if category == "audio":
@@ -356,8 +377,8 @@ def _ingest_single_file(
         doc_id, does_exist = add_document(
             transcript, filename, chat_id=chat_id, media_type="audio", mime_type=mime
         )
-        if not does_exist and transcript:
-            chunk_document_fn.remote(transcript, max_chunk_size, doc_id)
+        if transcript:
+            _schedule_chunking(chunk_document_fn, (transcript, max_chunk_size, doc_id), does_exist, reingest)
         return cast(int, doc_id)
 
     # video
@@ -366,11 +387,19 @@ def _ingest_single_file(
     doc_id, does_exist = add_document(
         analysis, filename, chat_id=chat_id, media_type="video", mime_type=mime
     )
-    if not does_exist and analysis:
-        chunk_document_fn.remote(analysis, max_chunk_size, doc_id)
+    if analysis:
+        _schedule_chunking(chunk_document_fn, (analysis, max_chunk_size, doc_id), does_exist, reingest)
     return cast(int, doc_id)
 
 
+def _schedule_chunking(chunk_fn: Any, args: tuple[Any, ...], does_exist: bool, reingest: bool) -> None:
+    """Chunk a new document, or refresh an existing one when *reingest* is set."""
+    if not does_exist:
+        chunk_fn.remote(*args)
+    elif reingest:
+        chunk_fn.remote(*args, reingest=True)
+
+
 def RetrieveCurrentDocsHandler(request: Request, user_email: str) -> ResponseReturnValue:
     payload = cast(dict[str, Any], request.get_json(force=True))
     return jsonify(doc_info=retrieve_docs(payload.get("chat_id"), user_email))
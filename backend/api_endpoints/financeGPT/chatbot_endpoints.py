@@ -68,8 +68,10 @@ chunk_document = finance_gpt_service.chunk_document
 chunk_document_by_page = finance_gpt_service.chunk_document_by_page
 chunk_document_by_page_optimized = finance_gpt_service.chunk_document_by_page_optimized
 chunk_document_optimized = finance_gpt_service.chunk_document_optimized
+chunk_tabular_document = finance_gpt_service.chunk_tabular_document
 fast_pdf_ingestion = finance_gpt_service.fast_pdf_ingestion
 get_relevant_chunks = finance_gpt_service.get_relevant_chunks
+get_relevant_chunks_multi = finance_gpt_service.get_relevant_chunks_multi
 get_text_from_single_file = finance_gpt_service.get_text_from_single_file
 get_text_from_url = finance_gpt_service.get_text_from_url
 get_text_pages_from_single_file = finance_gpt_service.get_text_pages_from_single_file
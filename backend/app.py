@@ -1,3 +1,4 @@
+import hashlib
 import json
 import os
 import pathlib
@@ -102,6 +103,11 @@ from datetime import datetime
 
 from features import is_finance_gpt_enabled, is_agent_enabled
 from services.llm_provider import get_openai_client
+from services.chunk_index_cache import chunk_index_cache
+from services.embedding_backfill import start_background_backfill
+from services.reaper import start_background_reaper
+from services.embedding_cache import embedding_cache
+from services.ingestion_jobs import IngestionSource, ingestion_jobs
 from agents.config import AgentConfig
 from api_endpoints.languages.arabic import arabic_blueprint
 from api_endpoints.languages.chinese import chinese_blueprint
@@ -114,6 +120,7 @@ if is_finance_gpt_enabled():
     from services.finance_gpt import (
         _get_model,
         chunk_document,
+        chunk_tabular_document,
         fetch_external_url,
         get_relevant_chunks,
         get_text_from_url,
@@ -144,6 +151,11 @@ app.register_blueprint(arabic_blueprint)
 # Issue #217: surface missing provider API keys at startup (non-blocking).
 AgentConfig.log_api_key_status()
 
+# Re-encode legacy float64 chunk embeddings when EMBEDDING_BACKFILL_ON_STARTUP is set.
+start_background_backfill()
+# Remove tombstoned chats, documents and chunks unless REAPER_ENABLED=false.
+start_background_reaper()
+
 client = get_openai_client()
 def ensure_ray_started():  # pragma: no cover
     if not ray.is_initialized():
@@ -302,6 +314,8 @@ def verifyAuthForIDs(table, non_user_id):
 @jwt_or_session_token_required
 def create_shareable_playbook(chat_id):
     url = create_chat_shareable_url(chat_id)
+    if url is None:
+        return jsonify({"error": "Chat not found"}), 404
     return jsonify({
             "url": url,
             "success": True,
@@ -345,6 +359,22 @@ def health_keys():
     # Public endpoint: expose only an ok flag; missing-key details stay in logs.
     return jsonify({"ok": AgentConfig.check_api_keys()["ok"]}), 200
 
+@app.route('/health/caches', methods=['GET'])
+def health_caches():
+    """
+    Retrieval cache statistics, used to size the in-process caches.
+    ---
+    tags:
+      - System
+    responses:
+      200:
+        description: Hit/miss counters and occupancy for the query-embedding cache and the per-chat chunk index cache. Only aggregate counts are returned.
+    """
+    return jsonify({
+        "embedding_cache": embedding_cache.stats(),
+        "chunk_index_cache": chunk_index_cache.stats(),
+    }), 200
+
 # Auth
 os.environ["OAUTHLIB_INSECURE_TRANSPORT"] = "1"  #this is to set our environment to https because OAuth 2.0 only supports https environments
 
@@ -822,7 +852,7 @@ def ingest_pdfs():
         # If the JWT is invalid, return an error
         return jsonify({"error": "Invalid JWT"}), 401
 
-    return IngestDocumentsHandler(request, user_email, p, chunk_document)
+    return IngestDocumentsHandler(request, user_email, p, chunk_document, chunk_tabular_document)
 
 
 @app.route('/ingest-pdf-demo', methods=['POST'])
@@ -1269,7 +1299,7 @@ USER_EMAIL_API = "api@example.com"
 @valid_api_key_required
 def upload():  # pragma: no cover
     """
-    Upload documents to a new chat session.
+    Upload documents to a new chat session, or to an existing one.
     ---
     tags:
       - Public SDK
@@ -1290,18 +1320,36 @@ def upload():  # pragma: no cover
         name: model_type
         type: string
         description: '"gpt" / 0 for OpenAI, "claude" / 1 for Anthropic'
+      - in: formData
+        name: chat_id
+        type: integer
+        description: Add the documents to this chat instead of creating a new one
+      - in: formData
+        name: reingest
+        type: boolean
+        description: Refresh documents already in the chat, re-embedding only the chunks whose text changed
     responses:
-      200:
-        description: Upload successful — returns chat_id for subsequent /public/chat calls
+      202:
+        description: Upload accepted — returns the chat id for subsequent /public/chat calls and an ingestion job to poll (status_url) or stream (events_url) until it completes
         schema:
           type: object
           properties:
-            chat_id:
-              type: integer
             id:
               type: integer
+            job_id:
+              type: string
+            status:
+              type: string
+            status_url:
+              type: string
+            events_url:
+              type: string
+      400:
+        description: Invalid task type or chat id
       403:
         description: Insufficient credits
+      404:
+        description: Chat not found
     """
     print("Form data:", request.form)
     print("Files:", request.files)
@@ -1316,6 +1364,17 @@ def upload():  # pragma: no cover
     total_items = len(files) + len(paths)
     credits_needed = max(1, total_items)  # At least 1 credit, more for multiple files
 
+    # Uploading into an existing chat lets callers refresh its documents.
+    existing_chat_id = request.form.get('chat_id')
+    if existing_chat_id:
+        try:
+            existing_chat_id = int(existing_chat_id)
+        except ValueError:
+            return jsonify({"error": "chat_id must be an integer"}), 400
+        if get_chat_info(existing_chat_id) == (None, None, None):
+            return jsonify({"error": "Chat not found"}), 404
+    reingest = request.form.get('reingest', '').strip().lower() in ('1', 'true', 'yes')
+
     # Deduct credits before processing
     from database.db_auth import deduct_credits_from_api_key_user
     if not deduct_credits_from_api_key_user(api_key, credits_needed):
@@ -1356,38 +1415,109 @@ def upload():  # pragma: no cover
         #create new chat
         model_number = 0 if model_type == "gpt" else 1 if model_type == "claude" else None
         chat_number = 0 if chat_type == "documents" else None
-        chat_id = add_chat_to_db(user_email, chat_number, model_number)
+        chat_id = existing_chat_id or add_chat_to_db(user_email, chat_number, model_number)
 
-        #Ingest pdf
+        # Ingest in the background; clients poll the job or stream its events.
         MAX_CHUNK_SIZE = 1000
+        sources = [
+            IngestionSource(name=file.filename, content=file.read(), reingest=reingest) for file in files
+        ]
+        sources.extend(IngestionSource(name=path, url=path, reingest=reingest) for path in paths)
+        job = ingestion_jobs.submit(_api_key_owner(api_key), chat_id, sources, MAX_CHUNK_SIZE)
+    else:
+        return jsonify({"error": f"Invalid task type: {chat_type!r}. Use 'documents' or 0."}), 400
 
-        for file in files:
-            print("file is here")
-            result = p.from_buffer(file)
-            text = result["content"].strip()
+    return jsonify({
+        "id": chat_id,
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "status_url": f"/public/upload/jobs/{job['job_id']}",
+        "events_url": f"/public/upload/jobs/{job['job_id']}/events",
+    }), 202
 
-            filename = file.filename
 
-            doc_id, doesExist = add_document_to_db(text, filename, chat_id=chat_id)
+def _api_key_owner(api_key):
+    """Opaque job owner for an API key, so raw keys are never kept in memory."""
+    return "api:" + hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()
 
-            if not doesExist:
-                #chunk_document.remote(text, MAX_CHUNK_SIZE, doc_id)
-                result_id = chunk_document.remote(text, MAX_CHUNK_SIZE, doc_id)
-                result = ray.get(result_id)
-        for path in paths:
 
-            text = get_text_from_url(path)
+def _request_api_key():
+    auth_header = request.headers.get('Authorization')
+    return auth_header.split(' ')[1] if auth_header and auth_header.startswith('Bearer ') else None
 
-            doc_id, doesExist = add_document_to_db(text, path, chat_id=chat_id)
 
-            if not doesExist:
-                #chunk_document.remote(text, MAX_CHUNK_SIZE, doc_id)
-                result_id = chunk_document.remote(text, MAX_CHUNK_SIZE, doc_id)
-                result = ray.get(result_id)
-    else:
-        return jsonify({"error": f"Invalid task type: {chat_type!r}. Use 'documents' or 0."}), 400
+@app.route('/public/upload/jobs/<string:job_id>', methods=['GET'])
+@valid_api_key_required
+def public_upload_job_status(job_id):
+    """
+    Progress of an upload started with /public/upload.
+    ---
+    tags:
+      - Public SDK
+    security:
+      - BearerAuth: []
+    parameters:
+      - in: path
+        name: job_id
+        type: string
+        required: true
+    responses:
+      200:
+        description: Job status ("queued", "running", "completed", "completed_with_errors" or "failed") and per-file stage ("queued", "extracted", "chunked", "embedded", "stored" or "failed")
+      404:
+        description: Unknown job, or a job started with a different API key
+    """
+    job = ingestion_jobs.get(job_id, _api_key_owner(_request_api_key()))
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job), 200
+
 
-    return jsonify({"id": chat_id}), 200
+@app.route('/public/upload/jobs/<string:job_id>/events', methods=['GET'])
+@valid_api_key_required
+def public_upload_job_events(job_id):
+    """
+    Server-sent event stream of upload progress.
+    ---
+    tags:
+      - Public SDK
+    security:
+      - BearerAuth: []
+    parameters:
+      - in: path
+        name: job_id
+        type: string
+        required: true
+    responses:
+      200:
+        description: "text/event-stream of `progress` events carrying the job snapshot, ending with a `done` event"
+      404:
+        description: Unknown job, or a job started with a different API key
+    """
+    owner = _api_key_owner(_request_api_key())
+    if ingestion_jobs.get(job_id, owner) is None:
+        return jsonify({"error": "Job not found"}), 404
+
+    def generate():
+        snapshot = None
+        for event in ingestion_jobs.iter_events(job_id, owner):
+            if event is None:
+                yield ": keep-alive\n\n"
+                continue
+            snapshot = event
+            yield f"event: progress\ndata: {json.dumps(event)}\n\n"
+        if snapshot is not None:
+            yield f"event: done\ndata: {json.dumps(snapshot)}\n\n"
+
+    return Response(
+        generate(),
+        status=200,
+        mimetype="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        },
+    )
 
 
 @app.route('/public/chat', methods=['POST'])
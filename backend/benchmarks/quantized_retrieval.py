@@ -0,0 +1,77 @@
+"""Recall and latency of quantized two-stage retrieval against the exact path.
+
+Run from ``backend/``::
+
+    python -m benchmarks.quantized_retrieval --rows 100000 --queries 200 --k 10
+
+Vectors are synthetic: unit-normalised points scattered around a few hundred
+random topic centroids, which is closer to real embedding distributions than
+uniform noise.  Latency covers the coarse pass and exact rescoring; the
+in-process loader stands in for the ``get_chunk_embeddings`` round trip the
+API makes, so add one database query per search to compare end to end.
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+import numpy as np
+from services.quantization import QuantizedMatrix, two_stage_search
+from services.vector_search import normalize_rows, top_k_cosine
+
+
+def synthetic_vectors(centroids: np.ndarray, rows: int, rng: np.random.Generator) -> np.ndarray:
+    assignments = rng.integers(0, len(centroids), rows)
+    # Per-dimension noise of 1/sqrt(dims) puts a chunk at roughly 45 degrees from its topic.
+    noise = rng.standard_normal((rows, centroids.shape[1])).astype(np.float32) / np.sqrt(centroids.shape[1])
+    return normalize_rows(centroids[assignments] + noise)
+
+
+def recall(exact: np.ndarray, approximate: np.ndarray) -> float:
+    hits = [len(set(a.tolist()) & set(b.tolist())) for a, b in zip(exact, approximate, strict=True)]
+    return float(np.mean(hits)) / exact.shape[1]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--dimensions", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--topics", type=int, default=300)
+    parser.add_argument("--oversample", type=int, nargs="+", default=[2, 4, 8, 16])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    centroids = normalize_rows(rng.standard_normal((args.topics, args.dimensions)))
+    corpus = synthetic_vectors(centroids, args.rows, rng)
+    queries = synthetic_vectors(centroids, args.queries, rng)
+
+    # One query per search, as the API issues them.
+    started = time.perf_counter()
+    exact = np.vstack([top_k_cosine(query, corpus, args.k)[0] for query in queries])
+    exact_ms = (time.perf_counter() - started) * 1000 / args.queries
+    print(f"{args.rows} rows x {args.dimensions} dims, {args.queries} queries, k={args.k}")
+    print(f"{'method':<18}{'memory MB':>10}{'recall':>9}{'ms/query':>10}")
+    print(f"{'exact float32':<18}{corpus.nbytes / 2**20:>10.1f}{1.0:>9.3f}{exact_ms:>10.2f}")
+
+    def load(positions: np.ndarray) -> np.ndarray:
+        return corpus[positions]
+
+    for scheme in ("int8", "binary"):
+        quantized = QuantizedMatrix.from_normalized(corpus, scheme)
+        for oversample in args.oversample:
+            started = time.perf_counter()
+            found = np.vstack([
+                two_stage_search(query, quantized, args.k, load, oversample=oversample)[0]
+                for query in queries
+            ])
+            elapsed_ms = (time.perf_counter() - started) * 1000 / args.queries
+            label = f"{scheme} x{oversample}"
+            print(f"{label:<18}{quantized.nbytes / 2**20:>10.1f}{recall(exact, found):>9.3f}{elapsed_ms:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""Size-bounded bulk inserts for ``chunks`` rows.
+
+``add_chunks`` used to send a whole document in one ``executemany`` inside a
+single transaction.  With a ~6 KB embedding blob per row, large documents ran
+into ``max_allowed_packet``, held row locks for the entire insert and lost
+every embedding when anything failed near the end.  :class:`BulkChunkWriter`
+instead:
+
+- packs rows into multi-row ``INSERT ... VALUES (...), (...)`` statements no
+  larger than ``CHUNK_INSERT_MAX_BYTES`` (and ``CHUNK_INSERT_MAX_ROWS``);
+- commits after every ``CHUNK_COMMIT_ROWS`` rows, so locks are short and
+  completed work survives a failure;
+- on a dropped connection, lock timeout or deadlock, reconnects and resumes
+  from the last committed row.  If it still fails, :class:`ChunkWriteError`
+  says how many rows were committed, and ``write(rows, start=...)`` resumes
+  from there;
+- reports rows/sec in :class:`BulkWriteStats`.
+
+Writes of at least ``CHUNK_LOAD_DATA_MIN_ROWS`` rows (0 disables it) go
+through ``LOAD DATA LOCAL INFILE`` instead.  That needs ``local_infile=ON`` on
+the server, and the whole file is committed as one unit.
+"""
+
+from __future__ import annotations
+
+import os
+import tempfile
+import time
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass
+from typing import Any
+
+CHUNK_INSERT_MAX_BYTES = int(os.getenv("CHUNK_INSERT_MAX_BYTES", str(2 * 1024 * 1024)))
+CHUNK_INSERT_MAX_ROWS = int(os.getenv("CHUNK_INSERT_MAX_ROWS", "500"))
+CHUNK_COMMIT_ROWS = int(os.getenv("CHUNK_COMMIT_ROWS", "2000"))
+CHUNK_WRITE_MAX_RETRIES = int(os.getenv("CHUNK_WRITE_MAX_RETRIES", "3"))
+CHUNK_LOAD_DATA_MIN_ROWS = int(os.getenv("CHUNK_LOAD_DATA_MIN_ROWS", "0"))
+_RETRY_DELAY_SECONDS = 0.5
+# Escaping can double a blob in the worst case; budget for it plus quoting.
+_BLOB_SIZE_FACTOR = 2
+_VALUE_OVERHEAD_BYTES = 4
+# MySQL error codes worth a reconnect and resume: server gone away, lost
+# connection, lock wait timeout, deadlock.
+_RETRYABLE_ERRNOS = {2006, 2013, 2055, 1205, 1213}
+
+CHUNK_COLUMNS = ("start_index", "end_index", "document_id", "embedding_vector", "embedding_encoding")
+PAGED_CHUNK_COLUMNS = ("start_index", "end_index", "document_id", "embedding_vector", "page_number", "embedding_encoding")
+
+ConnectionFactory = Callable[[], tuple[Any, Any]]
+
+
+@dataclass
+class BulkWriteStats:
+    rows: int = 0
+    statements: int = 0
+    commits: int = 0
+    retries: int = 0
+    seconds: float = 0.0
+    method: str = "insert"
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"{self.rows} rows in {self.statements} statements / {self.commits} commits "
+            f"({self.rows_per_second:.0f} rows/s, {self.retries} retries, {self.method})"
+        )
+
+
+class ChunkWriteError(RuntimeError):
+    """A bulk write failed after committing *committed_rows* rows."""
+
+    def __init__(self, message: str, committed_rows: int) -> None:
+        super().__init__(message)
+        self.committed_rows = committed_rows
+
+
+def is_retryable(err: BaseException) -> bool:
+    """True for dropped connections, lock wait timeouts and deadlocks."""
+    if getattr(err, "errno", None) in _RETRYABLE_ERRNOS:
+        return True
+    return type(err).__name__ in {"OperationalError", "InterfaceError"}
+
+
+def estimate_row_bytes(row: Sequence[Any]) -> int:
+    """Upper-leaning size of *row* once rendered into an INSERT statement."""
+    size = 0
+    for value in row:
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            size += len(value) * _BLOB_SIZE_FACTOR
+        else:
+            size += len(str(value))
+        size += _VALUE_OVERHEAD_BYTES
+    return size
+
+
+def plan_statements(
+    rows: Sequence[Sequence[Any]],
+    max_bytes: int = CHUNK_INSERT_MAX_BYTES,
+    max_rows: int = CHUNK_INSERT_MAX_ROWS,
+    start: int = 0,
+) -> list[tuple[int, int]]:
+    """Split ``rows[start:]`` into contiguous ``(start, end)`` statement ranges.
+
+    A single row larger than *max_bytes* still gets a statement of its own.
+    """
+    ranges = []
+    begin = start
+    size = 0
+    for position in range(start, len(rows)):
+        cost = estimate_row_bytes(rows[position])
+        if position > begin and (size + cost > max_bytes or position - begin >= max_rows):
+            ranges.append((begin, position))
+            begin, size = position, 0
+        size += cost
+    if begin < len(rows):
+        ranges.append((begin, len(rows)))
+    return ranges
+
+
+def build_insert(columns: Sequence[str], row_count: int) -> str:
+    placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    return f"INSERT INTO chunks ({', '.join(columns)}) VALUES " + ", ".join([placeholders] * row_count)
+
+
+class BulkChunkWriter:
+    """Insert ``chunks`` rows in size-bounded statements with chunked commits."""
+
+    def __init__(
+        self,
+        columns: Sequence[str] = CHUNK_COLUMNS,
+        connect: ConnectionFactory | None = None,
+        max_statement_bytes: int = CHUNK_INSERT_MAX_BYTES,
+        max_statement_rows: int = CHUNK_INSERT_MAX_ROWS,
+        commit_rows: int = CHUNK_COMMIT_ROWS,
+        max_retries: int = CHUNK_WRITE_MAX_RETRIES,
+        load_data_min_rows: int = CHUNK_LOAD_DATA_MIN_ROWS,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.columns = tuple(columns)
+        self._connect = connect
+        self.max_statement_bytes = max_statement_bytes
+        self.max_statement_rows = max(1, max_statement_rows)
+        self.commit_rows = max(1, commit_rows)
+        self.max_retries = max_retries
+        self.load_data_min_rows = load_data_min_rows
+        self._sleep = sleep
+
+    def write(self, rows: Sequence[Sequence[Any]], start: int = 0) -> BulkWriteStats:
+        """Insert ``rows[start:]`` and return what it took.
+
+        Raises :class:`ChunkWriteError` (chained to the database error) when
+        the write cannot finish; its ``committed_rows`` is the *start* to
+        resume from.
+        """
+        stats = BulkWriteStats()
+        started = time.perf_counter()
+        if self.load_data_min_rows and len(rows) - start >= self.load_data_min_rows:
+            stats.method = "load_data"
+            self._load_data(rows, start, stats)
+        else:
+            self._insert(rows, start, stats)
+        stats.rows = len(rows) - start
+        stats.seconds = time.perf_counter() - started
+        return stats
+
+    def _connection(self) -> tuple[Any, Any]:
+        if self._connect is not None:
+            return self._connect()
+        from database.db_pool import get_db_connection
+
+        return get_db_connection()
+
+    def _insert(self, rows: Sequence[Sequence[Any]], start: int, stats: BulkWriteStats) -> None:
+        committed = start
+        while True:
+            conn, cursor = self._connection()
+            try:
+                pending = 0
+                for begin, end in plan_statements(rows, self.max_statement_bytes, self.max_statement_rows, committed):
+                    cursor.execute(
+                        build_insert(self.columns, end - begin),
+                        [value for row in rows[begin:end] for value in row],
+                    )
+                    stats.statements += 1
+                    pending += end - begin
+                    if pending >= self.commit_rows or end == len(rows):
+                        conn.commit()
+                        stats.commits += 1
+                        committed, pending = end, 0
+                return
+            except Exception as err:
+                _rollback(conn)
+                if stats.retries >= self.max_retries or not is_retryable(err):
+                    raise ChunkWriteError(
+                        f"Chunk write failed after {committed - start} of {len(rows) - start} rows: {err}",
+                        committed,
+                    ) from err
+                stats.retries += 1
+                print(
+                    f"[WARNING] Chunk write failed ({err}); resuming from row {committed} "
+                    f"(retry {stats.retries}/{self.max_retries})"
+                )
+                self._sleep(_RETRY_DELAY_SECONDS * stats.retries)
+            finally:
+                _close(conn, cursor)
+
+    def _load_data(self, rows: Sequence[Sequence[Any]], start: int, stats: BulkWriteStats) -> None:
+        blob_column = self.columns.index("embedding_vector")
+        targets = [f"@{name}" if index == blob_column else name for index, name in enumerate(self.columns)]
+        statement = (
+            "LOAD DATA LOCAL INFILE %s INTO TABLE chunks "
+            "FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n' "
+            f"({', '.join(targets)}) SET embedding_vector = UNHEX(@embedding_vector)"
+        )
+        with tempfile.NamedTemporaryFile("w", suffix=".tsv", delete=False) as handle:
+            for row in rows[start:]:
+                handle.write("\t".join(_tsv_value(value) for value in row) + "\n")
+            path = handle.name
+        try:
+            while True:
+                conn, cursor = _local_infile_connection()
+                try:
+                    cursor.execute(statement, (path,))
+                    conn.commit()
+                    stats.statements += 1
+                    stats.commits += 1
+                    return
+                except Exception as err:
+                    _rollback(conn)
+                    if stats.retries >= self.max_retries or not is_retryable(err):
+                        raise ChunkWriteError(f"LOAD DATA of {len(rows) - start} chunk rows failed: {err}", start) from err
+                    stats.retries += 1
+                    print(f"[WARNING] LOAD DATA failed ({err}); retry {stats.retries}/{self.max_retries}")
+                    self._sleep(_RETRY_DELAY_SECONDS * stats.retries)
+                finally:
+                    _close(conn, cursor)
+        finally:
+            os.unlink(path)
+
+
+def _tsv_value(value: Any) -> str:
+    if value is None:
+        return "\\N"
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).hex()
+    return str(value)
+
+
+def _local_infile_connection() -> tuple[Any, Any]:
+    """Open a dedicated connection with LOCAL INFILE enabled (pooled ones are not)."""
+    import mysql.connector
+    from database.db_pool import _db_connection_config
+
+    conn = mysql.connector.connect(allow_local_infile=True, **_db_connection_config())
+    return conn, conn.cursor()
+
+
+def _rollback(conn: Any) -> None:
+    try:
+        conn.rollback()
+    except Exception:
+        pass
+
+
+def _close(conn: Any, cursor: Any) -> None:
+    for resource in (cursor, conn):
+        try:
+            resource.close()
+        except Exception:
+            pass
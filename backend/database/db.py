@@ -1,3 +1,4 @@
+import hashlib
 import json
 import os
 import secrets
@@ -15,11 +16,56 @@ from constants.global_constants import (
     planToCredits,
 )
 from db_enums import PaidUserStatus
+from database.chunk_writer import CHUNK_COLUMNS, PAGED_CHUNK_COLUMNS, BulkChunkWriter, build_insert, plan_statements
 from database.db_pool import get_db_connection
+from database.embedding_encoding import (
+    EMBEDDING_ENCODING,
+    EMBEDDING_QUANTIZATION,
+    QUANTIZATION_SCHEMES,
+    decode_vector,
+    encode_code,
+)
+from database.embedding_space import DEFAULT_EMBEDDING_SPACE, space_from_row
 
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
+# Callbacks invoked with a chat id whenever chunks for that chat are added or
+# removed in this process (e.g. to drop cached retrieval indexes).
+_chunk_change_listeners = []
+# Bulk chunk writes at least this large log their throughput.
+_CHUNK_WRITE_REPORT_MIN_ROWS = 1000
+
+
+def register_chunk_change_listener(listener):
+    if listener not in _chunk_change_listeners:
+        _chunk_change_listeners.append(listener)
+
+
+def _notify_chunk_change(chat_ids):
+    for chat_id in chat_ids:
+        if chat_id is None:
+            continue
+        for listener in _chunk_change_listeners:
+            try:
+                listener(chat_id)
+            except Exception as exc:
+                print(f"[WARNING] Chunk change listener failed for chat {chat_id}: {exc}")
+
+
+def _chat_ids_for_chunk_data(cursor, chunk_data):
+    if not _chunk_change_listeners:
+        return []
+    document_ids = sorted({row[2] for row in chunk_data})
+    if not document_ids:
+        return []
+    placeholders = ", ".join(["%s"] * len(document_ids))
+    cursor.execute(
+        f"SELECT DISTINCT chat_id FROM documents WHERE id IN ({placeholders})",
+        document_ids,
+    )
+    return [row["chat_id"] for row in cursor.fetchall()]
+
 
 def create_7_day_free_trial(user_id):
     conn, cursor = get_db_connection()
@@ -758,8 +804,11 @@ def add_chat(user_email, chat_type, model_type):
     user_id = cursor.fetchone()["id"]
 
     cursor.execute(
-        "INSERT INTO chats (user_id, model_type, associated_task) VALUES (%s, %s, %s)",
-        (user_id, model_type, chat_type),
+        """
+        INSERT INTO chats (user_id, model_type, associated_task, embedding_model, embedding_dimensions)
+        VALUES (%s, %s, %s, %s, %s)
+        """,
+        (user_id, model_type, chat_type, DEFAULT_EMBEDDING_SPACE.model, DEFAULT_EMBEDDING_SPACE.dimensions),
     )
     chat_id = cursor.lastrowid
     cursor.execute("UPDATE chats SET chat_name = %s WHERE id = %s", (f"Chat {chat_id}", chat_id))
@@ -790,7 +839,7 @@ def retrieve_chats(user_email):
         SELECT chats.id, chats.model_type, chats.chat_name, chats.associated_task, chats.custom_model_key
         FROM chats
         JOIN users ON chats.user_id = users.id
-        WHERE users.email = %s;
+        WHERE users.email = %s AND chats.deleted_at IS NULL;
     """
     try:
         cursor.execute(query, (user_email,))
@@ -807,7 +856,7 @@ def find_most_recent_chat(user_email):
         SELECT chats.id, chats.chat_name
         FROM chats
         JOIN users ON chats.user_id = users.id
-        WHERE users.email = %s
+        WHERE users.email = %s AND chats.deleted_at IS NULL
         ORDER BY chats.created DESC
         LIMIT 1;
     """
@@ -825,7 +874,7 @@ def retrieve_messages(user_email, chat_id, chat_type):
         FROM messages
         JOIN chats ON messages.chat_id = chats.id
         JOIN users ON chats.user_id = users.id
-        WHERE chats.id = %s AND users.email = %s AND chats.associated_task = %s;
+        WHERE chats.id = %s AND users.email = %s AND chats.associated_task = %s AND chats.deleted_at IS NULL;
     """
     cursor.execute(query, (chat_id, user_email, chat_type))
     messages = cursor.fetchall()
@@ -884,51 +933,24 @@ def retrieve_messages(user_email, chat_id, chat_type):
 
 
 def delete_chat(chat_id, user_email):
+    """Tombstone a chat; ``services.reaper`` removes its rows in the background."""
     conn, cursor = get_db_connection()
-    cursor.execute(
-        """
-        DELETE chunks
-        FROM chunks
-        INNER JOIN documents ON chunks.document_id = documents.id
-        INNER JOIN chats ON documents.chat_id = chats.id
-        INNER JOIN users ON chats.user_id = users.id
-        WHERE chats.id = %s AND users.email = %s;
-        """,
-        (chat_id, user_email),
-    )
-    cursor.execute(
-        """
-        DELETE documents
-        FROM documents
-        INNER JOIN chats ON documents.chat_id = chats.id
-        INNER JOIN users ON chats.user_id = users.id
-        WHERE chats.id = %s AND users.email = %s;
-        """,
-        (chat_id, user_email),
-    )
-    cursor.execute(
-        """
-        DELETE messages
-        FROM messages
-        INNER JOIN chats ON messages.chat_id = chats.id
-        INNER JOIN users ON chats.user_id = users.id
-        WHERE chats.id = %s AND users.email = %s;
-        """,
-        (chat_id, user_email),
-    )
-    cursor.execute(
-        """
-        DELETE chats
-        FROM chats
-        INNER JOIN users ON chats.user_id = users.id
-        WHERE chats.id = %s AND users.email = %s;
-        """,
-        (chat_id, user_email),
-    )
-    conn.commit()
-    deleted = cursor.rowcount > 0
-    cursor.close()
-    conn.close()
+    try:
+        cursor.execute(
+            """
+            UPDATE chats
+            JOIN users ON chats.user_id = users.id
+            SET chats.deleted_at = CURRENT_TIMESTAMP
+            WHERE chats.id = %s AND users.email = %s AND chats.deleted_at IS NULL;
+            """,
+            (chat_id, user_email),
+        )
+        conn.commit()
+        deleted = cursor.rowcount > 0
+    finally:
+        cursor.close()
+        conn.close()
+    _notify_chunk_change([chat_id])
     return "Successfully deleted" if deleted else "Could not delete"
 
 
@@ -940,7 +962,7 @@ def reset_chat(chat_id, user_email):
         FROM messages
         INNER JOIN chats ON messages.chat_id = chats.id
         INNER JOIN users ON chats.user_id = users.id
-        WHERE chats.id = %s AND users.email = %s;
+        WHERE chats.id = %s AND users.email = %s AND chats.deleted_at IS NULL;
         """,
         (chat_id, user_email),
     )
@@ -952,31 +974,24 @@ def reset_chat(chat_id, user_email):
 
 
 def reset_uploaded_docs(chat_id, user_email):
+    """Tombstone every document of a chat; ``services.reaper`` removes them and their chunks."""
     conn, cursor = get_db_connection()
-    cursor.execute(
-        """
-        DELETE chunks
-        FROM chunks
-        INNER JOIN documents ON chunks.document_id = documents.id
-        INNER JOIN chats ON documents.chat_id = chats.id
-        INNER JOIN users ON chats.user_id = users.id
-        WHERE chats.id = %s AND users.email = %s;
-        """,
-        (chat_id, user_email),
-    )
-    cursor.execute(
-        """
-        DELETE documents
-        FROM documents
-        INNER JOIN chats ON documents.chat_id = chats.id
-        INNER JOIN users ON chats.user_id = users.id
-        WHERE chats.id = %s AND users.email = %s;
-        """,
-        (chat_id, user_email),
-    )
-    conn.commit()
-    cursor.close()
-    conn.close()
+    try:
+        cursor.execute(
+            """
+            UPDATE documents
+            INNER JOIN chats ON documents.chat_id = chats.id
+            INNER JOIN users ON chats.user_id = users.id
+            SET documents.deleted_at = CURRENT_TIMESTAMP
+            WHERE chats.id = %s AND users.email = %s AND documents.deleted_at IS NULL;
+            """,
+            (chat_id, user_email),
+        )
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+    _notify_chunk_change([chat_id])
 
 
 def change_chat_mode(chat_mode_to_change_to, chat_id, user_email):
@@ -1014,6 +1029,7 @@ def add_document(text, document_name, chat_id=None, media_type="text", mime_type
             FROM documents
             WHERE document_name = %s
             AND chat_id = %s
+            AND deleted_at IS NULL
             """,
             (document_name, chat_id),
         )
@@ -1085,32 +1101,222 @@ def get_message_attachments(message_id):
         conn.close()
 
 
-def add_chunks_with_page_numbers(chunk_data):
+def append_document_text(document_id, text):
+    """Append *text* to a document's stored text (used by streaming ingestion)."""
     conn, cursor = get_db_connection()
-    cursor.executemany(
-        """
-        INSERT INTO chunks (start_index, end_index, document_id, embedding_vector, page_number)
-        VALUES (%s, %s, %s, %s, %s)
-        """,
-        chunk_data,
+    cursor.execute(
+        "UPDATE documents SET document_text = CONCAT(COALESCE(document_text, ''), %s) WHERE id = %s",
+        (text, document_id),
     )
     conn.commit()
     cursor.close()
     conn.close()
 
 
-def add_chunks(chunk_data):
+def _chunk_insert_rows(columns, chunk_data, encoding, space, embedding_ids=None):
+    """Return ``(columns, rows)`` for inserting *chunk_data* tagged with *encoding* and *space*.
+
+    When ``EMBEDDING_QUANTIZATION`` is set, each row also gets its code.
+    Rows with an entry in *embedding_ids* reference that ``embeddings`` row
+    instead of storing their own vector.
+    """
+    columns = tuple(columns) + ("embedding_model", "embedding_dimensions")
+    rows = [tuple(row) + (encoding, space.model, space.dimensions) for row in chunk_data]
+    if EMBEDDING_QUANTIZATION in QUANTIZATION_SCHEMES:
+        columns = columns + ("embedding_code", "embedding_code_scheme")
+        rows = [
+            row + (encode_code(decode_vector(row[3], encoding), EMBEDDING_QUANTIZATION), EMBEDDING_QUANTIZATION)
+            for row in rows
+        ]
+    if embedding_ids is not None and any(embedding_id is not None for embedding_id in embedding_ids):
+        columns = columns + ("embedding_id",)
+        rows = [
+            (*row[:3], None if embedding_id is not None else row[3], *row[4:], embedding_id)
+            for row, embedding_id in zip(rows, embedding_ids, strict=True)
+        ]
+    return columns, rows
+
+
+def _write_chunks(columns, chunk_data, encoding, space, embedding_ids=None):
+    """Bulk-insert chunk rows (see :func:`_chunk_insert_rows`), then notify listeners."""
+    if not chunk_data:
+        return
+    columns, rows = _chunk_insert_rows(columns, chunk_data, encoding, space, embedding_ids)
+    writer = BulkChunkWriter(columns, connect=lambda: get_db_connection())
+    stats = writer.write(rows)
+    if stats.rows >= _CHUNK_WRITE_REPORT_MIN_ROWS:
+        print(f"Stored chunks: {stats.summary()}")
+    if not _chunk_change_listeners:
+        return
     conn, cursor = get_db_connection()
-    cursor.executemany(
-        """
-        INSERT INTO chunks (start_index, end_index, document_id, embedding_vector)
-        VALUES (%s, %s, %s, %s)
-        """,
-        chunk_data,
-    )
-    conn.commit()
-    cursor.close()
-    conn.close()
+    try:
+        chat_ids = _chat_ids_for_chunk_data(cursor, chunk_data)
+    finally:
+        cursor.close()
+        conn.close()
+    _notify_chunk_change(chat_ids)
+
+
+def add_chunks_with_page_numbers(
+    chunk_data, encoding=EMBEDDING_ENCODING, space=DEFAULT_EMBEDDING_SPACE, embedding_ids=None
+):
+    _write_chunks(PAGED_CHUNK_COLUMNS, chunk_data, encoding, space, embedding_ids)
+
+
+def add_chunks(chunk_data, encoding=EMBEDDING_ENCODING, space=DEFAULT_EMBEDDING_SPACE, embedding_ids=None):
+    _write_chunks(CHUNK_COLUMNS, chunk_data, encoding, space, embedding_ids)
+
+
+def get_document_revision_base(document_id):
+    """Return ``(document_text, chunks)`` of a document, *chunks* being its live spans by id.
+
+    Each chunk is ``{"chunk_id", "start_index", "end_index", "page_number"}``.
+    Returns ``(None, [])`` for an unknown or deleted document.
+    """
+    conn, cursor = get_db_connection()
+    try:
+        cursor.execute(
+            "SELECT document_text FROM documents WHERE id = %s AND deleted_at IS NULL",
+            (document_id,),
+        )
+        document = cursor.fetchone()
+        if not document:
+            return None, []
+        cursor.execute(
+            """
+            SELECT id AS chunk_id, start_index, end_index, page_number
+            FROM chunks
+            WHERE document_id = %s AND deleted_at IS NULL
+            ORDER BY id
+            """,
+            (document_id,),
+        )
+        return document["document_text"] or "", cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def revise_document_chunks(
+    document_id,
+    base_text,
+    text,
+    moved,
+    removed,
+    chunk_data,
+    encoding=EMBEDDING_ENCODING,
+    space=DEFAULT_EMBEDDING_SPACE,
+    embedding_ids=None,
+):
+    """Replace a document's text and apply a chunk diff in one transaction.
+
+    *moved* is ``[(chunk_id, start, end, page_number)]`` for kept chunks whose
+    span changed, *removed* the chunk ids to tombstone and *chunk_data* the
+    paged rows to insert (as for :func:`add_chunks_with_page_numbers`).
+    Returns None, changing nothing, if the stored text is no longer
+    *base_text* (another revision won); otherwise the number of chunks
+    inserted.
+    """
+    conn, cursor = get_db_connection()
+    try:
+        cursor.execute(
+            "SELECT chat_id, MD5(COALESCE(document_text, '')) AS text_md5 FROM documents WHERE id = %s FOR UPDATE",
+            (document_id,),
+        )
+        document = cursor.fetchone()
+        if not document or document["text_md5"] != hashlib.md5(base_text.encode("utf-8")).hexdigest():
+            conn.rollback()
+            return None
+        cursor.execute("UPDATE documents SET document_text = %s WHERE id = %s", (text, document_id))
+        # Moved chunks keep their ids, so cached indexes need the revision bump.
+        cursor.execute(
+            "UPDATE chats SET chunk_revision = chunk_revision + 1 WHERE id = %s", (document["chat_id"],)
+        )
+        if moved:
+            cursor.executemany(
+                """
+                UPDATE chunks SET start_index = %s, end_index = %s, page_number = %s
+                WHERE id = %s AND document_id = %s
+                """,
+                [(start, end, page_number, chunk_id, document_id) for chunk_id, start, end, page_number in moved],
+            )
+        if removed:
+            placeholders = ", ".join(["%s"] * len(removed))
+            cursor.execute(
+                f"""
+                UPDATE chunks SET deleted_at = CURRENT_TIMESTAMP
+                WHERE document_id = %s AND id IN ({placeholders})
+                """,
+                [document_id, *removed],
+            )
+        if chunk_data:
+            columns, rows = _chunk_insert_rows(PAGED_CHUNK_COLUMNS, chunk_data, encoding, space, embedding_ids)
+            for begin, end in plan_statements(rows):
+                cursor.execute(
+                    build_insert(columns, end - begin),
+                    [value for row in rows[begin:end] for value in row],
+                )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+    if moved or removed or chunk_data:
+        _notify_chunk_change([document["chat_id"]])
+    return len(chunk_data)
+
+
+def get_embeddings_by_hash(content_hashes):
+    """Return ``{content_hash: {"id", "embedding_vector", "embedding_encoding"}}`` for stored hashes."""
+    content_hashes = list(dict.fromkeys(content_hashes))
+    if not content_hashes:
+        return {}
+    placeholders = ", ".join(["%s"] * len(content_hashes))
+    conn, cursor = get_db_connection()
+    try:
+        cursor.execute(
+            f"""
+            SELECT id, content_hash, embedding_vector, embedding_encoding
+            FROM embeddings
+            WHERE content_hash IN ({placeholders})
+            """,
+            content_hashes,
+        )
+        return {row["content_hash"]: row for row in cursor.fetchall()}
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def add_embeddings(entries, space, encoding=EMBEDDING_ENCODING):
+    """Store ``(content_hash, blob)`` pairs in *space*; returns ``{content_hash: id}``.
+
+    A hash stored concurrently by another writer keeps that writer's vector.
+    """
+    if not entries:
+        return {}
+    conn, cursor = get_db_connection()
+    try:
+        cursor.executemany(
+            """
+            INSERT IGNORE INTO embeddings (
+                content_hash, embedding_model, embedding_dimensions, embedding_vector, embedding_encoding
+            ) VALUES (%s, %s, %s, %s, %s)
+            """,
+            [(content_hash, space.model, space.dimensions, blob, encoding) for content_hash, blob in entries],
+        )
+        conn.commit()
+        placeholders = ", ".join(["%s"] * len(entries))
+        cursor.execute(
+            f"SELECT id, content_hash FROM embeddings WHERE content_hash IN ({placeholders})",
+            [content_hash for content_hash, _ in entries],
+        )
+        return {row["content_hash"]: row["id"] for row in cursor.fetchall()}
+    finally:
+        cursor.close()
+        conn.close()
 
 
 def retrieve_docs(chat_id, user_email):
@@ -1121,7 +1327,8 @@ def retrieve_docs(chat_id, user_email):
         FROM documents
         JOIN chats ON documents.chat_id = chats.id
         JOIN users ON chats.user_id = users.id
-        WHERE chats.id = %s AND users.email = %s;
+        WHERE chats.id = %s AND users.email = %s
+          AND documents.deleted_at IS NULL AND chats.deleted_at IS NULL;
         """,
         (chat_id, user_email),
     )
@@ -1135,24 +1342,46 @@ def delete_doc(doc_id, user_email):
     conn, cursor = get_db_connection()
     cursor.execute(
         """
-        SELECT d.id
+        SELECT d.id, d.chat_id
         FROM documents d
         JOIN chats c ON d.chat_id = c.id
         JOIN users u ON c.user_id = u.id
-        WHERE u.email = %s AND d.id = %s
+        WHERE u.email = %s AND d.id = %s AND d.deleted_at IS NULL
         """,
         (user_email, doc_id),
     )
     verification_result = cursor.fetchone()
     if verification_result:
-        cursor.execute("DELETE FROM chunks WHERE document_id = %s", (doc_id,))
-        cursor.execute("DELETE FROM documents WHERE id = %s", (doc_id,))
+        # Tombstone only; services.reaper deletes the document and its chunks.
+        cursor.execute("UPDATE documents SET deleted_at = CURRENT_TIMESTAMP WHERE id = %s", (doc_id,))
         conn.commit()
     cursor.close()
     conn.close()
+    if verification_result:
+        _notify_chunk_change([verification_result.get("chat_id")])
     return "success"
 
 
+def discard_document(document_id):
+    """Tombstone a document whose ingestion failed, so uploading it again starts afresh.
+
+    Chunks already stored for it are hidden with it and removed by
+    ``services.reaper``.
+    """
+    conn, cursor = get_db_connection()
+    try:
+        cursor.execute("SELECT chat_id FROM documents WHERE id = %s AND deleted_at IS NULL", (document_id,))
+        document = cursor.fetchone()
+        if not document:
+            return
+        cursor.execute("UPDATE documents SET deleted_at = CURRENT_TIMESTAMP WHERE id = %s", (document_id,))
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+    _notify_chunk_change([document["chat_id"]])
+
+
 def add_model_key(model_key, chat_id, user_email):
     conn, cursor = get_db_connection()
     cursor.execute(
@@ -1170,175 +1399,153 @@ def add_model_key(model_key, chat_id, user_email):
 
 
 def create_chat_shareable_url(chat_id):
-    conn, cursor = get_db_connection()
-    share_uuid = str(uuid.uuid4())
-    cursor.execute(
-        "INSERT INTO chat_shares (chat_id, share_uuid) VALUES (%s, %s)",
-        (chat_id, share_uuid),
-    )
-    chat_share_id = cursor.lastrowid
+    """Snapshot a chat's messages, documents and chunks into a share; returns its URL path.
 
-    cursor.execute(
-        """
-        SELECT sent_from_user, message_text, created
-        FROM messages
-        WHERE chat_id = %s
-        ORDER BY created ASC
-        """,
-        (chat_id,),
-    )
-    messages = cursor.fetchall()
-    for message in messages:
-        role = "user" if message["sent_from_user"] else "chatbot"
+    Each table is copied with one ``INSERT ... SELECT`` on the server, so the
+    cost no longer grows with a statement per row.  Chunks that reference the
+    embedding store share its vectors instead of copying them.  Returns None
+    for an unknown or deleted chat.
+    """
+    share_uuid = str(uuid.uuid4())
+    conn, cursor = get_db_connection()
+    try:
+        cursor.execute(
+            """
+            INSERT INTO chat_shares (chat_id, share_uuid)
+            SELECT id, %s FROM chats WHERE id = %s AND deleted_at IS NULL
+            """,
+            (share_uuid, chat_id),
+        )
+        if cursor.rowcount == 0:
+            conn.rollback()
+            return None
+        chat_share_id = cursor.lastrowid
         cursor.execute(
             """
             INSERT INTO chat_share_messages (chat_share_id, role, message_text, created)
-            VALUES (%s, %s, %s, %s)
+            SELECT %s, CASE WHEN sent_from_user THEN 'user' ELSE 'chatbot' END, message_text, created
+            FROM messages
+            WHERE chat_id = %s
+            ORDER BY created ASC, id ASC
             """,
-            (chat_share_id, role, message["message_text"], message["created"]),
+            (chat_share_id, chat_id),
         )
-
-    cursor.execute(
-        """
-        SELECT id, document_name, document_text, storage_key, created
-        FROM documents
-        WHERE chat_id = %s
-        """,
-        (chat_id,),
-    )
-    docs = cursor.fetchall()
-    for doc in docs:
         cursor.execute(
             """
             INSERT INTO chat_share_documents (
-                chat_share_id, document_name, document_text, storage_key, created
-            ) VALUES (%s, %s, %s, %s, %s)
+                chat_share_id, source_document_id, document_name, document_text,
+                storage_key, media_type, mime_type, created
+            )
+            SELECT %s, id, document_name, document_text, storage_key, media_type, mime_type, created
+            FROM documents
+            WHERE chat_id = %s AND deleted_at IS NULL
+            ORDER BY id
             """,
-            (
-                chat_share_id,
-                doc["document_name"],
-                doc["document_text"],
-                doc["storage_key"],
-                doc["created"],
-            ),
+            (chat_share_id, chat_id),
         )
-        chat_share_doc_id = cursor.lastrowid
         cursor.execute(
             """
-            SELECT start_index, end_index, embedding_vector, page_number
-            FROM chunks
-            WHERE document_id = %s
+            INSERT INTO chat_share_chunks (
+                chat_share_document_id, start_index, end_index, embedding_vector,
+                embedding_encoding, embedding_model, embedding_dimensions, embedding_id, page_number
+            )
+            SELECT sd.id, c.start_index, c.end_index, c.embedding_vector,
+                   c.embedding_encoding, c.embedding_model, c.embedding_dimensions, c.embedding_id, c.page_number
+            FROM chat_share_documents sd
+            JOIN chunks c ON c.document_id = sd.source_document_id
+            WHERE sd.chat_share_id = %s AND c.deleted_at IS NULL
+            ORDER BY c.id
             """,
-            (doc["id"],),
+            (chat_share_id,),
         )
-        chunks = cursor.fetchall()
-        for chunk in chunks:
-            cursor.execute(
-                """
-                INSERT INTO chat_share_chunks (
-                    chat_share_document_id, start_index, end_index, embedding_vector, page_number
-                ) VALUES (%s, %s, %s, %s, %s)
-                """,
-                (
-                    chat_share_doc_id,
-                    chunk["start_index"],
-                    chunk["end_index"],
-                    chunk["embedding_vector"],
-                    chunk["page_number"],
-                ),
-            )
-
-    conn.commit()
-    cursor.close()
-    conn.close()
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
     return f"/playbook/{share_uuid}"
 
 
 def access_shareable_chat(share_uuid, user_id=1):
-    conn, cursor = get_db_connection()
-    cursor.execute("SELECT * FROM chat_shares WHERE share_uuid = %s", (share_uuid,))
-    share = cursor.fetchone()
-    if not share:
-        cursor.close()
-        conn.close()
-        return None
+    """Import a shared chat for *user_id* and return the new chat id (None for an unknown share).
 
-    cursor.execute(
-        """
-        INSERT INTO chats (user_id, model_type, chat_name, associated_task)
-        VALUES (%s, %s, %s, %s)
-        """,
-        (user_id, 0, "Imported from share", 0),
-    )
-    new_chat_id = cursor.lastrowid
+    Like :func:`create_chat_shareable_url`, every table is copied set-based.
+    """
+    conn, cursor = get_db_connection()
+    try:
+        cursor.execute("SELECT id FROM chat_shares WHERE share_uuid = %s", (share_uuid,))
+        share = cursor.fetchone()
+        if not share:
+            return None
 
-    cursor.execute(
-        """
-        SELECT role, message_text
-        FROM chat_share_messages
-        WHERE chat_share_id = %s
-        ORDER BY created ASC
-        """,
-        (share["id"],),
-    )
-    messages = cursor.fetchall()
-    for message in messages:
-        sent_from_user = 1 if message["role"] == "user" else 0
+        # The imported chat is served from the space its chunks were embedded in.
         cursor.execute(
             """
-            INSERT INTO messages (chat_id, message_text, sent_from_user)
-            VALUES (%s, %s, %s)
+            SELECT sc.embedding_model, sc.embedding_dimensions
+            FROM chat_share_chunks sc
+            JOIN chat_share_documents sd ON sc.chat_share_document_id = sd.id
+            WHERE sd.chat_share_id = %s
+            ORDER BY sc.id
+            LIMIT 1
             """,
-            (new_chat_id, message["message_text"], sent_from_user),
+            (share["id"],),
         )
-
-    cursor.execute(
-        """
-        SELECT id, document_name, document_text, storage_key
-        FROM chat_share_documents
-        WHERE chat_share_id = %s
-        """,
-        (share["id"],),
-    )
-    docs = cursor.fetchall()
-    for doc in docs:
+        chat_space = space_from_row(cursor.fetchone())
         cursor.execute(
             """
-            INSERT INTO documents (chat_id, document_name, document_text, storage_key)
-            VALUES (%s, %s, %s, %s)
+            INSERT INTO chats (user_id, model_type, chat_name, associated_task, embedding_model, embedding_dimensions)
+            VALUES (%s, %s, %s, %s, %s, %s)
             """,
-            (new_chat_id, doc["document_name"], doc["document_text"], doc["storage_key"]),
+            (user_id, 0, "Imported from share", 0, chat_space.model, chat_space.dimensions),
         )
-        new_doc_id = cursor.lastrowid
+        new_chat_id = cursor.lastrowid
         cursor.execute(
             """
-            SELECT start_index, end_index, embedding_vector, page_number
-            FROM chat_share_chunks
-            WHERE chat_share_document_id = %s
+            INSERT INTO messages (chat_id, message_text, sent_from_user)
+            SELECT %s, message_text, CASE WHEN role = 'user' THEN 1 ELSE 0 END
+            FROM chat_share_messages
+            WHERE chat_share_id = %s
+            ORDER BY created ASC, id ASC
             """,
-            (doc["id"],),
+            (new_chat_id, share["id"]),
         )
-        chunks = cursor.fetchall()
-        for chunk in chunks:
-            cursor.execute(
-                """
-                INSERT INTO chunks (
-                    document_id, start_index, end_index, embedding_vector, page_number
-                ) VALUES (%s, %s, %s, %s, %s)
-                """,
-                (
-                    new_doc_id,
-                    chunk["start_index"],
-                    chunk["end_index"],
-                    chunk["embedding_vector"],
-                    chunk["page_number"],
-                ),
+        cursor.execute(
+            """
+            INSERT INTO documents (
+                chat_id, source_share_document_id, document_name, document_text, storage_key, media_type, mime_type
             )
-
-    conn.commit()
-    cursor.close()
-    conn.close()
-    return new_chat_id
+            SELECT %s, id, document_name, document_text, storage_key, media_type, mime_type
+            FROM chat_share_documents
+            WHERE chat_share_id = %s
+            ORDER BY id
+            """,
+            (new_chat_id, share["id"]),
+        )
+        cursor.execute(
+            """
+            INSERT INTO chunks (
+                document_id, start_index, end_index, embedding_vector, embedding_encoding,
+                embedding_model, embedding_dimensions, embedding_id, page_number
+            )
+            SELECT d.id, sc.start_index, sc.end_index, sc.embedding_vector, sc.embedding_encoding,
+                   sc.embedding_model, sc.embedding_dimensions, sc.embedding_id, sc.page_number
+            FROM documents d
+            JOIN chat_share_chunks sc ON sc.chat_share_document_id = d.source_share_document_id
+            WHERE d.chat_id = %s
+            ORDER BY sc.id
+            """,
+            (new_chat_id,),
+        )
+        conn.commit()
+        return new_chat_id
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
 
 
 def retrieve_messages_from_share_uuid(share_uuid):
@@ -1367,7 +1574,7 @@ def get_document_content(document_id, email):
         FROM documents d
         JOIN chats c ON d.chat_id = c.id
         JOIN users u ON c.user_id = u.id
-        WHERE d.id = %s AND u.email = %s
+        WHERE d.id = %s AND u.email = %s AND d.deleted_at IS NULL AND c.deleted_at IS NULL
         """,
         (document_id, email),
     )
@@ -1483,8 +1690,8 @@ def get_message_info(answer_id, user_email):
         FROM messages m
         JOIN chats ct ON m.chat_id = ct.id
         JOIN users u ON ct.user_id = u.id
-        LEFT JOIN chunks c ON FIND_IN_SET(c.id, m.relevant_chunks) > 0
-        WHERE m.id = %s AND u.email = %s
+        LEFT JOIN chunks c ON FIND_IN_SET(c.id, m.relevant_chunks) > 0 AND c.deleted_at IS NULL
+        WHERE m.id = %s AND u.email = %s AND ct.deleted_at IS NULL
         """,
         (answer_id, user_email),
     )
@@ -1511,18 +1718,86 @@ def get_message_info(answer_id, user_email):
     return question, answer
 
 
-def get_chat_chunks(user_email, chat_id):
+def get_chat_chunks(user_email, chat_id, code_scheme=None):
+    """Return a chat's chunk rows (metadata and embeddings) ordered by id.
+
+    With *code_scheme*, rows also carry ``embedding_code`` and the float
+    vector is only sent for rows that have no code of that scheme yet.
+    """
+    vector_column = "COALESCE(e.embedding_vector, c.embedding_vector) AS embedding_vector"
+    params = [user_email, chat_id]
+    if code_scheme:
+        vector_column = (
+            "c.embedding_code, c.embedding_code_scheme, "
+            "CASE WHEN c.embedding_code_scheme = %s THEN NULL "
+            "ELSE COALESCE(e.embedding_vector, c.embedding_vector) END AS embedding_vector"
+        )
+        params.insert(0, code_scheme)
     conn, cursor = get_db_connection()
     cursor.execute(
-        """
-        SELECT c.start_index, c.end_index, c.embedding_vector, c.document_id, d.document_name, d.document_text
+        f"""
+        SELECT c.id AS chunk_id, c.start_index, c.end_index, c.page_number, {vector_column},
+               COALESCE(e.embedding_encoding, c.embedding_encoding) AS embedding_encoding,
+               c.embedding_model, c.embedding_dimensions, c.document_id, d.document_name,
+               ch.chunk_revision
         FROM chunks c
+        LEFT JOIN embeddings e ON c.embedding_id = e.id
         JOIN documents d ON c.document_id = d.id
         JOIN chats ch ON d.chat_id = ch.id
         JOIN users u ON ch.user_id = u.id
         WHERE u.email = %s AND ch.id = %s
+          AND c.deleted_at IS NULL AND d.deleted_at IS NULL AND ch.deleted_at IS NULL
+        ORDER BY c.id
         """,
-        (user_email, chat_id),
+        params,
+    )
+    rows = cursor.fetchall()
+    cursor.close()
+    conn.close()
+    return rows
+
+
+def get_chunk_embeddings(user_email, chunk_ids):
+    """Return ``{chunk_id: (embedding_vector, embedding_encoding)}`` for chunks owned by *user_email*."""
+    chunk_ids = [int(chunk_id) for chunk_id in chunk_ids]
+    if not chunk_ids:
+        return {}
+
+    placeholders = ", ".join(["%s"] * len(chunk_ids))
+    conn, cursor = get_db_connection()
+    cursor.execute(
+        f"""
+        SELECT c.id AS chunk_id,
+               COALESCE(e.embedding_vector, c.embedding_vector) AS embedding_vector,
+               COALESCE(e.embedding_encoding, c.embedding_encoding) AS embedding_encoding
+        FROM chunks c
+        LEFT JOIN embeddings e ON c.embedding_id = e.id
+        JOIN documents d ON c.document_id = d.id
+        JOIN chats ch ON d.chat_id = ch.id
+        JOIN users u ON ch.user_id = u.id
+        WHERE u.email = %s AND c.id IN ({placeholders})
+          AND c.deleted_at IS NULL AND d.deleted_at IS NULL AND ch.deleted_at IS NULL
+        """,
+        [user_email, *chunk_ids],
+    )
+    rows = cursor.fetchall()
+    cursor.close()
+    conn.close()
+    return {row["chunk_id"]: (row["embedding_vector"], row["embedding_encoding"]) for row in rows}
+
+
+def get_document_chunk_refs(document_id, after_id=0):
+    """Return ``[{"chunk_id", "chat_id"}]`` for a document's chunks after *after_id*, in insertion order."""
+    conn, cursor = get_db_connection()
+    cursor.execute(
+        """
+        SELECT c.id AS chunk_id, d.chat_id
+        FROM chunks c
+        JOIN documents d ON c.document_id = d.id
+        WHERE c.document_id = %s AND c.id > %s AND c.deleted_at IS NULL
+        ORDER BY c.id
+        """,
+        (document_id, after_id),
     )
     rows = cursor.fetchall()
     cursor.close()
@@ -1530,10 +1805,525 @@ def get_chat_chunks(user_email, chat_id):
     return rows
 
 
+def get_chunk_texts(user_email, chunk_ids):
+    """Return ``{chunk_id: chunk_text}`` for the given chunks owned by *user_email*.
+
+    The text is cut out of ``documents.document_text`` on the server, so only
+    the selected chunks cross the wire rather than the full document per row.
+    """
+    chunk_ids = [int(chunk_id) for chunk_id in chunk_ids]
+    if not chunk_ids:
+        return {}
+
+    placeholders = ", ".join(["%s"] * len(chunk_ids))
+    conn, cursor = get_db_connection()
+    cursor.execute(
+        f"""
+        SELECT c.id AS chunk_id,
+               SUBSTRING(d.document_text, c.start_index + 1, c.end_index - c.start_index) AS chunk_text
+        FROM chunks c
+        JOIN documents d ON c.document_id = d.id
+        JOIN chats ch ON d.chat_id = ch.id
+        JOIN users u ON ch.user_id = u.id
+        WHERE u.email = %s AND c.id IN ({placeholders})
+          AND c.deleted_at IS NULL AND d.deleted_at IS NULL AND ch.deleted_at IS NULL
+        """,
+        [user_email, *chunk_ids],
+    )
+    rows = cursor.fetchall()
+    cursor.close()
+    conn.close()
+    return {row["chunk_id"]: row["chunk_text"] or "" for row in rows}
+
+
+def get_document_chunk_texts(document_id):
+    """Return ``[{"chunk_id", "chunk_text"}]`` for a document's chunks in insertion order."""
+    conn, cursor = get_db_connection()
+    try:
+        cursor.execute(
+            """
+            SELECT c.id AS chunk_id,
+                   SUBSTRING(d.document_text, c.start_index + 1, c.end_index - c.start_index) AS chunk_text
+            FROM chunks c
+            JOIN documents d ON c.document_id = d.id
+            WHERE c.document_id = %s AND c.deleted_at IS NULL
+            ORDER BY c.id
+            """,
+            (document_id,),
+        )
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def get_chat_lexical_indexes(user_email, chat_id):
+    """Return ``{document_id: [postings_blob, ...]}``, the persisted lexical index segments of a chat's documents."""
+    conn, cursor = get_db_connection()
+    try:
+        cursor.execute(
+            """
+            SELECT li.document_id, li.postings
+            FROM document_lexical_index li
+            JOIN documents d ON li.document_id = d.id
+            JOIN chats ch ON d.chat_id = ch.id
+            JOIN users u ON ch.user_id = u.id
+            WHERE u.email = %s AND ch.id = %s AND d.deleted_at IS NULL AND ch.deleted_at IS NULL
+            ORDER BY li.document_id, li.segment
+            """,
+            (user_email, chat_id),
+        )
+        indexes = {}
+        for row in cursor.fetchall():
+            indexes.setdefault(row["document_id"], []).append(row["postings"])
+        return indexes
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def save_document_lexical_index(document_id, chunk_count, postings):
+    """Replace every lexical index segment of *document_id* with one blob covering all its chunks."""
+    conn, cursor = get_db_connection()
+    try:
+        cursor.execute("DELETE FROM document_lexical_index WHERE document_id = %s", (document_id,))
+        cursor.execute(
+            "INSERT INTO document_lexical_index (document_id, segment, chunk_count, postings) VALUES (%s, 0, %s, %s)",
+            (document_id, chunk_count, postings),
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def add_document_lexical_segment(document_id, segment, chunk_count, postings):
+    """Store the lexical index of one ingestion batch of *document_id* as segment *segment*."""
+    conn, cursor = get_db_connection()
+    try:
+        cursor.execute(
+            """
+            INSERT INTO document_lexical_index (document_id, segment, chunk_count, postings)
+            VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE chunk_count = VALUES(chunk_count), postings = VALUES(postings)
+            """,
+            (document_id, segment, chunk_count, postings),
+        )
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def get_chunks_by_encoding(encoding, after_id=0, limit=500):
+    """Return up to *limit* ``{"id", "embedding_vector"}`` inline rows stored in *encoding*, by id."""
+    conn, cursor = get_db_connection()
+    try:
+        cursor.execute(
+            """
+            SELECT id, embedding_vector
+            FROM chunks
+            WHERE embedding_encoding = %s AND embedding_vector IS NOT NULL AND id > %s
+            ORDER BY id
+            LIMIT %s
+            """,
+            (encoding, after_id, limit),
+        )
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def reencode_chunk_embeddings(updates, source_encoding, target_encoding):
+    """Rewrite ``(chunk_id, blob)`` pairs in *target_encoding* in one transaction.
+
+    Rows whose encoding changed since they were read are left alone.
+    Returns the number of rows updated.
+    """
+    if not updates:
+        return 0
+    conn, cursor = get_db_connection()
+    try:
+        cursor.executemany(
+            """
+            UPDATE chunks SET embedding_vector = %s, embedding_encoding = %s
+            WHERE id = %s AND embedding_encoding = %s
+            """,
+            [(blob, target_encoding, chunk_id, source_encoding) for chunk_id, blob in updates],
+        )
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def get_chunks_missing_code(scheme, after_id=0, limit=500):
+    """Return up to *limit* ``{"id", "embedding_vector", "embedding_encoding"}`` rows without a *scheme* code."""
+    conn, cursor = get_db_connection()
+    try:
+        cursor.execute(
+            """
+            SELECT c.id,
+                   COALESCE(e.embedding_vector, c.embedding_vector) AS embedding_vector,
+                   COALESCE(e.embedding_encoding, c.embedding_encoding) AS embedding_encoding
+            FROM chunks c
+            LEFT JOIN embeddings e ON c.embedding_id = e.id
+            WHERE (c.embedding_code_scheme IS NULL OR c.embedding_code_scheme <> %s) AND c.id > %s
+            ORDER BY c.id
+            LIMIT %s
+            """,
+            (scheme, after_id, limit),
+        )
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def set_chunk_codes(updates, scheme):
+    """Store ``(chunk_id, code)`` pairs as *scheme* codes in one transaction; returns rows updated."""
+    if not updates:
+        return 0
+    conn, cursor = get_db_connection()
+    try:
+        cursor.executemany(
+            "UPDATE chunks SET embedding_code = %s, embedding_code_scheme = %s WHERE id = %s",
+            [(code, scheme, chunk_id) for chunk_id, code in updates],
+        )
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def get_chat_chunk_version(user_email, chat_id):
+    """Return ``(chunk_count, max_chunk_id, chunk_revision)`` for a chat's chunks.
+
+    Chunk ids are auto-increment, so the first two change whenever chunks are
+    added or removed; ``chats.chunk_revision`` is bumped by updates that keep
+    the ids (re-ingestion moving offsets, the re-embedding swap).  Together
+    they let callers validate cached retrieval indexes without re-reading the
+    embeddings.
+    """
+    conn, cursor = get_db_connection()
+    cursor.execute(
+        """
+        SELECT COUNT(c.id) AS chunk_count, COALESCE(MAX(c.id), 0) AS max_chunk_id,
+               COALESCE(MAX(ch.chunk_revision), 0) AS chunk_revision
+        FROM chunks c
+        JOIN documents d ON c.document_id = d.id
+        JOIN chats ch ON d.chat_id = ch.id
+        JOIN users u ON ch.user_id = u.id
+        WHERE u.email = %s AND ch.id = %s
+          AND c.deleted_at IS NULL AND d.deleted_at IS NULL AND ch.deleted_at IS NULL
+        """,
+        (user_email, chat_id),
+    )
+    row = cursor.fetchone()
+    cursor.close()
+    conn.close()
+    if not row:
+        return 0, 0, 0
+    return int(row["chunk_count"]), int(row["max_chunk_id"]), int(row["chunk_revision"])
+
+
+def get_chat_embedding_space(user_email, chat_id):
+    """Return the :class:`EmbeddingSpace` a chat owned by *user_email* is served from."""
+    conn, cursor = get_db_connection()
+    try:
+        cursor.execute(
+            """
+            SELECT ch.embedding_model, ch.embedding_dimensions
+            FROM chats ch
+            JOIN users u ON ch.user_id = u.id
+            WHERE u.email = %s AND ch.id = %s AND ch.deleted_at IS NULL
+            """,
+            (user_email, chat_id),
+        )
+        return space_from_row(cursor.fetchone())
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def get_document_embedding_space(document_id):
+    """Return the space new chunks of *document_id* must be embedded in (its chat's)."""
+    conn, cursor = get_db_connection()
+    try:
+        cursor.execute(
+            """
+            SELECT ch.embedding_model, ch.embedding_dimensions
+            FROM documents d
+            JOIN chats ch ON d.chat_id = ch.id
+            WHERE d.id = %s AND d.deleted_at IS NULL AND ch.deleted_at IS NULL
+            """,
+            (document_id,),
+        )
+        return space_from_row(cursor.fetchone())
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def get_chunks_to_reembed(chat_id, space, after_id=0, limit=100):
+    """Return up to *limit* ``{"id", "chunk_text"}`` rows of a chat not yet in (or staged for) *space*."""
+    conn, cursor = get_db_connection()
+    try:
+        cursor.execute(
+            """
+            SELECT c.id,
+                   SUBSTRING(d.document_text, c.start_index + 1, c.end_index - c.start_index) AS chunk_text
+            FROM chunks c
+            JOIN documents d ON c.document_id = d.id
+            LEFT JOIN chunk_embedding_staging s
+              ON s.chunk_id = c.id AND s.embedding_model = %s AND s.embedding_dimensions = %s
+            WHERE d.chat_id = %s AND c.id > %s AND s.chunk_id IS NULL
+              AND c.deleted_at IS NULL AND d.deleted_at IS NULL
+              AND (c.embedding_model <> %s OR c.embedding_dimensions <> %s)
+            ORDER BY c.id
+            LIMIT %s
+            """,
+            (space.model, space.dimensions, chat_id, after_id, space.model, space.dimensions, limit),
+        )
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def stage_chunk_embeddings(chat_id, space, updates, encoding=EMBEDDING_ENCODING):
+    """Stage ``(chunk_id, blob)`` vectors in *space* for :func:`swap_chat_embedding_space`."""
+    if not updates:
+        return 0
+    conn, cursor = get_db_connection()
+    try:
+        cursor.executemany(
+            """
+            INSERT INTO chunk_embedding_staging (
+                chunk_id, chat_id, embedding_model, embedding_dimensions, embedding_vector, embedding_encoding
+            ) VALUES (%s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                embedding_model = VALUES(embedding_model),
+                embedding_dimensions = VALUES(embedding_dimensions),
+                embedding_vector = VALUES(embedding_vector),
+                embedding_encoding = VALUES(embedding_encoding)
+            """,
+            [(chunk_id, chat_id, space.model, space.dimensions, blob, encoding) for chunk_id, blob in updates],
+        )
+        conn.commit()
+        return len(updates)
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def swap_chat_embedding_space(chat_id, space):
+    """Move a chat and all of its staged chunks to *space* in one transaction.
+
+    The chat row is locked first, so concurrent readers see either the old
+    vectors and space or the new ones, never a mix.  Returns the number of
+    chunks swapped, or None (and changes nothing) while some chunk outside
+    *space* has no staged vector yet.
+    """
+    conn, cursor = get_db_connection()
+    try:
+        cursor.execute("SELECT id FROM chats WHERE id = %s FOR UPDATE", (chat_id,))
+        if cursor.fetchone() is None:
+            conn.rollback()
+            return None
+        cursor.execute(
+            """
+            SELECT COUNT(*) AS pending
+            FROM chunks c
+            JOIN documents d ON c.document_id = d.id
+            LEFT JOIN chunk_embedding_staging s
+              ON s.chunk_id = c.id AND s.embedding_model = %s AND s.embedding_dimensions = %s
+            WHERE d.chat_id = %s AND s.chunk_id IS NULL
+              AND c.deleted_at IS NULL AND d.deleted_at IS NULL
+              AND (c.embedding_model <> %s OR c.embedding_dimensions <> %s)
+            """,
+            (space.model, space.dimensions, chat_id, space.model, space.dimensions),
+        )
+        if cursor.fetchone()["pending"]:
+            conn.rollback()
+            return None
+        cursor.execute(
+            """
+            UPDATE chunks c
+            JOIN chunk_embedding_staging s ON s.chunk_id = c.id
+            SET c.embedding_vector = s.embedding_vector,
+                c.embedding_encoding = s.embedding_encoding,
+                c.embedding_model = s.embedding_model,
+                c.embedding_dimensions = s.embedding_dimensions,
+                c.embedding_id = NULL,
+                c.embedding_code = NULL,
+                c.embedding_code_scheme = NULL
+            WHERE s.chat_id = %s AND s.embedding_model = %s AND s.embedding_dimensions = %s
+            """,
+            (chat_id, space.model, space.dimensions),
+        )
+        swapped = cursor.rowcount
+        cursor.execute(
+            """
+            UPDATE chats SET embedding_model = %s, embedding_dimensions = %s, chunk_revision = chunk_revision + 1
+            WHERE id = %s
+            """,
+            (space.model, space.dimensions, chat_id),
+        )
+        cursor.execute("DELETE FROM chunk_embedding_staging WHERE chat_id = %s", (chat_id,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+    _notify_chunk_change([chat_id])
+    return swapped
+
+
+_EMBEDDING_UNREFERENCED = (
+    "NOT EXISTS (SELECT 1 FROM chunks c WHERE c.embedding_id = {id}) "
+    "AND NOT EXISTS (SELECT 1 FROM chat_share_chunks s WHERE s.embedding_id = {id})"
+)
+
+# Tombstoned rows and the rows that hang off them, in the order services.reaper
+# removes them (children before parents).  Each query pages by primary key.
+# Chats that still have shares keep their tombstoned row, since snapshots
+# reference it.  prompt_answers.citation_id references chunks without ON
+# DELETE, so answers citing a reapable chunk go first, and a chunk cited
+# after that step waits for the next pass instead of failing its batch.
+# Embeddings no chunk or share snapshot references any more are removed after
+# the chunks; ingestion stores an embedding before the chunks that use it, so
+# only rows older than an hour are considered orphaned.
+_REAPABLE_ROWS = {
+    "prompt_answers": """
+        SELECT pa.id
+        FROM prompt_answers pa
+        JOIN chunks c ON pa.citation_id = c.id
+        JOIN documents d ON c.document_id = d.id
+        LEFT JOIN chats ch ON d.chat_id = ch.id
+        WHERE pa.id > %s
+          AND (c.deleted_at IS NOT NULL OR d.deleted_at IS NOT NULL OR ch.deleted_at IS NOT NULL)
+        ORDER BY pa.id
+        LIMIT %s
+    """,
+    "chunks": """
+        SELECT c.id
+        FROM chunks c
+        JOIN documents d ON c.document_id = d.id
+        LEFT JOIN chats ch ON d.chat_id = ch.id
+        WHERE c.id > %s
+          AND (c.deleted_at IS NOT NULL OR d.deleted_at IS NOT NULL OR ch.deleted_at IS NOT NULL)
+          AND NOT EXISTS (SELECT 1 FROM prompt_answers pa WHERE pa.citation_id = c.id)
+        ORDER BY c.id
+        LIMIT %s
+    """,
+    "embeddings": f"""
+        SELECT e.id
+        FROM embeddings e
+        WHERE e.id > %s
+          AND e.created < CURRENT_TIMESTAMP - INTERVAL 1 HOUR
+          AND {_EMBEDDING_UNREFERENCED.format(id="e.id")}
+        ORDER BY e.id
+        LIMIT %s
+    """,
+    "documents": """
+        SELECT d.id
+        FROM documents d
+        LEFT JOIN chats ch ON d.chat_id = ch.id
+        WHERE d.id > %s
+          AND (d.deleted_at IS NOT NULL OR ch.deleted_at IS NOT NULL)
+          AND NOT EXISTS (SELECT 1 FROM chunks c WHERE c.document_id = d.id)
+        ORDER BY d.id
+        LIMIT %s
+    """,
+    "message_attachments": """
+        SELECT ma.id
+        FROM message_attachments ma
+        JOIN messages m ON ma.message_id = m.id
+        JOIN chats ch ON m.chat_id = ch.id
+        WHERE ma.id > %s AND ch.deleted_at IS NOT NULL
+        ORDER BY ma.id
+        LIMIT %s
+    """,
+    "messages": """
+        SELECT m.id
+        FROM messages m
+        JOIN chats ch ON m.chat_id = ch.id
+        WHERE m.id > %s AND ch.deleted_at IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM message_attachments ma WHERE ma.message_id = m.id)
+        ORDER BY m.id
+        LIMIT %s
+    """,
+    "qa_feedback": """
+        SELECT f.id
+        FROM qa_feedback f
+        JOIN chats ch ON f.chat_id = ch.id
+        WHERE f.id > %s AND ch.deleted_at IS NOT NULL
+        ORDER BY f.id
+        LIMIT %s
+    """,
+    "chats": """
+        SELECT ch.id
+        FROM chats ch
+        WHERE ch.id > %s AND ch.deleted_at IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM documents d WHERE d.chat_id = ch.id)
+          AND NOT EXISTS (SELECT 1 FROM messages m WHERE m.chat_id = ch.id)
+          AND NOT EXISTS (SELECT 1 FROM qa_feedback f WHERE f.chat_id = ch.id)
+          AND NOT EXISTS (SELECT 1 FROM chat_shares s WHERE s.chat_id = ch.id)
+        ORDER BY ch.id
+        LIMIT %s
+    """,
+}
+REAPABLE_TABLES = tuple(_REAPABLE_ROWS)
+# Checked again when deleting, so a row referenced since it was listed is kept.
+_REAP_DELETE_CONDITIONS = {"embeddings": _EMBEDDING_UNREFERENCED.format(id="embeddings.id")}
+
+
+def get_reapable_ids(table, after_id=0, limit=500):
+    """Return up to *limit* ids of *table* rows left behind by a deletion, after *after_id*."""
+    conn, cursor = get_db_connection()
+    try:
+        cursor.execute(_REAPABLE_ROWS[table], (after_id, limit))
+        return [row["id"] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def delete_reaped_rows(table, ids):
+    """Delete rows of *table* returned by :func:`get_reapable_ids`; returns the count."""
+    if table not in _REAPABLE_ROWS:
+        raise ValueError(f"Not a reapable table: {table!r}")
+    if not ids:
+        return 0
+    placeholders = ", ".join(["%s"] * len(ids))
+    condition = _REAP_DELETE_CONDITIONS.get(table)
+    sql = f"DELETE FROM {table} WHERE id IN ({placeholders})" + (f" AND {condition}" if condition else "")
+    conn, cursor = get_db_connection()
+    try:
+        cursor.execute(sql, list(ids))
+        conn.commit()
+        return cursor.rowcount
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+
 def get_chat_info(chat_id):
     conn, cursor = get_db_connection()
     cursor.execute(
-        "SELECT model_type, chat_name, associated_task FROM chats WHERE id = %s",
+        "SELECT model_type, chat_name, associated_task FROM chats WHERE id = %s AND deleted_at IS NULL",
         (chat_id,),
     )
     result = cursor.fetchone()
@@ -0,0 +1,116 @@
+"""On-disk encodings for ``chunks.embedding_vector`` blobs.
+
+Embeddings used to be stored as raw float64 (8 bytes per dimension) even
+though retrieval ranks in float32.  Each chunk now records the encoding of its
+blob in ``embedding_encoding``, so rows written before and after a change of
+``EMBEDDING_ENCODING`` coexist:
+
+- ``float64``: legacy rows (the column default).
+- ``float32``: the default for new rows; half the storage, identical ranking.
+- ``float16``: a quarter of the storage, for very large corpora.
+
+Decoding always returns float32.  Rows read without an encoding (older
+queries, shared chats copied before the column existed) fall back to
+inferring it from the blob length.
+
+Chunks can also carry a compact *code* of the unit-normalised vector in
+``embedding_code`` for two-stage retrieval (see ``services.quantization``),
+tagged with its scheme in ``embedding_code_scheme``:
+
+- ``int8``: a float32 scale followed by one signed byte per dimension.
+- ``binary``: one sign bit per dimension, packed.
+"""
+
+from __future__ import annotations
+
+import os
+from collections.abc import Sequence
+
+import numpy as np
+
+ENCODING_DTYPES = {
+    "float64": np.float64,
+    "float32": np.float32,
+    "float16": np.float16,
+}
+LEGACY_ENCODING = "float64"
+EMBEDDING_ENCODING = os.getenv("EMBEDDING_ENCODING", "float32").lower()
+if EMBEDDING_ENCODING not in ENCODING_DTYPES:
+    print(f"[WARNING] Unknown EMBEDDING_ENCODING {EMBEDDING_ENCODING!r}; using float32")
+    EMBEDDING_ENCODING = "float32"
+
+QUANTIZATION_SCHEMES = ("int8", "binary")
+EMBEDDING_QUANTIZATION = os.getenv("EMBEDDING_QUANTIZATION", "none").lower()
+if EMBEDDING_QUANTIZATION not in QUANTIZATION_SCHEMES + ("none",):
+    print(f"[WARNING] Unknown EMBEDDING_QUANTIZATION {EMBEDDING_QUANTIZATION!r}; quantization disabled")
+    EMBEDDING_QUANTIZATION = "none"
+_INT8_MAX = 127
+_SCALE_BYTES = 4
+
+
+def encode_vector(vector: Sequence[float] | np.ndarray, encoding: str = EMBEDDING_ENCODING) -> bytes:
+    """Serialize *vector* as a blob in *encoding*."""
+    return np.asarray(vector, dtype=ENCODING_DTYPES[encoding]).tobytes()
+
+
+def infer_encoding(blob: bytes, dimensions: int | None = None) -> str:
+    """Guess a blob's encoding from its length; float64 unless *dimensions* says otherwise."""
+    if dimensions:
+        for encoding, dtype in ENCODING_DTYPES.items():
+            if len(blob) == dimensions * np.dtype(dtype).itemsize:
+                return encoding
+    return LEGACY_ENCODING
+
+
+def decode_vector(blob: bytes, encoding: str | None = None, dimensions: int | None = None) -> np.ndarray:
+    """Deserialize a blob written by :func:`encode_vector` as float32."""
+    if encoding not in ENCODING_DTYPES:
+        encoding = infer_encoding(blob, dimensions)
+    return np.frombuffer(blob, dtype=ENCODING_DTYPES[encoding]).astype(np.float32)
+
+
+def reencode(blob: bytes, source: str, target: str) -> bytes:
+    """Convert a blob from *source* to *target* encoding."""
+    return np.frombuffer(blob, dtype=ENCODING_DTYPES[source]).astype(ENCODING_DTYPES[target]).tobytes()
+
+
+# ---------------------------------------------------------------------------
+# Quantized codes
+# ---------------------------------------------------------------------------
+
+
+def quantize_int8(normalized: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Scalar-quantize unit rows to ``(int8 codes, float32 per-row scales)``."""
+    normalized = np.atleast_2d(np.asarray(normalized, dtype=np.float32))
+    peaks = np.abs(normalized).max(axis=1) if normalized.size else np.zeros(len(normalized), np.float32)
+    scales = np.where(peaks > 0, peaks / _INT8_MAX, 1.0).astype(np.float32)
+    codes = np.clip(np.rint(normalized / scales[:, np.newaxis]), -_INT8_MAX, _INT8_MAX).astype(np.int8)
+    return codes, scales
+
+
+def quantize_binary(normalized: np.ndarray) -> np.ndarray:
+    """Pack the sign bit of every dimension, eight dimensions per byte."""
+    return np.packbits(np.atleast_2d(np.asarray(normalized)) > 0, axis=1)
+
+
+def code_size(scheme: str, dimensions: int) -> int:
+    if scheme == "int8":
+        return _SCALE_BYTES + dimensions
+    return (dimensions + 7) // 8
+
+
+def encode_code(vector: Sequence[float] | np.ndarray, scheme: str) -> bytes:
+    """Serialize the *scheme* code of *vector* (normalised here)."""
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(vector))
+    unit = vector / norm if norm > 0 else vector
+    if scheme == "int8":
+        codes, scales = quantize_int8(unit)
+        return scales.tobytes() + codes.tobytes()
+    return quantize_binary(unit).tobytes()
+
+
+def decode_int8_code(blob: bytes) -> tuple[np.ndarray, float]:
+    """Split an ``int8`` code blob into its codes and scale."""
+    scale = float(np.frombuffer(blob[:_SCALE_BYTES], dtype=np.float32)[0])
+    return np.frombuffer(blob[_SCALE_BYTES:], dtype=np.int8), scale
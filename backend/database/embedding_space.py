@@ -0,0 +1,48 @@
+"""Which embedding model and dimension a vector belongs to.
+
+Vectors from different models, or the same model at different dimensions,
+cannot be compared.  Every chunk therefore records its
+``embedding_model``/``embedding_dimensions``, and every chat records the
+space it is *served* from: ingestion embeds into the chat's space and
+retrieval embeds the query into it.  ``services.reembed`` moves a chat to a
+new space without ever exposing a mix of the two.
+
+New chats use ``EMBEDDING_MODEL`` at ``EMBEDDING_DIMENSIONS``.  Models that
+support provider-side dimension reduction (OpenAI ``text-embedding-3-*``) are
+asked for exactly that many dimensions.
+"""
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class EmbeddingSpace:
+    model: str
+    dimensions: int
+
+    def __str__(self) -> str:
+        return f"{self.model}@{self.dimensions}"
+
+
+# Every chunk written before spaces were recorded.
+LEGACY_EMBEDDING_SPACE = EmbeddingSpace("text-embedding-3-small", 768)
+DEFAULT_EMBEDDING_SPACE = EmbeddingSpace(
+    os.getenv("EMBEDDING_MODEL", LEGACY_EMBEDDING_SPACE.model),
+    int(os.getenv("EMBEDDING_DIMENSIONS", str(LEGACY_EMBEDDING_SPACE.dimensions))),
+)
+_DIMENSION_REDUCTION_PREFIXES = ("text-embedding-3-",)
+
+
+def supports_dimension_reduction(model: str) -> bool:
+    """True when the provider can return fewer dimensions for *model* on request."""
+    return model.startswith(_DIMENSION_REDUCTION_PREFIXES)
+
+
+def space_from_row(row: dict | None, default: EmbeddingSpace = DEFAULT_EMBEDDING_SPACE) -> EmbeddingSpace:
+    """Read ``embedding_model``/``embedding_dimensions`` from a row, or *default*."""
+    if not row or not row.get("embedding_model") or not row.get("embedding_dimensions"):
+        return default
+    return EmbeddingSpace(row["embedding_model"], int(row["embedding_dimensions"]))
@@ -132,13 +132,17 @@ class Chat(Base):
     chat_name = Column(Text)
     associated_task = Column(Integer, nullable=False)
     custom_model_key = Column(Text)
+    embedding_model = Column(String(64), nullable=False, default="text-embedding-3-small")
+    embedding_dimensions = Column(Integer, nullable=False, default=768)
+    chunk_revision = Column(Integer, nullable=False, default=0)
+    deleted_at = Column(TIMESTAMP)
 
     user = relationship("User", back_populates="chats")
     messages = relationship("Message", back_populates="chat")
     documents = relationship("Document", back_populates="chat")
     share = relationship("ChatShare", back_populates="chat", uselist=False)
 
-    __table_args__ = (Index("idx_chats_user_id", "user_id"),)
+    __table_args__ = (Index("idx_chats_user_live", "user_id", "deleted_at", "created"),)
 
 
 class ChatShare(Base):
@@ -171,6 +175,7 @@ class ChatShareDocument(Base):
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     chat_share_id = Column(Integer, ForeignKey("chat_shares.id"), nullable=False)
+    source_document_id = Column(Integer)
     document_name = Column(String(255), nullable=False)
     document_text = Column(Text)
     storage_key = Column(Text, nullable=False)
@@ -181,6 +186,8 @@ class ChatShareDocument(Base):
     chat_share = relationship("ChatShare", back_populates="documents")
     chunks = relationship("ChatShareChunk", back_populates="document")
 
+    __table_args__ = (Index("idx_chat_share_documents_source", "chat_share_id", "source_document_id"),)
+
 
 class ChatShareChunk(Base):
     __tablename__ = "chat_share_chunks"
@@ -190,6 +197,10 @@ class ChatShareChunk(Base):
     start_index = Column(Integer)
     end_index = Column(Integer)
     embedding_vector = Column(BLOB)
+    embedding_encoding = Column(String(16), nullable=False, default="float64")
+    embedding_model = Column(String(64), nullable=False, default="text-embedding-3-small")
+    embedding_dimensions = Column(Integer, nullable=False, default=768)
+    embedding_id = Column(Integer, ForeignKey("embeddings.id"))
     page_number = Column(Integer)
 
     document = relationship("ChatShareDocument", back_populates="chunks")
@@ -252,11 +263,16 @@ class Document(Base):
     document_text = Column(Text)
     media_type = Column(Enum("text", "image", "video", "audio"), nullable=False, default="text")
     mime_type = Column(String(255))
+    source_share_document_id = Column(Integer)
+    deleted_at = Column(TIMESTAMP)
 
     chat = relationship("Chat", back_populates="documents")
     chunks = relationship("Chunk", back_populates="document")
 
-    __table_args__ = (Index("idx_documents_chat_id", "chat_id"),)
+    __table_args__ = (
+        Index("idx_documents_chat_name", "chat_id", "document_name", "deleted_at"),
+        Index("idx_documents_source_share", "chat_id", "source_share_document_id"),
+    )
 
 
 class Chunk(Base):
@@ -267,11 +283,54 @@ class Chunk(Base):
     end_index = Column(Integer)
     document_id = Column(Integer, ForeignKey("documents.id"), nullable=False)
     embedding_vector = Column(BLOB)
+    embedding_encoding = Column(String(16), nullable=False, default="float64")
+    embedding_code = Column(BLOB)
+    embedding_code_scheme = Column(String(8))
+    embedding_model = Column(String(64), nullable=False, default="text-embedding-3-small")
+    embedding_dimensions = Column(Integer, nullable=False, default=768)
+    embedding_id = Column(Integer, ForeignKey("embeddings.id"))
     page_number = Column(Integer)
+    deleted_at = Column(TIMESTAMP)
 
     document = relationship("Document", back_populates="chunks")
 
-    __table_args__ = (Index("idx_chunks_document_id", "document_id"),)
+    __table_args__ = (Index("idx_chunks_document_live", "document_id", "deleted_at"),)
+
+
+class Embedding(Base):
+    __tablename__ = "embeddings"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    content_hash = Column(String(64), unique=True, nullable=False)
+    embedding_model = Column(String(64), nullable=False)
+    embedding_dimensions = Column(Integer, nullable=False)
+    embedding_vector = Column(BLOB, nullable=False)
+    embedding_encoding = Column(String(16), nullable=False)
+    created = Column(TIMESTAMP, nullable=False, default=datetime.utcnow)
+
+
+class ChunkEmbeddingStaging(Base):
+    __tablename__ = "chunk_embedding_staging"
+
+    chunk_id = Column(Integer, ForeignKey("chunks.id", ondelete="CASCADE"), primary_key=True)
+    chat_id = Column(Integer, nullable=False)
+    embedding_model = Column(String(64), nullable=False)
+    embedding_dimensions = Column(Integer, nullable=False)
+    embedding_vector = Column(BLOB, nullable=False)
+    embedding_encoding = Column(String(16), nullable=False)
+    created = Column(TIMESTAMP, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (Index("idx_chunk_embedding_staging_chat", "chat_id"),)
+
+
+class DocumentLexicalIndex(Base):
+    __tablename__ = "document_lexical_index"
+
+    document_id = Column(Integer, ForeignKey("documents.id", ondelete="CASCADE"), primary_key=True)
+    segment = Column(Integer, primary_key=True, nullable=False, default=0)
+    chunk_count = Column(Integer, nullable=False)
+    postings = Column(BLOB, nullable=False)
+    updated = Column(TIMESTAMP, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
 # ---------------------------------------------------------------------------
@@ -321,7 +380,31 @@ class ApiKey(Base):
 
     user = relationship("User", back_populates="api_keys")
 
-    __table_args__ = (Index("idx_api_keys_user_id", "user_id"),)
+    __table_args__ = (
+        Index("idx_api_keys_user_id", "user_id"),
+        Index("idx_api_keys_api_key", "api_key"),
+    )
+
+
+class ApiUsage(Base):
+    __tablename__ = "api_usage"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"))
+    api_key_id = Column(Integer, ForeignKey("apiKeys.id", ondelete="SET NULL"))
+    endpoint = Column(String(128), nullable=False)
+    model = Column(String(128))
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    completion_tokens = Column(Integer, nullable=False, default=0)
+    total_tokens = Column(Integer, nullable=False, default=0)
+    credits_used = Column(Integer, nullable=False, default=1)
+    created = Column(TIMESTAMP, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("idx_api_usage_user_created", "user_id", "created"),
+        Index("idx_api_usage_key_id", "api_key_id"),
+        Index("idx_api_usage_created", "created"),
+    )
 
 
 # ---------------------------------------------------------------------------
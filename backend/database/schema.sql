@@ -74,6 +74,16 @@ CREATE TABLE freeTrialsAccessed (
     FOREIGN KEY (user_id) REFERENCES users(id)
 );
 
+CREATE TABLE embeddings (
+    id INTEGER PRIMARY KEY AUTO_INCREMENT,
+    content_hash CHAR(64) NOT NULL UNIQUE,
+    embedding_model VARCHAR(64) NOT NULL,
+    embedding_dimensions INTEGER NOT NULL,
+    embedding_vector BLOB NOT NULL,
+    embedding_encoding VARCHAR(16) NOT NULL,
+    created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
 CREATE TABLE chats (
     id INTEGER PRIMARY KEY AUTO_INCREMENT,
     created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
@@ -82,6 +92,10 @@ CREATE TABLE chats (
     chat_name TEXT,
     associated_task INTEGER NOT NULL,
     custom_model_key TEXT,
+    embedding_model VARCHAR(64) NOT NULL DEFAULT 'text-embedding-3-small',
+    embedding_dimensions INTEGER NOT NULL DEFAULT 768,
+    chunk_revision INTEGER NOT NULL DEFAULT 0,
+    deleted_at TIMESTAMP NULL DEFAULT NULL,
     FOREIGN KEY (user_id) REFERENCES users(id)
 );
 
@@ -105,6 +119,7 @@ CREATE TABLE chat_share_messages (
 CREATE TABLE chat_share_documents (
     id INTEGER PRIMARY KEY AUTO_INCREMENT,
     chat_share_id INTEGER NOT NULL,
+    source_document_id INTEGER,
     document_name VARCHAR(255) NOT NULL,
     document_text LONGTEXT,
     storage_key TEXT NOT NULL,
@@ -120,8 +135,13 @@ CREATE TABLE chat_share_chunks (
     start_index INTEGER,
     end_index INTEGER,
     embedding_vector BLOB,
+    embedding_encoding VARCHAR(16) NOT NULL DEFAULT 'float64',
+    embedding_model VARCHAR(64) NOT NULL DEFAULT 'text-embedding-3-small',
+    embedding_dimensions INTEGER NOT NULL DEFAULT 768,
+    embedding_id INTEGER,
     page_number INTEGER,
-    FOREIGN KEY (chat_share_document_id) REFERENCES chat_share_documents(id)
+    FOREIGN KEY (chat_share_document_id) REFERENCES chat_share_documents(id),
+    FOREIGN KEY (embedding_id) REFERENCES embeddings(id)
 );
 
 
@@ -175,6 +195,8 @@ CREATE TABLE documents (
     document_text LONGTEXT,
     media_type ENUM('text', 'image', 'video', 'audio') NOT NULL DEFAULT 'text',
     mime_type VARCHAR(255),
+    source_share_document_id INTEGER,
+    deleted_at TIMESTAMP NULL DEFAULT NULL,
     FOREIGN KEY (chat_id) REFERENCES chats(id)
 );
 
@@ -184,8 +206,38 @@ CREATE TABLE chunks (
     end_index INTEGER,
     document_id INTEGER NOT NULL,
     embedding_vector BLOB,
+    embedding_encoding VARCHAR(16) NOT NULL DEFAULT 'float64',
+    embedding_code BLOB,
+    embedding_code_scheme VARCHAR(8),
+    embedding_model VARCHAR(64) NOT NULL DEFAULT 'text-embedding-3-small',
+    embedding_dimensions INTEGER NOT NULL DEFAULT 768,
+    embedding_id INTEGER,
     page_number INTEGER,
-    FOREIGN KEY (document_id) REFERENCES documents(id)
+    deleted_at TIMESTAMP NULL DEFAULT NULL,
+    FOREIGN KEY (document_id) REFERENCES documents(id),
+    FOREIGN KEY (embedding_id) REFERENCES embeddings(id)
+);
+
+CREATE TABLE chunk_embedding_staging (
+    chunk_id INTEGER PRIMARY KEY,
+    chat_id INTEGER NOT NULL,
+    embedding_model VARCHAR(64) NOT NULL,
+    embedding_dimensions INTEGER NOT NULL,
+    embedding_vector BLOB NOT NULL,
+    embedding_encoding VARCHAR(16) NOT NULL,
+    created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (chunk_id) REFERENCES chunks(id) ON DELETE CASCADE,
+    INDEX idx_chunk_embedding_staging_chat (chat_id)
+);
+
+CREATE TABLE document_lexical_index (
+    document_id INTEGER NOT NULL,
+    segment INTEGER NOT NULL DEFAULT 0,
+    chunk_count INTEGER NOT NULL,
+    postings LONGBLOB NOT NULL,
+    updated TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (document_id, segment),
+    FOREIGN KEY (document_id) REFERENCES documents(id) ON DELETE CASCADE
 );
 
 CREATE TABLE prompts (
@@ -250,16 +302,19 @@ CREATE TABLE IF NOT EXISTS api_usage (
 
 CREATE UNIQUE INDEX idx_users_email ON users(email);
 CREATE INDEX idx_message_attachments_message_id ON message_attachments(message_id);
-CREATE INDEX idx_chats_user_id ON chats(user_id);
+CREATE INDEX idx_chats_user_live ON chats(user_id, deleted_at, created);
 CREATE INDEX idx_messages_chat_id ON messages(chat_id);
 CREATE INDEX idx_messages_sent_from_user ON messages(sent_from_user);
 CREATE INDEX idx_api_keys_user_id ON apiKeys(user_id);
-CREATE INDEX idx_documents_chat_id ON documents(chat_id);
-CREATE INDEX idx_chunks_document_id ON chunks(document_id);
+CREATE INDEX idx_api_keys_api_key ON apiKeys(api_key);
+CREATE INDEX idx_documents_chat_name ON documents(chat_id, document_name, deleted_at);
+CREATE INDEX idx_documents_source_share ON documents(chat_id, source_share_document_id);
+CREATE INDEX idx_chat_share_documents_source ON chat_share_documents(chat_share_id, source_document_id);
+CREATE INDEX idx_chunks_document_live ON chunks(document_id, deleted_at);
 CREATE INDEX idx_prompt_answers_prompt_id ON prompt_answers(prompt_id);
 CREATE INDEX idx_prompt_answers_citation_id ON prompt_answers(citation_id);
 CREATE UNIQUE INDEX idx_user_chatbot_unique ON user_company_chatbots(user_id, path);
-CREATE INDEX idx_api_usage_user_id  ON api_usage(user_id);
+CREATE INDEX idx_api_usage_user_created ON api_usage(user_id, created);
 CREATE INDEX idx_api_usage_key_id   ON api_usage(api_key_id);
 CREATE INDEX idx_api_usage_created  ON api_usage(created);
 CREATE INDEX idx_qa_feedback_chat_id ON qa_feedback(chat_id);
@@ -13,47 +13,62 @@ sys.path.append(backend_dir)
 from fastmcp import FastMCP
 from database.db import get_db_connection
 from api_endpoints.financeGPT.chatbot_endpoints import (
-    get_relevant_chunks, add_document_to_db, chunk_document,
+    get_relevant_chunks_multi,
     retrieve_docs_from_db, delete_doc_from_db, add_message_to_db,
     add_sources_to_db, retrieve_message_from_db,
     get_text_from_single_file, get_text_from_url
 )
+from services.ingestion_jobs import IngestionSource, ingestion_jobs
+
+MCP_JOB_OWNER = "mcp"
 
 # Initialize FastMCP server
 mcp = FastMCP("Document Agent Server")
 
 @mcp.tool()
-def retrieve_relevant_chunks(query: str, chat_id: int, user_email: str, k: int = 2) -> str:
-    """Retrieve relevant document chunks based on a given user query"""
+def retrieve_relevant_chunks(query: str, chat_id: int, user_email: str, k: int = 2, additional_queries: List[str] = None) -> str:
+    """Retrieve relevant document chunks for a query, optionally with extra phrasings of it"""
 
     try:
-        sources = get_relevant_chunks(k, query, chat_id, user_email)
+        queries = [query] + list(additional_queries or [])
+        sources = get_relevant_chunks_multi(k, queries, chat_id, user_email)
 
-        if not sources or sources == ["No text found"]:
+        if not sources:
             return "No relevant documents found."
 
         result = []
-        for i, (chunk_text, document_name) in enumerate(sources):
-            result.append(f"Source {i+1} ({document_name}):\n{chunk_text}")
+        for i, source in enumerate(sources):
+            result.append(f"Source {i+1} ({source['document_name']}):\n{source['chunk_text']}")
 
         return "\n\n---\n\n".join(result)
     except Exception as e:
         return f"Error retrieving documents: {str(e)}"
 
 @mcp.tool()
-def ingest_document(text: str, document_name: str, chat_id: int, chunk_size: int = 1000) -> str:
-    """Ingest a document and create embeddings"""
+def ingest_document(text: str, document_name: str, chat_id: int, chunk_size: int = 1000, reingest: bool = False) -> str:
+    """Ingest a document and create embeddings in the background; reingest=True refreshes an existing one"""
     try:
-        doc_id, exists = add_document_to_db(text, document_name, chat_id)
-
-        if not exists:
-            # Process document asynchronously
-            chunk_document.remote(text, chunk_size, doc_id)
-
-        return f"Document '{document_name}' ingested successfully. Document ID: {doc_id}"
+        job = ingestion_jobs.submit(
+            MCP_JOB_OWNER,
+            chat_id,
+            [IngestionSource(name=document_name, text=text, reingest=reingest)],
+            chunk_size,
+        )
+        return (
+            f"Document '{document_name}' queued for ingestion. Job ID: {job['job_id']}. "
+            "Use get_ingestion_status to track progress."
+        )
     except Exception as e:
         return f"Error ingesting document: {str(e)}"
 
+@mcp.tool()
+def get_ingestion_status(job_id: str) -> str:
+    """Get the progress of a document ingestion job"""
+    job = ingestion_jobs.get(job_id, MCP_JOB_OWNER)
+    if job is None:
+        return f"No ingestion job found with ID {job_id}."
+    return json.dumps(job, indent=2)
+
 @mcp.tool()
 def list_documents(chat_id: int, user_email: str) -> str:
     """List all documents in a chat"""
@@ -48,13 +48,15 @@ class PrivateChatbot:
             'Authorization': f'Bearer {api_key}'
         }
 
-    def upload(self, task_type, model_type, file_paths=None):
+    def upload(self, task_type, model_type, file_paths=None, chat_id=None, reingest=False):
         """Upload documents for data retrieval and Q&A.
 
         Args:
             task_type (str): Specifies the type of task to perform. Currently supports document-based interaction ("documents").
             model_type (str): Determines the AI model to use for processing the request. Different model types available are "gpt" for GPT-4 and "claude" for Claude.
             file_paths (list[str], optional): A list of file paths to documents for document-based tasks. Required if task_type is 'documents'. Example: ['path/to/file1.pdf', 'path/to/file2.pdf'].
+            chat_id (int, optional): Adds the documents to this existing chat instead of creating a new one.
+            reingest (bool, optional): Refreshes documents already in the chat, re-embedding only the chunks whose text changed. Defaults to False.
 
         Returns:
             response (dict): A JSON response from the API, including the `chat_id` for interactions based on the uploaded content.
@@ -69,7 +71,7 @@ class PrivateChatbot:
         if self.is_private == False:
             if model_type != "gpt" and model_type != "claude":
                 return {"error": "Model type is not valid. Please enter a valid model type"}
-            return upload_public(self.API_BASE_URL, self.headers, task_type, model_type, file_paths)
+            return upload_public(self.API_BASE_URL, self.headers, task_type, model_type, file_paths, chat_id, reingest)
         else:
             if model_type != "llama" and model_type != "mistral":
                 return {"error": "Model type is not valid. Please enter a valid model type"}
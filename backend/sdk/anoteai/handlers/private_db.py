@@ -144,8 +144,8 @@ def get_relevant_chunks(k, question, chat_id):
     embeddingVector = openai.embeddings.create(input=question, model="text-embedding-ada-002").data[0].embedding
     embeddingVector = np.array(embeddingVector)
 
-    res = knn(embeddingVector, embeddings)
-    num_results = min(k, len(res))
+    res = knn(embeddingVector, embeddings, k)
+    num_results = len(res)
 
     #Get the k most relevant chunks
     source_chunks = []
@@ -166,23 +166,33 @@ def get_relevant_chunks(k, question, chat_id):
     return source_chunks
 
 
-def knn(x, y):
-    x = np.expand_dims(x, axis=0)
-    # Calculate cosine similarity
-    similarities = np.dot(x, y.T) / (np.linalg.norm(x) * np.linalg.norm(y))
-    # Convert similarities to distances
-    distances = 1 - similarities.flatten()
-    nearest_neighbors = np.argsort(distances)
-
-    results = []
-    for i in range(len(nearest_neighbors)):
-        item = {
-            "index": nearest_neighbors[i],
-            "similarity_score": distances[nearest_neighbors[i]]
-        }
-        results.append(item)
+def knn(x, y, k=None):
+    x = np.asarray(x, dtype=np.float32)
+    y = np.asarray(y, dtype=np.float32)
+    if y.ndim == 1:
+        y = np.expand_dims(y, axis=0)
+    # Cosine similarity against each row, using per-row norms
+    x_norm = np.linalg.norm(x) or 1e-8
+    y_norms = np.linalg.norm(y, axis=1)
+    y_norms = np.where(y_norms == 0, 1e-8, y_norms)
+    similarities = (y @ x) / (y_norms * x_norm)
+
+    # Only the k nearest rows are ranked; the rest are never sorted
+    if k is None:
+        k = len(similarities)
+    k = min(k, len(similarities))
+    if k <= 0:
+        return []
+    if k < len(similarities):
+        nearest_neighbors = np.argpartition(-similarities, k - 1)[:k]
+    else:
+        nearest_neighbors = np.arange(len(similarities))
+    nearest_neighbors = nearest_neighbors[np.argsort(-similarities[nearest_neighbors], kind="stable")]
 
-    return results
+    return [
+        {"index": index, "similarity_score": 1 - similarities[index]}
+        for index in nearest_neighbors
+    ]
 
 def add_sources_to_db(message_id, sources):
     combined_sources = ""
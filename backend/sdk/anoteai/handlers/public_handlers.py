@@ -1,9 +1,10 @@
 import requests
 import os
 import re
+import time
 
 
-def upload_public(API_url, headers, task_type, model_type, file_paths=None):
+def upload_public(API_url, headers, task_type, model_type, file_paths=None, chat_id=None, reingest=False):
     if task_type == "documents": #Question-answering
         if file_paths is None:
             return {"error": "You are attempting to do question-answering. There are no files uploaded. Please upload at least one file."}
@@ -14,6 +15,10 @@ def upload_public(API_url, headers, task_type, model_type, file_paths=None):
                 "task_type": task_type,
                 "model_type": model_type
             }
+            if chat_id is not None:
+                data["chat_id"] = chat_id
+            if reingest:
+                data["reingest"] = "true"
 
             files = []
             opened_files = []
@@ -38,7 +43,7 @@ def upload_public(API_url, headers, task_type, model_type, file_paths=None):
 
             try:
                 response = requests.post(url, data=data, files=files, headers=headers)
-                return response.json()
+                return wait_for_upload(API_url, headers, response.json())
             except requests.exceptions.JSONDecodeError as e:
                 return {"error": f"Failed to decode JSON response {e}"}
             finally:
@@ -47,6 +52,23 @@ def upload_public(API_url, headers, task_type, model_type, file_paths=None):
     else:
         return {"error": "Task type is not recognized. Please enter a valid task type."}
 
+def wait_for_upload(API_url, headers, upload_response, timeout=1800, poll_interval=1.0):
+    """Poll the ingestion job returned by /public/upload until it finishes.
+
+    Returns *upload_response* with the final ``status`` and per-file ``files``
+    merged in, so callers can chat as soon as this returns.
+    """
+    status_url = upload_response.get("status_url") if isinstance(upload_response, dict) else None
+    if not status_url:
+        return upload_response
+
+    deadline = time.monotonic() + timeout
+    while True:
+        job = requests.get(f"{API_url}{status_url}", headers=headers).json()
+        if job.get("status") not in ("queued", "running") or time.monotonic() >= deadline:
+            return {**upload_response, "status": job.get("status"), "files": job.get("files", [])}
+        time.sleep(poll_interval)
+
 def is_file_or_isHtml(path):
     if os.path.isfile(path):
         return "file"
@@ -40,6 +40,7 @@ from __future__ import annotations
 
 import json
 import os
+import time
 from dataclasses import dataclass, field
 from typing import Any, Generator
 
@@ -228,7 +229,24 @@ class DocumentsClient:
         resp.raise_for_status()
         for _, fobj in files:
             fobj[1].close()
-        return resp.json()
+        return self._wait_for_ingestion(resp.json())
+
+    def _wait_for_ingestion(self, upload: dict, timeout: float = 1800, poll_interval: float = 1.0) -> dict:
+        """Poll the upload's ingestion job so documents are searchable on return."""
+        status_url = upload.get("status_url")
+        if not status_url:
+            return upload
+        deadline = time.monotonic() + timeout
+        while True:
+            resp = requests.get(
+                f"{self._http.base_url}{status_url}",
+                headers={"Authorization": f"Bearer {self._http.api_key}"},
+            )
+            resp.raise_for_status()
+            job = resp.json()
+            if job.get("status") not in ("queued", "running") or time.monotonic() >= deadline:
+                return {**upload, "status": job.get("status"), "files": job.get("files", [])}
+            time.sleep(poll_interval)
 
     def question_answer(self, question: str, chat_id: int, model: str = "gpt-4o") -> dict:
         """Simple stateless Q&A against previously-uploaded documents."""
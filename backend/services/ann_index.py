@@ -0,0 +1,330 @@
+"""Optional approximate-nearest-neighbour (IVF) index for large chats.
+
+Exact retrieval scores every chunk in a chat.  For chats with tens of
+thousands of chunks this module keeps an inverted-file (IVF) partition of the
+chat's embeddings: a set of spherical k-means centroids plus the list each
+chunk id belongs to.  A query is compared against the centroids, only the
+``ANN_NPROBE`` closest lists are scored exactly, and the vectors themselves
+are read from the cached chat matrix (``services.chunk_index_cache``), so the
+index never duplicates embeddings.
+
+- Disabled unless ``ENABLE_ANN_INDEX=true``.  Chats below ``ANN_MIN_CHUNKS``
+  always use the exact path.
+- Each chat's index is persisted to ``ANN_INDEX_DIR/chat_<id>.npz`` and loaded
+  lazily on first search.  Before searching it is synced with the current
+  chunk ids, so deleted chunks are dropped and missing chunks are assigned to
+  their nearest list without retraining.
+- Ingestion calls :func:`index_document_chunks` so chats that already have an
+  index pick up new chunks as they are written.  Re-embedding a chat into a
+  new space calls :func:`discard_chat_index` so it is retrained.
+- :func:`recall_at_k` compares the index against exact search for tuning.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Sequence
+from contextlib import contextmanager
+from typing import Any
+
+import numpy as np
+from database.db import get_document_chunk_refs
+
+from services.vector_search import normalize_rows, top_k_cosine
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX hosts
+    fcntl = None
+
+ENABLE_ANN_INDEX = os.getenv("ENABLE_ANN_INDEX", "false").lower() == "true"
+ANN_MIN_CHUNKS = int(os.getenv("ANN_MIN_CHUNKS", "5000"))
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "8"))
+ANN_INDEX_DIR = os.getenv(
+    "ANN_INDEX_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "database", "ann_indexes"),
+)
+# Retrain once the chat has grown this many times past the training size.
+_RETRAIN_GROWTH = 4
+_TRAIN_SAMPLE = 20000
+_TRAIN_ITERATIONS = 8
+_MAX_LOADED = 64
+
+
+# ---------------------------------------------------------------------------
+# IVF index
+# ---------------------------------------------------------------------------
+
+
+class IVFIndex:
+    """Centroids plus a chunk-id → list assignment for one chat."""
+
+    def __init__(
+        self,
+        centroids: np.ndarray,
+        chunk_ids: np.ndarray,
+        lists: np.ndarray,
+        trained_size: int,
+    ) -> None:
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.chunk_ids = np.asarray(chunk_ids, dtype=np.int64)
+        self.lists = np.asarray(lists, dtype=np.int32)
+        self.trained_size = int(trained_size)
+        self._members: tuple[np.ndarray, np.ndarray] | None = None
+
+    def __len__(self) -> int:
+        return len(self.chunk_ids)
+
+    @property
+    def nlist(self) -> int:
+        return int(self.centroids.shape[0])
+
+    @classmethod
+    def train(cls, chunk_ids: np.ndarray, normalized_matrix: np.ndarray, seed: int = 0) -> IVFIndex:
+        """Cluster *normalized_matrix* with spherical k-means and assign every row."""
+        count = normalized_matrix.shape[0]
+        nlist = max(1, min(count, int(np.sqrt(count))))
+        rng = np.random.default_rng(seed)
+        sample = normalized_matrix
+        if count > _TRAIN_SAMPLE:
+            sample = normalized_matrix[rng.choice(count, _TRAIN_SAMPLE, replace=False)]
+
+        centroids = sample[rng.choice(sample.shape[0], nlist, replace=False)].copy()
+        for _ in range(_TRAIN_ITERATIONS):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            empty = ~np.any(sums, axis=1)
+            sums[empty] = centroids[empty]
+            centroids = normalize_rows(sums)
+
+        index = cls(centroids, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32), count)
+        index.add(chunk_ids, normalized_matrix)
+        return index
+
+    def add(self, chunk_ids: Sequence[int] | np.ndarray, vectors: np.ndarray) -> None:
+        """Assign new chunks to their nearest list."""
+        chunk_ids = np.asarray(chunk_ids, dtype=np.int64)
+        fresh = ~np.isin(chunk_ids, self.chunk_ids)
+        if not fresh.any():
+            return
+        chunk_ids = chunk_ids[fresh]
+        lists = np.argmax(normalize_rows(np.asarray(vectors)[fresh]) @ self.centroids.T, axis=1)
+        self.chunk_ids = np.concatenate([self.chunk_ids, chunk_ids])
+        self.lists = np.concatenate([self.lists, lists.astype(np.int32)])
+        self._members = None
+
+    def remove(self, chunk_ids: Sequence[int] | np.ndarray) -> None:
+        keep = ~np.isin(self.chunk_ids, np.asarray(chunk_ids, dtype=np.int64))
+        self.chunk_ids = self.chunk_ids[keep]
+        self.lists = self.lists[keep]
+        self._members = None
+
+    def copy(self) -> IVFIndex:
+        return IVFIndex(self.centroids, self.chunk_ids.copy(), self.lists.copy(), self.trained_size)
+
+    def needs_retrain(self) -> bool:
+        return len(self) > max(1, self.trained_size) * _RETRAIN_GROWTH
+
+    def sync(self, chunk_ids: np.ndarray, normalized_matrix: np.ndarray) -> bool:
+        """Make the index cover exactly *chunk_ids*; returns True if it changed."""
+        stale = ~np.isin(self.chunk_ids, chunk_ids)
+        missing = ~np.isin(chunk_ids, self.chunk_ids)
+        if stale.any():
+            self.remove(self.chunk_ids[stale])
+        if missing.any():
+            self.add(chunk_ids[missing], normalized_matrix[missing])
+        return bool(stale.any() or missing.any())
+
+    def probe(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """Return the chunk ids stored in the *nprobe* lists closest to *query*."""
+        order, boundaries = self._grouped_members()
+        nprobe = max(1, min(nprobe, self.nlist))
+        scores = self.centroids @ query
+        lists = np.argpartition(-scores, nprobe - 1)[:nprobe] if nprobe < self.nlist else range(self.nlist)
+        members = [order[boundaries[list_id] : boundaries[list_id + 1]] for list_id in lists]
+        return self.chunk_ids[np.concatenate(members)] if members else self.chunk_ids[:0]
+
+    def _grouped_members(self) -> tuple[np.ndarray, np.ndarray]:
+        if self._members is None:
+            order = np.argsort(self.lists, kind="stable")
+            boundaries = np.searchsorted(self.lists[order], np.arange(self.nlist + 1))
+            self._members = (order, boundaries)
+        return self._members
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary_path = f"{path}.tmp.{os.getpid()}"
+        with open(temporary_path, "wb") as handle:
+            np.savez(
+                handle,
+                centroids=self.centroids,
+                chunk_ids=self.chunk_ids,
+                lists=self.lists,
+                trained_size=np.array(self.trained_size),
+            )
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> IVFIndex | None:
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            return cls(data["centroids"], data["chunk_ids"], data["lists"], int(data["trained_size"]))
+
+
+# ---------------------------------------------------------------------------
+# Search against a cached chat index
+# ---------------------------------------------------------------------------
+
+
+def search(
+    ivf: IVFIndex,
+    chat_index: Any,
+    query_vectors: np.ndarray,
+    k: int,
+    nprobe: int = ANN_NPROBE,
+) -> np.ndarray:
+    """Return positions into *chat_index* of the best *k* chunks per query.
+
+    *chat_index* must expose ``chunk_ids`` sorted ascending and a row-normalised
+    ``matrix`` (see ``ChatChunkIndex``).  Rows are padded with ``-1`` when the
+    probed lists hold fewer than *k* chunks.
+    """
+    queries = normalize_rows(np.asarray(query_vectors, dtype=np.float32))
+    results = []
+    for query in queries:
+        candidate_ids = ivf.probe(query, nprobe)
+        positions = np.searchsorted(chat_index.chunk_ids, candidate_ids)
+        valid = positions < len(chat_index.chunk_ids)
+        valid[valid] &= chat_index.chunk_ids[positions[valid]] == candidate_ids[valid]
+        positions = positions[valid]
+        if not len(positions):
+            results.append(np.empty(0, dtype=np.int64))
+            continue
+        nearest, _ = top_k_cosine(query, chat_index.matrix[positions], k)
+        results.append(positions[nearest[0]])
+    width = max((len(row) for row in results), default=0)
+    padded = np.full((len(results), width), -1, dtype=np.int64)
+    for row, positions in enumerate(results):
+        padded[row, : len(positions)] = positions
+    return padded
+
+
+def recall_at_k(
+    ivf: IVFIndex,
+    chat_index: Any,
+    query_vectors: np.ndarray,
+    k: int,
+    nprobe: int = ANN_NPROBE,
+) -> float:
+    """Mean fraction of the exact top-*k* that the IVF search also returns."""
+    exact, _ = top_k_cosine(query_vectors, chat_index.matrix, k)
+    approximate = search(ivf, chat_index, query_vectors, k, nprobe)
+    if not exact.size:
+        return 1.0
+    hits = [
+        len(set(exact_row.tolist()) & set(approx_row.tolist()))
+        for exact_row, approx_row in zip(exact, approximate, strict=True)
+    ]
+    return float(np.mean(hits) / exact.shape[1])
+
+
+# ---------------------------------------------------------------------------
+# Per-chat persistence
+# ---------------------------------------------------------------------------
+
+_loaded: OrderedDict[int, tuple[IVFIndex, tuple[int, int]]] = OrderedDict()
+_loaded_lock = threading.Lock()
+
+
+def index_path(chat_id: int) -> str:
+    return os.path.join(ANN_INDEX_DIR, f"chat_{int(chat_id)}.npz")
+
+
+@contextmanager
+def _chat_file_lock(chat_id: int):
+    os.makedirs(ANN_INDEX_DIR, exist_ok=True)
+    with open(os.path.join(ANN_INDEX_DIR, f"chat_{int(chat_id)}.lock"), "w") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def get_chat_ann_index(chat_id: int, chat_index: Any) -> IVFIndex | None:
+    """Return an IVF index in sync with *chat_index*, or None for the exact path."""
+    if not ENABLE_ANN_INDEX or len(chat_index) < ANN_MIN_CHUNKS:
+        return None
+
+    tag = (chat_index.version, getattr(chat_index, "space", None))
+    with _loaded_lock:
+        cached = _loaded.get(chat_id)
+        if cached is not None and cached[1] == tag:
+            _loaded.move_to_end(chat_id)
+            return cached[0]
+
+    try:
+        with _chat_file_lock(chat_id):
+            # Never mutate an index other threads may be searching.
+            ivf = cached[0].copy() if cached is not None else IVFIndex.load(index_path(chat_id))
+            if ivf is None or ivf.centroids.shape[1] != chat_index.matrix.shape[1]:
+                ivf = IVFIndex.train(chat_index.chunk_ids, chat_index.matrix)
+                ivf.save(index_path(chat_id))
+            elif ivf.sync(chat_index.chunk_ids, chat_index.matrix):
+                if ivf.needs_retrain():
+                    ivf = IVFIndex.train(chat_index.chunk_ids, chat_index.matrix)
+                ivf.save(index_path(chat_id))
+    except (OSError, ValueError) as exc:
+        print(f"[WARNING] ANN index unavailable for chat {chat_id}, using exact search: {exc}")
+        return None
+
+    with _loaded_lock:
+        _loaded[chat_id] = (ivf, tag)
+        _loaded.move_to_end(chat_id)
+        while len(_loaded) > _MAX_LOADED:
+            _loaded.popitem(last=False)
+    return ivf
+
+
+def discard_chat_index(chat_id: int) -> None:
+    """Forget a chat's index (e.g. after its embeddings changed); it is retrained on next search."""
+    with _loaded_lock:
+        _loaded.pop(chat_id, None)
+    try:
+        with _chat_file_lock(chat_id):
+            if os.path.exists(index_path(chat_id)):
+                os.remove(index_path(chat_id))
+    except OSError as exc:
+        print(f"[WARNING] Could not remove ANN index for chat {chat_id}: {exc}")
+
+
+def index_document_chunks(document_id: int, embeddings: Sequence[Sequence[float]]) -> None:
+    """Add a document's most recently stored chunks to its chat's persisted index.
+
+    *embeddings* belong to the last ``len(embeddings)`` chunks written for the
+    document, so ingestion can call this once per stored batch.  Chats without
+    an index yet are skipped; they are trained lazily on first search once they
+    reach ``ANN_MIN_CHUNKS``.  Never raises.
+    """
+    if not ENABLE_ANN_INDEX or not len(embeddings):
+        return
+    try:
+        refs = get_document_chunk_refs(document_id)
+        if len(refs) < len(embeddings):
+            return
+        refs = refs[len(refs) - len(embeddings) :]
+        chat_id = refs[0]["chat_id"]
+        with _chat_file_lock(chat_id):
+            ivf = IVFIndex.load(index_path(chat_id))
+            if ivf is None:
+                return
+            ivf.add([ref["chunk_id"] for ref in refs], np.asarray(embeddings, dtype=np.float32))
+            ivf.save(index_path(chat_id))
+    except Exception as exc:
+        print(f"[WARNING] ANN index update failed for document {document_id}: {exc}")
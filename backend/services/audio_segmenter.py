@@ -0,0 +1,173 @@
+"""Split long audio on silence into Whisper-sized, slightly overlapping pieces.
+
+Whisper accepts at most 25 MB per request and transcribes a request in time
+roughly proportional to its length.  For long recordings ``audio_service``
+therefore cuts the audio into pieces and transcribes them concurrently:
+
+- :func:`detect_silences` runs ffmpeg's ``silencedetect`` once over the file;
+- :func:`plan_segments` cuts at the latest silence before each piece reaches
+  ``max_seconds`` (or hard at ``max_seconds`` when there is none in its
+  second half) and extends every clip ``overlap_seconds`` past each cut so
+  words at a hard cut are heard whole on both sides;
+- :func:`extract_segment` re-encodes one piece as 16 kHz mono MP3, which
+  keeps a ten-minute piece around 5 MB;
+- :func:`stitch` shifts each piece's Whisper segments to global time and
+  keeps a segment only in the piece whose own span contains its midpoint,
+  so the overlaps are not transcribed twice.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import subprocess
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+# Segments are re-encoded at 64 kbit/s
+_SEGMENT_BYTES_PER_SECOND = 64_000 // 8
+_SILENCE_NOISE = "-35dB"
+_SILENCE_MIN_SECONDS = 0.5
+_SILENCE_START = re.compile(r"silence_start:\s*(-?[0-9.]+)")
+_SILENCE_END = re.compile(r"silence_end:\s*(-?[0-9.]+)")
+
+
+@dataclass(frozen=True)
+class AudioSegment:
+    """A piece of the recording: ``[start, end)`` is its own span, ``[clip_start, clip_end)`` what is transcribed."""
+
+    index: int
+    start: float
+    end: float
+    clip_start: float
+    clip_end: float
+
+
+@dataclass(frozen=True)
+class TranscriptLine:
+    start: float
+    end: float
+    text: str
+
+
+def probe_duration(audio_path: str) -> float | None:
+    """Return the duration of *audio_path* in seconds using ffprobe, or None on failure."""
+    try:
+        result = subprocess.run(
+            [
+                "ffprobe", "-v", "error",
+                "-show_entries", "format=duration",
+                "-of", "default=noprint_wrappers=1:nokey=1",
+                audio_path,
+            ],
+            capture_output=True, text=True, timeout=30,
+        )
+        return float(result.stdout.strip())
+    except Exception:
+        return None
+
+
+def max_segment_seconds(max_bytes: int, max_seconds: float, overlap_seconds: float = 0.0) -> float:
+    """Longest segment whose clip, *overlap_seconds* wider on each side, stays within *max_bytes* once re-encoded."""
+    clip_seconds = 0.9 * max_bytes / _SEGMENT_BYTES_PER_SECOND
+    return max(1.0, min(max_seconds, clip_seconds - 2 * overlap_seconds))
+
+
+def detect_silences(audio_path: str, duration: float) -> list[tuple[float, float]]:
+    """Return the ``(silence_start, silence_end)`` spans of *audio_path*, *duration* seconds long.
+
+    Failures are logged and give no silences, so the plan falls back to hard cuts.
+    """
+    try:
+        result = subprocess.run(
+            [
+                "ffmpeg", "-i", audio_path,
+                "-af", f"silencedetect=noise={_SILENCE_NOISE}:d={_SILENCE_MIN_SECONDS}",
+                "-f", "null", "-",
+            ],
+            capture_output=True, timeout=600,
+            check=True,
+        )
+    except Exception as exc:
+        print(f"[audio_segmenter] silence detection failed: {exc}")
+        return []
+
+    log = result.stderr.decode(errors="replace")
+    starts = [float(value) for value in _SILENCE_START.findall(log)]
+    ends = [float(value) for value in _SILENCE_END.findall(log)]
+    # A recording that ends in silence has one start without an end.
+    if len(starts) == len(ends) + 1:
+        ends.append(duration)
+    count = min(len(starts), len(ends))
+    return list(zip(starts[:count], ends[:count], strict=True))
+
+
+def plan_segments(
+    duration: float,
+    silences: Sequence[tuple[float, float]],
+    max_seconds: float,
+    overlap_seconds: float,
+) -> list[AudioSegment]:
+    """Cut ``[0, duration)`` into pieces of at most *max_seconds*, clipped *overlap_seconds* wider."""
+    cut_points = sorted((start + end) / 2 for start, end in silences)
+    spans: list[tuple[float, float]] = []
+    start = 0.0
+    while duration - start > max_seconds:
+        limit = start + max_seconds
+        candidates = [point for point in cut_points if start + max_seconds / 2 < point <= limit]
+        end = candidates[-1] if candidates else limit
+        spans.append((start, end))
+        start = end
+    spans.append((start, duration))
+    return [
+        AudioSegment(
+            index,
+            start,
+            end,
+            max(0.0, start - overlap_seconds),
+            min(duration, end + overlap_seconds),
+        )
+        for index, (start, end) in enumerate(spans)
+    ]
+
+
+def extract_segment(audio_path: str, segment: AudioSegment, output_dir: str) -> bytes:
+    """Re-encode *segment* of *audio_path* as 16 kHz mono MP3 and return its bytes."""
+    piece_path = os.path.join(output_dir, f"segment_{segment.index:04d}.mp3")
+    subprocess.run(
+        [
+            "ffmpeg",
+            "-ss", f"{segment.clip_start:.3f}",
+            "-t", f"{segment.clip_end - segment.clip_start:.3f}",
+            "-i", audio_path,
+            "-vn",
+            "-ar", "16000",
+            "-ac", "1",
+            "-b:a", "64k",
+            piece_path, "-y",
+        ],
+        capture_output=True, timeout=300,
+        check=True,
+    )
+    with open(piece_path, "rb") as f:
+        return f.read()
+
+
+def stitch(
+    segments: Sequence[AudioSegment],
+    pieces: Sequence[Sequence[TranscriptLine]],
+) -> list[TranscriptLine]:
+    """Merge per-piece lines (timed from each clip's start) into one global transcript."""
+    merged: list[TranscriptLine] = []
+    last = len(segments) - 1
+    for segment, lines in zip(segments, pieces, strict=True):
+        for line in lines:
+            start, end = segment.clip_start + line.start, segment.clip_start + line.end
+            middle = (start + end) / 2
+            if (segment.index > 0 and middle < segment.start) or (segment.index < last and middle >= segment.end):
+                continue
+            text = line.text.strip()
+            if not text or (merged and merged[-1].text == text and start - merged[-1].end < 1.0):
+                continue
+            merged.append(TranscriptLine(start, end, text))
+    return merged
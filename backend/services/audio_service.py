@@ -5,13 +5,34 @@ The resulting transcript is stored as ``document_text`` and fed into the
 existing chunking + embedding pipeline, making the audio fully searchable.
 
 Supported formats (Whisper API): flac, m4a, mp3, mp4, mpeg, mpga, oga,
-ogg, wav, webm.  Maximum file size: 25 MB (enforced by MAX_AUDIO_BYTES).
+ogg, wav, webm.  Whisper takes at most 25 MB per request (MAX_AUDIO_BYTES).
+
+When ffmpeg is on PATH, recordings longer than ``AUDIO_SEGMENT_MAX_SECS`` or
+larger than ``MAX_AUDIO_BYTES`` (up to ``MAX_LONG_AUDIO_BYTES``) are split
+on silence by ``services.audio_segmenter`` and the pieces are transcribed
+``AUDIO_TRANSCRIBE_CONCURRENCY`` at a time, so an hour-long call takes about
+as long as its longest piece.  The stitched transcript carries a global
+timestamp on every line.
 """
 import io
 import os
-from typing import Optional
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional
 
 from agents.config import AgentConfig
+from services.audio_segmenter import (
+    AudioSegment,
+    TranscriptLine,
+    detect_silences,
+    extract_segment,
+    max_segment_seconds,
+    plan_segments,
+    probe_duration,
+    stitch,
+)
 
 # Whisper supports these extensions directly.  We pass the filename so the
 # API can infer the codec — do not strip it.
@@ -49,12 +70,14 @@ def transcribe_audio(
             "Set ENABLE_MULTIMODAL=true to transcribe audio.]"
         )
 
-    if len(audio_bytes) > AgentConfig.MAX_AUDIO_BYTES:
+    segmentable = shutil.which("ffmpeg") is not None
+    limit = AgentConfig.MAX_LONG_AUDIO_BYTES if segmentable else AgentConfig.MAX_AUDIO_BYTES
+    if len(audio_bytes) > limit:
         mb = len(audio_bytes) / (1024 * 1024)
-        limit_mb = AgentConfig.MAX_AUDIO_BYTES / (1024 * 1024)
+        limit_mb = limit / (1024 * 1024)
         return (
             f"[Audio file too large for transcription ({mb:.1f} MB). "
-            f"Whisper API limit: {limit_mb:.0f} MB.]"
+            f"Limit: {limit_mb:.0f} MB.]"
         )
 
     ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
@@ -64,33 +87,50 @@ def transcribe_audio(
             f"Supported: {', '.join(sorted(_WHISPER_SUPPORTED_EXTS))}.]"
         )
 
+    if segmentable:
+        tmp_dir = tempfile.mkdtemp(prefix="anote_audio_")
+        try:
+            transcript = _transcribe_segmented(audio_bytes, filename, language, tmp_dir)
+        except Exception as exc:
+            return f"[Audio transcription failed: {exc}]"
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        if transcript is not None:
+            return transcript
+        if len(audio_bytes) > AgentConfig.MAX_AUDIO_BYTES:
+            return "[Audio transcription failed: could not read the duration needed to split the file.]"
+
     return _transcribe_with_whisper(audio_bytes, filename, language)
 
 
+def _whisper_request(audio_bytes: bytes, filename: str, language: Optional[str]) -> Any:
+    from openai import OpenAI
+
+    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+    # Whisper requires a file-like object with a name attribute.
+    audio_file = io.BytesIO(audio_bytes)
+    audio_file.name = filename  # type: ignore[attr-defined]
+
+    kwargs: dict = {
+        "model": "whisper-1",
+        "file": audio_file,
+        "response_format": "verbose_json",  # includes segments + language
+        "prompt": _PROMPT_HINT,
+    }
+    if language:
+        kwargs["language"] = language
+
+    return client.audio.transcriptions.create(**kwargs)
+
+
 def _transcribe_with_whisper(
     audio_bytes: bytes,
     filename: str,
     language: Optional[str],
 ) -> str:
     try:
-        from openai import OpenAI
-
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-        # Whisper requires a file-like object with a name attribute.
-        audio_file = io.BytesIO(audio_bytes)
-        audio_file.name = filename  # type: ignore[attr-defined]
-
-        kwargs: dict = {
-            "model": "whisper-1",
-            "file": audio_file,
-            "response_format": "verbose_json",  # includes segments + language
-            "prompt": _PROMPT_HINT,
-        }
-        if language:
-            kwargs["language"] = language
-
-        result = client.audio.transcriptions.create(**kwargs)
+        result = _whisper_request(audio_bytes, filename, language)
 
         transcript = getattr(result, "text", None) or str(result)
         detected_lang = getattr(result, "language", "unknown")
@@ -107,3 +147,90 @@ def _transcribe_with_whisper(
 
     except Exception as exc:
         return f"[Audio transcription failed: {exc}]"
+
+
+# Long recordings -----------------------------------------------------------------
+
+
+def _field(item: Any, name: str) -> Any:
+    return item.get(name) if isinstance(item, dict) else getattr(item, name, None)
+
+
+def _timestamp(seconds: float) -> str:
+    hours, rest = divmod(int(seconds), 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{hours:d}:{minutes:02d}:{secs:02d}" if hours else f"{minutes:02d}:{secs:02d}"
+
+
+def _transcribe_segment(
+    audio_path: str,
+    segment: AudioSegment,
+    output_dir: str,
+    language: Optional[str],
+) -> tuple[list[TranscriptLine], Optional[str]]:
+    """Transcribe one piece; lines are timed from the piece's clip start."""
+    try:
+        piece = extract_segment(audio_path, segment, output_dir)
+        result = _whisper_request(piece, f"segment_{segment.index:04d}.mp3", language)
+    except Exception as exc:
+        own_span = (segment.start - segment.clip_start, segment.end - segment.clip_start)
+        return [TranscriptLine(*own_span, f"[Transcription of this part failed: {exc}]")], None
+
+    lines = [
+        TranscriptLine(float(_field(item, "start") or 0.0), float(_field(item, "end") or 0.0), _field(item, "text") or "")
+        for item in (_field(result, "segments") or [])
+    ]
+    if not lines:
+        text = _field(result, "text") or ""
+        lines = [TranscriptLine(segment.start - segment.clip_start, segment.end - segment.clip_start, text)]
+    return lines, _field(result, "language")
+
+
+def _transcribe_segmented(
+    audio_bytes: bytes,
+    filename: str,
+    language: Optional[str],
+    tmp_dir: str,
+) -> Optional[str]:
+    """Split and transcribe a long recording concurrently.
+
+    Returns None when the recording fits in one request (or its duration
+    cannot be read) so the caller sends it whole.
+    """
+    audio_path = os.path.join(tmp_dir, "source" + os.path.splitext(filename)[1])
+    with open(audio_path, "wb") as f:
+        f.write(audio_bytes)
+
+    duration = probe_duration(audio_path)
+    if duration is None:
+        return None
+    max_seconds = max_segment_seconds(
+        AgentConfig.MAX_AUDIO_BYTES, AgentConfig.AUDIO_SEGMENT_MAX_SECS, AgentConfig.AUDIO_SEGMENT_OVERLAP_SECS
+    )
+    if duration <= max_seconds and len(audio_bytes) <= AgentConfig.MAX_AUDIO_BYTES:
+        return None
+
+    started = time.perf_counter()
+    segments = plan_segments(
+        duration, detect_silences(audio_path, duration), max_seconds, AgentConfig.AUDIO_SEGMENT_OVERLAP_SECS
+    )
+    workers = max(1, min(AgentConfig.AUDIO_TRANSCRIBE_CONCURRENCY, len(segments)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="whisper") as pool:
+        results = list(
+            pool.map(lambda segment: _transcribe_segment(audio_path, segment, tmp_dir, language), segments)
+        )
+    lines = stitch(segments, [piece_lines for piece_lines, _ in results])
+    detected_lang = next((lang for _, lang in results if lang), language or "unknown")
+
+    longest = max(segment.clip_end - segment.clip_start for segment in segments)
+    print(
+        f"[audio_service] {filename}: {len(segments)} segments (longest {longest:.0f}s) "
+        f"transcribed in {time.perf_counter() - started:.1f}s with {workers} workers"
+    )
+
+    minutes, seconds = divmod(int(duration), 60)
+    header = (
+        f"[Audio transcript — language: {detected_lang}, duration: {minutes}m {seconds}s, "
+        f"{len(segments)} segments]\n\n"
+    )
+    return header + "\n".join(f"[{_timestamp(line.start)}] {line.text}" for line in lines)
@@ -0,0 +1,306 @@
+"""In-process, per-chat cache of the vectors used by ``get_relevant_chunks``.
+
+Building the retrieval matrix for a chat means pulling every chunk row from
+MySQL, decoding each ``embedding_vector`` blob and stacking the results.  The
+agents retrieve several times per turn, so this module keeps the decoded
+matrix around between calls:
+
+- Each entry holds a contiguous, row-normalised float32 matrix ready for
+  :func:`services.vector_search.top_k_cosine`, the original row norms and
+  compact per-chunk metadata (ids, offsets, page numbers and a document
+  index).  Chunk text is not cached; callers fetch it for the top-k winners
+  only (see ``database.db.get_chunk_texts``).
+- Entries are versioned by ``(chunk_count, max_chunk_id, chunk_revision)``
+  for the chat; the revision counts in-place chunk updates such as
+  re-ingestion and the re-embedding swap.  The caller compares that
+  fingerprint against the database before trusting an entry, which also
+  catches chunks written by Ray workers in other processes.
+- ``database.db`` notifies the cache whenever chunks for a chat are added or
+  removed, so local writes drop the entry immediately.
+- Total size is bounded by ``CHUNK_INDEX_CACHE_MAX_MB``; the least recently
+  used chats are evicted first.
+- With ``EMBEDDING_QUANTIZATION`` set, entries hold compact codes instead of
+  the float matrix (see :mod:`services.quantization`).
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Iterable, Mapping
+from dataclasses import dataclass, field
+from typing import Any
+
+import numpy as np
+from database.db import register_chunk_change_listener
+from database.embedding_encoding import QUANTIZATION_SCHEMES, code_size, decode_vector, encode_code
+from database.embedding_space import EmbeddingSpace, space_from_row
+
+from services.quantization import QuantizedMatrix
+from services.vector_search import normalize_rows
+
+DEFAULT_MAX_BYTES = int(float(os.getenv("CHUNK_INDEX_CACHE_MAX_MB", "256")) * 1024 * 1024)
+
+
+# ---------------------------------------------------------------------------
+# Index entry
+# ---------------------------------------------------------------------------
+
+
+@dataclass
+class ChatChunkIndex:
+    """Decoded retrieval data for one chat.
+
+    Quantized entries carry ``codes`` instead of a float ``matrix``.
+    ``space`` is the embedding space queries must be embedded in.
+    ``lexical`` is the chat's BM25 index, attached on first lexical search.
+    """
+
+    version: tuple[int, int, int]
+    matrix: np.ndarray
+    norms: np.ndarray
+    chunk_ids: np.ndarray
+    starts: np.ndarray
+    ends: np.ndarray
+    pages: np.ndarray
+    doc_positions: np.ndarray
+    document_ids: list[int] = field(default_factory=list)
+    document_names: list[str] = field(default_factory=list)
+    codes: QuantizedMatrix | None = None
+    space: EmbeddingSpace | None = None
+    lexical: Any = None
+
+    def __len__(self) -> int:
+        return int(self.chunk_ids.shape[0])
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by this entry."""
+        arrays = (
+            self.matrix,
+            self.norms,
+            self.chunk_ids,
+            self.starts,
+            self.ends,
+            self.pages,
+            self.doc_positions,
+        )
+        name_bytes = sum(len(name or "") for name in self.document_names)
+        code_bytes = self.codes.nbytes if self.codes is not None else 0
+        lexical_bytes = self.lexical.nbytes if self.lexical is not None else 0
+        return sum(array.nbytes for array in arrays) + name_bytes + code_bytes + lexical_bytes
+
+    def page_number(self, position: int) -> int | None:
+        page = int(self.pages[position])
+        return page if page >= 0 else None
+
+
+def chunk_rows_version(rows: Iterable[Mapping[str, Any]]) -> tuple[int, int, int]:
+    """Return the ``(chunk_count, max_chunk_id, chunk_revision)`` fingerprint of *rows*."""
+    count = 0
+    max_id = 0
+    revision = 0
+    for row in rows:
+        count += 1
+        max_id = max(max_id, int(row.get("chunk_id") or 0))
+        revision = max(revision, int(row.get("chunk_revision") or 0))
+    return count, max_id, revision
+
+
+def _row_code(row: Mapping[str, Any], dimensions: int, scheme: str) -> bytes | None:
+    """Return the stored *scheme* code for *row*, or compute it from the vector."""
+    code = row.get("embedding_code")
+    if code is not None and row.get("embedding_code_scheme") == scheme and len(code) == code_size(scheme, dimensions):
+        return bytes(code)
+    if row.get("embedding_vector") is None:
+        print(f"[WARNING] Skipping chunk {row.get('chunk_id')} without an embedding")
+        return None
+    embedding = decode_vector(row["embedding_vector"], row.get("embedding_encoding"), dimensions)
+    if len(embedding) != dimensions:
+        print(f"[WARNING] Skipping chunk with bad dimensions: {len(embedding)}")
+        return None
+    return encode_code(embedding, scheme)
+
+
+def build_chat_index(
+    rows: list[Mapping[str, Any]],
+    dimensions: int,
+    quantization: str = "none",
+    space: EmbeddingSpace | None = None,
+) -> ChatChunkIndex:
+    """Decode chunk rows from ``get_chat_chunks`` into a :class:`ChatChunkIndex`.
+
+    Rows whose embedding does not have *dimensions* values are skipped, the
+    same way ``get_relevant_chunks`` always has.  With *space*, rows recorded
+    in another embedding space (chunks written while the chat was being
+    re-embedded) are skipped too.  With *quantization* set to ``int8`` or
+    ``binary`` only codes are kept (stored ones when present) and ``matrix``
+    is empty.
+    """
+    quantized = quantization in QUANTIZATION_SCHEMES
+    vectors: list[np.ndarray] = []
+    codes: list[bytes] = []
+    chunk_ids: list[int] = []
+    starts: list[int] = []
+    ends: list[int] = []
+    pages: list[int] = []
+    doc_positions: list[int] = []
+    document_ids: list[int] = []
+    document_names: list[str] = []
+    position_for_document: dict[Any, int] = {}
+    foreign = 0
+
+    for row in rows:
+        if space is not None and space_from_row(row, space) != space:
+            foreign += 1
+            continue
+        if quantized:
+            code = _row_code(row, dimensions, quantization)
+            if code is None:
+                continue
+            codes.append(code)
+        else:
+            embedding = decode_vector(row["embedding_vector"], row.get("embedding_encoding"), dimensions)
+            if len(embedding) != dimensions:
+                print(f"[WARNING] Skipping chunk with bad dimensions: {len(embedding)}")
+                continue
+            vectors.append(embedding)
+
+        document_key = row.get("document_id", row["document_name"])
+        if document_key not in position_for_document:
+            position_for_document[document_key] = len(document_ids)
+            document_ids.append(row.get("document_id"))
+            document_names.append(row["document_name"])
+
+        chunk_ids.append(int(row.get("chunk_id") or 0))
+        starts.append(row["start_index"])
+        ends.append(row["end_index"])
+        page_number = row.get("page_number")
+        pages.append(-1 if page_number is None else page_number)
+        doc_positions.append(position_for_document[document_key])
+
+    if foreign:
+        print(f"[WARNING] Skipping {foreign} chunks not embedded in {space}")
+    if vectors:
+        matrix = np.vstack(vectors).astype(np.float32)
+    else:
+        matrix = np.empty((0, dimensions), dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1).astype(np.float32)
+
+    return ChatChunkIndex(
+        version=chunk_rows_version(rows),
+        matrix=normalize_rows(matrix, norms),
+        norms=norms,
+        chunk_ids=np.asarray(chunk_ids, dtype=np.int64),
+        starts=np.asarray(starts, dtype=np.int64),
+        ends=np.asarray(ends, dtype=np.int64),
+        pages=np.asarray(pages, dtype=np.int32),
+        doc_positions=np.asarray(doc_positions, dtype=np.int32),
+        document_ids=document_ids,
+        document_names=document_names,
+        codes=QuantizedMatrix.from_blobs(codes, quantization, dimensions) if quantized else None,
+        space=space,
+    )
+
+
+# ---------------------------------------------------------------------------
+# LRU cache
+# ---------------------------------------------------------------------------
+
+
+class ChunkIndexCache:
+    """Thread-safe, memory-bounded LRU of :class:`ChatChunkIndex` entries.
+
+    Keys are ``(user_email, chat_id, ...)`` so an entry is never served to a
+    user who does not own the chat.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[tuple[Any, ...], ChatChunkIndex] = OrderedDict()
+        self._sizes: dict[tuple[Any, ...], int] = {}
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def get(self, key: tuple[Any, ...], version: tuple[int, ...]) -> ChatChunkIndex | None:
+        """Return the entry for *key* if it matches *version*, else None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.version != tuple(version):
+                if entry is not None:
+                    self._remove(key)
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry
+
+    def put(self, key: tuple[Any, ...], entry: ChatChunkIndex) -> None:
+        """Store *entry*, evicting least recently used chats to stay in budget."""
+        size = entry.nbytes
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = entry
+            self._sizes[key] = size
+            self._bytes += size
+            self._evict_to_budget()
+
+    def refresh_size(self, key: tuple[Any, ...]) -> None:
+        """Re-measure the entry for *key* after data was attached to it."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            size = entry.nbytes
+            self._bytes += size - self._sizes[key]
+            self._sizes[key] = size
+            self._evict_to_budget()
+
+    def invalidate(self, chat_id: int) -> None:
+        """Drop every cached entry for *chat_id*."""
+        with self._lock:
+            for key in [key for key in self._entries if str(key[1]) == str(chat_id)]:
+                self._remove(key)
+                self._invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict[str, Any]:
+        """Return hit/miss/eviction counters and current occupancy."""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": (self._hits / lookups) if lookups else 0.0,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+            }
+
+    def _remove(self, key: tuple[Any, ...]) -> None:
+        self._entries.pop(key)
+        self._bytes -= self._sizes.pop(key)
+
+    def _evict_to_budget(self) -> None:
+        while self._bytes > self.max_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
+            self._evictions += 1
+
+
+chunk_index_cache = ChunkIndexCache()
+register_chunk_change_listener(chunk_index_cache.invalidate)
@@ -0,0 +1,169 @@
+"""Offset-native recursive character chunking.
+
+The ingestion paths used to split text with ``RecursiveCharacterTextSplitter``
+and then recover each chunk's position with ``text.find(chunk, position)``,
+falling back to a whole-document search whenever overlap made the first
+search miss.  That is close to quadratic on large documents and returns the
+wrong offsets for repeated boilerplate.
+
+This module applies the same recursive strategy (paragraphs, lines,
+sentences, words, then characters, with separators kept at the start of the
+following piece and surrounding whitespace stripped) directly on index
+ranges, so every span is exact by construction.  Spans are produced lazily.
+
+Overlap is capped at a fifth of the chunk size so very small chunk sizes
+still make forward progress.
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from collections.abc import Iterable, Iterator, Sequence
+
+DEFAULT_SEPARATORS = ("\n\n", "\n", ". ", "? ", "! ", " ", "")
+DEFAULT_CHUNK_OVERLAP = 200
+
+
+def iter_chunk_spans(
+    text: str,
+    chunk_size: int,
+    chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+    separators: Sequence[str] = DEFAULT_SEPARATORS,
+) -> Iterator[tuple[int, int]]:
+    """Yield ``(start, end)`` offsets of each chunk of *text*, in order."""
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be positive")
+    overlap = min(max(0, chunk_overlap), chunk_size // 5)
+    for start, end in _split(text, 0, len(text), chunk_size, overlap, tuple(separators)):
+        start, end = _strip(text, start, end)
+        if start < end:
+            yield start, end
+
+
+def iter_page_spans(
+    text_pages: Iterable[str],
+    chunk_size: int,
+    chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+    separators: Sequence[str] = DEFAULT_SEPARATORS,
+) -> Iterator[tuple[int, int, int]]:
+    """Yield ``(start, end, page_number)`` for every chunk of every page.
+
+    Offsets are into the concatenation of the pages (how ``documents``
+    stores ``document_text``); page numbers start at 1.  Chunks never span
+    a page boundary.
+    """
+    page_start = 0
+    for page_number, page_text in enumerate(text_pages, start=1):
+        for start, end in iter_chunk_spans(page_text, chunk_size, chunk_overlap, separators):
+            yield page_start + start, page_start + end, page_number
+        page_start += len(page_text)
+
+
+def iter_segment_spans(
+    segments: Iterable[tuple[str, int | None]],
+    chunk_size: int,
+    chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+    separators: Sequence[str] = DEFAULT_SEPARATORS,
+) -> Iterator[tuple[int, int, int | None]]:
+    """Yield ``(start, end, page_number)`` for ``(text, page_number)`` segments.
+
+    Chunks the way ``services.ingestion_pipeline`` does, so the same segments
+    always give the same spans.
+    """
+    offset = 0
+    for text, page_number in segments:
+        for start, end in iter_chunk_spans(text, chunk_size, chunk_overlap, separators):
+            yield offset + start, offset + end, page_number
+        offset += len(text)
+
+
+# ---------------------------------------------------------------------------
+# Internals
+# ---------------------------------------------------------------------------
+
+
+def _split(
+    text: str,
+    start: int,
+    end: int,
+    chunk_size: int,
+    overlap: int,
+    separators: tuple[str, ...],
+) -> Iterator[tuple[int, int]]:
+    separator = ""
+    remaining: tuple[str, ...] = ()
+    for position, candidate in enumerate(separators):
+        if candidate == "" or text.find(candidate, start, end) != -1:
+            separator = candidate
+            remaining = separators[position + 1 :]
+            break
+
+    if separator == "":
+        yield from _windows(start, end, chunk_size, overlap)
+        return
+
+    small: list[tuple[int, int]] = []
+    for piece in _pieces(text, start, end, separator):
+        if piece[1] - piece[0] < chunk_size:
+            small.append(piece)
+            continue
+        if small:
+            yield from _merge(small, chunk_size, overlap)
+            small = []
+        if remaining:
+            yield from _split(text, piece[0], piece[1], chunk_size, overlap, remaining)
+        else:
+            yield piece
+    if small:
+        yield from _merge(small, chunk_size, overlap)
+
+
+def _pieces(text: str, start: int, end: int, separator: str) -> Iterator[tuple[int, int]]:
+    """Split ``text[start:end]`` before each *separator*, keeping it on the right."""
+    piece_start = start
+    found = text.find(separator, start + 1, end)
+    while found != -1:
+        yield piece_start, found
+        piece_start = found
+        found = text.find(separator, found + len(separator), end)
+    if piece_start < end:
+        yield piece_start, end
+
+
+def _merge(
+    pieces: list[tuple[int, int]],
+    chunk_size: int,
+    overlap: int,
+) -> Iterator[tuple[int, int]]:
+    """Greedily join contiguous *pieces* into chunks that carry *overlap*."""
+    window: deque[tuple[int, int]] = deque()
+    total = 0
+    for piece_start, piece_end in pieces:
+        length = piece_end - piece_start
+        if window and total + length > chunk_size:
+            yield window[0][0], window[-1][1]
+            while window and (total > overlap or total + length > chunk_size):
+                first_start, first_end = window.popleft()
+                total -= first_end - first_start
+        window.append((piece_start, piece_end))
+        total += length
+    if window:
+        yield window[0][0], window[-1][1]
+
+
+def _windows(start: int, end: int, chunk_size: int, overlap: int) -> Iterator[tuple[int, int]]:
+    step = chunk_size - overlap
+    position = start
+    while position < end:
+        yield position, min(position + chunk_size, end)
+        if position + chunk_size >= end:
+            return
+        position += step
+
+
+def _strip(text: str, start: int, end: int) -> tuple[int, int]:
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
@@ -0,0 +1,83 @@
+"""Chunk-level diff of a document against its new text.
+
+``add_document`` keeps the existing row when a document with the same name
+is uploaded to a chat again, so refreshing an edited report used to mean
+deleting and re-ingesting it.  Re-ingestion instead re-chunks the new text
+exactly like the first ingestion and matches every new span to a stored
+chunk with the same text (by digest, first come first served):
+
+- matched chunks are kept with their embedding, their offsets updated if
+  the text around them moved;
+- new spans without a match are the only ones embedded;
+- stored chunks left unmatched are tombstoned.
+
+Because the recursive chunker cuts at paragraph boundaries first, a local
+edit only changes the chunks around it.  ``finance_gpt.reingest_document``
+applies the plan through ``database.db.revise_document_chunks`` in one
+transaction.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from collections import defaultdict, deque
+from collections.abc import Iterable, Mapping, Sequence
+from dataclasses import dataclass, field
+from typing import Any
+
+Span = tuple[int, int, "int | None"]
+
+
+@dataclass
+class RevisionPlan:
+    """What changes between a document's stored chunks and its new text."""
+
+    kept: int = 0
+    # (chunk_id, start, end, page_number) of kept chunks whose span changed.
+    moved: list[tuple[int, int, int, int | None]] = field(default_factory=list)
+    removed: list[int] = field(default_factory=list)
+    # (start, end, page_number) spans of the new text that need an embedding.
+    added: list[Span] = field(default_factory=list)
+
+    @property
+    def unchanged(self) -> bool:
+        return not (self.moved or self.removed or self.added)
+
+    def summary(self) -> str:
+        return (
+            f"{self.kept} chunks kept ({len(self.moved)} moved), "
+            f"{len(self.added)} added, {len(self.removed)} removed"
+        )
+
+
+def _digest(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+def plan_revision(
+    old_text: str,
+    old_chunks: Sequence[Mapping[str, Any]],
+    new_text: str,
+    new_spans: Iterable[Span],
+) -> RevisionPlan:
+    """Match *new_spans* of *new_text* to *old_chunks* of *old_text* by chunk text.
+
+    *old_chunks* are ``{"chunk_id", "start_index", "end_index", "page_number"}``
+    rows in id order; identical texts are matched in document order.
+    """
+    available: dict[bytes, deque[Mapping[str, Any]]] = defaultdict(deque)
+    for chunk in old_chunks:
+        available[_digest(old_text[chunk["start_index"] : chunk["end_index"]])].append(chunk)
+
+    plan = RevisionPlan()
+    for start, end, page_number in new_spans:
+        candidates = available.get(_digest(new_text[start:end]))
+        if not candidates:
+            plan.added.append((start, end, page_number))
+            continue
+        chunk = candidates.popleft()
+        plan.kept += 1
+        if (chunk["start_index"], chunk["end_index"], chunk["page_number"]) != (start, end, page_number):
+            plan.moved.append((chunk["chunk_id"], start, end, page_number))
+    plan.removed = sorted(chunk["chunk_id"] for remaining in available.values() for chunk in remaining)
+    return plan
@@ -0,0 +1,150 @@
+"""Throttled re-encoding of stored chunk embeddings.
+
+Migration ``0003`` tags every existing chunk as ``float64``.  This backfill
+walks those rows in id order, ``EMBEDDING_BACKFILL_BATCH_SIZE`` at a time,
+rewrites each blob in ``EMBEDDING_ENCODING`` in place and sleeps
+``EMBEDDING_BACKFILL_PAUSE_SECONDS`` between batches so it never competes
+with ingestion for long.  It is safe to stop and restart: progress is the
+encoding column itself.
+
+The same loop can store quantized codes (``EMBEDDING_QUANTIZATION``) for
+chunks written before quantization was enabled; see :func:`run_code_backfill`.
+
+Run it once with ``python -m services.embedding_backfill [--codes]`` or set
+``EMBEDDING_BACKFILL_ON_STARTUP=true`` to run both on a daemon thread in the
+API process.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from database.db import (
+    get_chunks_by_encoding,
+    get_chunks_missing_code,
+    reencode_chunk_embeddings,
+    set_chunk_codes,
+)
+from database.embedding_encoding import (
+    EMBEDDING_ENCODING,
+    EMBEDDING_QUANTIZATION,
+    LEGACY_ENCODING,
+    QUANTIZATION_SCHEMES,
+    decode_vector,
+    encode_code,
+    reencode,
+)
+
+EMBEDDING_BACKFILL_BATCH_SIZE = int(os.getenv("EMBEDDING_BACKFILL_BATCH_SIZE", "500"))
+EMBEDDING_BACKFILL_PAUSE_SECONDS = float(os.getenv("EMBEDDING_BACKFILL_PAUSE_SECONDS", "0.5"))
+EMBEDDING_BACKFILL_ON_STARTUP = os.getenv("EMBEDDING_BACKFILL_ON_STARTUP", "false").lower() == "true"
+
+
+@dataclass
+class BackfillStats:
+    scanned: int = 0
+    updated: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+
+
+def run_backfill(
+    source: str = LEGACY_ENCODING,
+    target: str = EMBEDDING_ENCODING,
+    batch_size: int = EMBEDDING_BACKFILL_BATCH_SIZE,
+    pause_seconds: float = EMBEDDING_BACKFILL_PAUSE_SECONDS,
+    stop: threading.Event | None = None,
+    sleep: Callable[[float], None] = time.sleep,
+) -> BackfillStats:
+    """Re-encode every *source* chunk as *target*, one throttled batch at a time."""
+    stats = BackfillStats()
+    if source == target:
+        return stats
+    started = time.perf_counter()
+    after_id = 0
+    while stop is None or not stop.is_set():
+        rows = get_chunks_by_encoding(source, after_id, batch_size)
+        if not rows:
+            break
+        updates = [(row["id"], reencode(row["embedding_vector"], source, target)) for row in rows]
+        stats.updated += reencode_chunk_embeddings(updates, source, target)
+        stats.scanned += len(rows)
+        stats.batches += 1
+        after_id = rows[-1]["id"]
+        if len(rows) < batch_size:
+            break
+        sleep(pause_seconds)
+    stats.seconds = time.perf_counter() - started
+    return stats
+
+
+def run_code_backfill(
+    scheme: str = EMBEDDING_QUANTIZATION,
+    batch_size: int = EMBEDDING_BACKFILL_BATCH_SIZE,
+    pause_seconds: float = EMBEDDING_BACKFILL_PAUSE_SECONDS,
+    stop: threading.Event | None = None,
+    sleep: Callable[[float], None] = time.sleep,
+) -> BackfillStats:
+    """Store a *scheme* code for every chunk that lacks one, one throttled batch at a time."""
+    stats = BackfillStats()
+    if scheme not in QUANTIZATION_SCHEMES:
+        return stats
+    started = time.perf_counter()
+    after_id = 0
+    while stop is None or not stop.is_set():
+        rows = get_chunks_missing_code(scheme, after_id, batch_size)
+        if not rows:
+            break
+        updates = [
+            (row["id"], encode_code(decode_vector(row["embedding_vector"], row["embedding_encoding"]), scheme))
+            for row in rows
+            if row["embedding_vector"] is not None
+        ]
+        stats.updated += set_chunk_codes(updates, scheme)
+        stats.scanned += len(rows)
+        stats.batches += 1
+        after_id = rows[-1]["id"]
+        if len(rows) < batch_size:
+            break
+        sleep(pause_seconds)
+    stats.seconds = time.perf_counter() - started
+    return stats
+
+
+def start_background_backfill() -> threading.Thread | None:
+    """Start the backfills on a daemon thread when ``EMBEDDING_BACKFILL_ON_STARTUP`` is set."""
+    if not EMBEDDING_BACKFILL_ON_STARTUP:
+        return None
+    if EMBEDDING_ENCODING == LEGACY_ENCODING and EMBEDDING_QUANTIZATION not in QUANTIZATION_SCHEMES:
+        return None
+
+    def run() -> None:
+        try:
+            stats = run_backfill()
+            print(
+                f"Embedding backfill to {EMBEDDING_ENCODING}: {stats.updated} of {stats.scanned} chunks "
+                f"in {stats.batches} batches ({stats.seconds:.1f}s)"
+            )
+            stats = run_code_backfill()
+            if stats.batches:
+                print(f"Embedding code backfill ({EMBEDDING_QUANTIZATION}): {stats.updated} chunks")
+        except Exception as err:
+            print(f"[ERROR] Embedding backfill failed: {err}")
+
+    thread = threading.Thread(target=run, name="embedding-backfill", daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    if "--codes" in sys.argv[1:]:
+        result = run_code_backfill()
+        print(f"Stored {EMBEDDING_QUANTIZATION} codes for {result.updated} of {result.scanned} chunks")
+    else:
+        result = run_backfill()
+        print(f"Re-encoded {result.updated} of {result.scanned} chunks as {EMBEDDING_ENCODING} in {result.seconds:.1f}s")
@@ -0,0 +1,235 @@
+"""Process-wide cache of query embeddings.
+
+``finance_gpt.get_embedding`` is called for every retrieval, and the agents
+routinely retrieve the same question several times per turn (``_tool_retrieve``,
+``_tool_retrieve_multi``, ``DocumentRetrievalAgent.process`` and the fallback
+path), while popular questions repeat across users.  This module memoises
+those remote calls:
+
+- Keys are ``(model, dimensions, normalised text)``.  Normalisation applies
+  Unicode NFKC and collapses whitespace; case is preserved because embedding
+  models are case sensitive.
+- Entries expire after ``EMBEDDING_CACHE_TTL_SECONDS`` and the in-memory tier
+  holds at most ``EMBEDDING_CACHE_MAX_ENTRIES`` vectors, evicting the least
+  recently used first.
+- When ``EMBEDDING_CACHE_PATH`` is set, entries are also written to a local
+  SQLite file so they survive restarts and are shared with Ray workers on the
+  same host.  Disk failures are logged and never fail the embedding call.
+- :meth:`EmbeddingCache.stats` reports hit rates so the cache can be sized.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from collections.abc import Callable, Sequence
+from typing import Any
+
+import numpy as np
+
+DEFAULT_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "10000"))
+DEFAULT_TTL_SECONDS = float(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", "86400"))
+DEFAULT_DISK_PATH = os.getenv("EMBEDDING_CACHE_PATH", "")
+DEFAULT_DISK_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_DISK_MAX_ENTRIES", "200000"))
+# Expired and overflow rows are pruned from disk once every this many writes.
+_DISK_PRUNE_INTERVAL = 500
+
+
+def normalize_text(text: str) -> str:
+    """Return the cache form of *text*: NFKC with whitespace runs collapsed."""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def cache_key(model: str, dimensions: int, text: str) -> str:
+    """Return the stable digest used for both the memory and disk tiers."""
+    raw = f"{model}\x00{int(dimensions)}\x00{normalize_text(text)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# On-disk tier
+# ---------------------------------------------------------------------------
+
+
+class _DiskStore:
+    """Tiny SQLite key/value store for embedding vectors."""
+
+    def __init__(self, path: str, max_entries: int) -> None:
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, vector BLOB NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str, min_created_at: float) -> tuple[np.ndarray, float] | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT vector, created_at FROM embeddings WHERE key = ? AND created_at >= ?",
+                (key, min_created_at),
+            ).fetchone()
+        return None if row is None else (np.frombuffer(row[0], dtype=np.float32), row[1])
+
+    def put(self, key: str, vector: np.ndarray, created_at: float, min_created_at: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO embeddings (key, vector, created_at) VALUES (?, ?, ?)",
+                (key, vector.tobytes(), created_at),
+            )
+            self._writes += 1
+            if self._writes % _DISK_PRUNE_INTERVAL == 0:
+                self._prune(min_created_at)
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+
+    def _prune(self, min_created_at: float) -> None:
+        self._conn.execute("DELETE FROM embeddings WHERE created_at < ?", (min_created_at,))
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key NOT IN ("
+            " SELECT key FROM embeddings ORDER BY created_at DESC LIMIT ?)",
+            (self.max_entries,),
+        )
+
+
+# ---------------------------------------------------------------------------
+# Cache
+# ---------------------------------------------------------------------------
+
+
+class EmbeddingCache:
+    """Thread-safe TTL + LRU cache of embedding vectors with an optional disk tier."""
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        disk_path: str | None = DEFAULT_DISK_PATH,
+        disk_max_entries: int = DEFAULT_DISK_MAX_ENTRIES,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: OrderedDict[str, tuple[np.ndarray, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._disk: _DiskStore | None = None
+        if disk_path:
+            try:
+                self._disk = _DiskStore(disk_path, disk_max_entries)
+            except (OSError, sqlite3.Error) as err:
+                print(f"[WARNING] Embedding cache disk store disabled ({disk_path}): {err}")
+
+    def get(self, model: str, dimensions: int, text: str) -> list[float] | None:
+        """Return the cached embedding for *text*, or None on a miss."""
+        key = cache_key(model, dimensions, text)
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return entry[0].tolist()
+                del self._entries[key]
+                self._expirations += 1
+
+        stored = self._disk_get(key, now)
+        with self._lock:
+            if stored is None:
+                self._misses += 1
+                return None
+            self._disk_hits += 1
+            self._store(key, *stored)
+        return stored[0].tolist()
+
+    def put(self, model: str, dimensions: int, text: str, embedding: Sequence[float]) -> None:
+        key = cache_key(model, dimensions, text)
+        vector = np.asarray(embedding, dtype=np.float32)
+        now = self._clock()
+        with self._lock:
+            self._store(key, vector, now)
+        if self._disk is not None:
+            try:
+                self._disk.put(key, vector, now, now - self.ttl_seconds)
+            except sqlite3.Error as err:
+                print(f"[WARNING] Embedding cache disk write failed: {err}")
+
+    def get_or_compute(
+        self,
+        model: str,
+        dimensions: int,
+        text: str,
+        compute: Callable[[str], Sequence[float]],
+    ) -> list[float]:
+        """Return the cached embedding for *text*, calling *compute* on a miss."""
+        cached = self.get(model, dimensions, text)
+        if cached is not None:
+            return cached
+        embedding = compute(text)
+        self.put(model, dimensions, text, embedding)
+        return list(embedding)
+
+    def clear(self, include_disk: bool = False) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._hits = self._disk_hits = self._misses = 0
+            self._evictions = self._expirations = 0
+        if include_disk and self._disk is not None:
+            self._disk.clear()
+
+    def stats(self) -> dict[str, Any]:
+        """Return hit/miss counters and occupancy for sizing the cache."""
+        with self._lock:
+            hits = self._hits + self._disk_hits
+            lookups = hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "disk_enabled": self._disk is not None,
+                "hits": self._hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "hit_rate": (hits / lookups) if lookups else 0.0,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+            }
+
+    def _store(self, key: str, vector: np.ndarray, created_at: float) -> None:
+        self._entries[key] = (vector, created_at + self.ttl_seconds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def _disk_get(self, key: str, now: float) -> tuple[np.ndarray, float] | None:
+        if self._disk is None:
+            return None
+        try:
+            return self._disk.get(key, now - self.ttl_seconds)
+        except sqlite3.Error as err:
+            print(f"[WARNING] Embedding cache disk read failed: {err}")
+            return None
+
+
+embedding_cache = EmbeddingCache()
@@ -0,0 +1,181 @@
+"""Concurrent, rate-limit-aware batching for document embeddings.
+
+Ingestion used to send fixed 32/64-text batches one after another, so a large
+filing waited on dozens of sequential HTTPS round trips.  The dispatcher here:
+
+- packs texts into batches by an estimated token budget
+  (``EMBEDDING_BATCH_MAX_TOKENS``) as well as a text-count cap
+  (``EMBEDDING_BATCH_MAX_TEXTS``);
+- keeps up to ``EMBEDDING_CONCURRENCY`` batches in flight on a thread pool;
+- retries 429, 5xx and connection errors with full-jitter exponential backoff,
+  honouring ``Retry-After`` when the provider sends one;
+- returns embeddings in input order regardless of completion order.
+
+``embed_fn`` is any callable taking a list of strings and returning one
+vector per string (``finance_gpt._get_model()`` in production), so the
+dispatcher can be exercised against a local fake embedding server.
+"""
+
+from __future__ import annotations
+
+import os
+import random
+import time
+from collections.abc import Callable, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "64000"))
+EMBEDDING_BATCH_MAX_TEXTS = int(os.getenv("EMBEDDING_BATCH_MAX_TEXTS", "256"))
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "5"))
+_BASE_DELAY_SECONDS = 0.5
+_MAX_DELAY_SECONDS = 30.0
+# Rough chars-per-token ratio for English text with cl100k-style tokenisers.
+_CHARS_PER_TOKEN = 4
+
+EmbedFn = Callable[[list[str]], Sequence[Sequence[float]]]
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap upper-leaning token estimate; avoids a tokenizer dependency."""
+    return len(text) // _CHARS_PER_TOKEN + 1
+
+
+def plan_batches(
+    texts: Sequence[str],
+    max_tokens: int = EMBEDDING_BATCH_MAX_TOKENS,
+    max_texts: int = EMBEDDING_BATCH_MAX_TEXTS,
+) -> list[tuple[int, int]]:
+    """Split *texts* into contiguous ``(start, end)`` ranges within both budgets.
+
+    A single text larger than *max_tokens* still gets a batch of its own.
+    """
+    batches = []
+    start = 0
+    tokens = 0
+    for position, text in enumerate(texts):
+        cost = estimate_tokens(text)
+        if position > start and (tokens + cost > max_tokens or position - start >= max_texts):
+            batches.append((start, position))
+            start, tokens = position, 0
+        tokens += cost
+    if start < len(texts):
+        batches.append((start, len(texts)))
+    return batches
+
+
+# ---------------------------------------------------------------------------
+# Retry classification
+# ---------------------------------------------------------------------------
+
+
+def _status_code(err: BaseException) -> int | None:
+    status = getattr(err, "status_code", None)
+    if status is None:
+        status = getattr(getattr(err, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_retryable(err: BaseException) -> bool:
+    """True for rate limits, server errors and transport failures."""
+    status = _status_code(err)
+    if status is not None:
+        return status == 429 or status >= 500
+    if isinstance(err, (ConnectionError, TimeoutError)):
+        return True
+    return type(err).__name__ in {"APIConnectionError", "APITimeoutError", "ConnectionError", "Timeout"}
+
+
+def retry_after_seconds(err: BaseException) -> float | None:
+    headers = getattr(getattr(err, "response", None), "headers", None) or {}
+    try:
+        value = headers.get("Retry-After") or headers.get("retry-after")
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+# ---------------------------------------------------------------------------
+# Dispatcher
+# ---------------------------------------------------------------------------
+
+
+@dataclass
+class DispatchStats:
+    texts: int = 0
+    batches: int = 0
+    retries: int = 0
+    seconds: float = 0.0
+
+
+class EmbeddingDispatcher:
+    """Embed many texts with bounded concurrency and order-preserving output."""
+
+    def __init__(
+        self,
+        embed_fn: EmbedFn,
+        concurrency: int = EMBEDDING_CONCURRENCY,
+        max_batch_tokens: int = EMBEDDING_BATCH_MAX_TOKENS,
+        max_batch_texts: int = EMBEDDING_BATCH_MAX_TEXTS,
+        max_retries: int = EMBEDDING_MAX_RETRIES,
+        base_delay: float = _BASE_DELAY_SECONDS,
+        max_delay: float = _MAX_DELAY_SECONDS,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.embed_fn = embed_fn
+        self.concurrency = max(1, concurrency)
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_texts = max(1, max_batch_texts)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._sleep = sleep
+        self.last_stats = DispatchStats()
+
+    def embed(self, texts: Sequence[str]) -> list[list[float]]:
+        """Return one embedding per text, in the same order as *texts*."""
+        started = time.perf_counter()
+        texts = list(texts)
+        batches = plan_batches(texts, self.max_batch_tokens, self.max_batch_texts)
+        results: list[list[list[float]]] = [[] for _ in batches]
+        retries = [0] * len(batches)
+
+        def run(batch_number: int) -> None:
+            start, end = batches[batch_number]
+            vectors, retries[batch_number] = self._embed_with_retry(texts[start:end])
+            if len(vectors) != end - start:
+                raise RuntimeError(f"Embedding provider returned {len(vectors)} vectors for {end - start} texts")
+            results[batch_number] = [list(vector) for vector in vectors]
+
+        if len(batches) <= 1 or self.concurrency == 1:
+            for batch_number in range(len(batches)):
+                run(batch_number)
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.concurrency, len(batches))) as pool:
+                # list() re-raises the first failure after in-flight batches finish.
+                list(pool.map(run, range(len(batches))))
+
+        self.last_stats = DispatchStats(
+            texts=len(texts),
+            batches=len(batches),
+            retries=sum(retries),
+            seconds=time.perf_counter() - started,
+        )
+        return [vector for batch in results for vector in batch]
+
+    def _embed_with_retry(self, batch: list[str]) -> tuple[Sequence[Sequence[float]], int]:
+        attempt = 0
+        while True:
+            try:
+                return self.embed_fn(batch), attempt
+            except Exception as err:
+                if attempt >= self.max_retries or not is_retryable(err):
+                    raise
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * (2**attempt)))
+                delay = max(delay, retry_after_seconds(err) or 0.0)
+                print(
+                    f"[WARNING] Embedding batch failed ({err}); retry {attempt + 1}/{self.max_retries} in {delay:.2f}s"
+                )
+                self._sleep(delay)
+                attempt += 1
@@ -0,0 +1,94 @@
+"""Content-addressed store of passage embeddings.
+
+The same text is embedded over and over: a filing uploaded to several chats,
+boilerplate pages repeated across documents, a playbook restored by every
+user it is shared with.  Passage vectors are therefore kept once in the
+``embeddings`` table, keyed by a SHA-256 of the embedding space and the exact
+passage text, and chunks reference them through ``chunks.embedding_id``:
+
+- :func:`embed_passages` looks every text up by hash, embeds only the misses
+  (deduplicated within the batch too) and stores them, returning the vectors
+  and the ids for the chunk rows.
+- Sharing and restoring a chat copy ``embedding_id`` rather than the blob.
+- If the store cannot be reached the texts are embedded as before and the
+  chunks keep their vector inline (ids are ``None``), so ingestion never
+  fails because of it.  ``EMBEDDING_DEDUP=false`` turns the store off.
+
+Unlike ``services.embedding_cache`` the text is not normalised: a stored
+vector is reused only for byte-identical passages.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass
+
+from database.db import add_embeddings, get_embeddings_by_hash
+from database.embedding_encoding import EMBEDDING_ENCODING, decode_vector, encode_vector
+from database.embedding_space import EmbeddingSpace
+
+EMBEDDING_DEDUP = os.getenv("EMBEDDING_DEDUP", "true").strip().lower() not in ("0", "false", "no", "off")
+
+EmbedFn = Callable[[list[str]], list[list[float]]]
+
+
+@dataclass
+class StoreStats:
+    texts: int = 0
+    reused: int = 0
+    embedded: int = 0
+
+
+def content_hash(text: str, space: EmbeddingSpace) -> str:
+    """Key of the passage vector of *text* in *space*."""
+    raw = f"{space.model}\x00{int(space.dimensions)}\x00passage: {text}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def embed_passages(
+    texts: Sequence[str],
+    space: EmbeddingSpace,
+    embed: EmbedFn,
+    stats: StoreStats | None = None,
+) -> tuple[list[list[float]], list[int | None]]:
+    """Return ``(vectors, embedding_ids)`` for *texts*, calling *embed* only for unseen passages."""
+    texts = list(texts)
+    if not EMBEDDING_DEDUP or not texts:
+        return embed(texts), [None] * len(texts)
+
+    hashes = [content_hash(text, space) for text in texts]
+    try:
+        stored = get_embeddings_by_hash(hashes)
+    except Exception as err:
+        print(f"[WARNING] Embedding store lookup failed, embedding {len(texts)} passages inline: {err}")
+        return embed(texts), [None] * len(texts)
+
+    vectors: dict[str, list[float]] = {}
+    for digest, row in stored.items():
+        vectors[digest] = decode_vector(
+            row["embedding_vector"], row["embedding_encoding"], dimensions=space.dimensions
+        ).tolist()
+    missing = list(dict.fromkeys(digest for digest in hashes if digest not in vectors))
+    ids = {digest: row["id"] for digest, row in stored.items()}
+    if missing:
+        text_for_hash = dict(zip(hashes, texts, strict=True))
+        embedded = embed([text_for_hash[digest] for digest in missing])
+        vectors.update(zip(missing, embedded, strict=True))
+        try:
+            ids.update(
+                add_embeddings(
+                    [(digest, encode_vector(vectors[digest], EMBEDDING_ENCODING)) for digest in missing],
+                    space,
+                    EMBEDDING_ENCODING,
+                )
+            )
+        except Exception as err:
+            print(f"[WARNING] Embedding store write failed, keeping {len(missing)} vectors inline: {err}")
+
+    if stats is not None:
+        stats.texts += len(texts)
+        stats.embedded += len(missing)
+        stats.reused += len(texts) - len(missing)
+    return [vectors[digest] for digest in hashes], [ids.get(digest) for digest in hashes]
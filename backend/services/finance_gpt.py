@@ -1,13 +1,11 @@
-import ipaddress
+import collections
 import os
-import socket
 import threading
 from urllib.parse import urlparse, urlunparse
 
 import numpy as np
 import PyPDF2
 import ray
-import requests
 from dotenv import load_dotenv
 try:
     from langchain.text_splitter import RecursiveCharacterTextSplitter
@@ -16,16 +14,62 @@ except ModuleNotFoundError:
 from openai import OpenAI
 from tika import parser as p
 
-from database.db import add_chunks, add_chunks_with_page_numbers, get_chat_chunks
+from database.db import (
+    add_chunks,
+    add_chunks_with_page_numbers,
+    add_document_lexical_segment,
+    append_document_text,
+    discard_document,
+    get_chat_chunk_version,
+    get_chat_chunks,
+    get_chat_embedding_space,
+    get_chat_lexical_indexes,
+    get_chunk_embeddings,
+    get_chunk_texts,
+    get_document_chunk_refs,
+    get_document_chunk_texts,
+    get_document_embedding_space,
+    get_document_revision_base,
+    revise_document_chunks,
+    save_document_lexical_index,
+)
+from database.embedding_encoding import EMBEDDING_QUANTIZATION, QUANTIZATION_SCHEMES, decode_vector, encode_vector
+from database.embedding_space import DEFAULT_EMBEDDING_SPACE, supports_dimension_reduction
+from services import ann_index
+from services.chunk_index_cache import build_chat_index, chunk_index_cache
+from services.chunker import iter_page_spans, iter_segment_spans
+from services.document_revision import plan_revision
+from services.embedding_cache import embedding_cache, normalize_text
+from services.embedding_dispatcher import EMBEDDING_BATCH_MAX_TEXTS, EmbeddingDispatcher
+from services.embedding_store import StoreStats, embed_passages
+from services.http_fetch import FetchResult, UnsafeUrlError, ensure_public_host, extracted_text
+from services.http_fetch import fetch as http_fetch
+from services.ingestion_pipeline import iter_text_segments, run_pipeline
+from services.lexical_index import (
+    HYBRID_CANDIDATE_MULTIPLIER,
+    RETRIEVAL_MODE,
+    RETRIEVAL_MODES,
+    ChatLexicalIndex,
+    DocumentPostings,
+    reciprocal_rank_fusion,
+    term_counts,
+)
+from services.quantization import two_stage_search
+from services.table_store import TableWriter
+from services.tabular_service import iter_tabular_segments
+from services.vector_search import normalize_rows, top_k_cosine
 
 load_dotenv()
 
-EMBEDDING_MODEL = "text-embedding-3-small"
-EMBEDDING_DIMENSIONS = 768
+# Space of new chats; existing chats keep theirs until re-embedded (services.reembed).
+EMBEDDING_MODEL = DEFAULT_EMBEDDING_SPACE.model
+EMBEDDING_DIMENSIONS = DEFAULT_EMBEDDING_SPACE.dimensions
 MAX_CHUNK_SIZE = 1500
 CHUNK_OVERLAP = 200
+# Re-ingestion re-plans this many times when the document changes underneath it.
+REINGEST_MAX_ATTEMPTS = 3
 
-_embedding_model = None
+_embedding_models = {}
 _client = None
 _client_lock = threading.Lock()
 _model_lock = threading.Lock()
@@ -38,10 +82,6 @@ ALLOWED_FETCH_HOSTS = tuple(
 )
 
 
-class UnsafeUrlError(ValueError):
-    pass
-
-
 def _is_allowed_fetch_host(hostname: str) -> bool:
     return any(
         hostname == allowed_host or hostname.endswith(f".{allowed_host}")
@@ -58,22 +98,8 @@ def validate_external_url(web_url: str) -> None:
     if not _is_allowed_fetch_host(parsed.hostname.lower()):
         raise UnsafeUrlError("Host is not in the external fetch allowlist")
 
-    try:
-        address_info = socket.getaddrinfo(parsed.hostname, None)
-    except socket.gaierror as err:
-        raise UnsafeUrlError("Could not resolve host") from err
-
-    for _, _, _, _, sockaddr in address_info:
-        ip = ipaddress.ip_address(sockaddr[0])
-        if (
-            ip.is_private
-            or ip.is_loopback
-            or ip.is_link_local
-            or ip.is_multicast
-            or ip.is_reserved
-            or ip.is_unspecified
-        ):
-            raise UnsafeUrlError("URL resolves to a non-public address")
+    # Resolved through the shared resolver cache; the addresses are checked on every call.
+    ensure_public_host(parsed.hostname)
 
 
 def build_validated_public_url(web_url: str) -> str:
@@ -87,9 +113,10 @@ def build_validated_public_url(web_url: str) -> str:
     return urlunparse((parsed.scheme, netloc, path, "", parsed.query, ""))
 
 
-def fetch_external_url(web_url: str) -> requests.Response:
+def fetch_external_url(web_url: str) -> FetchResult:
+    """GET an allowlisted public URL through the pooled, revalidating fetch layer (``services.http_fetch``)."""
     safe_url = build_validated_public_url(web_url)
-    return requests.get(safe_url, timeout=10, allow_redirects=False)
+    return http_fetch(safe_url, timeout=10, allow_redirects=False)
 
 
 def _get_client() -> OpenAI:
@@ -103,27 +130,31 @@ def _get_client() -> OpenAI:
     return _client
 
 
-def _get_model():
-    global _embedding_model
+def _get_model(space=None):
+    """Return an embed function for *space* (default: ``DEFAULT_EMBEDDING_SPACE``).
 
-    if _embedding_model:
-        print("Skipping embedding model init")
-        return _embedding_model
+    Models that support it are asked for ``space.dimensions`` directly, so
+    the provider returns the reduced vector instead of the full-size one.
+    """
+    space = space or DEFAULT_EMBEDDING_SPACE
+    if space in _embedding_models:
+        return _embedding_models[space]
 
     with _model_lock:
-        if _embedding_model is None:
-            print(f"Using OpenAI embedding model: {EMBEDDING_MODEL}")
+        if space not in _embedding_models:
+            print(f"Using OpenAI embedding model: {space}")
+            options = {"dimensions": space.dimensions} if supports_dimension_reduction(space.model) else {}
 
             def embed_fn(texts):
                 if isinstance(texts, str):
                     texts = [texts]
 
-                response = _get_client().embeddings.create(model=EMBEDDING_MODEL, input=texts)
+                response = _get_client().embeddings.create(model=space.model, input=texts, **options)
                 return [item.embedding for item in response.data]
 
-            _embedding_model = embed_fn
+            _embedding_models[space] = embed_fn
 
-    return _embedding_model
+    return _embedding_models[space]
 
 
 def _get_text_splitter(chunk_size=None):
@@ -178,33 +209,78 @@ def preload_models():
     preload_embedding_model()
 
 
-def get_embedding(question):
+def _embed_query(text, space=None):
+    space = space or DEFAULT_EMBEDDING_SPACE
+    embedding = _get_model(space)(text)[0]
+    if len(embedding) != space.dimensions:
+        raise RuntimeError(
+            f"Unexpected embedding dimension: {len(embedding)}, expected {space.dimensions}"
+        )
+    return embedding
+
+
+def get_embedding(question, space=None):
+    space = space or DEFAULT_EMBEDDING_SPACE
     try:
-        model = _get_model()
-        embedding = model(f"query: {question}")[0]
-        if len(embedding) != EMBEDDING_DIMENSIONS:
-            raise RuntimeError(
-                f"Unexpected embedding dimension: {len(embedding)}, expected {EMBEDDING_DIMENSIONS}"
-            )
-        return embedding
+        return embedding_cache.get_or_compute(
+            space.model,
+            space.dimensions,
+            f"query: {question}",
+            lambda text: _embed_query(text, space),
+        )
     except Exception as err:
         print(f"[ERROR] Failed to get embedding: {err}")
         raise RuntimeError(f"Embedding generation failed: {err}") from err
 
 
-def get_embeddings_batch(texts, batch_size=32):
+def get_query_embeddings(questions, space=None):
+    """Embed several questions in *space* with at most one provider call.
+
+    Cached vectors are reused and identical questions are embedded once.
+    Returns one embedding per question, in order.
+    """
+    space = space or DEFAULT_EMBEDDING_SPACE
     try:
-        model = _get_model()
-        embeddings = []
-
-        for index in range(0, len(texts), batch_size):
-            batch_texts = texts[index : index + batch_size]
-            prefixed_texts = [f"passage: {text}" for text in batch_texts]
-            embeddings.extend(model(prefixed_texts))
-            print(
-                f"Processed batch {index // batch_size + 1}/{(len(texts) + batch_size - 1) // batch_size}"
-            )
+        texts = [f"query: {question}" for question in questions]
+        embeddings = [embedding_cache.get(space.model, space.dimensions, text) for text in texts]
+        missing = {}
+        for position, embedding in enumerate(embeddings):
+            if embedding is None:
+                missing.setdefault(normalize_text(texts[position]), []).append(position)
+        if missing:
+            pending = [texts[positions[0]] for positions in missing.values()]
+            fresh = _get_model(space)(pending)
+            for text, positions, embedding in zip(pending, missing.values(), fresh, strict=True):
+                if len(embedding) != space.dimensions:
+                    raise RuntimeError(
+                        f"Unexpected embedding dimension: {len(embedding)}, expected {space.dimensions}"
+                    )
+                embedding_cache.put(space.model, space.dimensions, text, embedding)
+                for position in positions:
+                    embeddings[position] = list(embedding)
+        return embeddings
+    except Exception as err:
+        print(f"[ERROR] Failed to get query embeddings: {err}")
+        raise RuntimeError(f"Embedding generation failed: {err}") from err
+
 
+def get_embeddings_batch(texts, batch_size=None, space=None):
+    """Embed document passages in *space* concurrently, in input order.
+
+    Batches are sized by token budget (see ``services.embedding_dispatcher``);
+    *batch_size* additionally caps the number of texts per request.
+    """
+    try:
+        dispatcher = EmbeddingDispatcher(
+            _get_model(space),
+            max_batch_texts=batch_size or EMBEDDING_BATCH_MAX_TEXTS,
+        )
+        embeddings = dispatcher.embed([f"passage: {text}" for text in texts])
+        stats = dispatcher.last_stats
+        print(
+            f"Embedded {stats.texts} texts in {stats.batches} batches "
+            f"({stats.retries} retries) in {stats.seconds:.2f}s"
+        )
         return embeddings
     except Exception as err:
         print(f"[ERROR] Failed to get batch embeddings: {err}")
@@ -214,31 +290,22 @@ def get_embeddings_batch(texts, batch_size=32):
 def prepare_chunks_for_embedding(text_pages, max_chunk_size):
     chunk_texts = []
     chunk_metadata = []
-    global_start_index = 0
-    page_number = 1
-    text_splitter = _get_text_splitter(max_chunk_size)
-
+    page_starts = []
+    page_start = 0
     for page_text in text_pages:
-        page_chunks = text_splitter.split_text(page_text)
-        page_position = 0
-        for chunk in page_chunks:
-            chunk_start_in_page = page_text.find(chunk, page_position)
-            if chunk_start_in_page == -1:
-                chunk_start_in_page = page_text.find(chunk)
-
-            chunk_end_in_page = chunk_start_in_page + len(chunk)
-            chunk_texts.append(chunk)
-            chunk_metadata.append(
-                {
-                    "global_start": global_start_index + chunk_start_in_page,
-                    "global_end": global_start_index + chunk_end_in_page,
-                    "page_number": page_number,
-                }
-            )
-            page_position = chunk_start_in_page + 1
+        page_starts.append(page_start)
+        page_start += len(page_text)
 
-        global_start_index += len(page_text)
-        page_number += 1
+    for start, end, page_number in iter_page_spans(text_pages, max_chunk_size, CHUNK_OVERLAP):
+        page_offset = page_starts[page_number - 1]
+        chunk_texts.append(text_pages[page_number - 1][start - page_offset : end - page_offset])
+        chunk_metadata.append(
+            {
+                "global_start": start,
+                "global_end": end,
+                "page_number": page_number,
+            }
+        )
 
     return chunk_texts, chunk_metadata
 
@@ -246,61 +313,10 @@ def prepare_chunks_for_embedding(text_pages, max_chunk_size):
 @ray.remote
 def chunk_document_by_page_optimized(text_pages, max_chunk_size, document_id):
     print("start optimized semantic page chunk doc")
-    chunk_texts = []
-    chunk_metadata = []
-    global_start_index = 0
-    page_number = 1
 
     try:
-        text_splitter = _get_text_splitter(max_chunk_size)
-
-        for page_text in text_pages:
-            page_chunks = text_splitter.split_text(page_text)
-            print(f"Page {page_number}: Created {len(page_chunks)} semantic chunks")
-            page_position = 0
-
-            for chunk in page_chunks:
-                chunk_start_in_page = page_text.find(chunk, page_position)
-                if chunk_start_in_page == -1:
-                    chunk_start_in_page = page_text.find(chunk)
-
-                chunk_end_in_page = chunk_start_in_page + len(chunk)
-                chunk_texts.append(chunk)
-                chunk_metadata.append(
-                    {
-                        "global_start": global_start_index + chunk_start_in_page,
-                        "global_end": global_start_index + chunk_end_in_page,
-                        "page_number": page_number,
-                    }
-                )
-                page_position = chunk_start_in_page + 1
-
-            global_start_index += len(page_text)
-            page_number += 1
-
-        print(f"Generating embeddings for {len(chunk_texts)} semantic page chunks in batches...")
-        embeddings = get_embeddings_batch(chunk_texts, batch_size=32)
-
-        for index, embedding in enumerate(embeddings):
-            if len(embedding) != EMBEDDING_DIMENSIONS:
-                raise RuntimeError(
-                    f"Page chunk {index} embedding dimension mismatch: expected {EMBEDDING_DIMENSIONS}, got {len(embedding)}"
-                )
-
-        chunk_data = []
-        for metadata, embedding in zip(chunk_metadata, embeddings, strict=False):
-            chunk_data.append(
-                (
-                    metadata["global_start"],
-                    metadata["global_end"],
-                    document_id,
-                    np.array(embedding).tobytes(),
-                    metadata["page_number"],
-                )
-            )
-
-        add_chunks_with_page_numbers(chunk_data)
-        print(f"Successfully processed {len(chunk_data)} semantic page chunks with batch embeddings")
+        processed = ingest_document_pages(_numbered_pages(text_pages), max_chunk_size, document_id)
+        print(f"Successfully processed {processed} semantic page chunks with batch embeddings")
     except Exception as err:
         print(f"[FATAL ERROR] Exception during optimized semantic page chunking: {err}")
         raise RuntimeError(
@@ -313,176 +329,474 @@ def chunk_document_by_page(text_pages, max_chunk_size, document_id):
     return chunk_document_by_page_optimized.remote(text_pages, max_chunk_size, document_id)
 
 
-@ray.remote
-def chunk_document_optimized(text, max_chunk_size, document_id):
-    chunk_texts = []
-    chunk_metadata = []
+def _numbered_pages(text_pages):
+    return ((page_text, page_number) for page_number, page_text in enumerate(text_pages, start=1))
 
-    try:
-        text_splitter = _get_text_splitter(max_chunk_size)
-        chunks = text_splitter.split_text(text)
-        print(f"RecursiveCharacterTextSplitter created {len(chunks)} semantic chunks")
-
-        current_position = 0
-        for chunk in chunks:
-            chunk_start = text.find(chunk, current_position)
-            if chunk_start == -1:
-                chunk_start = text.find(chunk)
-
-            chunk_texts.append(chunk)
-            chunk_metadata.append(
-                {
-                    "start_index": chunk_start,
-                    "end_index": chunk_start + len(chunk),
-                }
+
+def _embed_passages_checked(texts, space=None):
+    space = space or DEFAULT_EMBEDDING_SPACE
+    embeddings = get_embeddings_batch(texts, space=space)
+    for index, embedding in enumerate(embeddings):
+        if len(embedding) != space.dimensions:
+            raise RuntimeError(
+                f"Chunk {index} embedding dimension mismatch: expected {space.dimensions}, got {len(embedding)}"
             )
-            current_position = chunk_start + 1
-
-        print(f"Generating embeddings for {len(chunk_texts)} semantic chunks in batches...")
-        embeddings = get_embeddings_batch(chunk_texts, batch_size=32)
-
-        for index, embedding in enumerate(embeddings):
-            if len(embedding) != EMBEDDING_DIMENSIONS:
-                raise RuntimeError(
-                    f"Chunk {index} embedding dimension mismatch: expected {EMBEDDING_DIMENSIONS}, got {len(embedding)}"
-                )
-
-        chunk_data = []
-        for metadata, embedding in zip(chunk_metadata, embeddings, strict=False):
-            chunk_data.append(
-                (
-                    metadata["start_index"],
-                    metadata["end_index"],
-                    document_id,
-                    np.array(embedding).tobytes(),
-                )
+    return embeddings
+
+
+def _store_chunk_rows(rows, embeddings, space=None, embedding_ids=None):
+    space = space or DEFAULT_EMBEDDING_SPACE
+    if any(row[4] is not None for row in rows):
+        add_chunks_with_page_numbers(rows, space=space, embedding_ids=embedding_ids)
+    else:
+        add_chunks([row[:4] for row in rows], space=space, embedding_ids=embedding_ids)
+    ann_index.index_document_chunks(rows[0][2], embeddings)
+
+
+def ingest_document_pages(segments, max_chunk_size, document_id, append_text=None, progress=None):
+    """Stream ``(text, page_number)`` segments through the ingestion pipeline.
+
+    Extraction, chunk embedding and row inserts overlap (see
+    ``services.ingestion_pipeline``).  Chunks are embedded in the space of the
+    document's chat, and their terms are counted alongside; each stored batch
+    writes its own segment of the document's lexical index, so memory stays
+    flat however long the document is.  Passages already in the embedding
+    store are reused rather than embedded again
+    (``services.embedding_store``).  Pass *append_text* when the document row
+    does not hold its text yet.  Returns the number of chunks stored.
+    """
+    space = get_document_embedding_space(document_id)
+    store_stats = StoreStats()
+    # Batches reach the store stage in the order they were embedded.
+    embedding_ids = collections.deque()
+    counts = collections.deque()
+    lexical = {"segment": 0, "after_id": 0, "complete": True}
+
+    def embed(texts):
+        counts.extend(term_counts(text) for text in texts)
+        vectors, ids = embed_passages(
+            texts, space, lambda missing: _embed_passages_checked(missing, space), store_stats
+        )
+        embedding_ids.extend(ids)
+        return vectors
+
+    def store(rows, embeddings):
+        ids = [embedding_ids.popleft() for _ in rows]
+        batch_counts = [counts.popleft() for _ in rows]
+        _store_chunk_rows(rows, embeddings, space, ids)
+        if lexical["complete"]:
+            lexical["segment"] += 1
+            lexical["complete"] = _save_postings_segment(document_id, lexical, batch_counts)
+
+    stats = run_pipeline(
+        segments,
+        max_chunk_size,
+        document_id,
+        embed,
+        store,
+        append_text=append_text,
+        progress=progress,
+        chunk_overlap=CHUNK_OVERLAP,
+    )
+    if not lexical["complete"]:
+        _save_document_postings(document_id)
+    print(
+        f"Ingested document {document_id}: {stats.summary()}; "
+        f"reused {store_stats.reused}/{store_stats.texts} stored embeddings"
+    )
+    return stats.chunks
+
+
+def _document_postings_from_db(document_id):
+    rows = get_document_chunk_texts(document_id)
+    return DocumentPostings.from_texts([row["chunk_id"] for row in rows], [row["chunk_text"] or "" for row in rows])
+
+
+def _save_postings_segment(document_id, lexical, counts):
+    """Write the lexical index segment of the batch just stored; False if it cannot be.
+
+    *counts* belong to the chunks stored after ``lexical["after_id"]``.  When
+    the document holds other chunks too (it had some before this ingestion),
+    no segment is written and the caller rebuilds the index at the end.
+    """
+    try:
+        refs = get_document_chunk_refs(document_id, after_id=lexical["after_id"])
+        if len(refs) != len(counts):
+            return False
+        postings = DocumentPostings.from_counts([ref["chunk_id"] for ref in refs], counts)
+        add_document_lexical_segment(document_id, lexical["segment"], len(refs), postings.to_bytes())
+        lexical["after_id"] = refs[-1]["chunk_id"]
+        return True
+    except Exception as err:
+        print(f"[WARNING] Lexical index segment failed for document {document_id}: {err}")
+        return False
+
+
+def _save_document_postings(document_id):
+    """Rebuild the lexical index of *document_id* from its stored text.  Never raises."""
+    try:
+        postings = _document_postings_from_db(document_id)
+        save_document_lexical_index(document_id, len(postings.chunk_ids), postings.to_bytes())
+    except Exception as err:
+        print(f"[WARNING] Lexical index update failed for document {document_id}: {err}")
+
+
+def ingest_document_text(text, max_chunk_size, document_id, progress=None):
+    """Chunk, embed and store already-stored *text* for *document_id*.
+
+    *progress*, when given, is called as ``progress(stage, **details)`` as the
+    ``"chunked"``, ``"embedded"`` and ``"stored"`` stages complete.  Returns the
+    chunk count.
+    """
+    return ingest_document_pages(iter_text_segments(text), max_chunk_size, document_id, progress=progress)
+
+
+def reingest_document(segments, max_chunk_size, document_id, progress=None):
+    """Refresh an ingested document from new ``(text, page_number)`` segments.
+
+    Only chunks whose text is new are embedded; unchanged chunks keep their
+    vectors and get their offsets updated, and chunks that disappeared are
+    tombstoned, all with the new document text in one transaction (see
+    ``services.document_revision``).  *progress* is reported as for
+    :func:`ingest_document_text`.  Returns the applied ``RevisionPlan``.
+    """
+    segments = list(segments)
+    text = "".join(segment_text for segment_text, _ in segments)
+    space = get_document_embedding_space(document_id)
+    report = progress or (lambda stage, **details: None)
+
+    for _ in range(REINGEST_MAX_ATTEMPTS):
+        base_text, chunks = get_document_revision_base(document_id)
+        if base_text is None:
+            raise ValueError(f"Document {document_id} does not exist")
+        plan = plan_revision(
+            base_text, chunks, text, iter_segment_spans(segments, max_chunk_size, CHUNK_OVERLAP)
+        )
+        report("chunked", chunks=plan.kept + len(plan.added))
+        if plan.unchanged and base_text == text:
+            report("embedded")
+            report("stored", chunks=plan.kept)
+            print(f"Re-ingested document {document_id}: unchanged")
+            return plan
+
+        vectors, embedding_ids = [], []
+        if plan.added:
+            vectors, embedding_ids = embed_passages(
+                [text[start:end] for start, end, _ in plan.added],
+                space,
+                lambda missing: _embed_passages_checked(missing, space),
             )
+        report("embedded")
+        rows = [
+            (start, end, document_id, encode_vector(vector), page_number)
+            for (start, end, page_number), vector in zip(plan.added, vectors, strict=True)
+        ]
+        revised = revise_document_chunks(
+            document_id, base_text, text, plan.moved, plan.removed, rows, space=space, embedding_ids=embedding_ids
+        )
+        if revised is not None:
+            break
+        print(f"[WARNING] Document {document_id} changed during re-ingestion, planning again")
+    else:
+        raise RuntimeError(f"Document {document_id} kept changing during re-ingestion")
+
+    ann_index.index_document_chunks(document_id, vectors)
+    _save_document_postings(document_id)
+    report("stored", chunks=plan.kept + len(plan.added))
+    print(f"Re-ingested document {document_id}: {plan.summary()}")
+    return plan
+
+
+def ingest_tabular_document(file_bytes, filename, mime_type, max_chunk_size, document_id, progress=None, reingest=False):
+    """Stream a spreadsheet into row-group chunks and the document's table store.
+
+    Rows are read once: each row group becomes a chunk that repeats the
+    column header, and the same rows are written to the SQLite store used by
+    the ``table_query`` agent tool (``services.table_store``).  The document
+    row may be empty; its text is appended as chunks are stored.  With
+    *reingest*, an existing document is refreshed through
+    :func:`reingest_document` instead.  The table store is only replaced
+    when ingestion succeeds.  Returns the chunk count (or the
+    ``RevisionPlan`` when re-ingesting).
+    """
+    with TableWriter(document_id) as tables:
+        segments = iter_tabular_segments(file_bytes, filename, mime_type, max_chunk_size, tables)
+        if reingest:
+            return reingest_document(segments, max_chunk_size, document_id, progress=progress)
+        return ingest_document_pages(
+            segments, max_chunk_size, document_id, append_text=append_document_text, progress=progress
+        )
 
-        add_chunks(chunk_data)
-        print(f"Successfully processed {len(chunk_data)} semantic chunks with batch embeddings")
+
+@ray.remote
+def chunk_tabular_document(file_bytes, filename, mime_type, max_chunk_size, document_id, reingest=False):
+    try:
+        processed = ingest_tabular_document(
+            file_bytes, filename, mime_type, max_chunk_size, document_id, reingest=reingest
+        )
+        print(f"Successfully processed {processed} row-group chunks for {filename}")
+    except Exception as err:
+        print(f"[FATAL ERROR] Exception during tabular chunking: {err}")
+        if not reingest:
+            # The document was created for this upload; drop it so a retry ingests it again.
+            discard_document(document_id)
+        raise RuntimeError("Tabular chunking failed due to internal error") from err
+
+
+@ray.remote
+def chunk_document_optimized(text, max_chunk_size, document_id, reingest=False):
+    try:
+        if reingest:
+            reingest_document(iter_text_segments(text), max_chunk_size, document_id)
+            return
+        processed = ingest_document_text(text, max_chunk_size, document_id)
+        print(f"Successfully processed {processed} semantic chunks with batch embeddings")
     except Exception as err:
         print(f"[FATAL ERROR] Exception during optimized semantic chunking: {err}")
         raise RuntimeError("Optimized semantic chunking failed due to internal error") from err
 
 
 @ray.remote
-def chunk_document(text, max_chunk_size, document_id):
-    return chunk_document_optimized.remote(text, max_chunk_size, document_id)
+def chunk_document(text, max_chunk_size, document_id, reingest=False):
+    return chunk_document_optimized.remote(text, max_chunk_size, document_id, reingest=reingest)
 
 
 def fast_pdf_ingestion(text_pages, max_chunk_size, document_id):
     print(f"Starting fast semantic PDF ingestion for document {document_id}")
-    chunk_texts, chunk_metadata = prepare_chunks_for_embedding(text_pages, max_chunk_size)
-    print(f"Prepared {len(chunk_texts)} semantic chunks for processing")
-    print("Generating embeddings in optimized batches...")
-    embeddings = get_embeddings_batch(chunk_texts, batch_size=64)
-
-    for index, embedding in enumerate(embeddings):
-        if len(embedding) != EMBEDDING_DIMENSIONS:
-            raise RuntimeError(
-                f"Chunk {index} embedding dimension mismatch: expected {EMBEDDING_DIMENSIONS}, got {len(embedding)}"
-            )
-
     try:
-        chunk_data = []
-        for metadata, embedding in zip(chunk_metadata, embeddings, strict=False):
-            chunk_data.append(
-                (
-                    metadata["global_start"],
-                    metadata["global_end"],
-                    document_id,
-                    np.array(embedding).tobytes(),
-                    metadata["page_number"],
-                )
-            )
-
-        add_chunks_with_page_numbers(chunk_data)
-        print(f"Fast semantic PDF ingestion completed: {len(chunk_data)} chunks processed")
-        return len(chunk_data)
+        processed = ingest_document_pages(_numbered_pages(text_pages), max_chunk_size, document_id)
+        print(f"Fast semantic PDF ingestion completed: {processed} chunks processed")
+        return processed
     except Exception as err:
         print(f"[ERROR] Fast semantic PDF ingestion failed: {err}")
         raise RuntimeError(f"Fast semantic PDF ingestion failed: {err}") from err
 
 
-def knn(query_vector, document_vectors):
-    if query_vector.ndim == 1:
-        query_vector = np.expand_dims(query_vector, axis=0)
-    if document_vectors.ndim == 1:
-        document_vectors = np.expand_dims(document_vectors, axis=0)
-    if query_vector.shape[1] != document_vectors.shape[1]:
-        raise ValueError(
-            f"Dimension mismatch: query has {query_vector.shape[1]} dims, documents have {document_vectors.shape[1]} dims"
-        )
-
-    query_norm = np.linalg.norm(query_vector, axis=1, keepdims=True)
-    document_norm = np.linalg.norm(document_vectors, axis=1, keepdims=True)
-    query_norm = np.where(query_norm == 0, 1e-8, query_norm)
-    document_norm = np.where(document_norm == 0, 1e-8, document_norm)
+def knn(query_vector, document_vectors, k=None):
+    document_vectors = np.asarray(document_vectors)
+    if k is None:
+        k = 1 if document_vectors.ndim == 1 else len(document_vectors)
+    indices, similarities = top_k_cosine(query_vector, normalize_rows(document_vectors), k)
+    return [
+        {"index": index, "similarity_score": 1 - similarity}
+        for index, similarity in zip(indices[0], similarities[0], strict=True)
+    ]
 
-    similarities = np.dot(
-        query_vector / query_norm, (document_vectors / document_norm).T
-    ).flatten()
-    distances = 1 - similarities
-    nearest_neighbors = np.argsort(distances)
 
+def load_chat_index(user_email, chat_id):
+    """Return the cached :class:`ChatChunkIndex` for a chat, rebuilding it if stale.
+
+    The index only holds chunks in the chat's current embedding space, and a
+    re-embedding swap changes the cache key, so a search never mixes spaces.
+    """
+    space = get_chat_embedding_space(user_email, chat_id)
+    key = _index_key(user_email, chat_id, space)
+    version = get_chat_chunk_version(user_email, chat_id)
+    index = chunk_index_cache.get(key, version)
+    if index is None:
+        code_scheme = EMBEDDING_QUANTIZATION if EMBEDDING_QUANTIZATION in QUANTIZATION_SCHEMES else None
+        rows = get_chat_chunks(user_email, chat_id, code_scheme=code_scheme) if version[0] else []
+        index = build_chat_index(rows, space.dimensions, quantization=EMBEDDING_QUANTIZATION, space=space)
+        chunk_index_cache.put(key, index)
+    return index
+
+
+def _index_key(user_email, chat_id, space):
+    return (user_email, chat_id, space)
+
+
+def load_lexical_index(user_email, chat_id, index):
+    """Return the BM25 index over the chunks of *index*, attaching it on first use.
+
+    Persisted per-document postings are reused, their ingestion segments
+    merged and compacted into one row; a document whose postings do not cover
+    all of its chunks in *index* (not indexed yet, or indexed mid-ingestion)
+    is re-indexed from its stored text and saved.
+    """
+    if index.lexical is not None:
+        return index.lexical
+    stored = get_chat_lexical_indexes(user_email, chat_id)
+    chunk_documents = np.asarray(index.document_ids, dtype=object)[index.doc_positions] if len(index) else []
+    documents = []
+    for document_id in index.document_ids:
+        segments = stored.get(document_id, [])
+        postings = DocumentPostings.merge(DocumentPostings.from_bytes(blob) for blob in segments) if segments else None
+        expected = index.chunk_ids[chunk_documents == document_id]
+        if postings is None or not np.isin(expected, postings.chunk_ids).all():
+            postings = _document_postings_from_db(document_id)
+            save_document_lexical_index(document_id, len(postings.chunk_ids), postings.to_bytes())
+        elif len(segments) > 1:
+            save_document_lexical_index(document_id, len(postings.chunk_ids), postings.to_bytes())
+        documents.append(postings)
+    index.lexical = ChatLexicalIndex(index.chunk_ids, documents)
+    chunk_index_cache.refresh_size(_index_key(user_email, chat_id, index.space))
+    return index.lexical
+
+
+def _retrieve_positions(user_email, chat_id, index, questions, query_embeddings, k, mode):
+    """Return, per question, the best *k* positions in *index* for retrieval *mode*.
+
+    ``hybrid`` fuses the vector and BM25 rankings of a larger candidate pool;
+    it falls back to whichever side is available when the other fails
+    (*query_embeddings* is None when embedding failed).
+    """
+    if mode == "lexical":
+        lexical = load_lexical_index(user_email, chat_id, index)
+        return [lexical.search(question, k) for question in questions]
+    if mode == "vector":
+        return _nearest_positions(user_email, chat_id, index, query_embeddings, k)
+
+    pool = max(k, k * HYBRID_CANDIDATE_MULTIPLIER)
+    dense = None
+    if query_embeddings is not None:
+        dense = _nearest_positions(user_email, chat_id, index, query_embeddings, pool)
+    try:
+        lexical = load_lexical_index(user_email, chat_id, index)
+        sparse = [lexical.search(question, pool) for question in questions]
+    except Exception as err:
+        if dense is None:
+            raise
+        print(f"[WARNING] Lexical retrieval failed, using vectors only: {err}")
+        return [ranking[:k] for ranking in dense]
+    if dense is None:
+        return [ranking[:k] for ranking in sparse]
     return [
-        {"index": nearest_neighbors[index], "similarity_score": distances[nearest_neighbors[index]]}
-        for index in range(len(nearest_neighbors))
+        np.asarray(reciprocal_rank_fusion([vector_ranking, lexical_ranking], k), dtype=np.int64)
+        for vector_ranking, lexical_ranking in zip(dense, sparse, strict=True)
     ]
 
 
-def get_relevant_chunks(k, question, chat_id, user_email, include_metadata=False):
-    rows = get_chat_chunks(user_email, chat_id)
-    chunk_embeddings = []
-    chunk_metadata = []
+def _resolve_mode(mode):
+    mode = (mode or RETRIEVAL_MODE).lower()
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode {mode!r}; expected one of {RETRIEVAL_MODES}")
+    return mode
+
+
+def _index_dimensions(index):
+    return index.space.dimensions if index.space is not None else EMBEDDING_DIMENSIONS
+
+
+def _exact_vector_loader(user_email, index):
+    """Return a loader of exact vectors for *index* positions, for rescoring."""
+
+    def load(positions):
+        chunk_ids = index.chunk_ids[positions]
+        stored = get_chunk_embeddings(user_email, chunk_ids.tolist())
+        dimensions = _index_dimensions(index)
+        matrix = np.zeros((len(positions), dimensions), dtype=np.float32)
+        for row, chunk_id in enumerate(chunk_ids.tolist()):
+            if chunk_id in stored:
+                blob, encoding = stored[chunk_id]
+                matrix[row] = decode_vector(blob, encoding, dimensions)
+        return matrix
+
+    return load
+
+
+def _nearest_positions(user_email, chat_id, index, query_embeddings, k):
+    """Return, per query, the positions of the best *k* chunks in *index*."""
+    if index.codes is not None:
+        nearest, _ = two_stage_search(query_embeddings, index.codes, k, _exact_vector_loader(user_email, index))
+        return [row[row >= 0] for row in nearest]
+    ivf = ann_index.get_chat_ann_index(chat_id, index)
+    if ivf is not None:
+        nearest = ann_index.search(ivf, index, query_embeddings, k)
+    else:
+        nearest, _ = top_k_cosine(query_embeddings, index.matrix, k)
+    return [row[row >= 0] for row in nearest]
+
+
+def _source_chunk(index, position, chunk_texts, include_metadata):
+    document_name = index.document_names[index.doc_positions[position]]
+    chunk_text = chunk_texts.get(int(index.chunk_ids[position]), "")
+    if not include_metadata:
+        return (chunk_text, document_name)
+    return {
+        "chunk_text": chunk_text,
+        "document_name": document_name,
+        "page_number": index.page_number(position),
+        "start_index": int(index.starts[position]),
+        "end_index": int(index.ends[position]),
+        "source_type": "document_chunk",
+    }
+
+
+def get_relevant_chunks(k, question, chat_id, user_email, include_metadata=False, mode=None):
+    """Return the *k* chunks of a chat most relevant to *question*.
+
+    *mode* (default ``RETRIEVAL_MODE``) is ``vector`` for embedding
+    similarity, ``lexical`` for BM25 alone (no embedding call) or ``hybrid``
+    for both, fused by reciprocal rank.
+    """
+    mode = _resolve_mode(mode)
+    index = load_chat_index(user_email, chat_id)
+    if not len(index):
+        return []
 
-    for row in rows:
-        embedding = np.frombuffer(row["embedding_vector"])
-        if len(embedding) != EMBEDDING_DIMENSIONS:
-            print(f"[WARNING] Skipping chunk with bad dimensions: {len(embedding)}")
-            continue
+    query_embedding = None
+    if mode != "lexical":
+        try:
+            query_embedding = np.array(get_embedding(question, index.space))
+            if len(query_embedding) != _index_dimensions(index):
+                raise ValueError(f"Query embedding has wrong dimensions: {len(query_embedding)}")
+        except Exception as err:
+            print(f"[ERROR] Failed to generate query embedding: {err}")
+            if mode == "vector":
+                return []
+            query_embedding = None
 
-        chunk_embeddings.append(embedding)
-        chunk_metadata.append(
-            {
-                "start": row["start_index"],
-                "end": row["end_index"],
-                "page_number": row.get("page_number"),
-                "document_name": row["document_name"],
-                "document_text": row["document_text"],
-            }
-        )
+    top_positions = _retrieve_positions(user_email, chat_id, index, [question], query_embedding, k, mode)[0]
+    chunk_texts = get_chunk_texts(user_email, index.chunk_ids[top_positions].tolist())
+    return [
+        _source_chunk(index, position, chunk_texts, include_metadata)
+        for position in top_positions
+    ]
 
-    if not chunk_embeddings:
-        return []
 
-    try:
-        query_embedding = np.array(get_embedding(question))
-        if len(query_embedding) != EMBEDDING_DIMENSIONS:
-            raise ValueError(f"Query embedding has wrong dimensions: {len(query_embedding)}")
-    except Exception as err:
-        print(f"[ERROR] Failed to generate query embedding: {err}")
+def get_relevant_chunks_multi(k_per_query, questions, chat_id, user_email, mode=None):
+    """Retrieve for several questions at once, deduplicated by chunk id.
+
+    All questions are embedded in one provider call and scored against the
+    chat's vectors in one matrix multiply (*mode* as in
+    :func:`get_relevant_chunks`).  Returns metadata dicts (as with
+    ``get_relevant_chunks(..., include_metadata=True)``) plus ``chunk_id`` and
+    the ``query`` that first retrieved the chunk, in question order then rank.
+    """
+    mode = _resolve_mode(mode)
+    questions = [question for question in questions if question]
+    if not questions:
+        return []
+    index = load_chat_index(user_email, chat_id)
+    if not len(index):
         return []
 
-    results = knn(query_embedding, np.array(chunk_embeddings))
-    source_chunks = []
-    for index in range(min(k, len(results))):
-        metadata = chunk_metadata[results[index]["index"]]
-        chunk_text = metadata["document_text"][metadata["start"] : metadata["end"]]
-        if include_metadata:
-            source_chunks.append(
-                {
-                    "chunk_text": chunk_text,
-                    "document_name": metadata["document_name"],
-                    "page_number": metadata["page_number"],
-                    "start_index": metadata["start"],
-                    "end_index": metadata["end"],
-                    "source_type": "document_chunk",
-                }
-            )
-        else:
-            source_chunks.append((chunk_text, metadata["document_name"]))
-    return source_chunks
+    query_embeddings = None
+    if mode != "lexical":
+        try:
+            query_embeddings = np.array(get_query_embeddings(questions, index.space))
+        except Exception as err:
+            print(f"[ERROR] Failed to generate query embeddings: {err}")
+            if mode == "vector":
+                return []
+
+    winners = []
+    seen_chunk_ids = set()
+    ranked = _retrieve_positions(user_email, chat_id, index, questions, query_embeddings, k_per_query, mode)
+    for question, positions in zip(questions, ranked, strict=True):
+        for position in positions:
+            chunk_id = int(index.chunk_ids[position])
+            if chunk_id not in seen_chunk_ids:
+                seen_chunk_ids.add(chunk_id)
+                winners.append((question, position, chunk_id))
+
+    chunk_texts = get_chunk_texts(user_email, [chunk_id for _, _, chunk_id in winners])
+    results = []
+    for question, position, chunk_id in winners:
+        source = _source_chunk(index, position, chunk_texts, include_metadata=True)
+        source.update({"chunk_id": chunk_id, "query": question})
+        results.append(source)
+    return results
 
 
 def get_text_from_single_file(file):
@@ -497,5 +811,10 @@ def get_text_pages_from_single_file(file):
 
 def get_text_from_url(web_url):
     response = fetch_external_url(web_url)
-    result = p.from_buffer(response.content)
-    return result.get("content", "").strip().replace("\n", "").replace("\t", "")
+
+    def extract():
+        result = p.from_buffer(response.content)
+        return result.get("content", "").strip().replace("\n", "").replace("\t", "")
+
+    # An unchanged page (a 304, or the same bytes) is not parsed by Tika again.
+    return extracted_text(response.content, "tika", extract)
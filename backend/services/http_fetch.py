@@ -0,0 +1,450 @@
+"""Shared HTTP fetch layer for URL ingestion and the web agent tools.
+
+``get_text_from_url``, ``fetch_external_url`` and the ``fetch_url`` /
+``search_web`` agent tools used to open a fresh connection, resolve the host
+and download (and re-parse) the page on every call.  They now go through
+this module:
+
+- one pooled ``requests.Session`` per process (``HTTP_FETCH_POOL_SIZE``
+  connections per host), so repeated fetches reuse TCP/TLS connections;
+- :func:`resolve_host` keeps resolved addresses for
+  ``HTTP_FETCH_DNS_TTL_SECONDS`` in a bounded LRU.  Failed lookups are not
+  cached, and :func:`ensure_public_host` checks the (cached) addresses on
+  every call, so the private-address rules are never skipped;
+- the session's connections are pinned to those checked addresses: a new
+  connection resolves through the same cache, refuses non-public answers
+  and connects to the address itself, while TLS (SNI, certificate) and
+  the ``Host`` header still use the hostname.  A DNS answer that changes
+  after the check (rebinding) is never what a connection uses;
+- :func:`fetch` keeps GET responses that carry an ``ETag`` or
+  ``Last-Modified`` validator in a SQLite file at ``HTTP_CACHE_PATH`` and
+  revalidates them with ``If-None-Match`` / ``If-Modified-Since``; a 304
+  is answered from the stored body;
+- :func:`extracted_text` caches text extracted from a body by the body's
+  SHA-256, so re-ingesting an unchanged URL costs one 304 and no parsing.
+
+Both caches are bounded (``HTTP_CACHE_MAX_ENTRIES`` rows each, least
+recently used pruned) and an empty ``HTTP_CACHE_PATH`` disables them.  Disk
+failures are logged and never fail a fetch.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import ipaddress
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Mapping
+from dataclasses import dataclass, field
+from typing import Any
+from urllib.parse import urljoin, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+from urllib3.util.connection import create_connection
+
+HTTP_FETCH_POOL_SIZE = int(os.getenv("HTTP_FETCH_POOL_SIZE", "16"))
+HTTP_FETCH_DNS_CACHE_ENTRIES = int(os.getenv("HTTP_FETCH_DNS_CACHE_ENTRIES", "1024"))
+HTTP_FETCH_DNS_TTL_SECONDS = float(os.getenv("HTTP_FETCH_DNS_TTL_SECONDS", "60"))
+HTTP_CACHE_PATH = os.getenv(
+    "HTTP_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "database", "http_cache.sqlite3"),
+)
+HTTP_CACHE_MAX_ENTRIES = int(os.getenv("HTTP_CACHE_MAX_ENTRIES", "2000"))
+HTTP_CACHE_MAX_BODY_BYTES = int(os.getenv("HTTP_CACHE_MAX_BODY_BYTES", str(10 * 1024 * 1024)))
+MAX_REDIRECTS = 5
+# Response headers kept with a cached body.
+_STORED_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+# Overflow rows are pruned from disk once every this many writes.
+_DISK_PRUNE_INTERVAL = 100
+
+
+class UnsafeUrlError(ValueError):
+    pass
+
+
+@dataclass
+class FetchResult:
+    """A fetched response; ``from_cache`` is True when a 304 was answered from disk."""
+
+    url: str
+    status_code: int
+    headers: CaseInsensitiveDict
+    content: bytes
+    from_cache: bool = False
+    content_hash: str = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.content_hash = content_hash(self.content)
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    @property
+    def text(self) -> str:
+        encoding = get_encoding_from_headers(self.headers)
+        if not encoding or encoding.upper() == "ISO-8859-1":
+            encoding = "utf-8"
+        return self.content.decode(encoding, errors="replace")
+
+    def raise_for_status(self) -> None:
+        if not self.ok:
+            raise requests.HTTPError(f"{self.status_code} Error for url: {self.url}")
+
+
+def content_hash(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# Sessions
+# ---------------------------------------------------------------------------
+
+class _PinnedConnectionMixin:
+    """Open the socket to a checked public address of the host instead of resolving it again."""
+
+    _dns_host: str
+    host: str
+    port: int
+    timeout: Any
+    source_address: Any
+    socket_options: Any
+
+    def _new_conn(self) -> socket.socket:
+        error: OSError | None = None
+        for address in public_addresses(self._dns_host):
+            try:
+                return create_connection(
+                    (address, self.port),
+                    self.timeout,
+                    source_address=self.source_address,
+                    socket_options=self.socket_options,
+                )
+            except TimeoutError as err:
+                raise ConnectTimeoutError(
+                    self, f"Connection to {self.host} timed out. (connect timeout={self.timeout})"
+                ) from err
+            except OSError as err:
+                error = err
+        raise NewConnectionError(self, f"Failed to establish a new connection: {error}")
+
+
+class _PinnedHTTPConnection(_PinnedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _PinnedHTTPSConnection(_PinnedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _PinnedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _PinnedHTTPConnection
+
+
+class _PinnedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _PinnedHTTPSConnection
+
+
+class _PinnedAdapter(HTTPAdapter):
+    """Pooled adapter whose direct connections only reach checked public addresses."""
+
+    def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _PinnedHTTPConnectionPool,
+            "https": _PinnedHTTPSConnectionPool,
+        }
+
+
+_session: requests.Session | None = None
+_session_lock = threading.Lock()
+
+
+def session() -> requests.Session:
+    """Return the process-wide pooled session; it only connects to public addresses."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                pooled = requests.Session()
+                adapter = _PinnedAdapter(pool_connections=HTTP_FETCH_POOL_SIZE, pool_maxsize=HTTP_FETCH_POOL_SIZE)
+                pooled.mount("http://", adapter)
+                pooled.mount("https://", adapter)
+                _session = pooled
+    return _session
+
+
+# ---------------------------------------------------------------------------
+# Resolver cache
+# ---------------------------------------------------------------------------
+
+
+class ResolverCache:
+    """Bounded TTL + LRU cache of ``getaddrinfo`` results."""
+
+    def __init__(
+        self,
+        max_entries: int = HTTP_FETCH_DNS_CACHE_ENTRIES,
+        ttl_seconds: float = HTTP_FETCH_DNS_TTL_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: OrderedDict[str, tuple[tuple[str, ...], float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def resolve(self, hostname: str) -> tuple[str, ...]:
+        """Return the addresses of *hostname*; raises ``socket.gaierror`` when it does not resolve."""
+        hostname = hostname.lower()
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(hostname)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(hostname)
+                return entry[0]
+
+        addresses = tuple(dict.fromkeys(info[4][0] for info in socket.getaddrinfo(hostname, None)))
+        with self._lock:
+            self._entries[hostname] = (addresses, now + self.ttl_seconds)
+            self._entries.move_to_end(hostname)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return addresses
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+resolver_cache = ResolverCache()
+
+
+def resolve_host(hostname: str) -> tuple[str, ...]:
+    return resolver_cache.resolve(hostname)
+
+
+def is_public_address(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    return not (
+        ip.is_private
+        or ip.is_loopback
+        or ip.is_link_local
+        or ip.is_multicast
+        or ip.is_reserved
+        or ip.is_unspecified
+    )
+
+
+def public_addresses(hostname: str) -> tuple[str, ...]:
+    """Return the (cached) addresses of *hostname*; raises UnsafeUrlError unless all are public."""
+    try:
+        addresses = resolve_host(hostname)
+    except (socket.gaierror, UnicodeError) as err:
+        raise UnsafeUrlError("Could not resolve host") from err
+    if not addresses or not all(is_public_address(address) for address in addresses):
+        raise UnsafeUrlError("URL resolves to a non-public address")
+    return addresses
+
+
+def ensure_public_host(hostname: str) -> None:
+    """Raise UnsafeUrlError unless every address of *hostname* is public."""
+    public_addresses(hostname)
+
+
+def ensure_public_url(url: str) -> None:
+    parsed = urlparse(url)
+    if parsed.scheme not in {"http", "https"}:
+        raise UnsafeUrlError("Only http and https URLs are allowed")
+    if not parsed.hostname or parsed.username or parsed.password:
+        raise UnsafeUrlError("Invalid URL")
+    ensure_public_host(parsed.hostname)
+
+
+# ---------------------------------------------------------------------------
+# On-disk response and extracted-text cache
+# ---------------------------------------------------------------------------
+
+
+class _DiskCache:
+    """SQLite store of revalidatable responses and of text extracted from bodies."""
+
+    def __init__(self, path: str, max_entries: int) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " url TEXT PRIMARY KEY, headers TEXT NOT NULL, body BLOB NOT NULL, used_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS extracted_text ("
+            " content_hash TEXT NOT NULL, extractor TEXT NOT NULL, text TEXT NOT NULL, used_at REAL NOT NULL,"
+            " PRIMARY KEY (content_hash, extractor))"
+        )
+        self._conn.commit()
+
+    def get_response(self, url: str) -> tuple[CaseInsensitiveDict, bytes] | None:
+        with self._lock:
+            row = self._conn.execute("SELECT headers, body FROM responses WHERE url = ?", (url,)).fetchone()
+        return None if row is None else (CaseInsensitiveDict(json.loads(row[0])), bytes(row[1]))
+
+    def put_response(self, url: str, headers: Mapping[str, str], body: bytes) -> None:
+        stored = {name: headers[name] for name in _STORED_HEADERS if name in headers}
+        self._write(
+            "INSERT OR REPLACE INTO responses (url, headers, body, used_at) VALUES (?, ?, ?, ?)",
+            (url, json.dumps(stored), body, time.time()),
+        )
+
+    def touch_response(self, url: str) -> None:
+        self._write("UPDATE responses SET used_at = ? WHERE url = ?", (time.time(), url))
+
+    def get_text(self, digest: str, extractor: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text FROM extracted_text WHERE content_hash = ? AND extractor = ?", (digest, extractor)
+            ).fetchone()
+            if row is not None:
+                self._conn.execute(
+                    "UPDATE extracted_text SET used_at = ? WHERE content_hash = ? AND extractor = ?",
+                    (time.time(), digest, extractor),
+                )
+                self._conn.commit()
+        return None if row is None else row[0]
+
+    def put_text(self, digest: str, extractor: str, text: str) -> None:
+        self._write(
+            "INSERT OR REPLACE INTO extracted_text (content_hash, extractor, text, used_at) VALUES (?, ?, ?, ?)",
+            (digest, extractor, text, time.time()),
+        )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.execute("DELETE FROM extracted_text")
+            self._conn.commit()
+
+    def _write(self, statement: str, params: tuple[Any, ...]) -> None:
+        with self._lock:
+            self._conn.execute(statement, params)
+            self._writes += 1
+            if self._writes % _DISK_PRUNE_INTERVAL == 0:
+                for table, key in (("responses", "url"), ("extracted_text", "content_hash || extractor")):
+                    self._conn.execute(
+                        f"DELETE FROM {table} WHERE {key} NOT IN ("
+                        f" SELECT {key} FROM {table} ORDER BY used_at DESC LIMIT ?)",
+                        (self.max_entries,),
+                    )
+            self._conn.commit()
+
+
+_disk_cache: _DiskCache | None = None
+_disk_cache_opened = False
+_disk_cache_lock = threading.Lock()
+
+
+def _cache() -> _DiskCache | None:
+    global _disk_cache, _disk_cache_opened
+    if not _disk_cache_opened:
+        with _disk_cache_lock:
+            if not _disk_cache_opened:
+                if HTTP_CACHE_PATH:
+                    try:
+                        _disk_cache = _DiskCache(HTTP_CACHE_PATH, HTTP_CACHE_MAX_ENTRIES)
+                    except (OSError, sqlite3.Error) as err:
+                        print(f"[WARNING] HTTP cache disabled ({HTTP_CACHE_PATH}): {err}")
+                _disk_cache_opened = True
+    return _disk_cache
+
+
+def _cache_call(operation: Callable[[_DiskCache], Any]) -> Any:
+    cache = _cache()
+    if cache is None:
+        return None
+    try:
+        return operation(cache)
+    except sqlite3.Error as err:
+        print(f"[WARNING] HTTP cache access failed: {err}")
+        return None
+
+
+def _storable(response: requests.Response) -> bool:
+    cache_control = response.headers.get("Cache-Control", "").lower()
+    return (
+        response.status_code == 200
+        and ("ETag" in response.headers or "Last-Modified" in response.headers)
+        and "no-store" not in cache_control
+        and len(response.content) <= HTTP_CACHE_MAX_BODY_BYTES
+    )
+
+
+# ---------------------------------------------------------------------------
+# Fetching
+# ---------------------------------------------------------------------------
+
+
+def fetch(
+    url: str,
+    *,
+    headers: Mapping[str, str] | None = None,
+    timeout: float = 10,
+    allow_redirects: bool = False,
+    use_cache: bool = True,
+) -> FetchResult:
+    """GET *url* through the pooled session, revalidating a cached copy when there is one.
+
+    The host (and every redirect target) must resolve to public addresses,
+    and the connection is made to one of them.  Redirects are followed, at
+    most ``MAX_REDIRECTS`` times, only when *allow_redirects* is set.
+    """
+    for _ in range(MAX_REDIRECTS + 1):
+        ensure_public_url(url)
+        result = _fetch_once(url, dict(headers or {}), timeout, use_cache)
+        location = result.headers.get("Location")
+        if not (allow_redirects and location and result.status_code in (301, 302, 303, 307, 308)):
+            return result
+        url = urljoin(url, location)
+    raise requests.TooManyRedirects(f"Exceeded {MAX_REDIRECTS} redirects")
+
+
+def _fetch_once(url: str, headers: dict[str, str], timeout: float, use_cache: bool) -> FetchResult:
+    cached = _cache_call(lambda cache: cache.get_response(url)) if use_cache else None
+    if cached is not None:
+        cached_headers, _ = cached
+        if "ETag" in cached_headers:
+            headers.setdefault("If-None-Match", cached_headers["ETag"])
+        if "Last-Modified" in cached_headers:
+            headers.setdefault("If-Modified-Since", cached_headers["Last-Modified"])
+
+    response = session().get(url, headers=headers, timeout=timeout, allow_redirects=False)
+    if cached is not None and response.status_code == 304:
+        _cache_call(lambda cache: cache.touch_response(url))
+        return FetchResult(url, 200, cached[0], cached[1], from_cache=True)
+    if use_cache and _storable(response):
+        _cache_call(lambda cache: cache.put_response(url, response.headers, response.content))
+    return FetchResult(url, response.status_code, CaseInsensitiveDict(response.headers), response.content)
+
+
+def extracted_text(content: bytes, extractor: str, extract: Callable[[], str]) -> str:
+    """Return ``extract()`` for *content*, cached by its hash under the *extractor* name."""
+    digest = content_hash(content)
+    cached = _cache_call(lambda cache: cache.get_text(digest, extractor))
+    if cached is not None:
+        return cached
+    text = extract()
+    _cache_call(lambda cache: cache.put_text(digest, extractor, text))
+    return text
@@ -0,0 +1,339 @@
+"""Background document ingestion jobs with per-file progress.
+
+``/public/upload`` used to run Tika, insert each document and block on the
+Ray chunking task for every file in series, holding the HTTP request for
+minutes.  Uploads now become jobs:
+
+- :meth:`IngestionJobManager.submit` returns immediately; each file is
+  processed on a shared thread pool bounded by ``INGESTION_MAX_WORKERS``, so
+  files in a job run in parallel without letting a burst of uploads exhaust
+  the process.
+- Every file moves through ``queued`` → ``extracted`` → ``chunked`` →
+  ``embedded`` → ``stored`` (or ``failed``).  Snapshots are available from
+  :meth:`~IngestionJobManager.get` and as a change stream from
+  :meth:`~IngestionJobManager.iter_events` (used for the SSE endpoint).
+- Jobs are owned by an opaque key (a hash of the API key, or a fixed name for
+  MCP) and are only visible to that owner.  Finished jobs are forgotten after
+  ``INGESTION_JOB_TTL_SECONDS``.
+
+Job state lives in this process; the backend runs a single Flask process.
+"""
+
+from __future__ import annotations
+
+import io
+import os
+import threading
+import time
+import uuid
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any
+
+from database.db import add_document, append_document_text, discard_document
+from tika import parser as tika_parser
+
+from services.finance_gpt import (
+    get_text_from_url,
+    ingest_document_pages,
+    ingest_document_text,
+    ingest_tabular_document,
+    reingest_document,
+)
+from services.ingestion_pipeline import iter_pdf_pages, iter_text_segments
+from services.tabular_service import is_tabular_file
+
+INGESTION_MAX_WORKERS = int(os.getenv("INGESTION_MAX_WORKERS", "4"))
+INGESTION_JOB_TTL_SECONDS = float(os.getenv("INGESTION_JOB_TTL_SECONDS", "3600"))
+DEFAULT_MAX_CHUNK_SIZE = 1000
+_HEARTBEAT_SECONDS = 15.0
+
+FILE_STAGES = ("queued", "extracted", "chunked", "embedded", "stored")
+_TERMINAL_STAGES = {"stored", "failed"}
+
+ProgressFn = Callable[..., None]
+
+
+@dataclass
+class IngestionSource:
+    """One item to ingest: uploaded bytes, a URL or already-extracted text.
+
+    With *reingest*, a document of the same name already in the chat is
+    refreshed in place instead of being skipped.
+    """
+
+    name: str
+    content: bytes | None = None
+    url: str | None = None
+    text: str | None = None
+    reingest: bool = False
+
+
+@dataclass
+class FileProgress:
+    name: str
+    stage: str = "queued"
+    document_id: int | None = None
+    chunks: int | None = None
+    already_existed: bool = False
+    error: str | None = None
+
+
+@dataclass
+class IngestionJob:
+    id: str
+    owner: str
+    chat_id: int
+    files: list[FileProgress]
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+    version: int = 0
+
+    @property
+    def finished(self) -> bool:
+        return all(item.stage in _TERMINAL_STAGES for item in self.files)
+
+    @property
+    def status(self) -> str:
+        if self.finished:
+            failed = sum(item.stage == "failed" for item in self.files)
+            if not failed:
+                return "completed"
+            return "failed" if failed == len(self.files) else "completed_with_errors"
+        if all(item.stage == "queued" for item in self.files):
+            return "queued"
+        return "running"
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "chat_id": self.chat_id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "files": [asdict(item) for item in self.files],
+        }
+
+
+# ---------------------------------------------------------------------------
+# Per-file pipeline
+# ---------------------------------------------------------------------------
+
+
+def ingest_source(source: IngestionSource, chat_id: int, max_chunk_size: int, progress: ProgressFn) -> None:
+    """Extract, register, chunk, embed and store one source, reporting each stage.
+
+    PDFs are streamed page by page: the document row is created empty and
+    each page's text is appended as its chunks are stored.  Spreadsheets are
+    streamed the same way, a row group at a time, and also written to the
+    document's table store.  An existing document is skipped, or re-ingested
+    when ``source.reingest`` is set.  A document created here is discarded
+    again when its ingestion fails, so a retry does not find a partial copy.
+    """
+    if source.text is None and source.content is not None and source.content.startswith(b"%PDF-"):
+        document_id, already_existed = add_document("", source.name, chat_id=chat_id)
+        if already_existed:
+            if source.reingest:
+                _reingest(document_id, iter_pdf_pages(io.BytesIO(source.content)), max_chunk_size, progress)
+            else:
+                progress("stored", document_id=document_id, already_existed=True)
+            return
+        with _discarded_on_failure(document_id):
+            ingest_document_pages(
+                iter_pdf_pages(io.BytesIO(source.content)),
+                max_chunk_size,
+                document_id,
+                append_text=append_document_text,
+                progress=lambda stage, **details: progress(stage, document_id=document_id, **details),
+            )
+        return
+
+    if source.text is None and source.content is not None and is_tabular_file(source.name):
+        document_id, already_existed = add_document("", source.name, chat_id=chat_id)
+        if already_existed and not source.reingest:
+            progress("stored", document_id=document_id, already_existed=True)
+            return
+        with _discarded_on_failure(None if already_existed else document_id):
+            ingest_tabular_document(
+                source.content,
+                source.name,
+                "",
+                max_chunk_size,
+                document_id,
+                progress=lambda stage, **details: progress(
+                    stage, document_id=document_id, already_existed=already_existed, **details
+                ),
+                reingest=already_existed,
+            )
+        return
+
+    text = source.text
+    if text is None and source.content is not None:
+        text = ((tika_parser.from_buffer(source.content) or {}).get("content") or "").strip()
+    elif text is None and source.url:
+        text = get_text_from_url(source.url)
+    progress("extracted")
+
+    document_id, already_existed = add_document(text, source.name, chat_id=chat_id)
+    if already_existed:
+        if source.reingest:
+            _reingest(document_id, iter_text_segments(text or ""), max_chunk_size, progress)
+        else:
+            progress("stored", document_id=document_id, already_existed=True)
+        return
+
+    with _discarded_on_failure(document_id):
+        ingest_document_text(
+            text or "",
+            max_chunk_size,
+            document_id,
+            progress=lambda stage, **details: progress(stage, document_id=document_id, **details),
+        )
+
+
+@contextmanager
+def _discarded_on_failure(document_id: int | None) -> Iterator[None]:
+    """Tombstone the newly created *document_id* if the block raises, then re-raise."""
+    try:
+        yield
+    except BaseException:
+        if document_id is not None:
+            try:
+                discard_document(document_id)
+            except Exception as err:
+                print(f"[WARNING] Could not discard failed document {document_id}: {err}")
+        raise
+
+
+def _reingest(
+    document_id: int, segments: Iterable[tuple[str, int | None]], max_chunk_size: int, progress: ProgressFn
+) -> None:
+    reingest_document(
+        segments,
+        max_chunk_size,
+        document_id,
+        progress=lambda stage, **details: progress(stage, document_id=document_id, already_existed=True, **details),
+    )
+
+
+# ---------------------------------------------------------------------------
+# Job manager
+# ---------------------------------------------------------------------------
+
+
+class IngestionJobManager:
+    """Runs ingestion jobs on a bounded pool and tracks their progress."""
+
+    def __init__(
+        self,
+        max_workers: int = INGESTION_MAX_WORKERS,
+        job_ttl_seconds: float = INGESTION_JOB_TTL_SECONDS,
+        process: Callable[[IngestionSource, int, int, ProgressFn], None] = ingest_source,
+    ) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="ingest")
+        self._job_ttl_seconds = job_ttl_seconds
+        self._process = process
+        self._jobs: dict[str, IngestionJob] = {}
+        self._changed = threading.Condition()
+
+    def submit(
+        self,
+        owner: str,
+        chat_id: int,
+        sources: Sequence[IngestionSource],
+        max_chunk_size: int = DEFAULT_MAX_CHUNK_SIZE,
+    ) -> dict[str, Any]:
+        """Queue *sources* for ingestion into *chat_id* and return the job snapshot."""
+        job = IngestionJob(
+            id=uuid.uuid4().hex,
+            owner=owner,
+            chat_id=chat_id,
+            files=[FileProgress(name=source.name) for source in sources],
+        )
+        with self._changed:
+            self._purge_expired()
+            self._jobs[job.id] = job
+            snapshot = job.to_dict()
+        for position, source in enumerate(sources):
+            self._executor.submit(self._run, job, position, source, max_chunk_size)
+        return snapshot
+
+    def get(self, job_id: str, owner: str) -> dict[str, Any] | None:
+        """Return a snapshot of *job_id*, or None if it is unknown or not *owner*'s."""
+        with self._changed:
+            job = self._jobs.get(job_id)
+            if job is None or job.owner != owner:
+                return None
+            return job.to_dict()
+
+    def wait(self, job_id: str, owner: str, timeout: float | None = None) -> dict[str, Any] | None:
+        """Block until the job finishes (or *timeout*) and return its snapshot."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._changed:
+            job = self._jobs.get(job_id)
+            if job is None or job.owner != owner:
+                return None
+            while not job.finished:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._changed.wait(remaining)
+            return job.to_dict()
+
+    def iter_events(
+        self,
+        job_id: str,
+        owner: str,
+        heartbeat_seconds: float = _HEARTBEAT_SECONDS,
+    ) -> Iterator[dict[str, Any] | None]:
+        """Yield a snapshot on every change until the job finishes.
+
+        ``None`` is yielded after *heartbeat_seconds* without a change so the
+        caller can keep idle connections alive.
+        """
+        seen_version = -1
+        while True:
+            with self._changed:
+                job = self._jobs.get(job_id)
+                if job is None or job.owner != owner:
+                    return
+                if job.version == seen_version:
+                    self._changed.wait(heartbeat_seconds)
+                if job.version == seen_version:
+                    snapshot = None
+                else:
+                    seen_version = job.version
+                    snapshot = job.to_dict()
+                finished = job.finished
+            yield snapshot
+            if finished and snapshot is not None:
+                return
+
+    def _run(self, job: IngestionJob, position: int, source: IngestionSource, max_chunk_size: int) -> None:
+        def progress(stage: str, **details: Any) -> None:
+            self._update(job, position, stage=stage, **details)
+
+        try:
+            self._process(source, job.chat_id, max_chunk_size, progress)
+        except Exception as err:
+            print(f"[ERROR] Ingestion of {source.name!r} for job {job.id} failed: {err}")
+            self._update(job, position, stage="failed", error=str(err))
+
+    def _update(self, job: IngestionJob, position: int, **changes: Any) -> None:
+        with self._changed:
+            item = job.files[position]
+            for name, value in changes.items():
+                setattr(item, name, value)
+            job.version += 1
+            job.updated_at = time.time()
+            self._changed.notify_all()
+
+    def _purge_expired(self) -> None:
+        cutoff = time.time() - self._job_ttl_seconds
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished and job.updated_at < cutoff]:
+            del self._jobs[job_id]
+
+
+ingestion_jobs = IngestionJobManager()
@@ -0,0 +1,266 @@
+"""Streaming, stage-overlapped document ingestion.
+
+Ingestion used to run in strict phases: parse the whole file, chunk all of
+it, embed every chunk, then insert everything in one statement, so peak
+memory held the full text, every chunk and every embedding at once.  This
+pipeline instead connects three threads with bounded queues:
+
+    extract (segments) ──▶ chunk + embed (batches) ──▶ store (caller thread)
+
+While segment N+1 is being extracted, segment N's chunks are being embedded
+and the previous batch is being inserted.  At most ``PIPELINE_QUEUE_SIZE``
+items wait between stages, so memory stays flat regardless of document size.
+
+A *segment* is ``(text, page_number)``; page numbers are ``None`` for
+unpaged text.  Chunk offsets are global across segments, matching how
+``documents.document_text`` stores the concatenated text.  When the text is
+not stored yet, ``append_text`` writes it to the document: segments are
+buffered and appended once per stored batch, just before the chunks that
+point into them, rather than one append per page.
+
+Per-stage busy time is recorded in :class:`PipelineStats`.
+"""
+
+from __future__ import annotations
+
+import os
+import queue
+import threading
+import time
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from dataclasses import dataclass, field
+from typing import Any
+
+import PyPDF2
+from database.embedding_encoding import encode_vector
+
+from services.chunker import DEFAULT_CHUNK_OVERLAP, iter_chunk_spans
+
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "4"))
+PIPELINE_EMBED_BATCH = int(os.getenv("PIPELINE_EMBED_BATCH", "128"))
+# Unpaged text is cut into segments of about this many characters.
+TEXT_SEGMENT_CHARS = 64 * 1024
+_POLL_SECONDS = 0.1
+
+Segment = tuple[str, "int | None"]
+ChunkRow = tuple[int, int, int, bytes, "int | None"]
+ProgressFn = Callable[..., None]
+
+
+# ---------------------------------------------------------------------------
+# Segment sources
+# ---------------------------------------------------------------------------
+
+
+def iter_pdf_pages(file: Any) -> Iterator[Segment]:
+    """Yield ``(text, page_number)`` for each page, extracting lazily."""
+    reader = PyPDF2.PdfReader(file)
+    for page_number, page in enumerate(reader.pages, start=1):
+        yield page.extract_text() or "", page_number
+
+
+def iter_text_segments(text: str, segment_chars: int = TEXT_SEGMENT_CHARS) -> Iterator[Segment]:
+    """Cut unpaged *text* into segments, preferring paragraph boundaries."""
+    start = 0
+    while start < len(text):
+        end = min(start + segment_chars, len(text))
+        if end < len(text):
+            boundary = text.rfind("\n\n", start + segment_chars // 2, end)
+            if boundary != -1:
+                end = boundary
+        yield text[start:end], None
+        start = end
+
+
+# ---------------------------------------------------------------------------
+# Pipeline
+# ---------------------------------------------------------------------------
+
+
+@dataclass
+class PipelineStats:
+    segments: int = 0
+    chunks: int = 0
+    characters: int = 0
+    stage_seconds: dict[str, float] = field(
+        default_factory=lambda: {"extract": 0.0, "chunk": 0.0, "embed": 0.0, "store": 0.0}
+    )
+    wall_seconds: float = 0.0
+
+    def summary(self) -> str:
+        stages = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.stage_seconds.items())
+        return (
+            f"{self.segments} segments, {self.chunks} chunks in {self.wall_seconds:.2f}s ({stages})"
+        )
+
+
+class _Done:
+    """End-of-stream marker."""
+
+
+_DONE = _Done()
+
+
+class _Failed:
+    def __init__(self, error: BaseException) -> None:
+        self.error = error
+
+
+class _SegmentText:
+    def __init__(self, text: str) -> None:
+        self.text = text
+
+
+def run_pipeline(
+    segments: Iterable[Segment],
+    max_chunk_size: int,
+    document_id: int,
+    embed_fn: Callable[[list[str]], Sequence[Sequence[float]]],
+    store_fn: Callable[[list[ChunkRow], list[Sequence[float]]], None],
+    *,
+    append_text: Callable[[int, str], None] | None = None,
+    progress: ProgressFn | None = None,
+    chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+    embed_batch: int = PIPELINE_EMBED_BATCH,
+    queue_size: int = PIPELINE_QUEUE_SIZE,
+    vector_encoder: Callable[[Sequence[float]], bytes] | None = None,
+) -> PipelineStats:
+    """Extract, chunk, embed and store *segments* with overlapped stages.
+
+    *embed_fn* maps chunk texts to vectors; *store_fn* receives each batch of
+    ``(start, end, document_id, vector_bytes, page_number)`` rows with their
+    vectors.  *progress*, when given, is called with ``"extracted"``,
+    ``"chunked"``, ``"embedded"`` and ``"stored"`` as each stage completes.
+    Any stage failure stops the others and is re-raised here.
+    """
+    encode = vector_encoder or encode_vector
+    report = progress or (lambda stage, **details: None)
+    stats = PipelineStats()
+    started = time.perf_counter()
+    cancelled = threading.Event()
+    segment_queue: queue.Queue[Any] = queue.Queue(maxsize=max(1, queue_size))
+    batch_queue: queue.Queue[Any] = queue.Queue(maxsize=max(1, queue_size))
+
+    def put(target: queue.Queue[Any], item: Any) -> bool:
+        while not cancelled.is_set():
+            try:
+                target.put(item, timeout=_POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(source: queue.Queue[Any]) -> Any:
+        while not cancelled.is_set():
+            try:
+                return source.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def extract() -> None:
+        try:
+            iterator = iter(segments)
+            while True:
+                tick = time.perf_counter()
+                segment = next(iterator, None)
+                stats.stage_seconds["extract"] += time.perf_counter() - tick
+                if segment is None:
+                    break
+                if not put(segment_queue, segment):
+                    return
+            report("extracted")
+            put(segment_queue, _DONE)
+        except BaseException as err:  # noqa: BLE001 - forwarded to the caller
+            put(segment_queue, _Failed(err))
+
+    def chunk_and_embed() -> None:
+        offset = 0
+        pending: list[tuple[int, int, str, int | None]] = []
+
+        def flush() -> bool:
+            if not pending:
+                return True
+            tick = time.perf_counter()
+            vectors = list(embed_fn([text for _, _, text, _ in pending]))
+            stats.stage_seconds["embed"] += time.perf_counter() - tick
+            if len(vectors) != len(pending):
+                raise RuntimeError(f"Embedding returned {len(vectors)} vectors for {len(pending)} chunks")
+            batch = (list(pending), vectors)
+            pending.clear()
+            return put(batch_queue, batch)
+
+        try:
+            while True:
+                item = get(segment_queue)
+                if isinstance(item, _Failed):
+                    put(batch_queue, item)
+                    return
+                if item is _DONE:
+                    if cancelled.is_set():
+                        return
+                    break
+                text, page_number = item
+                tick = time.perf_counter()
+                for start, end in iter_chunk_spans(text, max_chunk_size, chunk_overlap):
+                    pending.append((offset + start, offset + end, text[start:end], page_number))
+                    stats.chunks += 1
+                stats.stage_seconds["chunk"] += time.perf_counter() - tick
+                # The store stage appends segment text in order, before its chunks.
+                if append_text is not None and not put(batch_queue, _SegmentText(text)):
+                    return
+                offset += len(text)
+                stats.segments += 1
+                stats.characters += len(text)
+                if len(pending) >= embed_batch and not flush():
+                    return
+            report("chunked", chunks=stats.chunks)
+            if not flush():
+                return
+            report("embedded")
+            put(batch_queue, _DONE)
+        except BaseException as err:  # noqa: BLE001 - forwarded to the caller
+            put(batch_queue, _Failed(err))
+
+    workers = [
+        threading.Thread(target=extract, name=f"ingest-extract-{document_id}", daemon=True),
+        threading.Thread(target=chunk_and_embed, name=f"ingest-embed-{document_id}", daemon=True),
+    ]
+    for worker in workers:
+        worker.start()
+
+    pending_text: list[str] = []
+
+    def flush_text() -> None:
+        if pending_text:
+            append_text(document_id, "".join(pending_text))
+            pending_text.clear()
+
+    try:
+        while True:
+            item = get(batch_queue)
+            if isinstance(item, _Failed):
+                raise item.error
+            if item is _DONE:
+                flush_text()
+                break
+            tick = time.perf_counter()
+            if isinstance(item, _SegmentText):
+                pending_text.append(item.text)
+            else:
+                flush_text()
+                chunks, vectors = item
+                rows = [
+                    (start, end, document_id, encode(vector), page_number)
+                    for (start, end, _, page_number), vector in zip(chunks, vectors, strict=True)
+                ]
+                store_fn(rows, vectors)
+            stats.stage_seconds["store"] += time.perf_counter() - tick
+    finally:
+        cancelled.set()
+        for worker in workers:
+            worker.join()
+
+    report("stored")
+    stats.wall_seconds = time.perf_counter() - started
+    return stats
@@ -0,0 +1,251 @@
+"""BM25 lexical retrieval over an ingest-time inverted index.
+
+Dense embeddings rank exact tokens such as tickers (``AAPL``), section
+numbers (``7.01``, ``10-K``) and figures (``1,234.5``) poorly.  This module
+keeps a per-document inverted index built while chunks are embedded and
+combines it per chat for BM25 scoring:
+
+- :class:`DocumentPostings`: term → (chunk, frequency) postings for one
+  document.  It is persisted in ``document_lexical_index``: ingestion writes
+  one segment row per stored batch, the segments are merged (and compacted)
+  on first search, and deleting the document cascades.  Documents without
+  up-to-date rows are indexed from their stored text on first search.
+- :class:`ChatLexicalIndex`: the postings of every document in a chat,
+  aligned with the positions of the cached ``ChatChunkIndex``.
+- :func:`reciprocal_rank_fusion`: merges the lexical and vector rankings for
+  ``RETRIEVAL_MODE=hybrid``.  ``lexical`` mode answers from the index alone,
+  without an embedding call.
+"""
+
+from __future__ import annotations
+
+import io
+import os
+import re
+from collections import Counter
+from collections.abc import Iterable, Mapping, Sequence
+from dataclasses import dataclass
+
+import numpy as np
+
+RETRIEVAL_MODES = ("vector", "hybrid", "lexical")
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "vector").strip().lower()
+if RETRIEVAL_MODE not in RETRIEVAL_MODES:
+    print(f"[WARNING] Unknown RETRIEVAL_MODE {RETRIEVAL_MODE!r}; using vector")
+    RETRIEVAL_MODE = "vector"
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+# Hybrid mode fuses this many candidates per requested result from each side.
+HYBRID_CANDIDATE_MULTIPLIER = int(os.getenv("HYBRID_CANDIDATE_MULTIPLIER", "4"))
+# Rank constant of reciprocal rank fusion; 60 is the value from the original paper.
+RRF_K = 60
+_MAX_TERM_LENGTH = 64
+
+# Words, tickers and numbers; keeps inner dots, dashes and slashes ("10-k",
+# "7.01", "h1/2024") and drops thousands separators ("1,234" → "1234").
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[./\-][a-z0-9]+)*")
+_THOUSANDS_PATTERN = re.compile(r"(?<=\d),(?=\d{3}\b)")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were will with".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    """Lower-case lexical terms of *text*, in order, without stopwords."""
+    tokens = []
+    for token in _TOKEN_PATTERN.findall(_THOUSANDS_PATTERN.sub("", (text or "").lower())):
+        if token not in _STOPWORDS and len(token) <= _MAX_TERM_LENGTH:
+            tokens.append(token)
+    return tokens
+
+
+def term_counts(text: str) -> Counter[str]:
+    return Counter(tokenize(text))
+
+
+# ---------------------------------------------------------------------------
+# Per-document postings
+# ---------------------------------------------------------------------------
+
+
+@dataclass
+class DocumentPostings:
+    """Inverted index of one document's chunks, in CSR form over a sorted vocabulary."""
+
+    chunk_ids: np.ndarray
+    lengths: np.ndarray
+    terms: np.ndarray
+    indptr: np.ndarray
+    chunk_positions: np.ndarray
+    frequencies: np.ndarray
+
+    @classmethod
+    def from_counts(cls, chunk_ids: Sequence[int], counts: Sequence[Mapping[str, int]]) -> DocumentPostings:
+        """Build postings from one term counter per chunk (aligned with *chunk_ids*)."""
+        postings: dict[str, list[tuple[int, int]]] = {}
+        for position, counter in enumerate(counts):
+            for term, frequency in counter.items():
+                postings.setdefault(term, []).append((position, frequency))
+        terms = sorted(postings)
+        indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        flat = [entry for term in terms for entry in postings[term]]
+        indptr[1:] = np.cumsum([len(postings[term]) for term in terms])
+        return cls(
+            chunk_ids=np.asarray(chunk_ids, dtype=np.int64),
+            lengths=np.asarray([sum(counter.values()) for counter in counts], dtype=np.int32),
+            terms=np.asarray(terms, dtype=str),
+            indptr=indptr,
+            chunk_positions=np.asarray([position for position, _ in flat], dtype=np.int32),
+            frequencies=np.asarray([frequency for _, frequency in flat], dtype=np.int32),
+        )
+
+    @classmethod
+    def from_texts(cls, chunk_ids: Sequence[int], texts: Iterable[str]) -> DocumentPostings:
+        return cls.from_counts(chunk_ids, [term_counts(text) for text in texts])
+
+    @classmethod
+    def merge(cls, parts: Iterable[DocumentPostings]) -> DocumentPostings:
+        """Combine segments of one document; a chunk in several keeps its first postings."""
+        parts = list(parts)
+        if len(parts) == 1:
+            return parts[0]
+        seen: set[int] = set()
+        chunk_ids, lengths, terms, positions, frequencies = [], [], [], [], []
+        base = 0
+        for part in parts:
+            part_chunk_ids = part.chunk_ids.tolist()
+            keep = np.asarray([chunk_id not in seen for chunk_id in part_chunk_ids], dtype=bool)
+            seen.update(part_chunk_ids)
+            position_map = np.full(len(part_chunk_ids), -1, dtype=np.int64)
+            position_map[keep] = base + np.arange(int(keep.sum()))
+            base += int(keep.sum())
+            chunk_ids.append(part.chunk_ids[keep])
+            lengths.append(part.lengths[keep])
+            mapped = position_map[part.chunk_positions]
+            present = mapped >= 0
+            terms.append(np.repeat(part.terms, np.diff(part.indptr))[present])
+            positions.append(mapped[present])
+            frequencies.append(part.frequencies[present])
+        entry_terms = np.concatenate(terms) if terms else np.empty(0, dtype=str)
+        entry_positions = np.concatenate(positions) if positions else np.empty(0, dtype=np.int64)
+        order = np.lexsort((entry_positions, entry_terms))
+        vocabulary, term_sizes = np.unique(entry_terms[order], return_counts=True)
+        indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(term_sizes)
+        return cls(
+            chunk_ids=np.concatenate(chunk_ids).astype(np.int64),
+            lengths=np.concatenate(lengths).astype(np.int32),
+            terms=vocabulary.astype(str),
+            indptr=indptr,
+            chunk_positions=entry_positions[order].astype(np.int32),
+            frequencies=np.concatenate(frequencies)[order].astype(np.int32),
+        )
+
+    def to_bytes(self) -> bytes:
+        buffer = io.BytesIO()
+        np.savez_compressed(
+            buffer,
+            chunk_ids=self.chunk_ids,
+            lengths=self.lengths,
+            terms=self.terms,
+            indptr=self.indptr,
+            chunk_positions=self.chunk_positions,
+            frequencies=self.frequencies,
+        )
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> DocumentPostings:
+        with np.load(io.BytesIO(blob), allow_pickle=False) as data:
+            return cls(**{name: data[name] for name in data.files})
+
+
+# ---------------------------------------------------------------------------
+# Chat index and BM25 scoring
+# ---------------------------------------------------------------------------
+
+
+class ChatLexicalIndex:
+    """BM25 over the chunks of a ``ChatChunkIndex``; scores are aligned with its positions."""
+
+    def __init__(self, chunk_ids: np.ndarray, documents: Iterable[DocumentPostings]) -> None:
+        position_for_chunk = {int(chunk_id): position for position, chunk_id in enumerate(chunk_ids.tolist())}
+        self.size = len(position_for_chunk)
+        self.lengths = np.zeros(self.size, dtype=np.float32)
+        term_ids: dict[str, int] = {}
+        entry_terms: list[np.ndarray] = []
+        entry_positions: list[np.ndarray] = []
+        entry_frequencies: list[np.ndarray] = []
+        for document in documents:
+            positions = np.asarray(
+                [position_for_chunk.get(int(chunk_id), -1) for chunk_id in document.chunk_ids.tolist()],
+                dtype=np.int64,
+            )
+            present = positions >= 0
+            self.lengths[positions[present]] = document.lengths[present]
+            global_ids = np.asarray(
+                [term_ids.setdefault(str(term), len(term_ids)) for term in document.terms.tolist()], dtype=np.int64
+            )
+            per_entry_term = np.repeat(global_ids, np.diff(document.indptr))
+            mapped = positions[document.chunk_positions] if len(document.chunk_positions) else np.empty(0, np.int64)
+            keep = mapped >= 0
+            entry_terms.append(per_entry_term[keep])
+            entry_positions.append(mapped[keep])
+            entry_frequencies.append(document.frequencies[keep])
+
+        self.term_ids = term_ids
+        terms = np.concatenate(entry_terms) if entry_terms else np.empty(0, dtype=np.int64)
+        order = np.argsort(terms, kind="stable")
+        self.positions = (np.concatenate(entry_positions) if entry_positions else np.empty(0, np.int64))[order]
+        self.frequencies = (
+            np.concatenate(entry_frequencies) if entry_frequencies else np.empty(0, np.int32)
+        )[order].astype(np.float32)
+        self.indptr = np.zeros(len(term_ids) + 1, dtype=np.int64)
+        np.add.at(self.indptr, terms + 1, 1)
+        np.cumsum(self.indptr, out=self.indptr)
+        indexed = self.lengths > 0
+        self.average_length = float(self.lengths[indexed].mean()) if indexed.any() else 0.0
+        self.indexed_chunks = int(indexed.sum())
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.lengths.nbytes + self.positions.nbytes + self.frequencies.nbytes + self.indptr.nbytes)
+
+    def scores(self, query: str, k1: float = BM25_K1, b: float = BM25_B) -> np.ndarray:
+        """BM25 score of every chunk position for *query* (0 where no term matches)."""
+        scores = np.zeros(self.size, dtype=np.float32)
+        if not self.indexed_chunks:
+            return scores
+        normalizer = k1 * (1.0 - b + b * self.lengths / self.average_length)
+        for term in set(tokenize(query)):
+            term_id = self.term_ids.get(term)
+            if term_id is None:
+                continue
+            begin, end = self.indptr[term_id], self.indptr[term_id + 1]
+            positions = self.positions[begin:end]
+            frequencies = self.frequencies[begin:end]
+            document_frequency = end - begin
+            idf = np.log1p((self.indexed_chunks - document_frequency + 0.5) / (document_frequency + 0.5))
+            scores[positions] += idf * frequencies * (k1 + 1.0) / (frequencies + normalizer[positions])
+        return scores
+
+    def search(self, query: str, k: int) -> np.ndarray:
+        """Positions of the best *k* chunks with a positive score, best first."""
+        scores = self.scores(query)
+        matched = np.flatnonzero(scores > 0)
+        if not len(matched) or k <= 0:
+            return np.empty(0, dtype=np.int64)
+        order = np.argsort(-scores[matched], kind="stable")[:k]
+        return matched[order]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int, rank_constant: int = RRF_K) -> list[int]:
+    """Merge ranked position lists, scoring each position by ``sum(1 / (rank_constant + rank))``."""
+    fused: dict[int, float] = {}
+    for ranking in rankings:
+        for rank, position in enumerate(ranking, start=1):
+            fused[int(position)] = fused.get(int(position), 0.0) + 1.0 / (rank_constant + rank)
+    return sorted(fused, key=lambda position: -fused[position])[:k]
@@ -0,0 +1,148 @@
+"""Two-stage retrieval over quantized embedding codes.
+
+A 768-dimension float32 matrix costs 3 KB per chunk, which is too much to keep
+per chat for the largest tenants.  With ``EMBEDDING_QUANTIZATION`` set, the
+cached chat index holds only compact codes (see
+``database.embedding_encoding``):
+
+- ``int8``: ~0.77 KB per chunk; scores are the dot product with the
+  dequantized code.
+- ``binary``: 96 bytes per chunk; scores are ``dims - 2 * hamming`` against
+  the query's sign bits.
+
+A search over-fetches ``k * QUANTIZED_OVERSAMPLE`` candidates (at least
+``QUANTIZED_MIN_CANDIDATES``) with the codes, then loads the exact vectors of
+just those candidates and re-ranks them by true cosine similarity.  The
+benchmark in ``benchmarks/quantized_retrieval.py`` reports recall and latency
+against the exact path.
+"""
+
+from __future__ import annotations
+
+import os
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass
+
+import numpy as np
+from database.embedding_encoding import code_size, decode_int8_code, quantize_binary, quantize_int8
+
+from services.vector_search import normalize_rows
+
+QUANTIZED_OVERSAMPLE = int(os.getenv("QUANTIZED_OVERSAMPLE", "8"))
+QUANTIZED_MIN_CANDIDATES = int(os.getenv("QUANTIZED_MIN_CANDIDATES", "32"))
+# Rows scored per block, bounding the temporary float copy of int8 codes.
+_SCORE_BLOCK_ROWS = 8192
+_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+# numpy >= 2.0 has a vectorised popcount; older versions use the lookup table.
+_bitwise_count = getattr(np, "bitwise_count", None)
+
+VectorLoader = Callable[[np.ndarray], np.ndarray]
+
+
+@dataclass
+class QuantizedMatrix:
+    """Codes for every row of a chat matrix, in the same row order."""
+
+    scheme: str
+    dimensions: int
+    codes: np.ndarray
+    scales: np.ndarray
+
+    def __len__(self) -> int:
+        return int(self.codes.shape[0])
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.codes.nbytes + self.scales.nbytes)
+
+    @classmethod
+    def from_normalized(cls, normalized: np.ndarray, scheme: str) -> QuantizedMatrix:
+        """Quantize a row-normalised float matrix."""
+        normalized = np.asarray(normalized, dtype=np.float32)
+        dimensions = normalized.shape[1]
+        if scheme == "int8":
+            codes, scales = quantize_int8(normalized)
+            return cls(scheme, dimensions, codes, scales)
+        return cls(scheme, dimensions, quantize_binary(normalized), np.empty(0, dtype=np.float32))
+
+    @classmethod
+    def from_blobs(cls, blobs: Sequence[bytes], scheme: str, dimensions: int) -> QuantizedMatrix:
+        """Stack stored ``embedding_code`` blobs (all of *scheme*)."""
+        if scheme == "int8":
+            codes = np.empty((len(blobs), dimensions), dtype=np.int8)
+            scales = np.empty(len(blobs), dtype=np.float32)
+            for row, blob in enumerate(blobs):
+                codes[row], scales[row] = decode_int8_code(blob)
+            return cls(scheme, dimensions, codes, scales)
+        width = code_size(scheme, dimensions)
+        codes = np.frombuffer(b"".join(blobs), dtype=np.uint8).reshape(len(blobs), width)
+        return cls(scheme, dimensions, codes.copy(), np.empty(0, dtype=np.float32))
+
+    def scores(self, queries: np.ndarray) -> np.ndarray:
+        """Approximate similarity of every row to each query, ``(num_queries, rows)``."""
+        normalized = normalize_rows(queries)
+        result = np.empty((normalized.shape[0], len(self)), dtype=np.float32)
+        if self.scheme == "int8":
+            for begin in range(0, len(self), _SCORE_BLOCK_ROWS):
+                end = begin + _SCORE_BLOCK_ROWS
+                block = self.codes[begin:end].astype(np.float32) @ normalized.T
+                result[:, begin:end] = (block * self.scales[begin:end, np.newaxis]).T
+            return result
+        query_bits = quantize_binary(normalized)
+        for query_number, bits in enumerate(query_bits):
+            for begin in range(0, len(self), _SCORE_BLOCK_ROWS):
+                end = begin + _SCORE_BLOCK_ROWS
+                result[query_number, begin:end] = self.dimensions - 2 * _hamming(self.codes[begin:end], bits)
+        return result
+
+    def candidates(self, queries: np.ndarray, count: int) -> np.ndarray:
+        """Return the *count* best rows per query by approximate score, ``(num_queries, count)``."""
+        scores = self.scores(queries)
+        count = max(0, min(int(count), len(self)))
+        if count < len(self):
+            return np.argpartition(-scores, count - 1, axis=1)[:, :count]
+        return np.broadcast_to(np.arange(len(self)), (scores.shape[0], len(self))).copy()
+
+
+def _hamming(codes: np.ndarray, bits: np.ndarray) -> np.ndarray:
+    differing = np.bitwise_xor(codes, bits)
+    if _bitwise_count is not None:
+        return _bitwise_count(differing).sum(axis=1, dtype=np.int32)
+    return _POPCOUNT[differing].sum(axis=1, dtype=np.int32)
+
+
+def candidate_count(k: int, rows: int, oversample: int = QUANTIZED_OVERSAMPLE) -> int:
+    return min(rows, max(k * max(1, oversample), QUANTIZED_MIN_CANDIDATES, k))
+
+
+def two_stage_search(
+    query_vectors: np.ndarray,
+    quantized: QuantizedMatrix,
+    k: int,
+    load_vectors: VectorLoader,
+    oversample: int = QUANTIZED_OVERSAMPLE,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Over-fetch with *quantized* codes, then rank candidates by exact cosine.
+
+    *load_vectors* receives sorted row positions and returns their float
+    vectors in that order (one round trip for all queries).  Returns
+    ``(positions, similarities)`` shaped ``(num_queries, k)``, best first and
+    padded with ``-1`` / ``-inf`` when the chat has fewer than *k* chunks.
+    """
+    queries = normalize_rows(query_vectors)
+    k = max(0, int(k))
+    positions = np.full((queries.shape[0], k), -1, dtype=np.int64)
+    similarities = np.full((queries.shape[0], k), -np.inf, dtype=np.float32)
+    if not len(quantized) or k == 0:
+        return positions, similarities
+
+    candidates = quantized.candidates(queries, candidate_count(k, len(quantized), oversample))
+    union = np.unique(candidates)
+    exact = normalize_rows(load_vectors(union))
+    exact_scores = queries @ exact.T
+    for query_number, rows in enumerate(candidates):
+        scores = exact_scores[query_number, np.searchsorted(union, rows)]
+        order = np.argsort(-scores, kind="stable")[:k]
+        positions[query_number, : len(order)] = rows[order]
+        similarities[query_number, : len(order)] = scores[order]
+    return positions, similarities
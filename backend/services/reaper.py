@@ -0,0 +1,140 @@
+"""Background removal of deleted chats, documents and chunks.
+
+``delete_chat``, ``delete_doc`` and ``reset_uploaded_docs`` only set
+``deleted_at`` and every read path skips tombstoned rows, so a deletion
+returns immediately.  Re-ingestion tombstones replaced chunks the same way.
+This reaper removes what they leave behind:
+
+- tables are visited children first (answers citing reapable chunks,
+  chunks, embeddings no chunk references any more, documents, attachments,
+  messages, feedback, then chats) so no delete waits on a foreign key;
+- rows are deleted ``REAPER_BATCH_SIZE`` at a time in primary-key order,
+  with a ``REAPER_PAUSE_SECONDS`` sleep between batches, so locks stay short
+  and ingestion and retrieval keep their connections;
+- :class:`ReapStats` counts deleted rows per table and the rate; the last
+  pass is available from :func:`last_reap_stats`;
+- a reaped chat's ANN index and a reaped document's spreadsheet table
+  store are deleted with its rows.
+
+A failed batch is logged and retried on the next pass.  The API process
+runs a pass every ``REAPER_INTERVAL_SECONDS`` on a daemon thread unless
+``REAPER_ENABLED=false``, e.g. when a separate worker runs
+``python -m services.reaper`` instead.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+
+from database.db import REAPABLE_TABLES, delete_reaped_rows, get_reapable_ids
+
+from services import ann_index, table_store
+
+REAPER_BATCH_SIZE = int(os.getenv("REAPER_BATCH_SIZE", "500"))
+REAPER_PAUSE_SECONDS = float(os.getenv("REAPER_PAUSE_SECONDS", "0.2"))
+REAPER_INTERVAL_SECONDS = float(os.getenv("REAPER_INTERVAL_SECONDS", "60"))
+REAPER_ENABLED = os.getenv("REAPER_ENABLED", "true").lower() != "false"
+
+
+@dataclass
+class ReapStats:
+    deleted: dict[str, int] = field(default_factory=lambda: {table: 0 for table in REAPABLE_TABLES})
+    batches: int = 0
+    failures: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows(self) -> int:
+        return sum(self.deleted.values())
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+    def summary(self) -> str:
+        tables = ", ".join(f"{table} {count}" for table, count in self.deleted.items() if count)
+        return (
+            f"{self.rows} rows in {self.batches} batches ({tables or 'nothing to reap'}; "
+            f"{self.rows_per_second:.0f} rows/s, {self.failures} failed batches)"
+        )
+
+
+_last_stats: ReapStats | None = None
+
+
+def last_reap_stats() -> ReapStats | None:
+    """Stats of the most recently completed pass, or None before the first."""
+    return _last_stats
+
+
+def reap(
+    batch_size: int = REAPER_BATCH_SIZE,
+    pause_seconds: float = REAPER_PAUSE_SECONDS,
+    stop: threading.Event | None = None,
+    sleep: Callable[[float], None] = time.sleep,
+) -> ReapStats:
+    """Delete every reapable row once, one throttled primary-key batch at a time."""
+    global _last_stats
+    stats = ReapStats()
+    started = time.perf_counter()
+    for table in REAPABLE_TABLES:
+        after_id = 0
+        while stop is None or not stop.is_set():
+            ids = get_reapable_ids(table, after_id, batch_size)
+            if not ids:
+                break
+            try:
+                stats.deleted[table] += delete_reaped_rows(table, ids)
+            except Exception as err:
+                stats.failures += 1
+                print(f"[WARNING] Reaping {len(ids)} {table} rows after id {after_id} failed: {err}")
+            else:
+                if table == "chats":
+                    for chat_id in ids:
+                        ann_index.discard_chat_index(chat_id)
+                elif table == "documents":
+                    for document_id in ids:
+                        table_store.discard_document_tables(document_id)
+            stats.batches += 1
+            after_id = ids[-1]
+            if len(ids) < batch_size:
+                break
+            sleep(pause_seconds)
+    stats.seconds = time.perf_counter() - started
+    _last_stats = stats
+    return stats
+
+
+def start_background_reaper(
+    interval_seconds: float = REAPER_INTERVAL_SECONDS,
+) -> tuple[threading.Thread, threading.Event] | None:
+    """Reap every *interval_seconds* on a daemon thread unless ``REAPER_ENABLED`` is off.
+
+    Set the returned event to stop it.
+    """
+    if not REAPER_ENABLED:
+        return None
+    stop = threading.Event()
+
+    def run() -> None:
+        while not stop.is_set():
+            try:
+                stats = reap(stop=stop)
+                if stats.rows or stats.failures:
+                    print(f"Reaper: {stats.summary()}")
+            except Exception as err:
+                print(f"[ERROR] Reaper pass failed: {err}")
+            stop.wait(interval_seconds)
+
+    thread = threading.Thread(target=run, name="tombstone-reaper", daemon=True)
+    thread.start()
+    return thread, stop
+
+
+if __name__ == "__main__":
+    result = reap()
+    print(f"Reaped {result.summary()} in {result.seconds:.1f}s")
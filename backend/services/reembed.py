@@ -0,0 +1,166 @@
+"""Throttled migration of chats to a new embedding space.
+
+Changing ``EMBEDDING_MODEL`` or ``EMBEDDING_DIMENSIONS`` only affects new
+chats; existing chats keep being served from the space their chunks were
+embedded in.  This worker moves a chat (or every chat of a user) to a target
+space without a window where retrieval sees a mix:
+
+1. Chunks not in the target space are re-embedded
+   ``REEMBED_BATCH_SIZE`` at a time into ``chunk_embedding_staging``, with a
+   ``REEMBED_PAUSE_SECONDS`` sleep between batches.  Searches keep using the
+   old vectors meanwhile.
+2. ``swap_chat_embedding_space`` then replaces every chunk vector and the
+   chat's space in one transaction.
+3. Chunks ingested while the swap ran (in the old space) are hidden from
+   retrieval until the next pass picks them up; the worker repeats until
+   nothing is left.
+
+It is safe to stop and restart: staged vectors are kept.  Run it with
+``python -m services.reembed --chat-id 42`` or ``--user-email a@b.com``,
+optionally with ``--model``/``--dimensions`` (default: the configured space).
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from database.db import (
+    get_chunks_to_reembed,
+    retrieve_chats,
+    stage_chunk_embeddings,
+    swap_chat_embedding_space,
+)
+from database.embedding_encoding import EMBEDDING_ENCODING, encode_vector
+from database.embedding_space import DEFAULT_EMBEDDING_SPACE, EmbeddingSpace
+
+from services import ann_index
+
+REEMBED_BATCH_SIZE = int(os.getenv("REEMBED_BATCH_SIZE", "100"))
+REEMBED_PAUSE_SECONDS = float(os.getenv("REEMBED_PAUSE_SECONDS", "1.0"))
+# Passes per chat before giving up on chunks that keep arriving in the old space.
+REEMBED_MAX_PASSES = 5
+
+EmbedFn = Callable[[list[str], EmbeddingSpace], list[list[float]]]
+
+
+@dataclass
+class ReembedStats:
+    staged: int = 0
+    swapped: int = 0
+    batches: int = 0
+    passes: int = 0
+    seconds: float = 0.0
+    complete: bool = False
+
+
+def _embed_passages(texts: list[str], space: EmbeddingSpace) -> list[list[float]]:
+    from services.finance_gpt import _embed_passages_checked
+
+    return _embed_passages_checked(texts, space)
+
+
+def reembed_chat(
+    chat_id: int,
+    space: EmbeddingSpace = DEFAULT_EMBEDDING_SPACE,
+    batch_size: int = REEMBED_BATCH_SIZE,
+    pause_seconds: float = REEMBED_PAUSE_SECONDS,
+    embed: EmbedFn = _embed_passages,
+    stop: threading.Event | None = None,
+    sleep: Callable[[float], None] = time.sleep,
+) -> ReembedStats:
+    """Stage *space* vectors for every chunk of *chat_id*, then swap them in atomically."""
+    stats = ReembedStats()
+    started = time.perf_counter()
+    while stats.passes < REEMBED_MAX_PASSES and (stop is None or not stop.is_set()):
+        stats.passes += 1
+        after_id = 0
+        while stop is None or not stop.is_set():
+            rows = get_chunks_to_reembed(chat_id, space, after_id, batch_size)
+            if not rows:
+                break
+            embeddings = embed([row["chunk_text"] or "" for row in rows], space)
+            updates = [
+                (row["id"], encode_vector(embedding, EMBEDDING_ENCODING))
+                for row, embedding in zip(rows, embeddings, strict=True)
+            ]
+            stats.staged += stage_chunk_embeddings(chat_id, space, updates, EMBEDDING_ENCODING)
+            stats.batches += 1
+            after_id = rows[-1]["id"]
+            if len(rows) < batch_size:
+                break
+            sleep(pause_seconds)
+        if stop is not None and stop.is_set():
+            break
+        swapped = swap_chat_embedding_space(chat_id, space)
+        if swapped is not None:
+            stats.swapped += swapped
+            ann_index.discard_chat_index(chat_id)
+            if not get_chunks_to_reembed(chat_id, space, 0, 1):
+                stats.complete = True
+                break
+    stats.seconds = time.perf_counter() - started
+    return stats
+
+
+def reembed_user_chats(
+    user_email: str,
+    space: EmbeddingSpace = DEFAULT_EMBEDDING_SPACE,
+    stop: threading.Event | None = None,
+    **options,
+) -> dict[int, ReembedStats]:
+    """Migrate every chat owned by *user_email* to *space*, one chat at a time."""
+    results = {}
+    for chat in retrieve_chats(user_email):
+        if stop is not None and stop.is_set():
+            break
+        results[chat["id"]] = reembed_chat(chat["id"], space, stop=stop, **options)
+    return results
+
+
+def start_background_reembed(
+    chat_id: int | None = None,
+    user_email: str | None = None,
+    space: EmbeddingSpace = DEFAULT_EMBEDDING_SPACE,
+) -> tuple[threading.Thread, threading.Event]:
+    """Run a chat or user migration on a daemon thread; set the returned event to stop it."""
+    stop = threading.Event()
+
+    def run() -> None:
+        try:
+            if chat_id is not None:
+                results = {chat_id: reembed_chat(chat_id, space, stop=stop)}
+            else:
+                results = reembed_user_chats(user_email, space, stop=stop)
+            for migrated_chat, stats in results.items():
+                print(
+                    f"Re-embedded chat {migrated_chat} into {space}: {stats.swapped} chunks swapped, "
+                    f"complete={stats.complete} ({stats.seconds:.1f}s)"
+                )
+        except Exception as err:
+            print(f"[ERROR] Re-embedding into {space} failed: {err}")
+
+    thread = threading.Thread(target=run, name="embedding-reembed", daemon=True)
+    thread.start()
+    return thread, stop
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move chats to a new embedding model/dimension.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--chat-id", type=int)
+    target.add_argument("--user-email")
+    parser.add_argument("--model", default=DEFAULT_EMBEDDING_SPACE.model)
+    parser.add_argument("--dimensions", type=int, default=DEFAULT_EMBEDDING_SPACE.dimensions)
+    args = parser.parse_args()
+    target_space = EmbeddingSpace(args.model, args.dimensions)
+    if args.chat_id is not None:
+        outcome = {args.chat_id: reembed_chat(args.chat_id, target_space)}
+    else:
+        outcome = reembed_user_chats(args.user_email, target_space)
+    for migrated, result in outcome.items():
+        print(f"chat {migrated}: staged {result.staged}, swapped {result.swapped}, complete={result.complete}")
@@ -0,0 +1,212 @@
+"""Per-document SQLite copies of uploaded spreadsheets for filter/aggregate questions.
+
+Embedding every row of a large CSV finds rows that look like the question,
+but it cannot sum a column or count the rows matching a filter.  While a
+spreadsheet is streamed into row-group chunks (``services.tabular_service``)
+its rows are also written to ``TABLE_STORE_DIR/document_<id>.sqlite``:
+
+- one table per sheet (``data`` for CSV/TSV), with column names taken from
+  the header row and made SQL-safe;
+- values are typed as they are written (integers, decimals, text, ``NULL``
+  for empty cells) so ``SUM``/``AVG``/comparisons work; numbers with
+  leading zeros such as ZIP codes stay text;
+- the file is written under a temporary name and renamed when complete, so
+  readers never see a half-written store and re-uploads replace it whole.
+
+:func:`describe_tables` and :func:`query_tables` back the agent's
+``table_query`` tool.  Queries run on a read-only connection that only
+authorises ``SELECT`` and are cut off after ``TABLE_QUERY_TIMEOUT_SECONDS``
+and ``TABLE_QUERY_MAX_ROWS`` rows.  :func:`discard_document_tables` is
+called by the reaper when a document is removed.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import sqlite3
+import time
+import uuid
+from collections.abc import Iterable, Sequence
+from typing import Any
+
+TABLE_STORE_DIR = os.getenv(
+    "TABLE_STORE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "database", "table_stores"),
+)
+TABLE_QUERY_MAX_ROWS = int(os.getenv("TABLE_QUERY_MAX_ROWS", "200"))
+TABLE_QUERY_TIMEOUT_SECONDS = float(os.getenv("TABLE_QUERY_TIMEOUT_SECONDS", "5"))
+
+_INTEGER = re.compile(r"[+-]?(0|[1-9][0-9]*)")
+_DECIMAL = re.compile(r"[+-]?(0|[1-9][0-9]*)?\.[0-9]+([eE][+-]?[0-9]+)?")
+_ALLOWED_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION}
+_PROGRESS_STEPS = 10_000
+
+
+def store_path(document_id: int) -> str:
+    return os.path.join(TABLE_STORE_DIR, f"document_{int(document_id)}.sqlite")
+
+
+def has_tables(document_id: int) -> bool:
+    return os.path.exists(store_path(document_id))
+
+
+def discard_document_tables(document_id: int) -> None:
+    """Delete the table store of *document_id*, if any."""
+    try:
+        os.remove(store_path(document_id))
+    except FileNotFoundError:
+        pass
+
+
+def sql_identifier(name: Any, taken: set[str], fallback: str) -> str:
+    """Lower-case, underscore-separated version of *name* not already in *taken*."""
+    identifier = re.sub(r"[^0-9a-zA-Z]+", "_", str(name or "")).strip("_").lower() or fallback
+    if identifier[0].isdigit():
+        identifier = f"_{identifier}"
+    candidate, suffix = identifier, 2
+    while candidate in taken:
+        candidate, suffix = f"{identifier}_{suffix}", suffix + 1
+    taken.add(candidate)
+    return candidate
+
+
+def typed_value(value: Any) -> Any:
+    """Convert a cell to the value stored for it: int, float, text or None."""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    text = str(value).strip()
+    if not text:
+        return None
+    plain = text.replace(",", "") if re.fullmatch(r"[+-]?[0-9]{1,3}(,[0-9]{3})+(\.[0-9]+)?", text) else text
+    if _INTEGER.fullmatch(plain):
+        return int(plain)
+    if _DECIMAL.fullmatch(plain):
+        return float(plain)
+    return text
+
+
+class TableWriter:
+    """Writes the sheets of one document to its SQLite store.
+
+    Use as a context manager: the store replaces any previous one only when
+    the block exits without an exception.  Rows may be added from another
+    thread than the one that opened the writer (the ingestion pipeline
+    extracts on its own thread), but not from two threads at once.
+    """
+
+    def __init__(self, document_id: int) -> None:
+        self.document_id = int(document_id)
+        self._path = store_path(document_id)
+        self._tmp_path = f"{self._path}.{uuid.uuid4().hex}.tmp"
+        self._connection: sqlite3.Connection | None = None
+        self._tables: set[str] = set()
+        self._insert = ""
+        self._width = 0
+        self.rows = 0
+
+    def __enter__(self) -> TableWriter:
+        os.makedirs(TABLE_STORE_DIR, exist_ok=True)
+        self._connection = sqlite3.connect(self._tmp_path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode = OFF")
+        self._connection.execute("PRAGMA synchronous = OFF")
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            if exc_type is None:
+                connection.commit()
+            connection.close()
+        if exc_type is None and self._tables:
+            os.replace(self._tmp_path, self._path)
+        elif os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+    def start_table(self, name: Any, header: Sequence[Any]) -> str:
+        """Create a table for a sheet with *header*; returns its SQL name."""
+        assert self._connection is not None, "TableWriter used outside its context"
+        table = sql_identifier(name, self._tables, "data")
+        taken: set[str] = set()
+        columns = [sql_identifier(column, taken, f"column_{index + 1}") for index, column in enumerate(header)]
+        quoted = ", ".join(f'"{column}"' for column in columns)
+        self._connection.execute(f'CREATE TABLE "{table}" ({quoted})')
+        self._insert = f'INSERT INTO "{table}" ({quoted}) VALUES ({", ".join("?" * len(columns))})'
+        self._width = len(columns)
+        return table
+
+    def add_rows(self, rows: Iterable[Sequence[Any]]) -> None:
+        """Append *rows* to the current table, padding or trimming them to the header."""
+        assert self._connection is not None and self._insert, "start_table() must come first"
+        width = self._width
+        values = [
+            [typed_value(value) for value in list(row[:width]) + [None] * (width - len(row))] for row in rows
+        ]
+        self._connection.executemany(self._insert, values)
+        self.rows += len(values)
+
+
+def _read_only(document_id: int) -> sqlite3.Connection:
+    path = store_path(document_id)
+    if not os.path.exists(path):
+        raise LookupError(f"Document {document_id} has no table store")
+    return sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+
+
+def describe_tables(document_id: int) -> list[dict[str, Any]]:
+    """Return ``[{"table", "columns": [(name, type)], "rows"}]`` for *document_id*."""
+    connection = _read_only(document_id)
+    try:
+        tables = [row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        described = []
+        for table in tables:
+            columns = [row[1] for row in connection.execute(f'PRAGMA table_info("{table}")')]
+            row_count = connection.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+            types = []
+            for column in columns:
+                kinds = {
+                    kind for (kind,) in connection.execute(
+                        f'SELECT DISTINCT typeof("{column}") FROM (SELECT "{column}" FROM "{table}" LIMIT 1000)'
+                    )
+                } - {"null"}
+                types.append("number" if kinds and kinds <= {"integer", "real"} else "text")
+            described.append({"table": table, "columns": list(zip(columns, types, strict=True)), "rows": row_count})
+        return described
+    finally:
+        connection.close()
+
+
+def query_tables(
+    document_id: int,
+    sql: str,
+    max_rows: int = TABLE_QUERY_MAX_ROWS,
+    timeout_seconds: float = TABLE_QUERY_TIMEOUT_SECONDS,
+) -> tuple[list[str], list[tuple[Any, ...]], bool]:
+    """Run one read-only ``SELECT`` against *document_id*'s tables.
+
+    Returns ``(columns, rows, truncated)``.  Raises ValueError for anything
+    that is not a single SELECT or that runs past *timeout_seconds*.
+    """
+    statement = sql.strip().rstrip(";").strip()
+    if not statement or not sqlite3.complete_statement(statement + ";") or ";" in statement:
+        raise ValueError("Provide exactly one SELECT statement")
+
+    connection = _read_only(document_id)
+    deadline = time.monotonic() + timeout_seconds
+    connection.set_authorizer(
+        lambda action, *args: sqlite3.SQLITE_OK if action in _ALLOWED_ACTIONS else sqlite3.SQLITE_DENY
+    )
+    connection.set_progress_handler(lambda: int(time.monotonic() > deadline), _PROGRESS_STEPS)
+    try:
+        cursor = connection.execute(statement)
+        rows = cursor.fetchmany(max_rows + 1)
+        columns = [description[0] for description in cursor.description or ()]
+    except sqlite3.DatabaseError as err:
+        if time.monotonic() > deadline:
+            raise ValueError(f"Query took longer than {timeout_seconds:g}s") from err
+        raise ValueError(str(err)) from err
+    finally:
+        connection.close()
+    return columns, rows[:max_rows], len(rows) > max_rows
@@ -2,8 +2,16 @@
 
 Tika extracts spreadsheet data as a flat whitespace-separated dump that loses
 all column/row structure — making the data nearly unsearchable.  This service
-reads spreadsheets natively and converts each sheet into a Markdown table so
-that the column headers, values, and relationships are preserved in the index.
+reads spreadsheets natively and streams each sheet as row groups: every group
+is a small Markdown table that repeats the column header, sized to fit one
+chunk, so each embedded chunk is a self-describing slice of the table.
+Rows are never all held in memory: CSV/TSV are read through ``csv.reader``
+on the raw bytes and XLSX through openpyxl's read-only mode.
+
+When a :class:`services.table_store.TableWriter` is passed, the same pass
+writes every row to the document's SQLite store so filter and aggregate
+questions can be answered with a query (the ``table_query`` agent tool)
+instead of from embedded rows.
 
 Supported formats
 -----------------
@@ -13,23 +21,61 @@ Supported formats
 - XLS  (application/vnd.ms-excel)
 - ODS  (application/vnd.oasis.opendocument.spreadsheet)
 
-Dependencies: ``openpyxl`` (already in most ML stacks) for XLSX/ODS,
-``xlrd`` for legacy XLS.  Both are lightweight; CSV/TSV uses stdlib only.
+Dependencies: ``openpyxl`` for XLSX, ``pandas`` with ``xlrd``/``odfpy`` for
+legacy XLS and ODS (read a sheet at a time).  CSV/TSV uses stdlib only.
 """
+import codecs
 import csv
 import io
-from typing import Optional
+from collections.abc import Iterable, Iterator
+from typing import Any, Optional
+
+from services.table_store import TableWriter
 
-# Maximum rows rendered into Markdown per sheet.  Beyond this we summarise.
-_MAX_ROWS_FULL = 500
-# Maximum columns rendered per sheet (very wide sheets become unreadable).
+# Maximum columns rendered per row group (very wide sheets become unreadable).
+# The table store keeps every column.
 _MAX_COLS = 50
+# Characters per row group when no chunk size is given
+DEFAULT_ROW_GROUP_CHARS = 1000
+_DECODE_BLOCK = 1 << 20
+
+TABULAR_EXTENSIONS = ("csv", "tsv", "xls", "xlsx", "ods")
+_MIME_KINDS = {
+    "text/csv": "csv",
+    "text/tab-separated-values": "tsv",
+    "application/vnd.ms-excel": "xls",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": "xlsx",
+    "application/vnd.oasis.opendocument.spreadsheet": "ods",
+}
+
+Segment = tuple[str, Optional[int]]
 
 
 # ---------------------------------------------------------------------------
 # Public API
 # ---------------------------------------------------------------------------
 
+def is_tabular_file(filename: str, mime_type: str = "") -> bool:
+    return _file_kind(filename, mime_type) is not None
+
+
+def iter_tabular_segments(
+    file_bytes: bytes,
+    filename: str,
+    mime_type: str = "text/csv",
+    max_chunk_chars: int = DEFAULT_ROW_GROUP_CHARS,
+    tables: Optional[TableWriter] = None,
+) -> Iterator[Segment]:
+    """Yield ``(markdown, None)`` row-group segments of every sheet, in order.
+
+    Each segment fits in *max_chunk_chars* (unless a single row is longer)
+    so the chunker keeps it whole.  Rows are also written to *tables* when
+    given.  Raises on unreadable files.
+    """
+    for sheet_name, rows in _iter_sheets(file_bytes, filename, mime_type):
+        yield from _iter_row_groups(filename, sheet_name, rows, max_chunk_chars, tables)
+
+
 def ingest_tabular(
     file_bytes: bytes,
     filename: str,
@@ -37,147 +83,153 @@ def ingest_tabular(
 ) -> str:
     """Parse tabular data and return a structured Markdown document.
 
-    The document is suitable for direct storage as ``document_text`` and
-    feeding into the chunking + embedding pipeline.
+    The document is the concatenation of :func:`iter_tabular_segments` and
+    is suitable for direct storage as ``document_text`` and feeding into the
+    chunking + embedding pipeline.
 
     Returns a plain string; never raises so the document record is always
     created even on parse failure.
     """
-    ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
-
     try:
-        if ext in ("csv",) or mime_type == "text/csv":
-            return _ingest_delimited(file_bytes, filename, delimiter=",")
-        if ext in ("tsv",) or mime_type == "text/tab-separated-values":
-            return _ingest_delimited(file_bytes, filename, delimiter="\t")
-        if ext in ("xlsx", "ods") or "spreadsheetml" in mime_type or "opendocument.spreadsheet" in mime_type:
-            return _ingest_excel(file_bytes, filename, engine="openpyxl")
-        if ext == "xls" or mime_type == "application/vnd.ms-excel":
-            return _ingest_excel(file_bytes, filename, engine="xlrd")
-        # Fallback: try CSV
-        return _ingest_delimited(file_bytes, filename, delimiter=",")
+        return "".join(text for text, _ in iter_tabular_segments(file_bytes, filename, mime_type))
     except Exception as exc:
         return f"[Tabular parsing failed for '{filename}': {exc}]"
 
 
+def _file_kind(filename: str, mime_type: str) -> Optional[str]:
+    ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    return ext if ext in TABULAR_EXTENSIONS else _MIME_KINDS.get(mime_type)
+
+
+def _iter_sheets(file_bytes: bytes, filename: str, mime_type: str) -> Iterator[tuple[Optional[str], Iterable[Any]]]:
+    kind = _file_kind(filename, mime_type)
+    if kind == "tsv":
+        return _iter_delimited(file_bytes, delimiter="\t")
+    if kind == "xlsx":
+        return _iter_xlsx(file_bytes)
+    if kind == "ods":
+        return _iter_pandas(file_bytes, engine="odf")
+    if kind == "xls":
+        return _iter_pandas(file_bytes, engine="xlrd")
+    # CSV, and the fallback for anything else
+    return _iter_delimited(file_bytes, delimiter=",")
+
+
 # ---------------------------------------------------------------------------
 # Delimited (CSV / TSV)
 # ---------------------------------------------------------------------------
 
-def _ingest_delimited(file_bytes: bytes, filename: str, delimiter: str) -> str:
-    text = _decode(file_bytes)
-    reader = csv.reader(io.StringIO(text), delimiter=delimiter)
-    rows = list(reader)
-    if not rows:
-        return f"['{filename}' appears to be empty.]"
-
-    return _format_sheet(filename, rows, sheet_name=None)
+def _iter_delimited(file_bytes: bytes, delimiter: str) -> Iterator[tuple[Optional[str], Iterable[Any]]]:
+    stream = io.TextIOWrapper(io.BytesIO(file_bytes), encoding=_encoding(file_bytes), newline="")
+    yield None, csv.reader(stream, delimiter=delimiter)
 
 
 # ---------------------------------------------------------------------------
 # Excel (XLSX / XLS / ODS)
 # ---------------------------------------------------------------------------
 
-def _ingest_excel(file_bytes: bytes, filename: str, engine: str) -> str:
+def _iter_xlsx(file_bytes: bytes) -> Iterator[tuple[Optional[str], Iterable[Any]]]:
     try:
-        import openpyxl  # noqa: F401 — presence check for xlsx/ods
-    except ImportError:
-        return (
-            "[openpyxl is not installed. "
-            "Run `pip install openpyxl` to enable Excel ingestion.]"
-        )
+        import openpyxl
+    except ImportError as exc:
+        raise ImportError("openpyxl is not installed. Run `pip install openpyxl` to enable Excel ingestion.") from exc
 
+    workbook = openpyxl.load_workbook(io.BytesIO(file_bytes), read_only=True, data_only=True)
     try:
-        import pandas as pd
-    except ImportError:
-        return (
-            "[pandas is not installed. "
-            "Run `pip install pandas openpyxl` to enable Excel ingestion.]"
-        )
+        for worksheet in workbook.worksheets:
+            yield str(worksheet.title), worksheet.iter_rows(values_only=True)
+    finally:
+        workbook.close()
 
-    buf = io.BytesIO(file_bytes)
-    sections: list[str] = [f"# Spreadsheet: {filename}\n"]
 
+def _iter_pandas(file_bytes: bytes, engine: str) -> Iterator[tuple[Optional[str], Iterable[Any]]]:
     try:
-        xf = pd.ExcelFile(buf, engine=engine)
-    except Exception as exc:
-        return f"[Failed to open '{filename}': {exc}]"
+        import pandas as pd
+    except ImportError as exc:
+        raise ImportError("pandas is not installed. Run `pip install pandas` to enable Excel ingestion.") from exc
 
+    xf = pd.ExcelFile(io.BytesIO(file_bytes), engine=engine)
     for sheet_name in xf.sheet_names:
-        df = xf.parse(sheet_name, header=None, dtype=str)
-        df = df.fillna("")
-        rows = [list(r) for r in df.itertuples(index=False, name=None)]
-        sections.append(_format_sheet(filename, rows, sheet_name=str(sheet_name)))
-
-    return "\n\n".join(sections)
+        df = xf.parse(sheet_name, header=None, dtype=str).fillna("")
+        yield str(sheet_name), df.itertuples(index=False, name=None)
 
 
 # ---------------------------------------------------------------------------
-# Shared formatting helpers
+# Row groups
 # ---------------------------------------------------------------------------
 
-def _format_sheet(
+def _iter_row_groups(
     filename: str,
-    rows: list[list],
     sheet_name: Optional[str],
-) -> str:
-    if not rows:
-        label = f"Sheet '{sheet_name}'" if sheet_name else filename
-        return f"[{label} is empty.]"
-
-    # Truncate very wide tables
-    if len(rows[0]) > _MAX_COLS:
-        rows = [r[:_MAX_COLS] + ["…"] for r in rows]
-
-    header_row = rows[0]
-    data_rows = rows[1:]
-
-    total_rows = len(data_rows)
-    truncated = total_rows > _MAX_ROWS_FULL
-    display_rows = data_rows[:_MAX_ROWS_FULL]
-
-    lines: list[str] = []
-
-    if sheet_name:
-        lines.append(f"## Sheet: {sheet_name}")
-        lines.append(
-            f"*{total_rows} data row(s), {len(header_row)} column(s)"
-            + (" — showing first 500 rows" if truncated else "") + "*\n"
-        )
-
-    # Markdown table
-    lines.append(_md_table(header_row, display_rows))
-
-    if truncated:
-        lines.append(
-            f"\n*…{total_rows - _MAX_ROWS_FULL} additional rows not shown. "
-            "The full data is embedded in the index.*"
-        )
-        # Also append all remaining rows as plain CSV so they are indexed
-        # (they won't display nicely but will be found by semantic search).
-        lines.append("\n### Full data (indexed)\n```")
-        for r in data_rows[_MAX_ROWS_FULL:]:
-            lines.append(",".join(str(c) for c in r))
-        lines.append("```")
-
-    return "\n".join(lines)
-
-
-def _md_table(headers: list, rows: list[list]) -> str:
-    """Render a list of rows as a Markdown table."""
-    col_count = max(len(headers), max((len(r) for r in rows), default=0))
-
-    def pad(row: list, n: int) -> list:
-        return list(row) + [""] * (n - len(row))
-
-    h = pad(headers, col_count)
-    header_line = "| " + " | ".join(str(c) for c in h) + " |"
-    sep_line = "| " + " | ".join("---" for _ in h) + " |"
-    data_lines = [
-        "| " + " | ".join(str(c) for c in pad(r, col_count)) + " |"
-        for r in rows
-    ]
-    return "\n".join([header_line, sep_line] + data_lines)
+    rows: Iterable[Any],
+    max_chunk_chars: int,
+    tables: Optional[TableWriter],
+) -> Iterator[Segment]:
+    label = f"{filename} / sheet {sheet_name}" if sheet_name else filename
+    rows = iter(rows)
+    header = next((list(row) for row in rows if not _is_blank(row)), None)
+    if header is None:
+        yield f"[{label} is empty.]\n\n", None
+        return
+
+    if tables is not None:
+        tables.start_table(sheet_name or "data", header)
+    width = len(header)
+    shown = header[:_MAX_COLS] + (["…"] if width > _MAX_COLS else [])
+    table_head = _md_row(shown) + "| " + " | ".join("---" for _ in shown) + " |\n"
+
+    group: list[str] = []
+    raw_group: list[list] = []
+    group_chars = 0
+    first_row = row_number = 0
+    for row in rows:
+        if _is_blank(row):
+            continue
+        row = list(row)
+        row_number += 1
+        cells = row[:_MAX_COLS] + [""] * (min(width, _MAX_COLS) - len(row))
+        line = _md_row(cells + (["…"] if width > _MAX_COLS else []))
+        title = f"### {label} — rows {first_row or row_number}-{row_number}\n"
+        if group and len(title) + len(table_head) + group_chars + len(line) > max_chunk_chars:
+            yield _flush(label, first_row, row_number - 1, table_head, group, raw_group, tables)
+            group, raw_group, group_chars = [], [], 0
+        if not group:
+            first_row = row_number
+        group.append(line)
+        raw_group.append(row)
+        group_chars += len(line)
+    if group:
+        yield _flush(label, first_row, row_number, table_head, group, raw_group, tables)
+    elif row_number == 0:
+        yield f"### {label}\n{table_head}\n", None
+
+
+def _flush(
+    label: str,
+    first_row: int,
+    last_row: int,
+    table_head: str,
+    lines: list[str],
+    raw_rows: list[list],
+    tables: Optional[TableWriter],
+) -> Segment:
+    if tables is not None:
+        tables.add_rows(raw_rows)
+    return f"### {label} — rows {first_row}-{last_row}\n{table_head}{''.join(lines)}\n", None
+
+
+def _md_row(cells: list) -> str:
+    return "| " + " | ".join(_cell(cell) for cell in cells) + " |\n"
+
+
+def _cell(value: Any) -> str:
+    if value is None:
+        return ""
+    return " ".join(str(value).split()).replace("|", "\\|")
+
+
+def _is_blank(row: Any) -> bool:
+    return all(cell is None or str(cell).strip() == "" for cell in row)
 
 
 # ---------------------------------------------------------------------------
@@ -204,3 +256,15 @@ def _decode(b: bytes) -> str:
         return b.decode("utf-8")
     except UnicodeDecodeError:
         return b.decode("latin-1")
+
+
+def _encoding(b: bytes) -> str:
+    """``utf-8-sig`` when *b* is valid UTF-8, else ``latin-1``, checked a block at a time."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        for offset in range(0, len(b), _DECODE_BLOCK):
+            decoder.decode(b[offset:offset + _DECODE_BLOCK])
+        decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        return "latin-1"
+    return "utf-8-sig"
@@ -0,0 +1,67 @@
+"""Exact cosine top-k search over dense embedding matrices.
+
+The retrieval paths only ever use the first *k* neighbours, so instead of a
+full ``argsort`` over every chunk this module selects the winners with
+``np.argpartition`` and sorts just those *k* rows.  Document matrices are
+expected to be row-normalised once up front (see :func:`normalize_rows`) and
+any number of query vectors can be scored with a single matrix multiply.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+_EPSILON = 1e-8
+
+
+def normalize_rows(matrix: np.ndarray, norms: np.ndarray | None = None) -> np.ndarray:
+    """Return a contiguous float32 copy of *matrix* with unit-length rows.
+
+    Zero rows stay zero.  Pass precomputed *norms* to skip recomputing them.
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[np.newaxis, :]
+    if norms is None:
+        norms = np.linalg.norm(matrix, axis=1)
+    norms = np.where(norms == 0, _EPSILON, norms).astype(np.float32)
+    return np.ascontiguousarray(matrix / norms[:, np.newaxis])
+
+
+def top_k_cosine(
+    query_vectors: np.ndarray,
+    normalized_matrix: np.ndarray,
+    k: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Return the *k* most similar rows of *normalized_matrix* for each query.
+
+    *query_vectors* may be a single vector or a ``(num_queries, dims)`` batch;
+    queries are normalised here.  Returns ``(indices, similarities)``, both of
+    shape ``(num_queries, min(k, num_rows))`` and ordered best first.
+    """
+    queries = np.asarray(query_vectors, dtype=np.float32)
+    if queries.ndim == 1:
+        queries = queries[np.newaxis, :]
+    if normalized_matrix.ndim == 1:
+        normalized_matrix = normalized_matrix[np.newaxis, :]
+    if queries.shape[1] != normalized_matrix.shape[1]:
+        raise ValueError(
+            f"Dimension mismatch: query has {queries.shape[1]} dims, "
+            f"documents have {normalized_matrix.shape[1]} dims"
+        )
+
+    num_rows = normalized_matrix.shape[0]
+    k = max(0, min(int(k), num_rows))
+    if k == 0:
+        empty = np.empty((queries.shape[0], 0))
+        return empty.astype(np.int64), empty.astype(np.float32)
+
+    similarities = normalize_rows(queries) @ normalized_matrix.T
+    if k < num_rows:
+        candidates = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(num_rows), (queries.shape[0], num_rows))
+    candidate_scores = np.take_along_axis(similarities, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1, kind="stable")
+    indices = np.take_along_axis(candidates, order, axis=1)
+    return indices.astype(np.int64), np.take_along_axis(candidate_scores, order, axis=1)
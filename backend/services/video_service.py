@@ -2,32 +2,73 @@
 
 Pipeline for an uploaded video document:
   1. Write bytes to a secure temp file.
-  2. Use ffmpeg to extract one JPEG frame every ``VIDEO_FRAME_INTERVAL_SECS``
-     seconds (capped at ``VIDEO_MAX_FRAMES`` frames).
-  3. Call ``describe_image()`` (vision_service) on each frame and tag the
-     description with a timestamp.
-  4. Extract the audio track with ffmpeg and call ``transcribe_audio()``
-     (audio_service) on it via Whisper.
-  5. Interleave frame descriptions and transcript segments into a single
-     structured document that is stored as ``document_text`` and fed into the
-     normal chunking + embedding pipeline.
+  2. Start extracting the audio track with ffmpeg and transcribing it with
+     ``transcribe_audio()`` (audio_service) on a background thread.
+  3. Meanwhile, one ffmpeg pass picks frames by scene change (score above
+     ``VIDEO_SCENE_THRESHOLD``, plus the first frame and at least one frame
+     every ``VIDEO_FRAME_INTERVAL_SECS``), writes them as JPEGs and emits a
+     9x8 grayscale thumbnail of each for a 64-bit difference hash.
+  4. Frames within ``VIDEO_FRAME_DEDUP_DISTANCE`` bits of an already kept
+     frame are dropped, the rest are thinned evenly to ``VIDEO_MAX_FRAMES``,
+     and ``describe_image()`` (vision_service) runs on them
+     ``VIDEO_VISION_CONCURRENCY`` at a time.
+  5. Frame descriptions (in timestamp order) and the transcript are combined
+     into a single structured document that is stored as ``document_text``
+     and fed into the normal chunking + embedding pipeline.
+
+Each video logs a :class:`VideoStats` line with frame counts and the time
+spent on frames, vision calls and audio.
 
 Requires: ffmpeg on PATH.  If ffmpeg is unavailable the service falls back
 gracefully, returning a placeholder string so the document record is still
 created.
 """
-import io
 import os
+import re
 import shutil
 import subprocess
 import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import NamedTuple, Optional
 
 from agents.config import AgentConfig
 from services.audio_service import transcribe_audio
 from services.vision_service import describe_image
 
+# Frames considered before deduplication, as a multiple of VIDEO_MAX_FRAMES
+_CANDIDATE_FACTOR = 4
+_HASH_WIDTH, _HASH_HEIGHT = 9, 8
+_PTS_TIME = re.compile(r"pts_time:\s*(-?[0-9.]+)")
+
+
+class Frame(NamedTuple):
+    timestamp: float
+    path: str
+    phash: int
+
+
+@dataclass
+class VideoStats:
+    candidates: int = 0
+    duplicates: int = 0
+    described: int = 0
+    frames_seconds: float = 0.0
+    vision_seconds: float = 0.0
+    audio_seconds: float = 0.0
+    seconds: float = 0.0
+
+    def summary(self) -> str:
+        return (
+            f"{self.described} frames described ({self.candidates} scene frames, "
+            f"{self.duplicates} near-duplicates dropped) in {self.seconds:.1f}s; "
+            f"frames {self.frames_seconds:.1f}s, vision {self.vision_seconds:.1f}s, "
+            f"audio {self.audio_seconds:.1f}s"
+        )
+
+
 # ffmpeg probe / frame-extraction helpers ----------------------------------------
 
 
@@ -52,24 +93,69 @@ def _get_duration(video_path: str) -> Optional[float]:
         return None
 
 
-def _extract_frames(video_path: str, output_dir: str, interval: int, max_frames: int) -> list[tuple[float, str]]:
-    """Extract one JPEG frame every *interval* seconds into *output_dir*.
+def _dhash(thumbnail: bytes) -> int:
+    """64-bit difference hash of a 9x8 grayscale thumbnail: one bit per horizontal gradient."""
+    value = 0
+    for row in range(_HASH_HEIGHT):
+        pixels = thumbnail[row * _HASH_WIDTH:(row + 1) * _HASH_WIDTH]
+        for left, right in zip(pixels[:-1], pixels[1:], strict=True):
+            value = (value << 1) | (right > left)
+    return value
+
+
+def _candidate_spacing(duration: Optional[float], interval: float, max_candidates: int) -> tuple[float, float]:
+    """Return ``(min_gap, interval)`` spacing at most *max_candidates* frames over *duration* seconds.
 
-    Returns a list of (timestamp_secs, frame_path) tuples, capped at *max_frames*.
+    Scene changes closer than *min_gap* to the previous selected frame are
+    skipped and the interval fallback is widened to at least *min_gap*, so
+    the candidates cover the whole video instead of running out in a
+    fast-cutting opening.  Without a duration, no gap is enforced.
     """
-    # Build a select filter: pick one frame per interval second
-    select_expr = f"not(mod(t,{interval}))"
+    if not duration or duration <= 0:
+        return 0.0, float(interval)
+    min_gap = duration / max(1, max_candidates)
+    return min_gap, max(float(interval), min_gap)
+
+
+def _extract_frames(
+    video_path: str,
+    output_dir: str,
+    interval: float,
+    max_frames: int,
+    scene_threshold: float,
+    min_gap: float = 0.0,
+) -> list[Frame]:
+    """Extract scene-change frames into *output_dir* in one ffmpeg pass.
+
+    The first frame, every frame whose scene score exceeds *scene_threshold*
+    at least *min_gap* seconds after the previous selected frame, and a frame
+    after each *interval* seconds without one are selected, up to
+    *max_frames*.  Returns them in order with their timestamps and hashes.
+    """
+    select_expr = (
+        f"eq(n,0)+gt(scene,{scene_threshold})*gte(t-prev_selected_t,{min_gap:.3f})"
+        f"+gte(t-prev_selected_t,{interval:g})"
+    )
     frame_pattern = os.path.join(output_dir, "frame_%04d.jpg")
+    hash_path = os.path.join(output_dir, "thumbnails.gray")
 
     try:
-        subprocess.run(
+        result = subprocess.run(
             [
                 "ffmpeg", "-i", video_path,
-                "-vf", f"select='{select_expr}'",
+                "-filter_complex",
+                f"[0:v]select='{select_expr}',showinfo,split=2[jpeg][thumb];"
+                f"[thumb]scale={_HASH_WIDTH}:{_HASH_HEIGHT},format=gray[hash]",
+                "-map", "[jpeg]",
                 "-vsync", "vfr",
                 "-q:v", "3",          # JPEG quality (2=best, 5=ok for indexing)
                 "-frames:v", str(max_frames),
                 frame_pattern,
+                "-map", "[hash]",
+                "-vsync", "vfr",
+                "-f", "rawvideo",
+                "-frames:v", str(max_frames),
+                hash_path,
                 "-y",                 # overwrite
             ],
             capture_output=True, timeout=300,
@@ -82,12 +168,43 @@ def _extract_frames(video_path: str, output_dir: str, interval: int, max_frames:
         print(f"[video_service] ffmpeg error: {exc}")
         return []
 
-    frames = sorted(Path(output_dir).glob("frame_*.jpg"))
-    result = []
-    for i, path in enumerate(frames[:max_frames]):
-        timestamp = i * interval
-        result.append((float(timestamp), str(path)))
-    return result
+    timestamps = [float(value) for value in _PTS_TIME.findall(result.stderr.decode(errors="replace"))]
+    try:
+        thumbnails = Path(hash_path).read_bytes()
+    except OSError:
+        thumbnails = b""
+    size = _HASH_WIDTH * _HASH_HEIGHT
+
+    frames = []
+    for i, path in enumerate(sorted(Path(output_dir).glob("frame_*.jpg"))[:max_frames]):
+        timestamp = timestamps[i] if i < len(timestamps) else float(i * interval)
+        thumbnail = thumbnails[i * size:(i + 1) * size]
+        # Without a thumbnail the frame gets a unique hash and is never deduplicated.
+        phash = _dhash(thumbnail) if len(thumbnail) == size else -1 - i
+        frames.append(Frame(timestamp, str(path), phash))
+    return frames
+
+
+def _drop_near_duplicates(frames: list[Frame], max_distance: int) -> list[Frame]:
+    """Keep each frame only if its hash is more than *max_distance* bits from every kept frame."""
+    kept: list[Frame] = []
+    for frame in frames:
+        if frame.phash >= 0 and any(
+            other.phash >= 0 and (frame.phash ^ other.phash).bit_count() <= max_distance for other in kept
+        ):
+            continue
+        kept.append(frame)
+    return kept
+
+
+def _spread(frames: list[Frame], limit: int) -> list[Frame]:
+    """Thin *frames* to at most *limit*, evenly across the video."""
+    if len(frames) <= limit:
+        return frames
+    if limit <= 1:
+        return frames[:limit]
+    last = len(frames) - 1
+    return [frames[round(i * last / (limit - 1))] for i in range(limit)]
 
 
 def _extract_audio_track(video_path: str, output_dir: str) -> Optional[bytes]:
@@ -113,6 +230,28 @@ def _extract_audio_track(video_path: str, output_dir: str) -> Optional[bytes]:
         return None
 
 
+def _audio_section(video_path: str, output_dir: str, stats: VideoStats) -> str:
+    """Extract and transcribe the audio track, returning the transcript section."""
+    started = time.perf_counter()
+    try:
+        audio_bytes = _extract_audio_track(video_path, output_dir)
+        if audio_bytes:
+            # Long soundtracks are split and transcribed in parallel by audio_service.
+            transcript = transcribe_audio(audio_bytes, filename="audio_track.mp3")
+            return "\n## Audio transcript\n\n" + transcript
+        return "\n## Audio transcript\n[No audio track detected or extraction failed.]\n"
+    finally:
+        stats.audio_seconds = time.perf_counter() - started
+
+
+def _describe_frame(frame: Frame) -> str:
+    with open(frame.path, "rb") as f:
+        frame_bytes = f.read()
+    m, s = divmod(int(frame.timestamp), 60)
+    description = describe_image(frame_bytes, mime_type="image/jpeg")
+    return f"**[{m:02d}:{s:02d}]** {description.strip()}\n"
+
+
 # Public API ----------------------------------------------------------------------
 
 
@@ -120,6 +259,7 @@ def describe_video(
     video_bytes: bytes,
     filename: str = "video.mp4",
     mime_type: str = "video/mp4",
+    stats: Optional[VideoStats] = None,
 ) -> str:
     """Analyse *video_bytes* and return a structured searchable document.
 
@@ -127,6 +267,7 @@ def describe_video(
     transcript of the audio track so both visual and spoken content are indexed.
 
     Returns a string (never raises) so the document record is always created.
+    Pass *stats* to receive the frame counts and timings of the analysis.
     """
     if not AgentConfig.ENABLE_MULTIMODAL:
         return (
@@ -150,14 +291,17 @@ def describe_video(
 
     tmp_dir = tempfile.mkdtemp(prefix="anote_video_")
     try:
-        return _analyse(video_bytes, filename, tmp_dir)
+        return _analyse(video_bytes, filename, tmp_dir, stats)
     except Exception as exc:
         return f"[Video analysis failed: {exc}]"
     finally:
         shutil.rmtree(tmp_dir, ignore_errors=True)
 
 
-def _analyse(video_bytes: bytes, filename: str, tmp_dir: str) -> str:
+def _analyse(video_bytes: bytes, filename: str, tmp_dir: str, stats: Optional[VideoStats] = None) -> str:
+    stats = stats if stats is not None else VideoStats()
+    started = time.perf_counter()
+
     # Write video to disk (ffmpeg needs a seekable file)
     video_path = os.path.join(tmp_dir, filename)
     with open(video_path, "wb") as f:
@@ -168,7 +312,39 @@ def _analyse(video_bytes: bytes, filename: str, tmp_dir: str) -> str:
 
     interval = AgentConfig.VIDEO_FRAME_INTERVAL_SECS
     max_frames = AgentConfig.VIDEO_MAX_FRAMES
-    duration = _get_duration(video_path)
+    workers = max(1, AgentConfig.VIDEO_VISION_CONCURRENCY)
+
+    with ThreadPoolExecutor(max_workers=workers + 1, thread_name_prefix="video") as pool:
+        # ── Audio track transcript, alongside the frame work ─────────────────
+        audio_future = pool.submit(_audio_section, video_path, tmp_dir, stats)
+
+        duration = _get_duration(video_path)
+
+        # ── Frame selection and descriptions ────────────────────────────────
+        frames_started = time.perf_counter()
+        max_candidates = max_frames * _CANDIDATE_FACTOR
+        min_gap, spacing = _candidate_spacing(duration, interval, max_candidates)
+        frames = _extract_frames(
+            video_path,
+            frame_dir,
+            spacing,
+            max_candidates + 1,
+            AgentConfig.VIDEO_SCENE_THRESHOLD,
+            min_gap=min_gap,
+        )
+        unique = _drop_near_duplicates(frames, AgentConfig.VIDEO_FRAME_DEDUP_DISTANCE)
+        selected = _spread(unique, max_frames)
+        stats.candidates = len(frames)
+        stats.duplicates = len(frames) - len(unique)
+        stats.frames_seconds = time.perf_counter() - frames_started
+
+        vision_started = time.perf_counter()
+        vision_futures = [pool.submit(_describe_frame, frame) for frame in selected]
+        descriptions = [future.result() for future in vision_futures]
+        stats.described = len(descriptions)
+        stats.vision_seconds = time.perf_counter() - vision_started
+
+        audio = audio_future.result()
 
     sections: list[str] = []
 
@@ -177,33 +353,18 @@ def _analyse(video_bytes: bytes, filename: str, tmp_dir: str) -> str:
     if duration is not None:
         m, s = divmod(int(duration), 60)
         header_parts.append(f"duration: {m}m {s}s")
-    header_parts.append(f"frame interval: {interval}s]")
+    header_parts.append(f"frames: scene changes, at most {spacing:.0f}s apart]")
     sections.append(", ".join(header_parts))
     sections.append("")
 
-    # ── Frame descriptions ──────────────────────────────────────────────────
-    frames = _extract_frames(video_path, frame_dir, interval, max_frames)
-    if frames:
+    if descriptions:
         sections.append("## Visual content (key frames)\n")
-        for timestamp, frame_path in frames:
-            with open(frame_path, "rb") as f:
-                frame_bytes = f.read()
-            m, s = divmod(int(timestamp), 60)
-            ts_label = f"{m:02d}:{s:02d}"
-            description = describe_image(frame_bytes, mime_type="image/jpeg")
-            sections.append(f"**[{ts_label}]** {description.strip()}\n")
+        sections.extend(descriptions)
     else:
         sections.append("## Visual content\n[Frame extraction produced no frames.]\n")
 
-    # ── Audio track transcript ───────────────────────────────────────────────
-    audio_bytes = _extract_audio_track(video_path, tmp_dir)
-    if audio_bytes and len(audio_bytes) <= AgentConfig.MAX_AUDIO_BYTES:
-        sections.append("\n## Audio transcript\n")
-        transcript = transcribe_audio(audio_bytes, filename="audio_track.mp3")
-        sections.append(transcript)
-    elif audio_bytes:
-        sections.append("\n## Audio transcript\n[Audio track too large for Whisper transcription.]\n")
-    else:
-        sections.append("\n## Audio transcript\n[No audio track detected or extraction failed.]\n")
+    sections.append(audio)
 
+    stats.seconds = time.perf_counter() - started
+    print(f"[video_service] {filename}: {stats.summary()}")
     return "\n".join(sections)
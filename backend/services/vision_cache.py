@@ -0,0 +1,176 @@
+"""Persistent cache of vision-model image descriptions.
+
+Agents describe every image attachment on every turn, and a re-uploaded
+image is described again at ingestion, although the answer only depends on
+the image, the prompt and the model.  ``vision_service.describe_image``
+therefore looks descriptions up here first:
+
+- Keys are SHA-256 digests of ``(model, prompt, image content hash)``; the
+  content hash is of the uploaded bytes, before any resizing.
+- Descriptions live in a small in-memory LRU tier backed by a SQLite file
+  at ``VISION_CACHE_PATH`` (empty disables the disk tier), so they survive
+  restarts and are shared with Ray workers on the same host.
+- The disk tier holds at most ``VISION_CACHE_MAX_ENTRIES`` descriptions;
+  the least recently used are pruned once every few hundred writes.
+- Only successful descriptions are stored.  Disk failures are logged and
+  never fail the vision call.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+DEFAULT_DISK_PATH = os.getenv(
+    "VISION_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "database", "vision_cache.sqlite3"),
+)
+DEFAULT_MAX_ENTRIES = int(os.getenv("VISION_CACHE_MAX_ENTRIES", "20000"))
+DEFAULT_MEMORY_ENTRIES = int(os.getenv("VISION_CACHE_MEMORY_ENTRIES", "512"))
+# Overflow rows are pruned from disk once every this many writes.
+_DISK_PRUNE_INTERVAL = 200
+
+
+def content_hash(image_bytes: bytes) -> str:
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def cache_key(model: str, prompt: str, image_hash: str) -> str:
+    raw = f"{model}\x00{prompt}\x00{image_hash}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class _DiskStore:
+    """SQLite key/value store of descriptions, pruned by last use."""
+
+    def __init__(self, path: str, max_entries: int) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS descriptions ("
+            " key TEXT PRIMARY KEY, description TEXT NOT NULL, used_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str, now: float) -> str | None:
+        with self._lock:
+            row = self._conn.execute("SELECT description FROM descriptions WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self._conn.execute("UPDATE descriptions SET used_at = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+        return None if row is None else row[0]
+
+    def put(self, key: str, description: str, now: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO descriptions (key, description, used_at) VALUES (?, ?, ?)",
+                (key, description, now),
+            )
+            self._writes += 1
+            if self._writes % _DISK_PRUNE_INTERVAL == 0:
+                self._conn.execute(
+                    "DELETE FROM descriptions WHERE key NOT IN ("
+                    " SELECT key FROM descriptions ORDER BY used_at DESC LIMIT ?)",
+                    (self.max_entries,),
+                )
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM descriptions")
+            self._conn.commit()
+
+
+class VisionCache:
+    """Thread-safe LRU cache of image descriptions with an optional disk tier."""
+
+    def __init__(
+        self,
+        disk_path: str | None = DEFAULT_DISK_PATH,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        memory_entries: int = DEFAULT_MEMORY_ENTRIES,
+    ) -> None:
+        self.memory_entries = memory_entries
+        self._entries: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._disk: _DiskStore | None = None
+        if disk_path:
+            try:
+                self._disk = _DiskStore(disk_path, max_entries)
+            except (OSError, sqlite3.Error) as err:
+                print(f"[WARNING] Vision cache disk store disabled ({disk_path}): {err}")
+
+    def get(self, model: str, prompt: str, image_hash: str) -> str | None:
+        """Return the cached description, or None on a miss."""
+        key = cache_key(model, prompt, image_hash)
+        with self._lock:
+            description = self._entries.get(key)
+            if description is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return description
+
+        description = None
+        if self._disk is not None:
+            try:
+                description = self._disk.get(key, time.time())
+            except sqlite3.Error as err:
+                print(f"[WARNING] Vision cache disk read failed: {err}")
+        with self._lock:
+            if description is None:
+                self._misses += 1
+                return None
+            self._disk_hits += 1
+            self._remember(key, description)
+        return description
+
+    def put(self, model: str, prompt: str, image_hash: str, description: str) -> None:
+        key = cache_key(model, prompt, image_hash)
+        with self._lock:
+            self._remember(key, description)
+        if self._disk is not None:
+            try:
+                self._disk.put(key, description, time.time())
+            except sqlite3.Error as err:
+                print(f"[WARNING] Vision cache disk write failed: {err}")
+
+    def clear(self, include_disk: bool = False) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._hits = self._disk_hits = self._misses = 0
+        if include_disk and self._disk is not None:
+            self._disk.clear()
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            hits = self._hits + self._disk_hits
+            lookups = hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "disk_enabled": self._disk is not None,
+                "hits": self._hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "hit_rate": (hits / lookups) if lookups else 0.0,
+            }
+
+    def _remember(self, key: str, description: str) -> None:
+        self._entries[key] = description
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.memory_entries:
+            self._entries.popitem(last=False)
+
+
+vision_cache = VisionCache()
@@ -5,13 +5,39 @@ is skipped.  Instead, ``describe_image()`` is called to produce a detailed
 textual description via the configured vision-capable LLM.  That description
 is stored as ``document_text`` and fed into the normal chunking + embedding
 pipeline, making the image fully searchable through RAG.
+
+The agents call the same function for image attachments on every turn, so
+each call is made cheap:
+
+- descriptions are cached by (image content hash, prompt, model) in
+  ``services.vision_cache``, so an attachment is only described once;
+- on a miss the image is downscaled to the largest size the provider's
+  model actually looks at and recompressed (:func:`prepare_image`) before
+  it is base64-encoded and uploaded;
+- :func:`describe_images` describes the attachments of one message
+  concurrently, up to ``AgentConfig.VISION_DESCRIBE_CONCURRENCY`` at a time.
+
+Resizing needs Pillow; without it images are sent as uploaded.
 """
 import base64
+import io
 import os
-from typing import Optional
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
 
 from agents.config import AgentConfig
 
+from services.vision_cache import content_hash, vision_cache
+
+# OpenAI "high" detail fits images in 2048x2048, then scales the short side to 768.
+_OPENAI_MAX_LONG_EDGE = 2048
+_OPENAI_MAX_SHORT_EDGE = 768
+# Anthropic downscales images over 1568 px on the long edge or ~1.15 megapixels.
+_ANTHROPIC_MAX_LONG_EDGE = 1568
+_ANTHROPIC_MAX_PIXELS = 1_150_000
+
+_pillow_missing_logged = False
+
 _INDEXING_PROMPT = (
     "You are analyzing an image that has been uploaded as a document inside a "
     "RAG-based Q&A system. Your description will be the only representation of "
@@ -32,11 +58,14 @@ _INDEXING_PROMPT = (
 def describe_image(
     image_bytes: bytes,
     mime_type: str = "image/jpeg",
-    prompt: Optional[str] = None,
+    prompt: str | None = None,
+    model_type: int | None = None,
+    model: str | None = None,
 ) -> str:
     """Return a detailed textual description of *image_bytes*.
 
-    Uses the vision-capable LLM configured in ``AgentConfig``.
+    Uses the vision-capable LLM configured in ``AgentConfig`` unless
+    *model_type* (0=OpenAI, 1=Anthropic) or *model* say otherwise.
     Returns a placeholder string (never raises) so the document record is
     always created even if the vision call fails.
     """
@@ -55,67 +84,165 @@ def describe_image(
         )
 
     effective_prompt = prompt or _INDEXING_PROMPT
-    data_b64 = base64.b64encode(image_bytes).decode("utf-8")
+    provider = AgentConfig.DEFAULT_AGENT_MODEL_TYPE if model_type is None else model_type
+    model = model or (AgentConfig.OPENAI_VISION_MODEL if provider == 0 else AgentConfig.ANTHROPIC_VISION_MODEL)
+    image_hash = content_hash(image_bytes)
+    cached = vision_cache.get(model, effective_prompt, image_hash)
+    if cached is not None:
+        return cached
+
+    prepared, prepared_mime = prepare_image(image_bytes, mime_type, provider)
+    data_b64 = base64.b64encode(prepared).decode("utf-8")
+
+    if provider == 0:
+        try:
+            description = _describe_openai(data_b64, prepared_mime, effective_prompt, model)
+        except Exception as exc:
+            return f"[Image description failed (OpenAI): {exc}]"
+    else:
+        try:
+            description = _describe_anthropic(data_b64, prepared_mime, effective_prompt, model)
+        except Exception as exc:
+            return f"[Image description failed (Anthropic): {exc}]"
 
-    if AgentConfig.DEFAULT_AGENT_MODEL_TYPE == 0:
-        return _describe_openai(data_b64, mime_type, effective_prompt)
-    return _describe_anthropic(data_b64, mime_type, effective_prompt)
+    if description:
+        vision_cache.put(model, effective_prompt, image_hash, description)
+    return description
 
 
-def _describe_openai(data_b64: str, mime_type: str, prompt: str) -> str:
+def describe_images(
+    images: Sequence[tuple[bytes, str]],
+    prompt: str | None = None,
+    model_type: int | None = None,
+    model: str | None = None,
+) -> list[str]:
+    """Describe ``(image_bytes, mime_type)`` pairs concurrently; results are in input order.
+
+    Identical images are only described once.  Never raises (see
+    :func:`describe_image`).
+    """
+    unique: dict[str, tuple[bytes, str]] = {}
+    hashes = []
+    for image_bytes, mime_type in images:
+        image_hash = content_hash(image_bytes)
+        unique.setdefault(image_hash, (image_bytes, mime_type))
+        hashes.append(image_hash)
+
+    def describe(item: tuple[bytes, str]) -> str:
+        return describe_image(item[0], mime_type=item[1], prompt=prompt, model_type=model_type, model=model)
+
+    workers = min(len(unique), max(1, AgentConfig.VISION_DESCRIBE_CONCURRENCY))
+    if workers <= 1:
+        described = [describe(item) for item in unique.values()]
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="vision") as pool:
+            described = list(pool.map(describe, unique.values()))
+    by_hash = dict(zip(unique, described, strict=True))
+    return [by_hash[image_hash] for image_hash in hashes]
+
+
+def prepare_image(image_bytes: bytes, mime_type: str, provider: int) -> tuple[bytes, str]:
+    """Downscale and recompress an image to what *provider*'s vision model sees.
+
+    Images with transparency become PNG, everything else JPEG at
+    ``AgentConfig.VISION_JPEG_QUALITY``.  Returns the input unchanged when
+    Pillow is missing, the image cannot be decoded, it is animated, or
+    recompressing it would not make it smaller.
+    """
+    global _pillow_missing_logged
     try:
-        from openai import OpenAI
-
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        response = client.chat.completions.create(
-            model=AgentConfig.OPENAI_VISION_MODEL,
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": prompt},
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:{mime_type};base64,{data_b64}",
-                                "detail": "high",
-                            },
-                        },
-                    ],
-                }
-            ],
-            max_tokens=2048,
-        )
-        return response.choices[0].message.content or ""
+        from PIL import Image, ImageOps
+    except ImportError:
+        if not _pillow_missing_logged:
+            _pillow_missing_logged = True
+            print("[WARNING] Pillow is not installed; images are sent to the vision model at full size.")
+        return image_bytes, mime_type
+
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as opened:
+            if getattr(opened, "is_animated", False):
+                return image_bytes, mime_type
+            image = ImageOps.exif_transpose(opened)
+            width, height = image.size
+            scale = _target_scale(width, height, provider)
+            if scale < 1:
+                size = (max(1, int(width * scale)), max(1, int(height * scale)))
+                image = image.resize(size, Image.LANCZOS)
+            transparent = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+            output = io.BytesIO()
+            if transparent:
+                image.save(output, format="PNG", optimize=True)
+                prepared_mime = "image/png"
+            else:
+                image.convert("RGB").save(
+                    output, format="JPEG", quality=AgentConfig.VISION_JPEG_QUALITY, optimize=True
+                )
+                prepared_mime = "image/jpeg"
     except Exception as exc:
-        return f"[Image description failed (OpenAI): {exc}]"
+        print(f"[WARNING] Image preparation failed, sending it as uploaded: {exc}")
+        return image_bytes, mime_type
 
+    prepared = output.getvalue()
+    if scale >= 1 and len(prepared) >= len(image_bytes):
+        return image_bytes, mime_type
+    return prepared, prepared_mime
 
-def _describe_anthropic(data_b64: str, mime_type: str, prompt: str) -> str:
-    try:
-        import anthropic
-
-        client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
-        response = client.messages.create(
-            model=AgentConfig.ANTHROPIC_VISION_MODEL,
-            max_tokens=2048,
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "image",
-                            "source": {
-                                "type": "base64",
-                                "media_type": mime_type,
-                                "data": data_b64,
-                            },
+
+def _target_scale(width: int, height: int, provider: int) -> float:
+    long_edge, short_edge = max(width, height), min(width, height)
+    if provider == 0:
+        return min(1.0, _OPENAI_MAX_LONG_EDGE / long_edge, _OPENAI_MAX_SHORT_EDGE / short_edge)
+    return min(1.0, _ANTHROPIC_MAX_LONG_EDGE / long_edge, (_ANTHROPIC_MAX_PIXELS / (width * height)) ** 0.5)
+
+
+def _describe_openai(data_b64: str, mime_type: str, prompt: str, model: str) -> str:
+    from openai import OpenAI
+
+    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    response = client.chat.completions.create(
+        model=model,
+        messages=[
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": prompt},
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": f"data:{mime_type};base64,{data_b64}",
+                            "detail": "high",
                         },
-                        {"type": "text", "text": prompt},
-                    ],
-                }
-            ],
-        )
-        return response.content[0].text if response.content else ""
-    except Exception as exc:
-        return f"[Image description failed (Anthropic): {exc}]"
+                    },
+                ],
+            }
+        ],
+        max_tokens=2048,
+    )
+    return response.choices[0].message.content or ""
+
+
+def _describe_anthropic(data_b64: str, mime_type: str, prompt: str, model: str) -> str:
+    import anthropic
+
+    client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+    response = client.messages.create(
+        model=model,
+        max_tokens=2048,
+        messages=[
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "image",
+                        "source": {
+                            "type": "base64",
+                            "media_type": mime_type,
+                            "data": data_b64,
+                        },
+                    },
+                    {"type": "text", "text": prompt},
+                ],
+            }
+        ],
+    )
+    return response.content[0].text if response.content else ""
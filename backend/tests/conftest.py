@@ -20,6 +20,11 @@ os.environ.setdefault("SEC_API_KEY", "test-sec-key")
 os.environ.setdefault("JWT_SECRET_KEY", "test-secret")
 os.environ.setdefault("ENABLE_AGENTS", "false")
 os.environ.setdefault("AGENT_FALLBACK_ENABLED", "true")
+# Keep the on-disk caches out of the source tree; tests that need them use tmp_path.
+os.environ.setdefault("HTTP_CACHE_PATH", "")
+os.environ.setdefault("VISION_CACHE_PATH", "")
+# Importing app must not start the tombstone reaper against the stubbed database.
+os.environ.setdefault("REAPER_ENABLED", "false")
 
 
 def _register_module(name: str, module: types.ModuleType) -> None:
@@ -75,8 +80,10 @@ def _install_import_stubs() -> None:
     finance_module.add_chat_to_db = lambda *args, **kwargs: 1
     finance_module.add_message_to_db = lambda *args, **kwargs: 1
     finance_module.chunk_document = _RemoteCallable()
+    finance_module.chunk_tabular_document = _RemoteCallable()
     finance_module.add_document_to_db = lambda *args, **kwargs: (1, False)
     finance_module.get_relevant_chunks = lambda *args, **kwargs: [("chunk", "doc", 1)]
+    finance_module.get_relevant_chunks_multi = lambda *args, **kwargs: []
     finance_module.serialize_sources_for_api = lambda sources: [
         {
             "id": source.get("id", f"source-{index}") if isinstance(source, dict) else f"source-{index}",
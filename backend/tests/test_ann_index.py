@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+from typing import Any
+
+import numpy as np
+import pytest
+from services import ann_index
+from services.chunk_index_cache import build_chat_index
+
+
+def _clustered_rows(count: int, dims: int = 16, clusters: int = 8, seed: int = 0) -> list[dict[str, Any]]:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dims))
+    rows = []
+    for chunk_id in range(1, count + 1):
+        vector = centers[chunk_id % clusters] + 0.1 * rng.normal(size=dims)
+        rows.append(
+            {
+                "chunk_id": chunk_id,
+                "start_index": 0,
+                "end_index": 1,
+                "page_number": None,
+                "embedding_vector": vector.astype(np.float64).tobytes(),
+                "document_id": 1,
+                "document_name": "doc",
+            }
+        )
+    return rows
+
+
+@pytest.fixture(autouse=True)
+def _ann_settings(monkeypatch: pytest.MonkeyPatch, tmp_path: Any) -> None:
+    monkeypatch.setattr(ann_index, "ENABLE_ANN_INDEX", True)
+    monkeypatch.setattr(ann_index, "ANN_MIN_CHUNKS", 100)
+    monkeypatch.setattr(ann_index, "ANN_INDEX_DIR", str(tmp_path))
+    ann_index._loaded.clear()
+
+
+def test_ivf_search_recall_against_exact() -> None:
+    index = build_chat_index(_clustered_rows(900), 16)
+    ivf = ann_index.IVFIndex.train(index.chunk_ids, index.matrix)
+    queries = index.matrix[:20]
+
+    assert ivf.nlist == 30
+    assert ann_index.recall_at_k(ivf, index, queries, 5, nprobe=ivf.nlist) == 1.0
+    assert ann_index.recall_at_k(ivf, index, queries, 5, nprobe=4) >= 0.9
+
+    positions = ann_index.search(ivf, index, queries[0], 3)
+    assert positions.shape == (1, 3)
+    assert positions[0][0] == 0
+
+
+def test_ivf_sync_save_and_load(tmp_path: Any) -> None:
+    index = build_chat_index(_clustered_rows(300), 16)
+    ivf = ann_index.IVFIndex.train(index.chunk_ids[:200], index.matrix[:200])
+
+    assert ivf.sync(index.chunk_ids[50:], index.matrix[50:])
+    assert sorted(ivf.chunk_ids.tolist()) == list(range(51, 301))
+    assert not ivf.sync(index.chunk_ids[50:], index.matrix[50:])
+
+    path = str(tmp_path / "chat.npz")
+    ivf.save(path)
+    loaded = ann_index.IVFIndex.load(path)
+    assert loaded is not None
+    assert np.array_equal(loaded.chunk_ids, ivf.chunk_ids)
+    assert np.array_equal(loaded.lists, ivf.lists)
+    assert loaded.trained_size == 200
+    assert ann_index.IVFIndex.load(str(tmp_path / "missing.npz")) is None
+
+
+def test_get_chat_ann_index_threshold_persistence_and_sync() -> None:
+    small = build_chat_index(_clustered_rows(50), 16)
+    assert ann_index.get_chat_ann_index(7, small) is None
+
+    index = build_chat_index(_clustered_rows(400), 16)
+    ivf = ann_index.get_chat_ann_index(7, index)
+    assert ivf is not None
+    assert ann_index.get_chat_ann_index(7, index) is ivf
+
+    ann_index._loaded.clear()
+    reloaded = ann_index.get_chat_ann_index(7, index)
+    assert reloaded is not ivf
+    assert np.array_equal(reloaded.centroids, ivf.centroids)
+
+    grown = build_chat_index(_clustered_rows(450), 16)
+    synced = ann_index.get_chat_ann_index(7, grown)
+    assert len(synced) == 450
+    assert len(reloaded) == 400
+
+
+def test_index_document_chunks_appends_to_existing_index(monkeypatch: pytest.MonkeyPatch) -> None:
+    index = build_chat_index(_clustered_rows(400), 16)
+    ann_index.get_chat_ann_index(3, index)
+
+    monkeypatch.setattr(
+        ann_index,
+        "get_document_chunk_refs",
+        lambda document_id: [{"chunk_id": 401, "chat_id": 3}, {"chunk_id": 402, "chat_id": 3}],
+    )
+    ann_index.index_document_chunks(11, [[1.0] * 16, [0.5] * 16])
+
+    stored = ann_index.IVFIndex.load(ann_index.index_path(3))
+    assert stored is not None
+    assert {401, 402} <= set(stored.chunk_ids.tolist())
+
+    monkeypatch.setattr(ann_index, "get_document_chunk_refs", lambda document_id: 1 / 0)
+    ann_index.index_document_chunks(12, [[1.0] * 16])
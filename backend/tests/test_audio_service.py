@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+from services import audio_service
+from services.audio_segmenter import (
+    AudioSegment,
+    TranscriptLine,
+    max_segment_seconds,
+    plan_segments,
+    stitch,
+)
+
+
+def test_plan_segments_cuts_on_silence_or_hard_and_overlaps_clips() -> None:
+    segments = plan_segments(1500.0, [(100.0, 102.0), (540.0, 560.0), (1190.0, 1192.0)], 600, 2)
+
+    assert [(s.start, s.end) for s in segments] == [(0.0, 550.0), (550.0, 1150.0), (1150.0, 1500.0)]
+    assert [(s.clip_start, s.clip_end) for s in segments] == [(0.0, 552.0), (548.0, 1152.0), (1148.0, 1500.0)]
+    assert plan_segments(30.0, [], 600, 2) == [AudioSegment(0, 0.0, 30.0, 0.0, 30.0)]
+    assert max_segment_seconds(800_000, 600, 2) == 86.0 and max_segment_seconds(800_000, 60, 2) == 60
+
+
+def test_stitch_shifts_to_global_time_and_keeps_overlap_once() -> None:
+    segments = [AudioSegment(0, 0.0, 10.0, 0.0, 12.0), AudioSegment(1, 10.0, 20.0, 8.0, 20.0)]
+    pieces = [
+        [TranscriptLine(0.0, 5.0, "hello there"), TranscriptLine(9.0, 11.5, "across the cut")],
+        [TranscriptLine(1.0, 3.5, "across the cut"), TranscriptLine(3.5, 9.0, "goodbye")],
+    ]
+
+    assert stitch(segments, pieces) == [
+        TranscriptLine(0.0, 5.0, "hello there"),
+        TranscriptLine(9.0, 11.5, "across the cut"),
+        TranscriptLine(11.5, 17.0, "goodbye"),
+    ]
+
+
+def test_long_audio_is_transcribed_concurrently_with_global_timestamps(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    for name, value in {
+        "MAX_AUDIO_BYTES": 25 * 1024 * 1024,
+        "AUDIO_SEGMENT_MAX_SECS": 600,
+        "AUDIO_SEGMENT_OVERLAP_SECS": 2.0,
+        "AUDIO_TRANSCRIBE_CONCURRENCY": 3,
+    }.items():
+        monkeypatch.setattr(audio_service.AgentConfig, name, value, raising=False)
+    all_requests_in_flight = threading.Barrier(3, timeout=5)
+
+    def whisper(audio_bytes: bytes, filename: str, language: Any) -> SimpleNamespace:
+        all_requests_in_flight.wait()
+        index = int(audio_bytes)
+        return SimpleNamespace(
+            language="english",
+            segments=[{"start": 0.0 if index == 0 else 2.0, "end": 20.0, "text": f" part {index} "}],
+        )
+
+    monkeypatch.setattr(audio_service, "probe_duration", lambda path: 1500.0)
+    monkeypatch.setattr(audio_service, "detect_silences", lambda path, duration: [])
+    monkeypatch.setattr(
+        audio_service, "extract_segment", lambda path, segment, output_dir: str(segment.index).encode()
+    )
+    monkeypatch.setattr(audio_service, "_whisper_request", whisper)
+
+    transcript = audio_service._transcribe_segmented(b"audio", "call.mp3", None, str(tmp_path))
+
+    assert transcript is not None
+    assert transcript.startswith("[Audio transcript — language: english, duration: 25m 0s, 3 segments]")
+    assert transcript.splitlines()[2:] == ["[00:00] part 0", "[10:00] part 1", "[20:00] part 2"]
+
+
+def test_short_audio_is_sent_whole(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(audio_service.AgentConfig, "MAX_AUDIO_BYTES", 25 * 1024 * 1024, raising=False)
+    monkeypatch.setattr(audio_service.AgentConfig, "AUDIO_SEGMENT_OVERLAP_SECS", 2.0, raising=False)
+    monkeypatch.setattr(audio_service.AgentConfig, "AUDIO_SEGMENT_MAX_SECS", 600, raising=False)
+    monkeypatch.setattr(audio_service, "probe_duration", lambda path: 42.0)
+
+    assert audio_service._transcribe_segmented(b"audio", "memo.mp3", None, str(tmp_path)) is None
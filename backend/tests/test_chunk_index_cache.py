@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+from typing import Any
+
+import numpy as np
+from database import db
+from services import chunk_index_cache
+from services.chunk_index_cache import ChunkIndexCache, build_chat_index, chunk_rows_version
+
+
+def _row(chunk_id: int, vector: list[float], document_id: int = 1, page_number: Any = None) -> dict[str, Any]:
+    return {
+        "chunk_id": chunk_id,
+        "start_index": 0,
+        "end_index": 2,
+        "page_number": page_number,
+        "embedding_vector": np.array(vector, dtype=np.float64).tobytes(),
+        "document_id": document_id,
+        "document_name": f"doc-{document_id}",
+    }
+
+
+def test_build_chat_index_packs_float32_matrix_and_norms() -> None:
+    rows = [_row(4, [3.0, 4.0]), _row(9, [1.0, 0.0], document_id=2, page_number=5), _row(10, [1.0, 2.0, 3.0])]
+    index = build_chat_index(rows, 2)
+
+    assert index.matrix.dtype == np.float32
+    assert index.matrix.flags["C_CONTIGUOUS"]
+    assert len(index) == 2
+    assert np.allclose(index.norms, [5.0, 1.0])
+    assert np.allclose(np.linalg.norm(index.matrix, axis=1), 1.0)
+    assert index.document_names == ["doc-1", "doc-2"]
+    assert index.page_number(0) is None
+    assert index.page_number(1) == 5
+    assert index.version == chunk_rows_version(rows) == (3, 10, 0)
+
+
+def test_cache_hits_misses_and_version_mismatch() -> None:
+    cache = ChunkIndexCache(max_bytes=1024 * 1024)
+    index = build_chat_index([_row(1, [1.0, 0.0])], 2)
+
+    assert cache.get(("a@example.com", 1), (1, 1, 0)) is None
+    cache.put(("a@example.com", 1), index)
+    assert cache.get(("a@example.com", 1), (1, 1, 0)) is index
+    assert cache.get(("a@example.com", 1), (2, 7, 0)) is None
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["entries"] == 0
+
+
+def test_cache_evicts_least_recently_used_entry() -> None:
+    first = build_chat_index([_row(1, [1.0, 0.0])], 2)
+    cache = ChunkIndexCache(max_bytes=first.nbytes * 2)
+    cache.put(("a@example.com", 1), first)
+    cache.put(("a@example.com", 2), build_chat_index([_row(2, [0.0, 1.0])], 2))
+    assert cache.get(("a@example.com", 1), (1, 1, 0)) is first
+
+    cache.put(("a@example.com", 3), build_chat_index([_row(3, [1.0, 1.0])], 2))
+
+    assert cache.get(("a@example.com", 2), (1, 2, 0)) is None
+    assert cache.get(("a@example.com", 1), (1, 1, 0)) is first
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cache_is_invalidated_by_database_writes(monkeypatch: Any) -> None:
+    cache = chunk_index_cache.chunk_index_cache
+    cache.clear()
+    cache.put(("a@example.com", 5), build_chat_index([_row(1, [1.0, 0.0])], 2))
+    cache.put(("a@example.com", 6), build_chat_index([_row(2, [1.0, 0.0])], 2))
+
+    class _Cursor:
+        def execute(self, *args: Any) -> None:
+            pass
+
+        def executemany(self, *args: Any) -> None:
+            pass
+
+        def fetchall(self) -> list[dict[str, int]]:
+            return [{"chat_id": 5}]
+
+        def close(self) -> None:
+            pass
+
+    class _Conn:
+        def commit(self) -> None:
+            pass
+
+        def close(self) -> None:
+            pass
+
+    monkeypatch.setattr(db, "get_db_connection", lambda: (_Conn(), _Cursor()))
+    db.add_chunks([(0, 2, 11, b"")])
+    assert cache.get(("a@example.com", 5), (1, 1, 0)) is None
+
+    db.reset_uploaded_docs(6, "a@example.com")
+    assert cache.get(("a@example.com", 6), (1, 2, 0)) is None
+    assert cache.stats()["invalidations"] == 2
+    cache.clear()
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+from typing import Any
+
+import pytest
+from database import db
+from database.chunk_writer import (
+    CHUNK_COLUMNS,
+    BulkChunkWriter,
+    ChunkWriteError,
+    build_insert,
+    plan_statements,
+)
+from database.embedding_space import EmbeddingSpace
+
+
+class LostConnection(Exception):
+    errno = 2013
+
+
+class FakeDatabase:
+    """Records committed rows; uncommitted rows are dropped on rollback."""
+
+    def __init__(self, fail_on_statement: int | None = None, error: Exception | None = None) -> None:
+        self.committed: list[tuple[Any, ...]] = []
+        self.pending: list[tuple[Any, ...]] = []
+        self.statements: list[str] = []
+        self.commits = 0
+        self.fail_on_statement = fail_on_statement
+        self.error = error or LostConnection("Lost connection to MySQL server")
+
+    def connect(self) -> tuple[Any, Any]:
+        return _Conn(self), _Cursor(self)
+
+
+class _Cursor:
+    def __init__(self, database: FakeDatabase) -> None:
+        self.database = database
+
+    def execute(self, statement: str, params: list[Any]) -> None:
+        database = self.database
+        database.statements.append(statement)
+        if len(database.statements) == database.fail_on_statement:
+            raise database.error
+        width = statement.split("VALUES")[0].count(",") + 1
+        database.pending.extend(tuple(params[i : i + width]) for i in range(0, len(params), width))
+
+    def fetchall(self) -> list[dict[str, Any]]:
+        return []
+
+    def close(self) -> None:
+        pass
+
+
+class _Conn:
+    def __init__(self, database: FakeDatabase) -> None:
+        self.database = database
+
+    def commit(self) -> None:
+        self.database.committed.extend(self.database.pending)
+        self.database.pending.clear()
+        self.database.commits += 1
+
+    def rollback(self) -> None:
+        self.database.pending.clear()
+
+    def close(self) -> None:
+        pass
+
+
+def _rows(count: int, blob_size: int = 100) -> list[tuple[Any, ...]]:
+    return [(index, index + 1, 7, bytes(blob_size), "float32") for index in range(count)]
+
+
+def test_plan_statements_bounds_bytes_and_rows() -> None:
+    rows = _rows(10, blob_size=100)
+    # Each row is estimated at 2 * 100 bytes of blob plus small scalars and overhead.
+    assert plan_statements(rows, max_bytes=500, max_rows=100) == [(0, 2), (2, 4), (4, 6), (6, 8), (8, 10)]
+    assert plan_statements(rows, max_bytes=10_000, max_rows=4) == [(0, 4), (4, 8), (8, 10)]
+    assert plan_statements(rows, max_bytes=10, max_rows=4, start=8) == [(8, 9), (9, 10)]
+    assert build_insert(CHUNK_COLUMNS, 2).endswith("VALUES (%s, %s, %s, %s, %s), (%s, %s, %s, %s, %s)")
+
+
+def test_writer_uses_multi_row_statements_and_chunked_commits() -> None:
+    database = FakeDatabase()
+    writer = BulkChunkWriter(connect=database.connect, max_statement_rows=3, commit_rows=6)
+
+    stats = writer.write(_rows(10))
+
+    assert database.committed == _rows(10)
+    assert stats.statements == 4
+    assert stats.commits == 2
+    assert stats.rows == 10 and stats.rows_per_second > 0
+    assert "10 rows in 4 statements / 2 commits" in stats.summary()
+
+
+def test_writer_resumes_from_last_commit_after_lost_connection() -> None:
+    database = FakeDatabase(fail_on_statement=3)
+    writer = BulkChunkWriter(connect=database.connect, max_statement_rows=2, commit_rows=4, sleep=lambda s: None)
+
+    stats = writer.write(_rows(9))
+
+    assert database.committed == _rows(9)
+    assert stats.retries == 1
+    # Rows 4-5 were rolled back with the failed statement and re-sent from the checkpoint.
+    assert len(database.statements) == 6
+
+
+def test_writer_reports_committed_rows_on_permanent_failure() -> None:
+    database = FakeDatabase(fail_on_statement=3, error=ValueError("bad value"))
+    writer = BulkChunkWriter(connect=database.connect, max_statement_rows=2, commit_rows=2, sleep=lambda s: None)
+
+    with pytest.raises(ChunkWriteError) as excinfo:
+        writer.write(_rows(8))
+    assert excinfo.value.committed_rows == 4
+
+    database.fail_on_statement = None
+    writer.write(_rows(8), start=excinfo.value.committed_rows)
+    assert database.committed == _rows(8)
+
+
+def test_add_chunks_writes_through_bulk_writer(monkeypatch: pytest.MonkeyPatch) -> None:
+    database = FakeDatabase()
+    monkeypatch.setattr(db, "get_db_connection", database.connect)
+
+    rows = [(0, 5, 3, b"\x00" * 8, 1), (5, 9, 3, b"\x01" * 8, 2)]
+    db.add_chunks_with_page_numbers(rows, encoding="float16", space=EmbeddingSpace("text-embedding-3-large", 256))
+
+    assert database.committed == [row + ("float16", "text-embedding-3-large", 256) for row in rows]
+    assert "page_number" in database.statements[0]
+    assert "embedding_dimensions" in database.statements[0]
+
+
+def test_add_chunks_references_stored_embeddings(monkeypatch: pytest.MonkeyPatch) -> None:
+    database = FakeDatabase()
+    monkeypatch.setattr(db, "get_db_connection", database.connect)
+
+    rows = [(0, 5, 3, b"\x00" * 8), (5, 9, 3, b"\x01" * 8)]
+    db.add_chunks(rows, encoding="float32", space=EmbeddingSpace("text-embedding-3-small", 2), embedding_ids=[17, None])
+
+    assert database.committed == [
+        (0, 5, 3, None, "float32", "text-embedding-3-small", 2, 17),
+        (5, 9, 3, b"\x01" * 8, "float32", "text-embedding-3-small", 2, None),
+    ]
+    assert "embedding_id" in database.statements[0]
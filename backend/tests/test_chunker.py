@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import types
+
+import pytest
+from services.chunker import iter_chunk_spans, iter_page_spans
+
+
+def test_spans_are_exact_bounded_and_in_order() -> None:
+    text = "\n\n".join(
+        f"Paragraph {index}. " + " ".join(f"word{index}-{word}" for word in range(40)) for index in range(30)
+    )
+    spans = list(iter_chunk_spans(text, 200, 40))
+
+    assert spans
+    assert all(0 < end - start <= 200 for start, end in spans)
+    assert all(text[start:end] == text[start:end].strip() for start, end in spans)
+    assert [start for start, _ in spans] == sorted(start for start, _ in spans)
+    covered: set[int] = set()
+    for start, end in spans:
+        covered.update(range(start, end))
+    assert all(index in covered for index, char in enumerate(text) if not char.isspace())
+
+
+def test_repeated_boilerplate_gets_distinct_offsets() -> None:
+    boilerplate = "Forward-looking statements disclaimer."
+    text = "\n\n".join([boilerplate] * 5)
+    spans = list(iter_chunk_spans(text, len(boilerplate) + 1, 0))
+
+    assert len(spans) == 5
+    assert all(text[start:end] == boilerplate for start, end in spans)
+    assert len({start for start, _ in spans}) == 5
+
+
+def test_overlap_and_character_windows() -> None:
+    spans = list(iter_chunk_spans("abcdefghijkl", 5, 1))
+    assert spans == [(0, 5), (4, 9), (8, 12)]
+    assert list(iter_chunk_spans("abcdef", 3, 200)) == [(0, 3), (3, 6)]
+    assert list(iter_chunk_spans("   ", 3)) == []
+    with pytest.raises(ValueError):
+        list(iter_chunk_spans("abc", 0))
+
+
+def test_page_spans_are_lazy_and_use_global_offsets() -> None:
+    pages = iter(["first page", "", "second page"])
+    spans = iter_page_spans(pages, 100)
+
+    assert isinstance(spans, types.GeneratorType)
+    assert list(spans) == [(0, 10, 1), (10, 21, 3)]
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import hashlib
 from typing import Any
 from unittest.mock import MagicMock
 
@@ -105,13 +106,79 @@ def test_delete_and_reset_chat_return_success(
     connection.commit.assert_called_once()
 
 
-def test_reset_uploaded_docs_deletes_chunks_and_documents(db_connection: tuple[MagicMock, MagicMock]) -> None:
+def test_reset_uploaded_docs_tombstones_documents(db_connection: tuple[MagicMock, MagicMock]) -> None:
     connection, cursor = db_connection
     db.reset_uploaded_docs(5, "user@example.com")
-    assert cursor.execute.call_count == 2
+    assert cursor.execute.call_count == 1
+    assert "SET documents.deleted_at" in cursor.execute.call_args.args[0]
     connection.commit.assert_called_once()
 
 
+def test_delete_chat_only_tombstones_the_chat(db_connection: tuple[MagicMock, MagicMock]) -> None:
+    _, cursor = db_connection
+    cursor.rowcount = 0
+    assert db.delete_chat(5, "user@example.com") == "Could not delete"
+    (sql, params), = [call.args for call in cursor.execute.call_args_list]
+    assert "SET chats.deleted_at" in sql and "DELETE" not in sql
+    assert params == (5, "user@example.com")
+
+
+def test_delete_reaped_rows_only_accepts_reapable_tables(db_connection: tuple[MagicMock, MagicMock]) -> None:
+    connection, cursor = db_connection
+    cursor.rowcount = 2
+    assert db.delete_reaped_rows("chunks", [3, 4]) == 2
+    assert cursor.execute.call_args.args == ("DELETE FROM chunks WHERE id IN (%s, %s)", [3, 4])
+    connection.commit.assert_called_once()
+    with pytest.raises(ValueError):
+        db.delete_reaped_rows("users", [1])
+
+
+def test_in_place_chunk_updates_bump_the_chat_revision(db_connection: tuple[MagicMock, MagicMock]) -> None:
+    _, cursor = db_connection
+    cursor.fetchone.return_value = {"chat_id": 4, "text_md5": hashlib.md5(b"old").hexdigest()}
+    assert db.revise_document_chunks(7, "old", "new", [(1, 0, 3, None)], [], []) == 0
+    bumps = [call.args for call in cursor.execute.call_args_list if "chunk_revision" in call.args[0]]
+    assert bumps == [("UPDATE chats SET chunk_revision = chunk_revision + 1 WHERE id = %s", (4,))]
+
+    cursor.fetchone.return_value = {"chunk_count": 3, "max_chunk_id": 9, "chunk_revision": 2}
+    assert db.get_chat_chunk_version("user@example.com", 4) == (3, 9, 2)
+    assert "MAX(ch.chunk_revision)" in cursor.execute.call_args.args[0]
+
+
+def test_lexical_index_segments_are_grouped_and_replaced(db_connection: tuple[MagicMock, MagicMock]) -> None:
+    connection, cursor = db_connection
+    cursor.fetchall.return_value = [
+        {"document_id": 3, "postings": b"a"},
+        {"document_id": 3, "postings": b"b"},
+        {"document_id": 4, "postings": b"c"},
+    ]
+    assert db.get_chat_lexical_indexes("user@example.com", 9) == {3: [b"a", b"b"], 4: [b"c"]}
+    assert "ORDER BY li.document_id, li.segment" in cursor.execute.call_args.args[0]
+
+    cursor.execute.reset_mock()
+    db.save_document_lexical_index(3, 2, b"merged")
+    (delete_sql, delete_params), (insert_sql, insert_params) = [call.args for call in cursor.execute.call_args_list]
+    assert delete_sql.startswith("DELETE FROM document_lexical_index") and delete_params == (3,)
+    assert "VALUES (%s, 0, %s, %s)" in insert_sql and insert_params == (3, 2, b"merged")
+    connection.commit.assert_called_once()
+
+
+def test_orphaned_embeddings_are_rechecked_when_reaped(db_connection: tuple[MagicMock, MagicMock]) -> None:
+    _, cursor = db_connection
+    cursor.fetchall.return_value = [{"id": 8}, {"id": 9}]
+    assert db.get_reapable_ids("embeddings", 0, 500) == [8, 9]
+    listed = cursor.execute.call_args.args[0]
+    assert "FROM embeddings e" in listed and "INTERVAL 1 HOUR" in listed
+    assert "c.embedding_id = e.id" in listed and "s.embedding_id = e.id" in listed
+
+    cursor.rowcount = 1
+    assert db.delete_reaped_rows("embeddings", [8, 9]) == 1
+    sql, params = cursor.execute.call_args.args
+    assert sql.startswith("DELETE FROM embeddings WHERE id IN (%s, %s) AND NOT EXISTS")
+    assert "c.embedding_id = embeddings.id" in sql and "s.embedding_id = embeddings.id" in sql
+    assert params == [8, 9]
+
+
 def test_change_chat_mode_updates_model(db_connection: tuple[MagicMock, MagicMock]) -> None:
     connection, cursor = db_connection
     db.change_chat_mode(1, 5, "user@example.com")
@@ -172,3 +239,82 @@ def test_get_chat_info_returns_nones_when_missing(db_connection: tuple[MagicMock
     _, cursor = db_connection
     cursor.fetchone.return_value = None
     assert db.get_chat_info(1) == (None, None, None)
+
+
+def test_get_chunk_texts_fetches_only_requested_slices(db_connection: tuple[MagicMock, MagicMock]) -> None:
+    _, cursor = db_connection
+    cursor.fetchall.return_value = [{"chunk_id": 7, "chunk_text": "slice"}]
+    assert db.get_chunk_texts("user@example.com", [7, 8]) == {7: "slice"}
+    sql, params = cursor.execute.call_args.args
+    assert "SUBSTRING(d.document_text" in sql
+    assert params == ["user@example.com", 7, 8]
+
+
+def test_get_chunk_texts_skips_query_without_ids(db_connection: tuple[MagicMock, MagicMock]) -> None:
+    _, cursor = db_connection
+    assert db.get_chunk_texts("user@example.com", []) == {}
+    cursor.execute.assert_not_called()
+
+
+def test_get_chat_chunks_does_not_select_document_text(db_connection: tuple[MagicMock, MagicMock]) -> None:
+    _, cursor = db_connection
+    cursor.fetchall.return_value = []
+    db.get_chat_chunks("user@example.com", 3)
+    assert "document_text" not in cursor.execute.call_args.args[0]
+
+
+def test_create_chat_shareable_url_copies_each_table_in_one_statement(
+    db_connection: tuple[MagicMock, MagicMock],
+) -> None:
+    connection, cursor = db_connection
+    cursor.lastrowid = 21
+    cursor.rowcount = 1
+    url = db.create_chat_shareable_url(3)
+    statements = [call.args[0] for call in cursor.execute.call_args_list]
+    assert url is not None and url.startswith("/playbook/")
+    assert len(statements) == 4
+    assert all("INSERT INTO" in sql and "SELECT" in sql for sql in statements)
+    assert "deleted_at IS NULL" in statements[0]
+    assert "c.deleted_at IS NULL" in statements[3]
+    cursor.fetchall.assert_not_called()
+    connection.commit.assert_called_once()
+
+    cursor.execute.reset_mock()
+    cursor.rowcount = 0
+    assert db.create_chat_shareable_url(3) is None
+    assert cursor.execute.call_count == 1
+    connection.rollback.assert_called_once()
+
+
+def test_reads_by_id_skip_tombstoned_rows(db_connection: tuple[MagicMock, MagicMock]) -> None:
+    _, cursor = db_connection
+    cursor.fetchone.return_value = None
+    cursor.fetchall.return_value = []
+    cursor.rowcount = 0
+
+    db.reset_chat(3, "user@example.com")
+    db.get_document_revision_base(4)
+    db.get_chunk_embeddings("user@example.com", [7])
+    db.get_chat_embedding_space("user@example.com", 3)
+    db.get_document_embedding_space(4)
+
+    statements = [call.args[0] for call in cursor.execute.call_args_list]
+    assert len(statements) == 5
+    assert all("deleted_at IS NULL" in sql for sql in statements)
+    assert "c.deleted_at IS NULL AND d.deleted_at IS NULL AND ch.deleted_at IS NULL" in statements[2]
+
+
+def test_access_shareable_chat_imports_set_based_in_the_chunk_space(
+    db_connection: tuple[MagicMock, MagicMock],
+) -> None:
+    connection, cursor = db_connection
+    cursor.fetchone.side_effect = [{"id": 4}, {"embedding_model": "text-embedding-3-large", "embedding_dimensions": 256}]
+    cursor.lastrowid = 30
+    assert db.access_shareable_chat("uuid", user_id=2) == 30
+    chat_insert = cursor.execute.call_args_list[2].args
+    assert chat_insert[1] == (2, 0, "Imported from share", 0, "text-embedding-3-large", 256)
+    assert cursor.execute.call_count == 6
+    connection.commit.assert_called_once()
+
+    cursor.fetchone.side_effect = [None]
+    assert db.access_shareable_chat("missing") is None
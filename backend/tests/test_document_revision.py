@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+from typing import Any
+
+import numpy as np
+import pytest
+from database.embedding_encoding import decode_vector
+from database.embedding_space import EmbeddingSpace
+from services import finance_gpt
+from services.chunker import iter_segment_spans
+from services.document_revision import plan_revision
+
+PARAGRAPHS = [f"Paragraph {number} discusses segment revenue in detail." for number in range(6)]
+SPACE = EmbeddingSpace("text-embedding-3-small", 2)
+
+
+def _chunks(text: str) -> list[dict[str, Any]]:
+    return [
+        {"chunk_id": chunk_id, "start_index": start, "end_index": end, "page_number": page_number}
+        for chunk_id, (start, end, page_number) in enumerate(iter_segment_spans([(text, None)], 60, 0), start=1)
+    ]
+
+
+def test_plan_revision_keeps_moved_chunks_and_embeds_only_new_text() -> None:
+    old_text = "\n\n".join(PARAGRAPHS)
+    new_paragraphs = ["A new opening paragraph about guidance.", *PARAGRAPHS[:2], "Paragraph 2 was rewritten.", *PARAGRAPHS[3:]]
+    new_text = "\n\n".join(new_paragraphs)
+    old_chunks = _chunks(old_text)
+
+    plan = plan_revision(old_text, old_chunks, new_text, iter_segment_spans([(new_text, None)], 60, 0))
+
+    assert plan.kept == 5
+    assert [new_text[start:end] for start, end, _ in plan.added] == [new_paragraphs[0], new_paragraphs[3]]
+    assert plan.removed == [3]
+    assert {chunk_id for chunk_id, *_ in plan.moved} == {1, 2, 4, 5, 6}
+    for chunk_id, start, end, _ in plan.moved:
+        old = old_chunks[chunk_id - 1]
+        assert new_text[start:end] == old_text[old["start_index"] : old["end_index"]]
+
+
+def test_plan_revision_of_identical_text_is_unchanged() -> None:
+    text = "\n\n".join(PARAGRAPHS)
+    plan = plan_revision(text, _chunks(text), text, iter_segment_spans([(text, None)], 60, 0))
+    assert plan.unchanged and plan.kept == len(PARAGRAPHS)
+
+
+@pytest.fixture()
+def stored(monkeypatch: pytest.MonkeyPatch) -> dict[str, Any]:
+    text = "\n\n".join(PARAGRAPHS)
+    state: dict[str, Any] = {"text": text, "chunks": _chunks(text), "embedded": [], "revisions": [], "conflicts": 0}
+
+    def revise(document_id: int, base_text: str, new_text: str, moved: Any, removed: Any, rows: Any, **kwargs: Any) -> Any:
+        if state["conflicts"]:
+            state["conflicts"] -= 1
+            return None
+        state["revisions"].append({"moved": moved, "removed": removed, "rows": rows, **kwargs})
+        state["text"], state["chunks"] = new_text, _chunks(new_text)
+        return len(rows)
+
+    monkeypatch.setattr(finance_gpt, "get_document_embedding_space", lambda document_id: SPACE)
+    monkeypatch.setattr(finance_gpt, "get_document_revision_base", lambda document_id: (state["text"], state["chunks"]))
+    monkeypatch.setattr(finance_gpt, "revise_document_chunks", revise)
+    monkeypatch.setattr(
+        finance_gpt, "embed_passages", lambda texts, space, embed: (embed(texts), [None] * len(texts))
+    )
+    monkeypatch.setattr(
+        finance_gpt,
+        "_embed_passages_checked",
+        lambda texts, space=None: state["embedded"].extend(texts) or [[1.0, 0.5]] * len(texts),
+    )
+    monkeypatch.setattr(finance_gpt.ann_index, "index_document_chunks", lambda document_id, embeddings: None)
+    monkeypatch.setattr(finance_gpt, "_save_document_postings", lambda document_id, counts=None: None)
+    return state
+
+
+def test_reingest_document_applies_one_revision(stored: dict[str, Any]) -> None:
+    new_text = "\n\n".join([*PARAGRAPHS[:4], "Paragraph 4 now reports a loss."])
+    stages: list[str] = []
+
+    plan = finance_gpt.reingest_document(
+        [(new_text, None)], 60, 3, progress=lambda stage, **details: stages.append(stage)
+    )
+
+    assert stored["embedded"] == ["Paragraph 4 now reports a loss."]
+    assert plan.removed == [5, 6] and not plan.moved
+    (revision,) = stored["revisions"]
+    assert revision["space"] == SPACE
+    (row,) = revision["rows"]
+    assert new_text[row[0] : row[1]] == "Paragraph 4 now reports a loss." and row[2] == 3
+    np.testing.assert_allclose(decode_vector(row[3], dimensions=2), [1.0, 0.5])
+    assert stages == ["chunked", "embedded", "stored"]
+
+
+def test_reingest_document_replans_after_a_concurrent_revision(stored: dict[str, Any]) -> None:
+    stored["conflicts"] = 1
+    new_text = "\n\n".join(PARAGRAPHS[1:])
+
+    plan = finance_gpt.reingest_document([(new_text, None)], 60, 3)
+
+    assert plan.removed == [1] and stored["text"] == new_text
+    assert len(stored["revisions"]) == 1 and stored["embedded"] == []
+
+    assert finance_gpt.reingest_document([(new_text, None)], 60, 3).unchanged
@@ -6,6 +6,7 @@ Covers the new behaviours added on top of the original ingest path:
   * Batch over `MAX_FILES_PER_BATCH` → HTTP 413
   * Per-category size limits enforced BEFORE the file body is consumed
   * Per-file try/except: one failure does not abort the batch
+  * Files already in the chat are only re-chunked when `reingest` is set
   * Backward-compatible response shape (still exposes the `Success` key)
 """
 from __future__ import annotations
@@ -44,8 +45,12 @@ def _make_request(
     *,
     chat_id_values: list[str] | None = None,
     files: list[Any] | None = None,
+    reingest_values: list[str] | None = None,
 ) -> Any:
-    form_map = {"chat_id": chat_id_values if chat_id_values is not None else ["11"]}
+    form_map = {
+        "chat_id": chat_id_values if chat_id_values is not None else ["11"],
+        "reingest": reingest_values or [],
+    }
     files_map = {"files[]": files if files is not None else []}
     return SimpleNamespace(
         form=SimpleNamespace(getlist=lambda key: form_map.get(key, [])),
@@ -58,9 +63,10 @@ class _StubChunker:
 
     def __init__(self) -> None:
         self.calls: list[tuple[Any, int, int]] = []
+        self.reingest_calls: list[tuple[Any, int, int]] = []
 
-    def remote(self, text: Any, max_chunk_size: int, doc_id: int) -> None:
-        self.calls.append((text, max_chunk_size, doc_id))
+    def remote(self, text: Any, max_chunk_size: int, doc_id: int, reingest: bool = False) -> None:
+        (self.reingest_calls if reingest else self.calls).append((text, max_chunk_size, doc_id))
 
 
 # ---------------------------------------------------------------------------
@@ -203,6 +209,31 @@ def test_per_file_failure_does_not_poison_batch(
     assert add_doc_calls == [("good content", "good.pdf")]
 
 
+@pytest.mark.parametrize(("reingest_values", "expected"), [([], False), (["true"], True)])
+def test_existing_document_is_rechunked_only_on_reingest(
+    app_module: Any,
+    monkeypatch: pytest.MonkeyPatch,
+    reingest_values: list[str],
+    expected: bool,
+) -> None:
+    monkeypatch.setattr(documents_handler, "add_document", lambda text, filename, **kwargs: (42, True))
+    parser_module = SimpleNamespace(from_buffer=lambda file: {"content": "revised content"})
+    chunker = _StubChunker()
+
+    with app_module.app.app_context():
+        request = _make_request(
+            files=[_make_file(filename="report.pdf", content_type="application/pdf")],
+            reingest_values=reingest_values,
+        )
+        _, status = documents_handler.IngestDocumentsHandler(
+            request, "u@x.com", parser_module=parser_module, chunk_document_fn=chunker
+        )
+
+    assert status == 200
+    assert chunker.calls == []
+    assert chunker.reingest_calls == ([("revised content", 1000, 42)] if expected else [])
+
+
 # ---------------------------------------------------------------------------
 # _file_size_bytes helper
 # ---------------------------------------------------------------------------
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+from typing import Any
+
+import pytest
+from services.embedding_cache import EmbeddingCache, cache_key, normalize_text
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_normalized_keys_include_model_and_dimensions() -> None:
+    assert normalize_text("  what\tis\n revenue? ") == "what is revenue?"
+    assert cache_key("m", 8, "a  b") == cache_key("m", 8, " a b ")
+    assert cache_key("m", 8, "a b") != cache_key("m", 16, "a b")
+    assert cache_key("m", 8, "a b") != cache_key("other", 8, "a b")
+    assert cache_key("m", 8, "a b") != cache_key("m", 8, "A b")
+
+
+def test_get_or_compute_hits_expires_and_evicts() -> None:
+    clock = FakeClock()
+    cache = EmbeddingCache(max_entries=2, ttl_seconds=60, disk_path=None, clock=clock)
+    calls = []
+
+    def compute(text: str) -> list[float]:
+        calls.append(text)
+        return [float(len(text)), 0.5]
+
+    assert cache.get_or_compute("m", 2, "first", compute) == [5.0, 0.5]
+    assert cache.get_or_compute("m", 2, "first ", compute) == [5.0, 0.5]
+    assert calls == ["first"]
+
+    clock.now += 61
+    cache.get_or_compute("m", 2, "first", compute)
+    assert len(calls) == 2
+
+    cache.put("m", 2, "second", [1.0, 1.0])
+    cache.put("m", 2, "third", [2.0, 2.0])
+    assert cache.get("m", 2, "first") is None
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 3
+    assert stats["expirations"] == 1
+    assert stats["evictions"] == 1
+    assert stats["entries"] == 2
+    assert stats["hit_rate"] == pytest.approx(0.25)
+
+
+def test_disk_store_survives_restart_and_honours_ttl(tmp_path: Any) -> None:
+    clock = FakeClock()
+    path = str(tmp_path / "cache" / "embeddings.sqlite3")
+    EmbeddingCache(ttl_seconds=60, disk_path=path, clock=clock).put("m", 2, "q", [0.25, 0.75])
+
+    restarted = EmbeddingCache(ttl_seconds=60, disk_path=path, clock=clock)
+    assert restarted.get("m", 2, "q") == [0.25, 0.75]
+    assert restarted.get("m", 2, "q") == [0.25, 0.75]
+    assert restarted.stats()["disk_hits"] == 1
+    assert restarted.stats()["hits"] == 1
+
+    clock.now += 61
+    assert EmbeddingCache(ttl_seconds=60, disk_path=path, clock=clock).get("m", 2, "q") is None
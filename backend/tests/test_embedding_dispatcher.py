@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+from collections.abc import Callable, Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+import pytest
+import requests
+from services.embedding_dispatcher import (
+    EmbeddingDispatcher,
+    estimate_tokens,
+    is_retryable,
+    plan_batches,
+)
+
+
+class FakeEmbeddingServer(ThreadingHTTPServer):
+    """OpenAI-compatible ``/v1/embeddings`` stub that fails on demand."""
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), _FakeEmbeddingHandler)
+        self.lock = threading.Lock()
+        self.failures: list[int] = []
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1/embeddings"
+
+
+class _FakeEmbeddingHandler(BaseHTTPRequestHandler):
+    server: FakeEmbeddingServer
+
+    def do_POST(self) -> None:  # noqa: N802 - http.server API
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with self.server.lock:
+            self.server.requests += 1
+            status = self.server.failures.pop(0) if self.server.failures else 200
+            self.server.in_flight += 1
+            self.server.max_in_flight = max(self.server.max_in_flight, self.server.in_flight)
+        time.sleep(0.02)
+        with self.server.lock:
+            self.server.in_flight -= 1
+
+        if status != 200:
+            self.send_response(status)
+            self.send_header("Retry-After", "0")
+            self.end_headers()
+            return
+        payload = {"data": [{"embedding": [float(text.split()[-1]), 1.0]} for text in body["input"]]}
+        encoded = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        return None
+
+
+@pytest.fixture
+def fake_server() -> Iterator[FakeEmbeddingServer]:
+    server = FakeEmbeddingServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _http_embed_fn(url: str) -> Callable[[list[str]], list[list[float]]]:
+    session = requests.Session()
+
+    def embed(texts: list[str]) -> list[list[float]]:
+        response = session.post(url, json={"model": "fake", "input": texts}, timeout=5)
+        response.raise_for_status()
+        return [item["embedding"] for item in response.json()["data"]]
+
+    return embed
+
+
+def test_plan_batches_respects_token_and_count_budgets() -> None:
+    texts = ["x" * 39, "x" * 39, "x" * 39, "x" * 400, "x"]
+    assert estimate_tokens("x" * 39) == 10
+    assert plan_batches(texts, max_tokens=25, max_texts=10) == [(0, 2), (2, 3), (3, 4), (4, 5)]
+    assert plan_batches(texts, max_tokens=10_000, max_texts=2) == [(0, 2), (2, 4), (4, 5)]
+    assert plan_batches([], max_tokens=10, max_texts=10) == []
+
+
+def test_dispatcher_preserves_order_with_concurrency_and_retries(fake_server: FakeEmbeddingServer) -> None:
+    fake_server.failures = [429, 503]
+    dispatcher = EmbeddingDispatcher(
+        _http_embed_fn(fake_server.url),
+        concurrency=4,
+        max_batch_texts=3,
+        base_delay=0.001,
+        sleep=lambda seconds: None,
+    )
+
+    texts = [f"passage {index}" for index in range(20)]
+    embeddings = dispatcher.embed(texts)
+
+    assert [vector[0] for vector in embeddings] == [float(index) for index in range(20)]
+    assert dispatcher.last_stats.batches == 7
+    assert dispatcher.last_stats.retries == 2
+    assert fake_server.requests == 9
+    assert fake_server.max_in_flight > 1
+
+
+def test_dispatcher_does_not_retry_client_errors(fake_server: FakeEmbeddingServer) -> None:
+    fake_server.failures = [400]
+    sleeps: list[float] = []
+    dispatcher = EmbeddingDispatcher(_http_embed_fn(fake_server.url), sleep=sleeps.append)
+
+    with pytest.raises(requests.HTTPError):
+        dispatcher.embed(["passage 1"])
+    assert sleeps == []
+    assert fake_server.requests == 1
+
+
+def test_dispatcher_gives_up_after_max_retries() -> None:
+    class RateLimited(Exception):
+        status_code = 429
+
+    calls = []
+
+    def always_limited(texts: list[str]) -> list[list[float]]:
+        calls.append(texts)
+        raise RateLimited("slow down")
+
+    dispatcher = EmbeddingDispatcher(always_limited, max_retries=2, sleep=lambda seconds: None)
+    with pytest.raises(RateLimited):
+        dispatcher.embed(["a"])
+    assert len(calls) == 3
+    assert is_retryable(ConnectionError()) and not is_retryable(ValueError())
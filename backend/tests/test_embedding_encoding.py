@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+from typing import Any
+
+import numpy as np
+import pytest
+from database.embedding_encoding import decode_vector, encode_vector, infer_encoding, reencode
+from services import embedding_backfill
+from services.chunk_index_cache import build_chat_index
+
+
+def test_encodings_round_trip_as_float32() -> None:
+    vector = np.linspace(-1.0, 1.0, 768)
+
+    for encoding, size in (("float64", 6144), ("float32", 3072), ("float16", 1536)):
+        blob = encode_vector(vector, encoding)
+        assert len(blob) == size
+        decoded = decode_vector(blob, encoding)
+        assert decoded.dtype == np.float32
+        np.testing.assert_allclose(decoded, vector, atol=1e-3)
+
+    assert infer_encoding(encode_vector(vector, "float16"), 768) == "float16"
+    assert infer_encoding(encode_vector(vector, "float64")) == "float64"
+    assert reencode(encode_vector(vector, "float64"), "float64", "float32") == encode_vector(vector, "float32")
+
+
+def test_chat_index_reads_mixed_encodings() -> None:
+    rows = [
+        {
+            "chunk_id": chunk_id,
+            "start_index": 0,
+            "end_index": 1,
+            "document_id": 1,
+            "document_name": "doc",
+            "embedding_vector": encode_vector([1.0, float(chunk_id)], encoding),
+            "embedding_encoding": encoding,
+        }
+        for chunk_id, encoding in ((1, "float64"), (2, "float32"), (3, "float16"))
+    ]
+    # Rows from queries that do not select the column fall back to the blob length.
+    rows.append({**rows[0], "chunk_id": 4, "embedding_encoding": None})
+
+    index = build_chat_index(rows, 2)
+
+    assert list(index.chunk_ids) == [1, 2, 3, 4]
+    # Rows are stored normalized; the component ratio survives.
+    np.testing.assert_allclose(index.matrix[:, 1] / index.matrix[:, 0], [1.0, 2.0, 3.0, 1.0], rtol=1e-3)
+
+
+def test_backfill_reencodes_in_throttled_batches(monkeypatch: pytest.MonkeyPatch) -> None:
+    table = {chunk_id: [encode_vector([float(chunk_id)] * 4, "float64"), "float64"] for chunk_id in range(1, 6)}
+
+    def get_chunks(encoding: str, after_id: int, limit: int) -> list[dict[str, Any]]:
+        ids = sorted(i for i, (_, enc) in table.items() if enc == encoding and i > after_id)[:limit]
+        return [{"id": i, "embedding_vector": table[i][0]} for i in ids]
+
+    def update(updates: list[tuple[int, bytes]], source: str, target: str) -> int:
+        for chunk_id, blob in updates:
+            table[chunk_id] = [blob, target]
+        return len(updates)
+
+    monkeypatch.setattr(embedding_backfill, "get_chunks_by_encoding", get_chunks)
+    monkeypatch.setattr(embedding_backfill, "reencode_chunk_embeddings", update)
+    pauses: list[float] = []
+
+    stats = embedding_backfill.run_backfill("float64", "float32", batch_size=2, pause_seconds=0.25, sleep=pauses.append)
+
+    assert (stats.scanned, stats.updated, stats.batches) == (5, 5, 3)
+    assert pauses == [0.25, 0.25]
+    assert all(encoding == "float32" and len(blob) == 16 for blob, encoding in table.values())
+    assert decode_vector(table[3][0], "float32").tolist() == [3.0] * 4
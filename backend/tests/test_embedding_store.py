@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+from typing import Any
+
+import pytest
+from database.embedding_encoding import encode_vector
+from database.embedding_space import EmbeddingSpace
+from services import embedding_store
+
+SPACE = EmbeddingSpace("text-embedding-3-small", 2)
+
+
+class FakeEmbeddingTable:
+    def __init__(self) -> None:
+        self.rows: dict[str, dict[str, Any]] = {}
+
+    def lookup(self, hashes: list[str]) -> dict[str, dict[str, Any]]:
+        return {digest: self.rows[digest] for digest in hashes if digest in self.rows}
+
+    def add(self, entries: list[tuple[str, bytes]], space: EmbeddingSpace, encoding: str) -> dict[str, int]:
+        for digest, blob in entries:
+            self.rows.setdefault(
+                digest, {"id": len(self.rows) + 1, "embedding_vector": blob, "embedding_encoding": encoding}
+            )
+        return {digest: self.rows[digest]["id"] for digest, _ in entries}
+
+
+@pytest.fixture()
+def table(monkeypatch: pytest.MonkeyPatch) -> FakeEmbeddingTable:
+    fake = FakeEmbeddingTable()
+    monkeypatch.setattr(embedding_store, "get_embeddings_by_hash", fake.lookup)
+    monkeypatch.setattr(embedding_store, "add_embeddings", fake.add)
+    monkeypatch.setattr(embedding_store, "EMBEDDING_DEDUP", True)
+    return fake
+
+
+def _embedder(calls: list[list[str]]) -> Any:
+    def embed(texts: list[str]) -> list[list[float]]:
+        calls.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+    return embed
+
+
+def test_content_hash_depends_on_space_and_exact_text() -> None:
+    digest = embedding_store.content_hash("Revenue grew.", SPACE)
+    assert len(digest) == 64
+    assert digest != embedding_store.content_hash("Revenue  grew.", SPACE)
+    assert digest != embedding_store.content_hash("Revenue grew.", EmbeddingSpace(SPACE.model, 3))
+
+
+def test_embed_passages_embeds_each_unseen_text_once(table: FakeEmbeddingTable) -> None:
+    calls: list[list[str]] = []
+    stats = embedding_store.StoreStats()
+
+    vectors, ids = embedding_store.embed_passages(["aa", "bbb", "aa"], SPACE, _embedder(calls), stats)
+    again, again_ids = embedding_store.embed_passages(["bbb", "c"], SPACE, _embedder(calls), stats)
+
+    assert calls == [["aa", "bbb"], ["c"]]
+    assert vectors == [[2.0, 1.0], [3.0, 1.0], [2.0, 1.0]]
+    assert ids[0] == ids[2] and again_ids[0] == ids[1]
+    assert again == [[3.0, 1.0], [1.0, 1.0]]
+    assert (stats.texts, stats.embedded, stats.reused) == (5, 3, 2)
+
+
+def test_embed_passages_falls_back_to_inline_vectors(table: FakeEmbeddingTable, monkeypatch: pytest.MonkeyPatch) -> None:
+    def unavailable(*args: Any) -> Any:
+        raise ConnectionError("store down")
+
+    table.rows[embedding_store.content_hash("kept", SPACE)] = {
+        "id": 9, "embedding_vector": encode_vector([5.0, 5.0], "float32"), "embedding_encoding": "float32",
+    }
+    monkeypatch.setattr(embedding_store, "add_embeddings", unavailable)
+    calls: list[list[str]] = []
+
+    vectors, ids = embedding_store.embed_passages(["kept", "new"], SPACE, _embedder(calls))
+    assert vectors == [[5.0, 5.0], [3.0, 1.0]] and ids == [9, None]
+
+    monkeypatch.setattr(embedding_store, "get_embeddings_by_hash", unavailable)
+    vectors, ids = embedding_store.embed_passages(["kept"], SPACE, _embedder(calls))
+    assert vectors == [[4.0, 1.0]] and ids == [None]
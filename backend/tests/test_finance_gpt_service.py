@@ -1,11 +1,24 @@
 from __future__ import annotations
 
+from collections.abc import Iterable
 from types import SimpleNamespace
 from typing import Any
 
 import numpy as np
 import pytest
-from services import finance_gpt
+from database.embedding_space import DEFAULT_EMBEDDING_SPACE, EmbeddingSpace
+from services import finance_gpt, http_fetch
+
+
+@pytest.fixture(autouse=True)
+def _empty_retrieval_caches(monkeypatch: pytest.MonkeyPatch) -> Any:
+    monkeypatch.setattr(finance_gpt, "get_chat_embedding_space", lambda user_email, chat_id: DEFAULT_EMBEDDING_SPACE)
+    monkeypatch.setattr(finance_gpt, "get_document_embedding_space", lambda document_id: DEFAULT_EMBEDDING_SPACE)
+    finance_gpt.chunk_index_cache.clear()
+    finance_gpt.embedding_cache.clear()
+    yield
+    finance_gpt.chunk_index_cache.clear()
+    finance_gpt.embedding_cache.clear()
 
 
 def _fake_embedding_response(vectors: list[list[float]]) -> Any:
@@ -13,7 +26,7 @@ def _fake_embedding_response(vectors: list[list[float]]) -> Any:
 
 
 def test_get_model_and_embedding_helpers(monkeypatch: pytest.MonkeyPatch) -> None:
-    finance_gpt._embedding_model = None
+    finance_gpt._embedding_models = {}
     finance_gpt._text_splitters = {}
 
     client = SimpleNamespace(
@@ -31,6 +44,8 @@ def test_get_model_and_embedding_helpers(monkeypatch: pytest.MonkeyPatch) -> Non
 
     embedding = finance_gpt.get_embedding("question")
     assert len(embedding) == finance_gpt.EMBEDDING_DIMENSIONS
+    assert finance_gpt.get_embedding("  question ") == embedding
+    assert finance_gpt.embedding_cache.stats()["hits"] == 1
 
     embeddings = finance_gpt.get_embeddings_batch(["a", "b", "c"], batch_size=2)
     assert len(embeddings) == 3
@@ -68,8 +83,8 @@ def test_prepare_chunks_and_knn() -> None:
 
 def test_chunk_document_optimized(monkeypatch: pytest.MonkeyPatch) -> None:
     inserted = []
-    monkeypatch.setattr(finance_gpt, "get_embeddings_batch", lambda texts, batch_size=32: [[0.1] * finance_gpt.EMBEDDING_DIMENSIONS for _ in texts])
-    monkeypatch.setattr(finance_gpt, "add_chunks", lambda chunk_data: inserted.extend(chunk_data))
+    monkeypatch.setattr(finance_gpt, "get_embeddings_batch", lambda texts, batch_size=32, space=None: [[0.1] * finance_gpt.EMBEDDING_DIMENSIONS for _ in texts])
+    monkeypatch.setattr(finance_gpt, "add_chunks", lambda chunk_data, space=None, embedding_ids=None: inserted.extend(chunk_data))
 
     finance_gpt.chunk_document_optimized("abcdef", 3, 99)
 
@@ -79,8 +94,8 @@ def test_chunk_document_optimized(monkeypatch: pytest.MonkeyPatch) -> None:
 
 def test_chunk_document_by_page_and_fast_ingestion(monkeypatch: pytest.MonkeyPatch) -> None:
     inserted = []
-    monkeypatch.setattr(finance_gpt, "get_embeddings_batch", lambda texts, batch_size=32: [[0.2] * finance_gpt.EMBEDDING_DIMENSIONS for _ in texts])
-    monkeypatch.setattr(finance_gpt, "add_chunks_with_page_numbers", lambda chunk_data: inserted.extend(chunk_data))
+    monkeypatch.setattr(finance_gpt, "get_embeddings_batch", lambda texts, batch_size=32, space=None: [[0.2] * finance_gpt.EMBEDDING_DIMENSIONS for _ in texts])
+    monkeypatch.setattr(finance_gpt, "add_chunks_with_page_numbers", lambda chunk_data, space=None, embedding_ids=None: inserted.extend(chunk_data))
 
     finance_gpt.chunk_document_by_page_optimized(["abcdef", "ghijkl"], 3, 123)
     processed = finance_gpt.fast_pdf_ingestion(["mnopqr"], 3, 456)
@@ -90,31 +105,41 @@ def test_chunk_document_by_page_and_fast_ingestion(monkeypatch: pytest.MonkeyPat
     assert any(row[2] == 456 for row in inserted)
 
 
+
+
 def test_get_relevant_chunks(monkeypatch: pytest.MonkeyPatch) -> None:
     vector = np.array([1.0] * finance_gpt.EMBEDDING_DIMENSIONS, dtype=np.float64).tobytes()
+    monkeypatch.setattr(finance_gpt, "get_chat_chunk_version", lambda user_email, chat_id: (2, 2, 0))
     monkeypatch.setattr(
         finance_gpt,
         "get_chat_chunks",
-        lambda user_email, chat_id: [
+        lambda user_email, chat_id, code_scheme=None: [
             {
+                "chunk_id": 1,
                 "start_index": 0,
                 "end_index": 4,
                 "page_number": 1,
                 "embedding_vector": vector,
+                "document_id": 1,
                 "document_name": "doc-a",
-                "document_text": "abcdefgh",
             },
             {
+                "chunk_id": 2,
                 "start_index": 4,
                 "end_index": 8,
                 "page_number": 2,
                 "embedding_vector": vector,
+                "document_id": 2,
                 "document_name": "doc-b",
-                "document_text": "ijklmnop",
             },
         ],
     )
-    monkeypatch.setattr(finance_gpt, "get_embedding", lambda question: [1.0] * finance_gpt.EMBEDDING_DIMENSIONS)
+    monkeypatch.setattr(
+        finance_gpt,
+        "get_chunk_texts",
+        lambda user_email, chunk_ids: {1: "abcd", 2: "mnop"},
+    )
+    monkeypatch.setattr(finance_gpt, "get_embedding", lambda question, space=None: [1.0] * finance_gpt.EMBEDDING_DIMENSIONS)
 
     sources = finance_gpt.get_relevant_chunks(1, "question", 9, "user@example.com")
     assert len(sources) == 1
@@ -129,24 +154,75 @@ def test_get_relevant_chunks(monkeypatch: pytest.MonkeyPatch) -> None:
     )
     assert len(structured_sources) == 1
     assert structured_sources[0]["document_name"] in {"doc-a", "doc-b"}
+    assert structured_sources[0]["chunk_text"] in {"abcd", "mnop"}
     assert structured_sources[0]["source_type"] == "document_chunk"
 
 
+def test_get_relevant_chunks_reuses_cached_index(monkeypatch: pytest.MonkeyPatch) -> None:
+    dims = finance_gpt.EMBEDDING_DIMENSIONS
+    near = np.array([1.0] + [0.0] * (dims - 1), dtype=np.float64).tobytes()
+    far = np.array([0.0, 1.0] + [0.0] * (dims - 2), dtype=np.float64).tobytes()
+    rows: list[dict[str, Any]] = [
+        {"chunk_id": 1, "start_index": 0, "end_index": 4, "page_number": None, "embedding_vector": far,
+         "document_id": 1, "document_name": "doc-a"},
+        {"chunk_id": 2, "start_index": 4, "end_index": 8, "page_number": 3, "embedding_vector": near,
+         "document_id": 1, "document_name": "doc-a"},
+    ]
+    loads: list[int] = []
+    text_requests: list[list[int]] = []
+    version = {"value": (2, 2, 0)}
+
+    def get_chat_chunks(user_email: str, chat_id: int, code_scheme: Any = None) -> list[dict[str, Any]]:
+        loads.append(chat_id)
+        return rows
+
+    def get_chunk_texts(user_email: str, chunk_ids: Iterable[int]) -> dict[int, str]:
+        text_requests.append(list(chunk_ids))
+        return {2: "efgh"}
+
+    monkeypatch.setattr(finance_gpt, "get_chat_chunk_version", lambda user_email, chat_id: version["value"])
+    monkeypatch.setattr(finance_gpt, "get_chat_chunks", get_chat_chunks)
+    monkeypatch.setattr(finance_gpt, "get_chunk_texts", get_chunk_texts)
+    monkeypatch.setattr(finance_gpt, "get_embedding", lambda question, space=None: [1.0] + [0.0] * (dims - 1))
+
+    first = finance_gpt.get_relevant_chunks(1, "q", 9, "user@example.com", include_metadata=True)
+    second = finance_gpt.get_relevant_chunks(1, "q", 9, "user@example.com", include_metadata=True)
+    assert first == second
+    assert first[0]["chunk_text"] == "efgh"
+    assert first[0]["page_number"] == 3
+    assert loads == [9]
+    assert text_requests == [[2], [2]]
+
+    version["value"] = (3, 5, 0)
+    finance_gpt.get_relevant_chunks(1, "q", 9, "user@example.com")
+    assert loads == [9, 9]
+
+    # Re-ingestion moved chunks in place: same count and ids, new revision.
+    version["value"] = (2, 2, 1)
+    for row in rows:
+        row["chunk_revision"] = 1
+    finance_gpt.get_relevant_chunks(1, "q", 9, "user@example.com")
+    finance_gpt.get_relevant_chunks(1, "q", 9, "user@example.com")
+    assert loads == [9, 9, 9]
+
+
 def test_get_relevant_chunks_handles_embedding_failure(monkeypatch: pytest.MonkeyPatch) -> None:
-    monkeypatch.setattr(finance_gpt, "get_chat_chunks", lambda user_email, chat_id: [])
+    monkeypatch.setattr(finance_gpt, "get_chat_chunk_version", lambda user_email, chat_id: (0, 0, 0))
+    monkeypatch.setattr(finance_gpt, "get_chat_chunks", lambda user_email, chat_id, code_scheme=None: [])
     assert finance_gpt.get_relevant_chunks(2, "question", 1, "user@example.com") == []
 
+    monkeypatch.setattr(finance_gpt, "get_chat_chunk_version", lambda user_email, chat_id: (1, 0, 0))
+
     bad_vector = np.array([1.0, 2.0], dtype=np.float64).tobytes()
     monkeypatch.setattr(
         finance_gpt,
         "get_chat_chunks",
-        lambda user_email, chat_id: [
+        lambda user_email, chat_id, code_scheme=None: [
             {
                 "start_index": 0,
                 "end_index": 2,
                 "embedding_vector": bad_vector,
                 "document_name": "doc",
-                "document_text": "ab",
             }
         ],
     )
@@ -176,8 +252,9 @@ def test_pdf_and_url_helpers(monkeypatch: pytest.MonkeyPatch) -> None:
 
 def test_validate_external_url_allows_public_hosts(monkeypatch: pytest.MonkeyPatch) -> None:
     monkeypatch.setattr(finance_gpt, "ALLOWED_FETCH_HOSTS", ("example.com",))
+    monkeypatch.setattr(http_fetch, "resolver_cache", http_fetch.ResolverCache())
     monkeypatch.setattr(
-        finance_gpt.socket,
+        http_fetch.socket,
         "getaddrinfo",
         lambda host, port: [(None, None, None, None, ("93.184.216.34", 0))],
     )
@@ -192,8 +269,9 @@ def test_validate_external_url_allows_public_hosts(monkeypatch: pytest.MonkeyPat
 
 def test_validate_external_url_blocks_private_hosts(monkeypatch: pytest.MonkeyPatch) -> None:
     monkeypatch.setattr(finance_gpt, "ALLOWED_FETCH_HOSTS", ("localhost",))
+    monkeypatch.setattr(http_fetch, "resolver_cache", http_fetch.ResolverCache())
     monkeypatch.setattr(
-        finance_gpt.socket,
+        http_fetch.socket,
         "getaddrinfo",
         lambda host, port: [(None, None, None, None, ("127.0.0.1", 0))],
     )
@@ -207,3 +285,90 @@ def test_validate_external_url_blocks_non_allowlisted_host(
     monkeypatch.setattr(finance_gpt, "ALLOWED_FETCH_HOSTS", ("example.com",))
     with pytest.raises(finance_gpt.UnsafeUrlError):
         finance_gpt.validate_external_url("https://evil.com")
+
+
+def test_get_relevant_chunks_multi_embeds_once_and_dedupes_by_chunk_id(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    dims = finance_gpt.EMBEDDING_DIMENSIONS
+
+    def axis(i: int) -> list[float]:
+        return [1.0 if j == i else 0.0 for j in range(dims)]
+
+    rows = [
+        {"chunk_id": chunk_id, "start_index": 0, "end_index": 4, "page_number": None,
+         "embedding_vector": np.array(axis(chunk_id - 1), dtype=np.float64).tobytes(),
+         "document_id": 1, "document_name": "doc-a"}
+        for chunk_id in (1, 2, 3)
+    ]
+    model_calls: list[list[str]] = []
+    text_requests: list[list[int]] = []
+
+    def get_chunk_texts(user_email: str, chunk_ids: Iterable[int]) -> dict[int, str]:
+        text_requests.append(list(chunk_ids))
+        return {1: "one", 2: "two", 3: "three"}
+
+    monkeypatch.setattr(finance_gpt, "get_chat_chunk_version", lambda user_email, chat_id: (3, 3, 0))
+    monkeypatch.setattr(finance_gpt, "get_chat_chunks", lambda user_email, chat_id, code_scheme=None: rows)
+    monkeypatch.setattr(finance_gpt, "get_chunk_texts", get_chunk_texts)
+    vectors = {"query: first": axis(0), "query: second": [0.6, 0.8] + [0.0] * (dims - 2)}
+
+    def model(texts: Iterable[str]) -> list[list[float]]:
+        model_calls.append(list(texts))
+        return [vectors[text] for text in model_calls[-1]]
+
+    monkeypatch.setattr(finance_gpt, "_get_model", lambda space=None: model)
+
+    results = finance_gpt.get_relevant_chunks_multi(2, ["first", "second", "first "], 9, "user@example.com")
+
+    assert model_calls == [["query: first", "query: second"]]
+    assert [(result["chunk_id"], result["query"]) for result in results] == [
+        (1, "first"),
+        (2, "first"),
+    ]
+    assert results[0]["chunk_text"] == "one"
+    assert text_requests == [[1, 2]]
+
+    finance_gpt.get_relevant_chunks_multi(1, ["second"], 9, "user@example.com")
+    assert len(model_calls) == 1
+
+
+def test_get_model_requests_reduced_dimensions_per_space(monkeypatch: pytest.MonkeyPatch) -> None:
+    requests: list[dict[str, Any]] = []
+
+    def create(**kwargs: Any) -> Any:
+        requests.append(kwargs)
+        return _fake_embedding_response([[0.0] * kwargs.get("dimensions", 3) for _ in kwargs["input"]])
+
+    monkeypatch.setattr(finance_gpt, "_client", SimpleNamespace(embeddings=SimpleNamespace(create=create)))
+    monkeypatch.setattr(finance_gpt, "_embedding_models", {})
+    small = EmbeddingSpace("text-embedding-3-large", 256)
+    legacy = EmbeddingSpace("text-embedding-ada-002", 3)
+
+    assert len(finance_gpt.get_embedding("q", small)) == 256
+    finance_gpt._get_model(legacy)(["x"])
+
+    assert requests[0]["model"] == "text-embedding-3-large" and requests[0]["dimensions"] == 256
+    assert "dimensions" not in requests[1]
+    assert finance_gpt._get_model(small) is not finance_gpt._get_model(legacy)
+
+
+def test_load_chat_index_skips_chunks_from_other_spaces(monkeypatch: pytest.MonkeyPatch) -> None:
+    space = EmbeddingSpace("text-embedding-3-small", 4)
+    rows = [
+        {"chunk_id": 1, "start_index": 0, "end_index": 1, "page_number": None, "document_id": 1,
+         "document_name": "doc", "embedding_vector": np.ones(4, dtype=np.float32).tobytes(),
+         "embedding_encoding": "float32", "embedding_model": space.model, "embedding_dimensions": 4},
+        {"chunk_id": 2, "start_index": 1, "end_index": 2, "page_number": None, "document_id": 1,
+         "document_name": "doc", "embedding_vector": np.ones(4, dtype=np.float32).tobytes(),
+         "embedding_encoding": "float32", "embedding_model": "text-embedding-3-large", "embedding_dimensions": 4},
+    ]
+    monkeypatch.setattr(finance_gpt, "get_chat_embedding_space", lambda user_email, chat_id: space)
+    monkeypatch.setattr(finance_gpt, "get_chat_chunk_version", lambda user_email, chat_id: (2, 2, 0))
+    monkeypatch.setattr(finance_gpt, "get_chat_chunks", lambda user_email, chat_id, code_scheme=None: rows)
+
+    index = finance_gpt.load_chat_index("user@example.com", 5)
+
+    assert index.chunk_ids.tolist() == [1]
+    assert index.space == space
+    assert finance_gpt.load_chat_index("user@example.com", 5) is index
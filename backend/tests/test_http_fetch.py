@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import socket
+import threading
+from collections.abc import Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+
+import pytest
+import requests
+from services import http_fetch
+from services.http_fetch import ResolverCache, UnsafeUrlError
+
+ADDRESSES = {"example.com": "93.184.216.34", "internal.example.com": "10.0.0.5"}
+
+
+def _response(status: int, body: bytes = b"", **headers: str) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status
+    response._content = body
+    response.headers.update({name.replace("_", "-"): value for name, value in headers.items()})
+    return response
+
+
+class FakeSession:
+    def __init__(self, responses: list[requests.Response]) -> None:
+        self.responses = responses
+        self.requests: list[tuple[str, dict[str, str]]] = []
+
+    def get(self, url: str, headers: dict[str, str], **kwargs: Any) -> requests.Response:
+        self.requests.append((url, dict(headers)))
+        return self.responses.pop(0)
+
+
+@pytest.fixture(autouse=True)
+def isolated(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    lookups: list[str] = []
+
+    def getaddrinfo(host: str, port: Any) -> list[tuple[Any, ...]]:
+        lookups.append(host)
+        if host not in ADDRESSES:
+            raise socket.gaierror("unknown host")
+        return [(None, None, None, None, (ADDRESSES[host], 0))]
+
+    monkeypatch.setattr(http_fetch.socket, "getaddrinfo", getaddrinfo)
+    monkeypatch.setattr(http_fetch, "resolver_cache", ResolverCache(max_entries=8, ttl_seconds=60))
+    monkeypatch.setattr(http_fetch, "HTTP_CACHE_PATH", str(tmp_path / "http.sqlite3"))
+    monkeypatch.setattr(http_fetch, "_disk_cache", None)
+    monkeypatch.setattr(http_fetch, "_disk_cache_opened", False)
+    return lookups
+
+
+def test_unchanged_page_costs_one_conditional_request(monkeypatch: pytest.MonkeyPatch) -> None:
+    session = FakeSession([
+        _response(200, b"<p>report</p>", ETag='"v1"', Last_Modified="Mon, 05 Oct 2026 10:00:00 GMT"),
+        _response(304),
+    ])
+    monkeypatch.setattr(http_fetch, "_session", session)
+    parsed: list[bytes] = []
+
+    def text_of(result: http_fetch.FetchResult) -> str:
+        def parse() -> str:
+            parsed.append(result.content)
+            return "report"
+
+        text: str = http_fetch.extracted_text(result.content, "test", parse)
+        return text
+
+    first = http_fetch.fetch("https://example.com/report")
+    second = http_fetch.fetch("https://example.com/report")
+
+    assert (first.from_cache, second.from_cache) == (False, True)
+    assert second.content == b"<p>report</p>" and second.status_code == 200
+    assert second.headers["ETag"] == '"v1"'
+    assert session.requests[1][1] == {
+        "If-None-Match": '"v1"',
+        "If-Modified-Since": "Mon, 05 Oct 2026 10:00:00 GMT",
+    }
+    assert text_of(first) == text_of(second) == "report"
+    assert len(parsed) == 1
+
+
+def test_responses_without_validators_are_not_stored(monkeypatch: pytest.MonkeyPatch) -> None:
+    session = FakeSession([
+        _response(200, b"a"),
+        _response(200, b"b", ETag='"x"', Cache_Control="no-store"),
+        _response(200, b"c"),
+    ])
+    monkeypatch.setattr(http_fetch, "_session", session)
+
+    assert [http_fetch.fetch("https://example.com/").content for _ in range(3)] == [b"a", b"b", b"c"]
+    assert all(headers == {} for _, headers in session.requests)
+
+
+def test_resolver_cache_still_rejects_private_addresses(isolated: list[str]) -> None:
+    http_fetch.ensure_public_host("example.com")
+    http_fetch.ensure_public_host("EXAMPLE.com")
+    for _ in range(2):
+        with pytest.raises(UnsafeUrlError):
+            http_fetch.ensure_public_host("internal.example.com")
+    for _ in range(2):
+        with pytest.raises(UnsafeUrlError):
+            http_fetch.ensure_public_host("missing.example.com")
+
+    assert isolated == ["example.com", "internal.example.com", "missing.example.com", "missing.example.com"]
+
+
+def test_redirects_to_private_hosts_are_refused(monkeypatch: pytest.MonkeyPatch) -> None:
+    session = FakeSession([
+        _response(302, Location="/moved"),
+        _response(302, Location="http://internal.example.com/admin"),
+    ])
+    monkeypatch.setattr(http_fetch, "_session", session)
+
+    with pytest.raises(UnsafeUrlError):
+        http_fetch.fetch("https://example.com/", allow_redirects=True)
+    assert [url for url, _ in session.requests] == ["https://example.com/", "https://example.com/moved"]
+
+
+class HostEchoHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:  # noqa: N802 - http.server API
+        body = (self.headers["Host"] or "").encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+@pytest.fixture()
+def pinned(monkeypatch: pytest.MonkeyPatch) -> Iterator[list[tuple[str, int]]]:
+    """Route pinned connections to a local server, recording the address each one was pinned to."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), HostEchoHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    connected: list[tuple[str, int]] = []
+
+    def create_connection(address: tuple[str, int], *args: Any, **kwargs: Any) -> socket.socket:
+        connected.append(address)
+        sock = socket.socket()
+        sock.connect(server.server_address)
+        return sock
+
+    monkeypatch.setattr(http_fetch, "create_connection", create_connection)
+    monkeypatch.setattr(http_fetch, "_session", None)
+    yield connected
+    server.shutdown()
+    server.server_close()
+
+
+def test_connections_are_pinned_to_the_checked_address(
+    pinned: list[tuple[str, int]], isolated: list[str]
+) -> None:
+    result = http_fetch.fetch("http://example.com:8080/", use_cache=False)
+
+    assert result.content == b"example.com:8080"
+    assert pinned == [("93.184.216.34", 8080)]
+    assert isolated == ["example.com"]
+
+
+def test_rebinding_to_loopback_after_the_check_is_refused(
+    pinned: list[tuple[str, int]], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    answers = ["93.184.216.34", "127.0.0.1"]
+
+    def getaddrinfo(host: str, port: Any) -> list[tuple[Any, ...]]:
+        return [(None, None, None, None, (answers.pop(0), 0))]
+
+    monkeypatch.setattr(http_fetch.socket, "getaddrinfo", getaddrinfo)
+    # An expired entry makes the connection resolve again after the URL was checked.
+    monkeypatch.setattr(http_fetch, "resolver_cache", ResolverCache(max_entries=8, ttl_seconds=0))
+
+    with pytest.raises(UnsafeUrlError):
+        http_fetch.fetch("http://rebind.example.com/", use_cache=False)
+    assert answers == [] and pinned == []
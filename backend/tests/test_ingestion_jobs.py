@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import threading
+from typing import Any
+
+import pytest
+from services import ingestion_jobs
+from services.ingestion_jobs import IngestionJobManager, IngestionSource
+
+
+def _staged_process(source: IngestionSource, chat_id: int, max_chunk_size: int, progress: Any) -> None:
+    if source.name == "broken.pdf":
+        raise ValueError("cannot parse")
+    progress("extracted")
+    progress("chunked", document_id=7, chunks=3)
+    progress("embedded", document_id=7)
+    progress("stored", document_id=7)
+
+
+def test_job_reports_per_file_stages_and_failures() -> None:
+    manager = IngestionJobManager(max_workers=2, process=_staged_process)
+    job = manager.submit("owner", 5, [IngestionSource(name="a.pdf"), IngestionSource(name="broken.pdf")])
+
+    assert job["status"] in {"queued", "running", "completed_with_errors"}
+    final = manager.wait(job["job_id"], "owner", timeout=5)
+
+    assert final["status"] == "completed_with_errors"
+    assert final["chat_id"] == 5
+    assert final["files"][0] == {
+        "name": "a.pdf",
+        "stage": "stored",
+        "document_id": 7,
+        "chunks": 3,
+        "already_existed": False,
+        "error": None,
+    }
+    assert final["files"][1]["stage"] == "failed"
+    assert final["files"][1]["error"] == "cannot parse"
+    assert manager.get(job["job_id"], "someone-else") is None
+
+
+def test_files_run_in_parallel_within_worker_budget() -> None:
+    barrier = threading.Barrier(2, timeout=5)
+
+    def process(source: IngestionSource, chat_id: int, max_chunk_size: int, progress: Any) -> None:
+        barrier.wait()
+        progress("stored")
+
+    manager = IngestionJobManager(max_workers=2, process=process)
+    job = manager.submit("owner", 1, [IngestionSource(name="a"), IngestionSource(name="b")])
+    assert manager.wait(job["job_id"], "owner", timeout=5)["status"] == "completed"
+
+
+def test_iter_events_streams_until_finished() -> None:
+    release = threading.Event()
+
+    def process(source: IngestionSource, chat_id: int, max_chunk_size: int, progress: Any) -> None:
+        progress("extracted")
+        release.wait(5)
+        progress("stored")
+
+    manager = IngestionJobManager(max_workers=1, process=process)
+    job = manager.submit("owner", 1, [IngestionSource(name="a")])
+    events = manager.iter_events(job["job_id"], "owner", heartbeat_seconds=0.01)
+
+    first = next(events)
+    assert first is not None
+    release.set()
+    remaining = [event for event in events if event is not None]
+    assert remaining[-1]["status"] == "completed"
+    assert list(manager.iter_events("missing", "owner")) == []
+
+
+def test_ingest_source_skips_existing_and_tracks_document(monkeypatch: pytest.MonkeyPatch) -> None:
+    stages: list[tuple[str, dict[str, Any]]] = []
+    progress = lambda stage, **details: stages.append((stage, details))  # noqa: E731
+
+    monkeypatch.setattr(ingestion_jobs, "add_document", lambda text, name, chat_id=None: (3, True))
+    ingestion_jobs.ingest_source(IngestionSource(name="n", text="body"), 1, 100, progress)
+    assert stages == [("extracted", {}), ("stored", {"document_id": 3, "already_existed": True})]
+
+    stages.clear()
+    ingested = []
+    monkeypatch.setattr(ingestion_jobs, "add_document", lambda text, name, chat_id=None: (4, False))
+    monkeypatch.setattr(ingestion_jobs, "get_text_from_url", lambda url: "from url")
+
+    def fake_ingest(text: str, max_chunk_size: int, document_id: int, progress: Any) -> int:
+        ingested.append((text, max_chunk_size, document_id))
+        progress("stored", chunks=1)
+        return 1
+
+    monkeypatch.setattr(ingestion_jobs, "ingest_document_text", fake_ingest)
+    ingestion_jobs.ingest_source(IngestionSource(name="u", url="https://example.com"), 1, 100, progress)
+    assert ingested == [("from url", 100, 4)]
+    assert stages[-1] == ("stored", {"document_id": 4, "chunks": 1})
+
+
+def test_ingest_source_streams_pdf_pages(monkeypatch: pytest.MonkeyPatch) -> None:
+    created: list[tuple[str, str, int | None]] = []
+    streamed = []
+
+    def add_document(text: str, name: str, chat_id: int | None = None) -> tuple[int, bool]:
+        created.append((text, name, chat_id))
+        return 8, False
+
+    monkeypatch.setattr(ingestion_jobs, "add_document", add_document)
+    monkeypatch.setattr(ingestion_jobs, "iter_pdf_pages", lambda file: iter([("page one", 1), ("page two", 2)]))
+
+    def fake_pages(segments: Any, max_chunk_size: int, document_id: int, append_text: Any, progress: Any) -> int:
+        streamed.extend(segments)
+        assert append_text is ingestion_jobs.append_document_text
+        progress("stored")
+        return 2
+
+    monkeypatch.setattr(ingestion_jobs, "ingest_document_pages", fake_pages)
+    stages: list[tuple[str, dict[str, Any]]] = []
+    ingestion_jobs.ingest_source(
+        IngestionSource(name="report.pdf", content=b"%PDF-1.7 ..."),
+        2,
+        500,
+        lambda stage, **details: stages.append((stage, details)),
+    )
+
+    assert created == [("", "report.pdf", 2)]
+    assert streamed == [("page one", 1), ("page two", 2)]
+    assert stages == [("stored", {"document_id": 8})]
+
+
+def test_ingest_source_reingests_existing_document_on_request(monkeypatch: pytest.MonkeyPatch) -> None:
+    refreshed = []
+    monkeypatch.setattr(ingestion_jobs, "add_document", lambda text, name, chat_id=None: (9, True))
+
+    def fake_reingest(segments: Any, max_chunk_size: int, document_id: int, progress: Any) -> None:
+        refreshed.append((list(segments), document_id))
+        progress("stored", chunks=2)
+
+    monkeypatch.setattr(ingestion_jobs, "reingest_document", fake_reingest)
+    stages: list[tuple[str, dict[str, Any]]] = []
+
+    def record(stage: str, **details: Any) -> None:
+        stages.append((stage, details))
+
+    ingestion_jobs.ingest_source(IngestionSource(name="q3.txt", text="Revenue grew."), 2, 500, record)
+    ingestion_jobs.ingest_source(IngestionSource(name="q3.txt", text="Revenue fell.", reingest=True), 2, 500, record)
+
+    assert refreshed == [([("Revenue fell.", None)], 9)]
+    assert stages == [
+        ("extracted", {}),
+        ("stored", {"document_id": 9, "already_existed": True}),
+        ("extracted", {}),
+        ("stored", {"document_id": 9, "already_existed": True, "chunks": 2}),
+    ]
+
+
+def test_ingest_source_streams_spreadsheets(monkeypatch: pytest.MonkeyPatch) -> None:
+    created: list[tuple[str, str]] = []
+    calls = []
+
+    def add_document(text: str, name: str, chat_id: int | None = None) -> tuple[int, bool]:
+        created.append((text, name))
+        return 11, False
+
+    monkeypatch.setattr(ingestion_jobs, "add_document", add_document)
+
+    def fake_tabular(content: bytes, name: str, mime: str, max_chunk_size: int, document_id: int, **kwargs: Any) -> int:
+        calls.append((content, name, max_chunk_size, document_id, kwargs["reingest"]))
+        kwargs["progress"]("stored", chunks=2)
+        return 2
+
+    monkeypatch.setattr(ingestion_jobs, "ingest_tabular_document", fake_tabular)
+    stages: list[tuple[str, dict[str, Any]]] = []
+    ingestion_jobs.ingest_source(
+        IngestionSource(name="sales.csv", content=b"a,b\n1,2\n"),
+        2,
+        500,
+        lambda stage, **details: stages.append((stage, details)),
+    )
+
+    assert created == [("", "sales.csv")]
+    assert calls == [(b"a,b\n1,2\n", "sales.csv", 500, 11, False)]
+    assert stages == [("stored", {"document_id": 11, "already_existed": False, "chunks": 2})]
+
+
+def test_failed_ingestion_is_discarded_so_a_retry_produces_chunks(monkeypatch: pytest.MonkeyPatch) -> None:
+    documents: dict[str, int] = {}
+    discarded: list[int] = []
+
+    def add_document(text: str, name: str, chat_id: int | None = None) -> tuple[int, bool]:
+        if name in documents:
+            return documents[name], True
+        documents[name] = 20 + len(discarded)
+        return documents[name], False
+
+    def discard_document(document_id: int) -> None:
+        discarded.append(document_id)
+        del documents[next(name for name, live_id in documents.items() if live_id == document_id)]
+
+    attempts: list[int] = []
+
+    def flaky_ingest(text: str, max_chunk_size: int, document_id: int, progress: Any) -> int:
+        attempts.append(document_id)
+        if len(attempts) == 1:
+            progress("chunked", chunks=2)
+            raise RuntimeError("embedding service unavailable")
+        progress("stored", chunks=2)
+        return 2
+
+    monkeypatch.setattr(ingestion_jobs, "add_document", add_document)
+    monkeypatch.setattr(ingestion_jobs, "discard_document", discard_document)
+    monkeypatch.setattr(ingestion_jobs, "ingest_document_text", flaky_ingest)
+    manager = IngestionJobManager(max_workers=1)
+
+    first = manager.submit("owner", 1, [IngestionSource(name="filing.txt", text="body")])
+    assert manager.wait(first["job_id"], "owner", timeout=5)["files"][0]["stage"] == "failed"
+    retry = manager.submit("owner", 1, [IngestionSource(name="filing.txt", text="body")])
+    retried = manager.wait(retry["job_id"], "owner", timeout=5)["files"][0]
+
+    assert discarded == [20]
+    assert (retried["stage"], retried["document_id"], retried["chunks"], retried["already_existed"]) == (
+        "stored", 21, 2, False,
+    )
+    assert attempts == [20, 21]
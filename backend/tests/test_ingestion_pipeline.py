@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import threading
+from collections.abc import Iterator
+from typing import Any
+
+import pytest
+from services.ingestion_pipeline import iter_text_segments, run_pipeline
+
+
+def _embed(texts: list[str]) -> list[list[float]]:
+    return [[float(len(text)), 1.0] for text in texts]
+
+
+def test_pipeline_stores_rows_with_global_offsets_and_appends_text_first() -> None:
+    pages = [("alpha beta", 1), ("gamma", 2), ("", 3), ("delta", 4)]
+    events: list[Any] = []
+    stages: list[str] = []
+
+    stats = run_pipeline(
+        iter(pages),
+        100,
+        7,
+        _embed,
+        lambda rows, vectors: events.append(("rows", rows, vectors)),
+        append_text=lambda document_id, text: events.append(("text", document_id, text)),
+        progress=lambda stage, **details: stages.append(stage),
+        embed_batch=2,
+    )
+
+    document = "".join(text for text, _ in pages)
+    appended = ""
+    stored = []
+    for event in events:
+        if event[0] == "text":
+            appended += event[2]
+        else:
+            for start, end, document_id, vector_bytes, page_number in event[1]:
+                assert end <= len(appended)
+                stored.append((document[start:end], document_id, page_number))
+                assert isinstance(vector_bytes, bytes)
+    assert appended == document
+    # Page text is appended once per stored batch, not once per page.
+    assert [event[0] for event in events] == ["text", "rows", "text", "rows"]
+    assert stored == [("alpha beta", 7, 1), ("gamma", 7, 2), ("delta", 7, 4)]
+    assert stages == ["extracted", "chunked", "embedded", "stored"]
+    assert (stats.segments, stats.chunks) == (4, 3)
+    assert set(stats.stage_seconds) == {"extract", "chunk", "embed", "store"}
+
+
+def test_pipeline_overlaps_stages_with_bounded_queues() -> None:
+    produced = []
+    store_started = threading.Event()
+
+    def segments() -> Iterator[tuple[str, int]]:
+        for page_number in range(1, 50):
+            produced.append(page_number)
+            yield f"page {page_number}", page_number
+
+    def store(rows: list[Any], vectors: list[Any]) -> None:
+        if not store_started.is_set():
+            store_started.set()
+            # While the first batch is being stored, extraction continues but
+            # stays within the queue bounds.
+            for _ in range(50):
+                if len(produced) > 5:
+                    break
+                threading.Event().wait(0.01)
+            assert 1 < len(produced) < 49
+
+    stats = run_pipeline(segments(), 100, 1, _embed, store, embed_batch=1, queue_size=2)
+    assert stats.chunks == 49
+
+
+def test_pipeline_propagates_stage_failures() -> None:
+    def broken_segments() -> Iterator[tuple[str, int]]:
+        yield "fine", 1
+        raise ValueError("corrupt page")
+
+    with pytest.raises(ValueError, match="corrupt page"):
+        run_pipeline(broken_segments(), 100, 1, _embed, lambda rows, vectors: None)
+
+    def failing_store(rows: list[Any], vectors: list[Any]) -> None:
+        raise RuntimeError("db down")
+
+    with pytest.raises(RuntimeError, match="db down"):
+        run_pipeline(iter([("a", 1), ("b", 2)] * 20), 100, 1, _embed, failing_store, embed_batch=1)
+
+
+def test_iter_text_segments_prefers_paragraph_boundaries() -> None:
+    text = ("x" * 30 + "\n\n") * 10
+    segments = list(iter_text_segments(text, segment_chars=100))
+    assert "".join(segment for segment, _ in segments) == text
+    assert all(page is None for _, page in segments)
+    assert all(segment.startswith("\n\n") or index == 0 for index, (segment, _) in enumerate(segments))
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import importlib.util
+from collections.abc import Iterator
+from typing import Any
+
+import numpy as np
+import pytest
+from database.embedding_space import DEFAULT_EMBEDDING_SPACE, EmbeddingSpace
+from services import finance_gpt, lexical_index
+from services.lexical_index import (
+    ChatLexicalIndex,
+    DocumentPostings,
+    reciprocal_rank_fusion,
+    tokenize,
+)
+
+TEXTS = {
+    1: "Apple (AAPL) revenue grew 8% in fiscal 2024.",
+    2: "Microsoft cloud revenue was $1,234.5 million.",
+    3: "Item 7.01 Regulation FD disclosure for AAPL and AAPL options.",
+    4: "General discussion of market conditions.",
+}
+
+
+def test_tokenize_keeps_tickers_sections_and_figures() -> None:
+    assert tokenize("AAPL rose to $1,234.5 in Item 7.01 of the 10-K.") == [
+        "aapl", "rose", "1234.5", "item", "7.01", "10-k",
+    ]
+
+
+def test_postings_round_trip_and_bm25_ranking() -> None:
+    first = DocumentPostings.from_texts([1, 2], [TEXTS[1], TEXTS[2]])
+    second = DocumentPostings.from_bytes(DocumentPostings.from_texts([3, 4], [TEXTS[3], TEXTS[4]]).to_bytes())
+    index = ChatLexicalIndex(np.array([4, 3, 2, 1, 99]), [first, second])
+
+    assert index.indexed_chunks == 4
+    assert index.search("aapl", 5).tolist() == [1, 3]
+    assert index.search("1,234.5", 5).tolist() == [2]
+    assert index.search("unknownterm", 5).size == 0
+    assert index.scores("revenue")[4] == 0
+
+
+def test_merged_segments_match_a_single_build() -> None:
+    whole = DocumentPostings.from_texts([1, 2, 3], [TEXTS[1], TEXTS[2], TEXTS[3]])
+    merged = DocumentPostings.merge([
+        DocumentPostings.from_texts([1, 2], [TEXTS[1], TEXTS[2]]),
+        DocumentPostings.from_texts([2, 3], [TEXTS[2], TEXTS[3]]),
+    ])
+
+    for name in ("chunk_ids", "lengths", "terms", "indptr", "chunk_positions", "frequencies"):
+        assert np.array_equal(getattr(merged, name), getattr(whole, name)), name
+
+
+def test_ingestion_writes_one_index_segment_per_stored_batch(monkeypatch: pytest.MonkeyPatch) -> None:
+    stored_ids: list[int] = []
+    segments: dict[int, DocumentPostings] = {}
+    monkeypatch.setattr(finance_gpt, "get_document_embedding_space", lambda document_id: DEFAULT_EMBEDDING_SPACE)
+    monkeypatch.setattr(
+        finance_gpt, "embed_passages", lambda texts, space, embed, stats: ([[1.0, 0.0]] * len(texts), [None] * len(texts))
+    )
+    monkeypatch.setattr(
+        finance_gpt,
+        "_store_chunk_rows",
+        lambda rows, embeddings, space, ids: stored_ids.extend(range(len(stored_ids) + 1, len(stored_ids) + len(rows) + 1)),
+    )
+    monkeypatch.setattr(
+        finance_gpt,
+        "get_document_chunk_refs",
+        lambda document_id, after_id=0: [{"chunk_id": chunk_id} for chunk_id in stored_ids if chunk_id > after_id],
+    )
+    monkeypatch.setattr(
+        finance_gpt,
+        "add_document_lexical_segment",
+        lambda document_id, segment, chunk_count, blob: segments.__setitem__(segment, DocumentPostings.from_bytes(blob)),
+    )
+    monkeypatch.setattr(finance_gpt, "save_document_lexical_index", lambda *args: pytest.fail("no rebuild expected"))
+    pages = [(f"page {number} aapl", None) for number in range(300)]
+
+    assert finance_gpt.ingest_document_pages(iter(pages), 40, 10) == 300
+
+    assert sorted(segments) == [1, 2, 3]
+    merged = DocumentPostings.merge(segments[number] for number in sorted(segments))
+    whole = DocumentPostings.from_texts(stored_ids, [text for text, _ in pages])
+    assert merged.chunk_ids.tolist() == list(range(1, 301))
+    assert np.array_equal(merged.frequencies, whole.frequencies)
+
+
+def test_reciprocal_rank_fusion_rewards_agreement() -> None:
+    assert reciprocal_rank_fusion([[5, 1, 2], [1, 7]], 3) == [1, 5, 7]
+
+
+def test_unknown_retrieval_mode_falls_back_to_vector(
+    monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture[str]
+) -> None:
+    monkeypatch.setenv("RETRIEVAL_MODE", "semantic")
+    spec = importlib.util.spec_from_file_location("lexical_index_fresh", lexical_index.__file__)
+    assert spec is not None and spec.loader is not None
+    fresh = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(fresh)
+
+    assert fresh.RETRIEVAL_MODE == "vector"
+    assert "Unknown RETRIEVAL_MODE 'semantic'" in capsys.readouterr().out
+
+
+@pytest.fixture()
+def chat(monkeypatch: pytest.MonkeyPatch) -> Iterator[dict[str, Any]]:
+    vectors = {1: [1.0, 0.0], 2: [0.9, 0.1], 3: [0.0, 1.0], 4: [0.5, 0.5]}
+    rows = [
+        {"chunk_id": chunk_id, "start_index": 0, "end_index": 1, "page_number": None, "document_id": 10 + chunk_id // 3,
+         "document_name": f"doc{10 + chunk_id // 3}", "embedding_vector": np.asarray(vector, dtype=np.float32).tobytes(),
+         "embedding_encoding": "float32"}
+        for chunk_id, vector in vectors.items()
+    ]
+    state: dict[str, Any] = {"embedded": [], "saved": {}, "stored": {}}
+    # Document 10 was ingested in two batches, one index segment each.
+    state["stored"][10] = [
+        DocumentPostings.from_texts([1], [TEXTS[1]]).to_bytes(),
+        DocumentPostings.from_texts([2], [TEXTS[2]]).to_bytes(),
+    ]
+
+    def save(document_id: int, chunk_count: int, postings: bytes) -> None:
+        state["saved"][document_id] = chunk_count
+        state["stored"][document_id] = [postings]
+
+    space = EmbeddingSpace(DEFAULT_EMBEDDING_SPACE.model, 2)
+    finance_gpt.chunk_index_cache.clear()
+    monkeypatch.setattr(finance_gpt, "get_chat_embedding_space", lambda user_email, chat_id: space)
+    monkeypatch.setattr(finance_gpt, "get_chat_chunk_version", lambda user_email, chat_id: (4, 4, 0))
+    monkeypatch.setattr(finance_gpt, "get_chat_chunks", lambda user_email, chat_id, code_scheme=None: rows)
+    monkeypatch.setattr(finance_gpt, "get_chunk_texts", lambda user_email, chunk_ids: {i: TEXTS[i] for i in chunk_ids})
+    monkeypatch.setattr(finance_gpt, "get_chat_lexical_indexes", lambda user_email, chat_id: dict(state["stored"]))
+    monkeypatch.setattr(
+        finance_gpt,
+        "get_document_chunk_texts",
+        lambda document_id: [{"chunk_id": i, "chunk_text": TEXTS[i]} for i in TEXTS if 10 + i // 3 == document_id],
+    )
+    monkeypatch.setattr(finance_gpt, "save_document_lexical_index", save)
+    def get_embedding(question: str, space: EmbeddingSpace | None = None) -> list[float]:
+        state["embedded"].append(question)
+        return [0.0, 1.0]
+
+    monkeypatch.setattr(finance_gpt, "get_embedding", get_embedding)
+    yield state
+    finance_gpt.chunk_index_cache.clear()
+
+
+def test_lexical_mode_skips_embedding_and_indexes_missing_documents(chat: dict[str, Any]) -> None:
+    results = finance_gpt.get_relevant_chunks(2, "AAPL", 5, "user@example.com", mode="lexical")
+
+    assert [text for text, _ in results] == [TEXTS[3], TEXTS[1]]
+    assert chat["embedded"] == []
+    # Document 10's segments are compacted; document 11 is indexed from its text.
+    assert chat["saved"] == {10: 2, 11: 2}
+    assert finance_gpt.chunk_index_cache.stats()["bytes"] > 0
+
+
+def test_hybrid_mode_fuses_lexical_and_vector_rankings(chat: dict[str, Any]) -> None:
+    vector_only = finance_gpt.get_relevant_chunks(1, "Apple revenue", 5, "user@example.com", mode="vector")
+    hybrid = finance_gpt.get_relevant_chunks(2, "Apple revenue", 5, "user@example.com", mode="hybrid")
+
+    assert vector_only[0][0] == TEXTS[3]
+    # Both lexical matches outrank the vector-only winner once fused.
+    assert {text for text, _ in hybrid} == {TEXTS[1], TEXTS[2]}
+    with pytest.raises(ValueError):
+        finance_gpt.get_relevant_chunks(1, "q", 5, "user@example.com", mode="fuzzy")
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+from database.embedding_encoding import encode_code, encode_vector
+from database.embedding_space import EmbeddingSpace
+from services import finance_gpt
+from services.chunk_index_cache import build_chat_index
+from services.quantization import QuantizedMatrix, two_stage_search
+from services.vector_search import normalize_rows, top_k_cosine
+
+
+def _clustered(rows: int, dims: int, queries: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    """Return ``(corpus, queries)`` scattered around the same topic centroids."""
+    rng = np.random.default_rng(0)
+    centroids = normalize_rows(rng.standard_normal((20, dims)))
+    noise = rng.standard_normal((rows + queries, dims)) / np.sqrt(dims)
+    vectors = normalize_rows(centroids[rng.integers(0, 20, rows + queries)] + noise)
+    return vectors[:rows], vectors[rows:]
+
+
+@pytest.mark.parametrize("scheme", ["int8", "binary"])
+def test_two_stage_search_matches_exact_top_k(scheme: str) -> None:
+    corpus, queries = _clustered(2000, 256, queries=10)
+    exact, _ = top_k_cosine(queries, corpus, 5)
+    quantized = QuantizedMatrix.from_normalized(corpus, scheme)
+    loaded: list[np.ndarray] = []
+
+    def load_rows(rows: np.ndarray) -> np.ndarray:
+        loaded.append(rows)
+        return corpus.take(rows, axis=0)
+
+    positions, similarities = two_stage_search(queries, quantized, 5, load_rows, oversample=16)
+
+    hits = sum(len(set(a) & set(b)) for a, b in zip(exact.tolist(), positions.tolist(), strict=True))
+    assert hits / exact.size >= 0.9
+    assert np.all(np.diff(similarities, axis=1) <= 0)
+    assert len(loaded) == 1 and np.all(np.diff(loaded[0]) > 0)
+    assert quantized.nbytes < corpus.nbytes / 3
+
+
+def test_two_stage_search_pads_small_chats() -> None:
+    corpus, _ = _clustered(3, 16)
+    positions, similarities = two_stage_search(
+        corpus[0], QuantizedMatrix.from_normalized(corpus, "int8"), 5, lambda rows: corpus[rows]
+    )
+    assert positions[0, 0] == 0
+    assert positions[0, 3:].tolist() == [-1, -1]
+    assert np.isneginf(similarities[0, 3:]).all()
+
+
+@pytest.mark.parametrize("scheme", ["int8", "binary"])
+def test_stored_codes_match_in_memory_quantization(scheme: str) -> None:
+    corpus, _ = _clustered(4, 32)
+    blobs = [encode_code(row * 3.0, scheme) for row in corpus]
+    stored = QuantizedMatrix.from_blobs(blobs, scheme, 32)
+    direct = QuantizedMatrix.from_normalized(corpus, scheme)
+    np.testing.assert_array_equal(stored.codes, direct.codes)
+    np.testing.assert_allclose(stored.scales, direct.scales)
+
+
+def test_quantized_chat_index_uses_stored_codes_and_fills_gaps() -> None:
+    corpus, _ = _clustered(2, 8)
+    rows = [
+        {"chunk_id": 1, "start_index": 0, "end_index": 1, "document_id": 1, "document_name": "doc",
+         "embedding_code": encode_code(corpus[0], "int8"), "embedding_code_scheme": "int8", "embedding_vector": None},
+        {"chunk_id": 2, "start_index": 1, "end_index": 2, "document_id": 1, "document_name": "doc",
+         "embedding_code": None, "embedding_code_scheme": None,
+         "embedding_vector": encode_vector(corpus[1], "float32"), "embedding_encoding": "float32"},
+        {"chunk_id": 3, "start_index": 2, "end_index": 3, "document_id": 1, "document_name": "doc",
+         "embedding_code": None, "embedding_code_scheme": None, "embedding_vector": None},
+    ]
+
+    index = build_chat_index(rows, 8, quantization="int8")
+
+    assert len(index) == 2 and index.matrix.shape == (0, 8)
+    assert index.codes is not None and len(index.codes) == 2
+    np.testing.assert_array_equal(index.codes.codes, QuantizedMatrix.from_normalized(corpus, "int8").codes)
+
+
+def test_get_relevant_chunks_rescores_quantized_candidates(monkeypatch: pytest.MonkeyPatch) -> None:
+    dims = finance_gpt.EMBEDDING_DIMENSIONS
+    vectors, _ = _clustered(40, dims)
+    rows = [
+        {"chunk_id": chunk_id, "start_index": 0, "end_index": 1, "page_number": None, "document_id": 1,
+         "document_name": "doc", "embedding_code": encode_code(vector, "binary"), "embedding_code_scheme": "binary",
+         "embedding_vector": None}
+        for chunk_id, vector in enumerate(vectors, start=1)
+    ]
+    fetched: list[list[int]] = []
+
+    def get_chunk_embeddings(user_email: str, chunk_ids: list[int]) -> dict[int, tuple[bytes, str]]:
+        fetched.append(chunk_ids)
+        return {chunk_id: (encode_vector(vectors[chunk_id - 1], "float32"), "float32") for chunk_id in chunk_ids}
+
+    finance_gpt.chunk_index_cache.clear()
+    monkeypatch.setattr(finance_gpt, "EMBEDDING_QUANTIZATION", "binary")
+    monkeypatch.setattr(finance_gpt, "get_chat_chunk_version", lambda user_email, chat_id: (40, 40, 0))
+    monkeypatch.setattr(finance_gpt, "get_chat_chunks", lambda user_email, chat_id, code_scheme=None: rows)
+    monkeypatch.setattr(finance_gpt, "get_chunk_embeddings", get_chunk_embeddings)
+    monkeypatch.setattr(finance_gpt, "get_chunk_texts", lambda user_email, chunk_ids: {i: f"text {i}" for i in chunk_ids})
+    monkeypatch.setattr(finance_gpt, "get_embedding", lambda question, space=None: vectors[6].tolist())
+    monkeypatch.setattr(
+        finance_gpt, "get_chat_embedding_space", lambda user_email, chat_id: EmbeddingSpace("text-embedding-3-small", dims)
+    )
+
+    results = finance_gpt.get_relevant_chunks(3, "q", 9, "user@example.com")
+
+    assert results[0] == ("text 7", "doc")
+    assert len(fetched) == 1 and len(fetched[0]) == 32
+    finance_gpt.chunk_index_cache.clear()
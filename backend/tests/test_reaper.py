@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import pytest
+from services import reaper
+
+
+class FakeTables:
+    """Reapable ids per table; deleting a batch removes it."""
+
+    def __init__(
+        self,
+        rows: dict[str, list[int]],
+        failing: set[int] | None = None,
+        citations: dict[int, int] | None = None,
+        embedding_refs: dict[int, int] | None = None,
+    ) -> None:
+        self.rows = rows
+        self.failing = failing or set()
+        # prompt_answers id -> cited chunk id (a foreign key without ON DELETE)
+        self.citations = citations or {}
+        # chunk id -> embedding id; an embedding is orphaned once its chunks are gone
+        self.embedding_refs = embedding_refs or {}
+        self.queries: list[tuple[str, int]] = []
+        self.deleted: list[tuple[str, list[int]]] = []
+
+    def reapable(self, table: str, after_id: int, limit: int) -> list[int]:
+        self.queries.append((table, after_id))
+        rows = self.rows.get(table, [])
+        if table == "embeddings":
+            referenced = {self.embedding_refs[chunk] for chunk in self.rows.get("chunks", []) if chunk in self.embedding_refs}
+            rows = [row_id for row_id in rows if row_id not in referenced]
+        return [row_id for row_id in rows if row_id > after_id][:limit]
+
+    def delete(self, table: str, ids: list[int]) -> int:
+        if self.failing & set(ids):
+            raise RuntimeError("lock wait timeout")
+        cited = {self.citations[answer] for answer in self.rows.get("prompt_answers", [])}
+        if table == "chunks" and cited & set(ids):
+            raise RuntimeError("foreign key constraint fails")
+        self.deleted.append((table, list(ids)))
+        self.rows[table] = [row_id for row_id in self.rows[table] if row_id not in ids]
+        return len(ids)
+
+
+@pytest.fixture()
+def discarded(monkeypatch: pytest.MonkeyPatch) -> list[int]:
+    chats: list[int] = []
+    monkeypatch.setattr(reaper.ann_index, "discard_chat_index", chats.append)
+    return chats
+
+
+def _install(monkeypatch: pytest.MonkeyPatch, tables: FakeTables) -> None:
+    monkeypatch.setattr(reaper, "get_reapable_ids", tables.reapable)
+    monkeypatch.setattr(reaper, "delete_reaped_rows", tables.delete)
+
+
+def test_reap_deletes_children_first_in_throttled_batches(
+    monkeypatch: pytest.MonkeyPatch, discarded: list[int]
+) -> None:
+    tables = FakeTables({"chunks": [1, 2, 3, 4, 5], "documents": [7], "messages": [9, 10], "chats": [3]})
+    _install(monkeypatch, tables)
+    pauses: list[float] = []
+
+    stats = reaper.reap(batch_size=2, pause_seconds=0.1, sleep=pauses.append)
+
+    assert [table for table, _ in tables.deleted] == ["chunks", "chunks", "chunks", "documents", "messages", "chats"]
+    assert tables.deleted[0] == ("chunks", [1, 2])
+    assert stats.deleted["chunks"] == 5 and stats.rows == 9 and stats.batches == 6
+    assert pauses == [0.1, 0.1, 0.1]
+    assert discarded == [3]
+    assert reaper.last_reap_stats() is stats
+    assert "chunks 5" in stats.summary()
+
+
+def test_reap_skips_failed_batches_and_honours_stop(monkeypatch: pytest.MonkeyPatch, discarded: list[int]) -> None:
+    tables = FakeTables({"chunks": [1, 2, 3], "chats": [4]}, failing={1})
+    _install(monkeypatch, tables)
+
+    stats = reaper.reap(batch_size=1, sleep=lambda seconds: None)
+
+    assert stats.failures == 1 and stats.deleted["chunks"] == 2
+    assert tables.rows["chunks"] == [1]
+
+    stop = reaper.threading.Event()
+    stop.set()
+    assert reaper.reap(stop=stop).batches == 0
+
+
+def test_reap_removes_citing_answers_before_their_chunks(
+    monkeypatch: pytest.MonkeyPatch, discarded: list[int]
+) -> None:
+    tables = FakeTables(
+        {"prompt_answers": [11], "chunks": [1, 2, 3], "documents": [7], "chats": [3]},
+        citations={11: 2},
+    )
+    _install(monkeypatch, tables)
+
+    stats = reaper.reap(batch_size=500, sleep=lambda seconds: None)
+
+    assert [table for table, _ in tables.deleted] == ["prompt_answers", "chunks", "documents", "chats"]
+    assert tables.deleted[1] == ("chunks", [1, 2, 3])
+    assert stats.failures == 0 and stats.deleted["prompt_answers"] == 1
+
+
+def test_reap_removes_embeddings_orphaned_by_reaped_chunks(
+    monkeypatch: pytest.MonkeyPatch, discarded: list[int]
+) -> None:
+    tables = FakeTables(
+        {"chunks": [1, 2], "embeddings": [20, 21, 22, 23]},
+        embedding_refs={1: 20, 2: 21},
+    )
+    _install(monkeypatch, tables)
+
+    stats = reaper.reap(batch_size=2, sleep=lambda seconds: None)
+
+    assert tables.deleted == [("chunks", [1, 2]), ("embeddings", [20, 21]), ("embeddings", [22, 23])]
+    assert stats.deleted["embeddings"] == 4 and stats.failures == 0
+
+
+def test_background_reaper_runs_unless_disabled(monkeypatch: pytest.MonkeyPatch) -> None:
+    passes = reaper.threading.Event()
+
+    def fake_reap(stop: reaper.threading.Event | None = None) -> reaper.ReapStats:
+        passes.set()
+        return reaper.ReapStats()
+
+    monkeypatch.setattr(reaper, "reap", fake_reap)
+    monkeypatch.setattr(reaper, "REAPER_ENABLED", False)
+    assert reaper.start_background_reaper() is None
+
+    monkeypatch.setattr(reaper, "REAPER_ENABLED", True)
+    started = reaper.start_background_reaper(interval_seconds=60)
+    assert started is not None
+    thread, stop = started
+    assert passes.wait(timeout=5)
+    stop.set()
+    thread.join(timeout=5)
+    assert not thread.is_alive()
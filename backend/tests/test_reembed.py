@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+from typing import Any
+
+import numpy as np
+import pytest
+from database.embedding_encoding import decode_vector
+from database.embedding_space import EmbeddingSpace
+from services import reembed
+
+OLD = EmbeddingSpace("text-embedding-3-small", 768)
+NEW = EmbeddingSpace("text-embedding-3-large", 4)
+
+
+class FakeChunkStore:
+    """Chunks of one chat plus the staging table, mimicking the db helpers."""
+
+    def __init__(self, count: int) -> None:
+        self.chunks = {chunk_id: {"space": OLD, "text": f"chunk {chunk_id}"} for chunk_id in range(1, count + 1)}
+        self.staged: dict[int, tuple[EmbeddingSpace, bytes]] = {}
+        self.chat_space = OLD
+        self.swaps = 0
+        self.on_swap: Any = None
+
+    def to_reembed(self, chat_id: int, space: EmbeddingSpace, after_id: int, limit: int) -> list[dict[str, Any]]:
+        pending = [
+            {"id": chunk_id, "chunk_text": chunk["text"]}
+            for chunk_id, chunk in sorted(self.chunks.items())
+            if chunk_id > after_id and chunk["space"] != space and self.staged.get(chunk_id, (None,))[0] != space
+        ]
+        return pending[:limit]
+
+    def stage(self, chat_id: int, space: EmbeddingSpace, updates: list[tuple[int, bytes]], encoding: str) -> int:
+        for chunk_id, blob in updates:
+            self.staged[chunk_id] = (space, blob)
+        return len(updates)
+
+    def swap(self, chat_id: int, space: EmbeddingSpace) -> int | None:
+        if self.to_reembed(chat_id, space, 0, 1):
+            return None
+        swapped = 0
+        for chunk_id, (staged_space, blob) in self.staged.items():
+            self.chunks[chunk_id].update(space=staged_space, blob=blob)
+            swapped += 1
+        self.staged.clear()
+        self.chat_space = space
+        self.swaps += 1
+        if self.on_swap:
+            self.on_swap()
+        return swapped
+
+
+@pytest.fixture()
+def store(monkeypatch: pytest.MonkeyPatch) -> FakeChunkStore:
+    fake = FakeChunkStore(5)
+    monkeypatch.setattr(reembed, "get_chunks_to_reembed", fake.to_reembed)
+    monkeypatch.setattr(reembed, "stage_chunk_embeddings", fake.stage)
+    monkeypatch.setattr(reembed, "swap_chat_embedding_space", fake.swap)
+    monkeypatch.setattr(reembed.ann_index, "discard_chat_index", lambda chat_id: None)
+    return fake
+
+
+def _embed(texts: list[str], space: EmbeddingSpace) -> list[list[float]]:
+    return [[float(text.split()[-1])] * space.dimensions for text in texts]
+
+
+def test_reembed_chat_stages_in_throttled_batches_then_swaps_once(store: FakeChunkStore) -> None:
+    pauses: list[float] = []
+
+    stats = reembed.reembed_chat(7, NEW, batch_size=2, pause_seconds=0.5, embed=_embed, sleep=pauses.append)
+
+    assert stats.complete and stats.staged == 5 and stats.swapped == 5
+    assert stats.batches == 3 and pauses == [0.5, 0.5]
+    assert store.swaps == 1 and store.chat_space == NEW
+    assert all(chunk["space"] == NEW for chunk in store.chunks.values())
+    np.testing.assert_array_equal(decode_vector(store.chunks[3]["blob"], dimensions=4), [3.0] * 4)
+
+
+def test_reembed_chat_picks_up_chunks_written_during_the_swap(store: FakeChunkStore) -> None:
+    def late_ingest() -> None:
+        if store.swaps == 1:
+            store.chunks[6] = {"space": OLD, "text": "chunk 6"}
+
+    store.on_swap = late_ingest
+
+    stats = reembed.reembed_chat(7, NEW, batch_size=10, embed=_embed, sleep=lambda seconds: None)
+
+    assert stats.complete and stats.passes == 2 and stats.swapped == 6
+    assert store.chunks[6]["space"] == NEW
+
+
+def test_reembed_chat_stops_before_swapping(store: FakeChunkStore) -> None:
+    stop = reembed.threading.Event()
+
+    def embed(texts: list[str], space: EmbeddingSpace) -> list[list[float]]:
+        stop.set()
+        return _embed(texts, space)
+
+    stats = reembed.reembed_chat(7, NEW, batch_size=2, embed=embed, stop=stop, sleep=lambda seconds: None)
+
+    assert not stats.complete and stats.staged == 2
+    assert store.swaps == 0 and store.chat_space == OLD
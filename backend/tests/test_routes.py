@@ -7,6 +7,7 @@ from unittest.mock import MagicMock
 
 import jwt
 import pytest
+from services.ingestion_jobs import IngestionJobManager
 from werkzeug.exceptions import HTTPException
 
 
@@ -255,6 +256,11 @@ def test_share_and_health_routes(client: Any, app_module: Any, monkeypatch: pyte
     assert health_response.status_code == 200
     assert health_response.get_data(as_text=True) == "Healthy"
 
+    caches_response = client.get("/health/caches")
+    assert caches_response.status_code == 200
+    assert "hit_rate" in caches_response.get_json()["embedding_cache"]
+    assert "hit_rate" in caches_response.get_json()["chunk_index_cache"]
+
 
 def test_reset_everything_success(client: Any, app_module: Any, monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
     output_dir = tmp_path / "output"
@@ -534,6 +540,14 @@ def test_public_upload_success_and_invalid_task(client: Any, app_module: Any, mo
     monkeypatch.setattr(app_module, "add_chat_to_db", lambda *args: 42)
     monkeypatch.setattr(app_module, "add_document_to_db", lambda *args, **kwargs: (5, False))
     monkeypatch.setattr(app_module, "get_text_from_url", lambda url: "text")
+    submitted = []
+
+    def fake_process(source: Any, chat_id: int, max_chunk_size: int, progress: Any) -> None:
+        submitted.append((source.name, source.content))
+        progress("stored", document_id=5)
+
+    jobs = IngestionJobManager(max_workers=1, process=fake_process)
+    monkeypatch.setattr(app_module, "ingestion_jobs", jobs)
 
     success_response = client.post(
         "/public/upload",
@@ -544,8 +558,24 @@ def test_public_upload_success_and_invalid_task(client: Any, app_module: Any, mo
             "files[]": (io.BytesIO(b"pdf"), "sample.pdf"),
         },
     )
-    assert success_response.status_code == 200
-    assert success_response.get_json() == {"id": 42}
+    assert success_response.status_code == 202
+    upload = success_response.get_json()
+    assert upload["id"] == 42
+    assert upload["status_url"] == f"/public/upload/jobs/{upload['job_id']}"
+    jobs.wait(upload["job_id"], app_module._api_key_owner("api-key"), timeout=5)
+    assert submitted == [("sample.pdf", b"pdf")]
+
+    status_response = client.get(upload["status_url"], headers={"Authorization": "Bearer api-key"})
+    assert status_response.status_code == 200
+    assert status_response.get_json()["status"] == "completed"
+    assert status_response.get_json()["files"][0]["stage"] == "stored"
+
+    events_response = client.get(upload["events_url"], headers={"Authorization": "Bearer api-key"})
+    assert events_response.mimetype == "text/event-stream"
+    assert "event: done" in events_response.get_data(as_text=True)
+
+    other_key_response = client.get(upload["status_url"], headers={"Authorization": "Bearer other-key"})
+    assert other_key_response.status_code == 404
 
     invalid_response = client.post(
         "/public/upload",
@@ -556,6 +586,56 @@ def test_public_upload_success_and_invalid_task(client: Any, app_module: Any, mo
     assert "error" in invalid_response.get_json()
 
 
+def test_public_upload_reingests_into_an_existing_chat(
+    client: Any, app_module: Any, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(app_module, "is_api_key_valid", lambda api_key: True)
+    monkeypatch.setattr("database.db_auth.api_key_user_has_credits", lambda api_key, min_credits=1: True)
+    monkeypatch.setattr("database.db_auth.deduct_credits_from_api_key_user", lambda api_key, credits: True)
+    monkeypatch.setattr(app_module, "ensure_SDK_user_exists", lambda user_email: 1)
+    monkeypatch.setattr(app_module, "add_chat_to_db", lambda *args: pytest.fail("no new chat expected"))
+    monkeypatch.setattr(
+        app_module, "get_chat_info", lambda chat_id: (0, 0, "Chat") if chat_id == 7 else (None, None, None)
+    )
+    submitted = []
+
+    def fake_process(source: Any, chat_id: int, max_chunk_size: int, progress: Any) -> None:
+        submitted.append((source.name, chat_id, source.reingest))
+        progress("stored", document_id=5)
+
+    jobs = IngestionJobManager(max_workers=1, process=fake_process)
+    monkeypatch.setattr(app_module, "ingestion_jobs", jobs)
+
+    response = client.post(
+        "/public/upload",
+        headers={"Authorization": "Bearer api-key"},
+        data={
+            "task_type": "documents",
+            "chat_id": "7",
+            "reingest": "true",
+            "files[]": (io.BytesIO(b"pdf v2"), "sample.pdf"),
+        },
+    )
+    assert response.status_code == 202
+    upload = response.get_json()
+    assert upload["id"] == 7
+    jobs.wait(upload["job_id"], app_module._api_key_owner("api-key"), timeout=5)
+    assert submitted == [("sample.pdf", 7, True)]
+
+    missing = client.post(
+        "/public/upload",
+        headers={"Authorization": "Bearer api-key"},
+        data={"task_type": "documents", "chat_id": "8", "reingest": "true"},
+    )
+    assert missing.status_code == 404
+    invalid = client.post(
+        "/public/upload",
+        headers={"Authorization": "Bearer api-key"},
+        data={"task_type": "documents", "chat_id": "seven"},
+    )
+    assert invalid.status_code == 400
+
+
 def test_public_endpoints_require_valid_api_key(client: Any, app_module: Any, monkeypatch: pytest.MonkeyPatch) -> None:
     monkeypatch.setattr(app_module, "is_api_key_valid", lambda api_key: False)
     response = client.post("/public/evaluate", json={"message_id": 1}, headers={"Authorization": "Bearer bad-key"})
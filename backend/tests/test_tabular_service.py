@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any
+
+import pytest
+from services import finance_gpt, table_store
+from services.tabular_service import ingest_tabular, is_tabular_file, iter_tabular_segments
+
+SALES = (
+    b"region,amount,zip\n"
+    b"North,1200,01234\n"
+    b"South,\"1,500.50\",\n"
+    b"\n"
+    b"North,300,98765\n"
+    b"West|East,75,10001\n"
+)
+
+
+@pytest.fixture(autouse=True)
+def store_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    monkeypatch.setattr(table_store, "TABLE_STORE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def test_row_groups_repeat_the_header_and_fit_the_chunk_size() -> None:
+    segments = list(iter_tabular_segments(SALES, "sales.csv", max_chunk_chars=110))
+
+    assert len(segments) > 1
+    for text, page_number in segments:
+        assert page_number is None
+        assert len(text) <= 110
+        assert "| region | amount | zip |\n| --- | --- | --- |\n" in text
+        assert text.endswith("\n\n")
+    assert segments[0][0].startswith("### sales.csv — rows 1-")
+    assert "| West\\|East | 75 | 10001 |" in segments[-1][0]
+    assert ingest_tabular(SALES, "sales.csv") == "".join(text for text, _ in iter_tabular_segments(SALES, "sales.csv"))
+    assert is_tabular_file("Sales.XLSX") and is_tabular_file("export", "text/csv") and not is_tabular_file("a.pdf")
+
+
+def test_rows_are_written_to_a_queryable_store(store_dir: Path) -> None:
+    with table_store.TableWriter(4) as tables:
+        for _ in iter_tabular_segments(SALES, "sales.csv", max_chunk_chars=110, tables=tables):
+            assert not table_store.has_tables(4)
+
+    assert list(store_dir.iterdir()) == [Path(table_store.store_path(4))]
+    assert table_store.describe_tables(4) == [
+        {"table": "data", "columns": [("region", "text"), ("amount", "number"), ("zip", "text")], "rows": 4}
+    ]
+    columns, rows, truncated = table_store.query_tables(
+        4, "SELECT region, SUM(amount) AS total FROM data GROUP BY region ORDER BY region"
+    )
+    assert columns == ["region", "total"]
+    assert rows == [("North", 1500), ("South", 1500.5), ("West|East", 75)]
+    assert not truncated
+    assert table_store.query_tables(4, "SELECT zip FROM data", max_rows=2) == (["zip"], [("01234",), (None,)], True)
+
+
+def test_queries_are_read_only_single_selects() -> None:
+    with table_store.TableWriter(5) as tables:
+        tables.start_table("data", ["a"])
+        tables.add_rows([[1], [2]])
+
+    for statement in ("DELETE FROM data", "SELECT 1; SELECT 2", "ATTACH DATABASE 'x.db' AS x", "PRAGMA table_info(data)"):
+        with pytest.raises(ValueError):
+            table_store.query_tables(5, statement)
+    assert table_store.query_tables(5, "SELECT COUNT(*) FROM data;")[1] == [(2,)]
+    with pytest.raises(LookupError):
+        table_store.query_tables(6, "SELECT 1")
+
+
+def test_failed_ingestion_keeps_the_previous_store(monkeypatch: pytest.MonkeyPatch) -> None:
+    streamed: list[Any] = []
+
+    def fake_pages(segments: Any, max_chunk_size: int, document_id: int, append_text: Any, progress: Any) -> int:
+        streamed.extend(segments)
+        return len(streamed)
+
+    monkeypatch.setattr(finance_gpt, "ingest_document_pages", fake_pages)
+    assert finance_gpt.ingest_tabular_document(SALES, "sales.csv", "text/csv", 110, 7) == len(streamed)
+    assert table_store.query_tables(7, "SELECT COUNT(*) FROM data")[1] == [(4,)]
+
+    def failing_pages(segments: Any, *args: Any, **kwargs: Any) -> int:
+        next(iter(segments))
+        raise RuntimeError("embedding failed")
+
+    monkeypatch.setattr(finance_gpt, "ingest_document_pages", failing_pages)
+    with pytest.raises(RuntimeError):
+        finance_gpt.ingest_tabular_document(b"region\nEast\n", "sales.csv", "text/csv", 110, 7)
+    assert table_store.query_tables(7, "SELECT COUNT(*) FROM data")[1] == [(4,)]
+
+
+def test_failed_upload_task_discards_the_new_document(monkeypatch: pytest.MonkeyPatch) -> None:
+    discarded: list[int] = []
+
+    def failing_pages(segments: Any, *args: Any, **kwargs: Any) -> int:
+        raise RuntimeError("embedding failed")
+
+    monkeypatch.setattr(finance_gpt, "ingest_document_pages", failing_pages)
+    monkeypatch.setattr(finance_gpt, "discard_document", discarded.append)
+
+    with pytest.raises(RuntimeError):
+        finance_gpt.chunk_tabular_document.remote(SALES, "sales.csv", "text/csv", 110, 8)
+    assert discarded == [8]
+    assert not table_store.has_tables(8)
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+from services.vector_search import normalize_rows, top_k_cosine
+
+
+def test_normalize_rows_uses_per_row_norms() -> None:
+    normalized = normalize_rows(np.array([[3.0, 4.0], [0.0, 2.0], [0.0, 0.0]]))
+    assert normalized.dtype == np.float32
+    assert np.allclose(normalized, [[0.6, 0.8], [0.0, 1.0], [0.0, 0.0]])
+
+
+def test_top_k_cosine_matches_full_argsort() -> None:
+    rng = np.random.default_rng(7)
+    matrix = rng.normal(size=(200, 16))
+    queries = rng.normal(size=(3, 16))
+
+    indices, scores = top_k_cosine(queries, normalize_rows(matrix), 5)
+
+    assert indices.shape == scores.shape == (3, 5)
+    expected = normalize_rows(queries) @ normalize_rows(matrix).T
+    for row in range(3):
+        assert indices[row].tolist() == np.argsort(-expected[row])[:5].tolist()
+        assert np.all(np.diff(scores[row]) <= 0)
+
+
+def test_top_k_cosine_clamps_k_and_accepts_single_query() -> None:
+    matrix = normalize_rows(np.array([[1.0, 0.0], [0.0, 1.0]]))
+    indices, scores = top_k_cosine(np.array([0.0, 2.0]), matrix, 10)
+    assert indices.tolist() == [[1, 0]]
+    assert scores[0, 0] == pytest.approx(1.0)
+
+    empty_indices, _ = top_k_cosine(np.array([0.0, 2.0]), matrix, 0)
+    assert empty_indices.shape == (1, 0)
+
+
+def test_top_k_cosine_rejects_dimension_mismatch() -> None:
+    with pytest.raises(ValueError):
+        top_k_cosine(np.array([1.0, 0.0, 0.0]), normalize_rows(np.eye(2)), 1)
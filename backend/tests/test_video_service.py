@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import random
+import re
+import subprocess
+import threading
+from pathlib import Path
+from typing import Any
+
+import pytest
+from services import video_service
+from services.video_service import Frame, VideoStats
+
+FLAT = bytes([10] * 72)
+RAMP = bytes(range(72))
+
+
+@pytest.fixture(autouse=True)
+def video_config(monkeypatch: pytest.MonkeyPatch) -> None:
+    for name, value in {
+        "VIDEO_FRAME_INTERVAL_SECS": 30,
+        "VIDEO_MAX_FRAMES": 20,
+        "VIDEO_SCENE_THRESHOLD": 0.3,
+        "VIDEO_FRAME_DEDUP_DISTANCE": 6,
+        "VIDEO_VISION_CONCURRENCY": 4,
+    }.items():
+        monkeypatch.setattr(video_service.AgentConfig, name, value, raising=False)
+
+
+def test_near_duplicate_frames_are_dropped_and_rest_spread_evenly() -> None:
+    flat, ramp = video_service._dhash(FLAT), video_service._dhash(RAMP)
+    nearly_flat = flat | 1
+    frames = [Frame(0.0, "a", flat), Frame(4.0, "b", ramp), Frame(9.0, "c", nearly_flat), Frame(12.0, "d", -1)]
+
+    assert flat == 0 and ramp == 2**64 - 1
+    assert [frame.path for frame in video_service._drop_near_duplicates(frames, 6)] == ["a", "b", "d"]
+    assert [frame.path for frame in video_service._spread(frames, 2)] == ["a", "d"]
+
+
+def test_extract_frames_reads_scene_timestamps_and_thumbnails(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    commands: list[list[str]] = []
+
+    def fake_run(command: list[str], **kwargs: Any) -> subprocess.CompletedProcess[bytes]:
+        commands.append(command)
+        for index in (1, 2):
+            (tmp_path / f"frame_{index:04d}.jpg").write_bytes(b"jpeg")
+        (tmp_path / "thumbnails.gray").write_bytes(FLAT + RAMP)
+        stderr = b"[Parsed_showinfo_1] n:0 pts:0 pts_time:0\n[Parsed_showinfo_1] n:1 pts:9 pts_time:12.5 \n"
+        return subprocess.CompletedProcess(command, 0, b"", stderr)
+
+    monkeypatch.setattr(video_service.subprocess, "run", fake_run)
+
+    frames = video_service._extract_frames("video.mp4", str(tmp_path), 30, 80, 0.3)
+
+    assert [(frame.timestamp, Path(frame.path).name) for frame in frames] == [
+        (0.0, "frame_0001.jpg"), (12.5, "frame_0002.jpg"),
+    ]
+    assert [frame.phash for frame in frames] == [0, 2**64 - 1]
+    assert "gt(scene,0.3)" in " ".join(commands[0])
+
+
+def test_analyse_describes_frames_concurrently_alongside_audio(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    frame_dir = tmp_path / "frames"
+    frame_dir.mkdir()
+    frames = []
+    for index, (timestamp, thumbnail) in enumerate([(0.0, FLAT), (65.0, RAMP), (90.0, FLAT)]):
+        path = frame_dir / f"frame_{index}.jpg"
+        path.write_bytes(f"frame{index}".encode())
+        frames.append(Frame(timestamp, str(path), video_service._dhash(thumbnail)))
+
+    both_frames_in_flight = threading.Barrier(2, timeout=5)
+    vision_started = threading.Event()
+
+    def describe(image_bytes: bytes, mime_type: str = "image/jpeg") -> str:
+        vision_started.set()
+        both_frames_in_flight.wait()
+        return f"described {image_bytes.decode()}"
+
+    def transcribe(audio_bytes: bytes, filename: str = "audio.mp3") -> str:
+        assert vision_started.wait(timeout=5)
+        return "spoken words"
+
+    monkeypatch.setattr(video_service, "_get_duration", lambda path: 125.0)
+    monkeypatch.setattr(video_service, "_extract_frames", lambda *args, **kwargs: frames)
+    monkeypatch.setattr(video_service, "_extract_audio_track", lambda path, output_dir: b"mp3")
+    monkeypatch.setattr(video_service, "describe_image", describe)
+    monkeypatch.setattr(video_service, "transcribe_audio", transcribe)
+
+    stats = VideoStats()
+    document = video_service._analyse(b"video", "clip.mp4", str(tmp_path), stats)
+
+    assert "duration: 2m 5s" in document
+    assert document.index("**[00:00]** described frame0") < document.index("**[01:05]** described frame1")
+    assert "frame2" not in document
+    assert document.endswith("## Audio transcript\n\nspoken words")
+    assert (stats.candidates, stats.duplicates, stats.described) == (3, 1, 2)
+    assert stats.seconds >= stats.vision_seconds
+
+
+def test_candidates_cover_a_long_fast_cutting_video(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    duration = 2 * 3600.0
+    frame_dir = tmp_path / "frames"
+
+    def fake_run(command: list[str], **kwargs: Any) -> subprocess.CompletedProcess[bytes]:
+        graph = command[command.index("-filter_complex") + 1]
+        min_gap, interval = (float(value) for value in re.findall(r"gte\(t-prev_selected_t,([0-9.]+)\)", graph))
+        limit = int(command[command.index("-frames:v") + 1])
+        selected: list[float] = []
+        for second in range(int(duration)):
+            since = second - selected[-1] if selected else None
+            scene_cut = second % 2 == 0
+            if since is None or (scene_cut and since >= min_gap) or since >= interval:
+                selected.append(float(second))
+        selected = selected[:limit]
+        for index in range(len(selected)):
+            (frame_dir / f"frame_{index + 1:04d}.jpg").write_bytes(b"jpeg")
+        (frame_dir / "thumbnails.gray").write_bytes(b"".join(random.Random(i).randbytes(72) for i in selected))
+        stderr = "".join(f"[Parsed_showinfo_1] n:{i} pts:0 pts_time:{t}\n" for i, t in enumerate(selected))
+        return subprocess.CompletedProcess(command, 0, b"", stderr.encode())
+
+    described: list[float] = []
+
+    def describe_frame(frame: Frame) -> str:
+        described.append(frame.timestamp)
+        return f"frame at {frame.timestamp}\n"
+
+    monkeypatch.setattr(video_service.subprocess, "run", fake_run)
+    monkeypatch.setattr(video_service, "_get_duration", lambda path: duration)
+    monkeypatch.setattr(video_service, "_audio_section", lambda *args: "")
+    monkeypatch.setattr(video_service, "_describe_frame", describe_frame)
+
+    stats = VideoStats()
+    video_service._analyse(b"video", "talk.mp4", str(tmp_path), stats)
+
+    assert stats.candidates <= 20 * 4 + 1
+    assert len(described) == 20
+    assert described[0] == 0.0 and described[-1] >= 0.95 * duration
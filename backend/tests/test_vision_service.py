@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import io
+import threading
+from pathlib import Path
+
+import pytest
+from services import vision_service
+from services.vision_cache import VisionCache, content_hash
+
+
+@pytest.fixture(autouse=True)
+def vision_config(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> VisionCache:
+    for name, value in {
+        "ENABLE_MULTIMODAL": True,
+        "MAX_IMAGE_BYTES": 1024 * 1024,
+        "DEFAULT_AGENT_MODEL_TYPE": 0,
+        "OPENAI_VISION_MODEL": "vision-a",
+        "ANTHROPIC_VISION_MODEL": "vision-b",
+        "VISION_JPEG_QUALITY": 85,
+        "VISION_DESCRIBE_CONCURRENCY": 4,
+    }.items():
+        monkeypatch.setattr(vision_service.AgentConfig, name, value, raising=False)
+    cache = VisionCache(disk_path=str(tmp_path / "vision.sqlite3"))
+    monkeypatch.setattr(vision_service, "vision_cache", cache)
+    return cache
+
+
+def test_descriptions_are_cached_by_image_prompt_and_model(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    calls: list[tuple[str, str]] = []
+
+    def fake_openai(data_b64: str, mime_type: str, prompt: str, model: str) -> str:
+        calls.append((prompt, model))
+        if prompt == "fail":
+            raise RuntimeError("rate limited")
+        return f"described by {model}"
+
+    monkeypatch.setattr(vision_service, "_describe_openai", fake_openai)
+
+    assert vision_service.describe_image(b"png", "image/png") == "described by vision-a"
+    assert vision_service.describe_image(b"png", "image/png") == "described by vision-a"
+    assert vision_service.describe_image(b"png", "image/png", model="vision-c") == "described by vision-c"
+    assert vision_service.describe_image(b"png", "image/png", prompt="fail").startswith("[Image description failed")
+    assert vision_service.describe_image(b"png", "image/png", prompt="fail").startswith("[Image description failed")
+    assert len(calls) == 4
+
+    reopened = VisionCache(disk_path=str(tmp_path / "vision.sqlite3"))
+    assert reopened.get("vision-a", vision_service._INDEXING_PROMPT, content_hash(b"png")) == "described by vision-a"
+    assert reopened.get("vision-a", "fail", content_hash(b"png")) is None
+
+
+def test_attachments_are_described_concurrently_in_order(monkeypatch: pytest.MonkeyPatch) -> None:
+    in_flight = threading.Barrier(2, timeout=5)
+    calls: list[bytes] = []
+
+    def fake_describe(image_bytes: bytes, mime_type: str = "image/jpeg", **kwargs: object) -> str:
+        calls.append(image_bytes)
+        in_flight.wait()
+        return f"{image_bytes.decode()} ({mime_type})"
+
+    monkeypatch.setattr(vision_service, "describe_image", fake_describe)
+
+    described = vision_service.describe_images([(b"one", "image/png"), (b"two", "image/gif"), (b"one", "image/png")])
+
+    assert described == ["one (image/png)", "two (image/gif)", "one (image/png)"]
+    assert sorted(calls) == [b"one", b"two"]
+
+
+def test_images_are_downscaled_to_the_provider_resolution() -> None:
+    image_module = pytest.importorskip("PIL.Image")
+    original = io.BytesIO()
+    image_module.new("RGB", (4000, 3000), (200, 30, 30)).save(original, format="PNG")
+
+    openai_bytes, openai_mime = vision_service.prepare_image(original.getvalue(), "image/png", 0)
+    anthropic_bytes, _ = vision_service.prepare_image(original.getvalue(), "image/png", 1)
+
+    assert openai_mime == "image/jpeg"
+    assert image_module.open(io.BytesIO(openai_bytes)).size == (1024, 768)
+    width, height = image_module.open(io.BytesIO(anthropic_bytes)).size
+    assert max(width, height) <= 1568 and width * height <= 1_150_000
+    assert vision_service.prepare_image(b"not an image", "image/png", 0) == (b"not an image", "image/png")